@@ -7,10 +7,57 @@ import os
 ACCESS_KEY = os.getenv("VOLCENGINE_ACCESS_KEY")
 SECRET_KEY = os.getenv("VOLCENGINE_SECRET_KEY")
 
+
+def _parse_credentials(value):
+    """
+    解析多账号配置
+
+    格式: "ak:sk[:qps[:max_tasks]],ak:sk..."，未指定的配额使用默认值
+    """
+    credentials = []
+    for item in (value or "").split(","):
+        parts = [part.strip() for part in item.strip().split(":")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            continue
+        spec = {"access_key": parts[0], "secret_key": parts[1]}
+        if len(parts) > 2 and parts[2]:
+            spec["qps"] = float(parts[2])
+        if len(parts) > 3 and parts[3]:
+            spec["max_tasks"] = int(parts[3])
+        credentials.append(spec)
+    return credentials
+
+
+# 多账号配置（可选），提交任务时在账号间分摊配额
+CREDENTIALS = _parse_credentials(os.getenv("VOLCENGINE_CREDENTIALS"))
+
 # 区域配置
 REGION = "cn-north-1"  # 固定值
 SERVICE = "cv"         # 固定值
 
+
+def _parse_endpoints(value):
+    """
+    解析接入点配置
+
+    格式: "url[|region],url[|region]"，未指定区域时使用 REGION
+    """
+    endpoints = []
+    for item in (value or "").split(","):
+        url, _, region = item.strip().partition("|")
+        if url:
+            endpoints.append({"url": url.strip(), "region": region.strip() or REGION})
+    return endpoints
+
+
+# 接入点配置（可选多个，按延迟和可用性自动选择）
+ENDPOINTS = _parse_endpoints(os.getenv("VOLCENGINE_ENDPOINTS")) or [
+    {"url": "https://visual.volcengineapi.com", "region": REGION}
+]
+ENDPOINT_PROBE_INTERVAL = 30   # 后台延迟探测间隔（秒），0 表示不探测
+ENDPOINT_PROBE_TIMEOUT = 3     # 探测请求超时（秒）
+ENDPOINT_RETRY_AFTER = 30      # 接入点连接失败后暂停使用的时间（秒）
+
 # API版本
 API_VERSION = "2022-08-31"
 
@@ -32,9 +79,209 @@ REQ_KEYS = {
 
 # 超时配置
 DEFAULT_TIMEOUT = 30  # 请求超时时间（秒）
+CONNECT_TIMEOUT = 5   # 建立连接超时时间（秒）
+READ_TIMEOUT = DEFAULT_TIMEOUT  # 读取响应超时时间（秒）
+DOWNLOAD_READ_TIMEOUT = 60      # 下载文件时两次数据块之间的最长间隔（秒）
 MAX_WAIT_TIME = 600   # 最大等待时间（秒）
 CHECK_INTERVAL = 5    # 检查间隔（秒）
 
 # 重试配置
 MAX_RETRIES = 3       # 最大重试次数
-RETRY_DELAY = 2       # 重试延迟（秒）
\ No newline at end of file
+RETRY_DELAY = 2       # 重试延迟（秒）
+
+# 熔断配置（按 req_key + action 统计）
+CIRCUIT_WINDOW_SIZE = 20       # 统计最近N次请求
+CIRCUIT_MIN_REQUESTS = 10      # 至少N次请求后才计算错误率
+CIRCUIT_ERROR_RATE = 0.5       # 错误率阈值
+CIRCUIT_OPEN_SECONDS = 30      # 熔断持续时间（秒）
+CIRCUIT_HALF_OPEN_PROBES = 1   # 半开状态允许的探测请求数
+
+# 视为服务端故障的业务错误码
+SERVER_ERROR_CODES = {50500, 50501}
+
+# 限流错误码：50429 QPS超限，50430 并发任务数超限
+RATE_LIMIT_CODES = {50429, 50430}
+
+# 自适应并发限制配置（按 req_key 用 AIMD 调整同时进行的请求数，见 modules/adaptive_limiter.py）
+ADAPTIVE_LIMIT_ENABLED = os.getenv("VOLCENGINE_ADAPTIVE_LIMIT", "1") != "0"   # 是否启用
+ADAPTIVE_LIMIT_INITIAL = 4       # 初始并发上限
+ADAPTIVE_LIMIT_MIN = 1           # 并发上限下限
+ADAPTIVE_LIMIT_MAX = 64          # 并发上限上限
+ADAPTIVE_LIMIT_BACKOFF = 0.5     # 拥塞时上限乘以的系数
+ADAPTIVE_LATENCY_RATIO = 2.0     # 延迟超过基线N倍视为拥塞
+ADAPTIVE_LATENCY_SLACK = 1.0     # 且至少超过基线N秒
+ADAPTIVE_ERROR_WINDOW = 20       # 统计错误率的最近请求数
+ADAPTIVE_ERROR_RATE = 0.3        # 错误率超过该值视为拥塞
+ADAPTIVE_ACQUIRE_TIMEOUT = 60    # 等待并发名额的最长时间（秒）
+
+# 接口分类
+SUBMIT_ACTIONS = {"CVSubmitTask", "CVSync2AsyncSubmitTask"}   # 提交异步任务
+QUERY_ACTIONS = {"CVGetResult", "CVSync2AsyncGetResult"}      # 查询异步任务
+TERMINAL_STATUSES = {"done", "not_found", "expired"}           # 任务终止状态
+
+# 对冲请求配置（仅用于幂等查询接口）
+HEDGE_ENABLED = False                                      # 默认关闭，可在客户端上单独开启
+HEDGEABLE_ACTIONS = {"CVGetResult", "CVSync2AsyncGetResult"}
+HEDGE_BUDGET_RATIO = 0.05      # 对冲请求最多占总请求的5%
+HEDGE_MIN_SAMPLES = 20         # 至少N个延迟样本后才开始对冲
+HEDGE_MIN_DELAY = 0.5          # 对冲延迟下限（秒）
+HEDGE_MAX_WORKERS = 16         # 对冲线程池大小（只用于对冲请求，主请求不经过线程池）
+
+# 任务句柄配置
+TASK_POLL_WORKERS = 32         # 后台轮询线程数
+TASK_HANDLE_MAX_WAIT = 43200   # 句柄后台轮询的最长时间（秒），与任务结果有效期12小时一致
+
+# 任务轮询配置（各客户端 wait_for_completion 的 check_interval 作为间隔上限）
+POLL_MIN_INTERVAL = 2          # 最短轮询间隔（秒）
+POLL_BACKOFF = 1.5             # 轮询间隔增长倍数
+
+# 账号配额配置（可在 VOLCENGINE_CREDENTIALS 中按账号覆盖）
+ACCOUNT_QPS = 10               # 单账号每秒请求数上限
+ACCOUNT_MAX_TASKS = int(os.getenv("VOLCENGINE_ACCOUNT_MAX_TASKS", "0"))   # 单账号同时进行的异步任务上限（0 表示不限制）
+ACCOUNT_TASK_IDLE = 300        # 任务超过此时间（秒）没有被查询时视为已放弃等待，归还其并发名额
+ACCOUNT_COOLDOWN = 30          # 账号被限流或连续出错后的暂停时间（秒）
+ACCOUNT_ACQUIRE_TIMEOUT = 30   # 等待可用账号的最长时间（秒）
+
+# 全局配额协调配置（多进程/多机共用账号时按 账号+req_key 限制QPS和并发任务数，见 modules/quota_coordinator.py）
+# 后端：空表示不启用；file:路径 单机多进程；redis://主机:端口/库 多机；memory 仅本进程
+QUOTA_BACKEND = os.getenv("VOLCENGINE_QUOTA_BACKEND", "")
+QUOTA_KEY_PREFIX = "volc:quota:"     # Redis 键前缀
+QUOTA_TASK_LEASE = 900               # 任务名额的租约（秒），轮询时续期，进程崩溃后到期回收
+QUOTA_SLOT_POLL_INTERVAL = 0.5       # 并发名额已满时重新尝试的间隔（秒）
+QUOTA_ACQUIRE_TIMEOUT = 60           # 等待全局配额的最长时间（秒）
+QUOTA_ERROR_LOG_INTERVAL = 60        # 存储不可用警告的最短打印间隔（秒）
+
+
+def _parse_weights(value):
+    """
+    解析租户权重配置
+
+    格式: "tenant:weight,tenant:weight"
+    """
+    weights = {}
+    for item in (value or "").split(","):
+        name, _, weight = item.strip().partition(":")
+        if name.strip() and weight.strip():
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+# 公平调度配置（提交任务按通道和租户加权赤字轮询分配配额，见 modules/fair_scheduler.py）
+SCHEDULER_ENABLED = os.getenv("VOLCENGINE_FAIR_SCHEDULER", "1") != "0"   # 是否启用
+SCHEDULER_LANE_WEIGHTS = {"interactive": 8, "standard": 4, "bulk": 1}    # 通道权重
+SCHEDULER_TENANT_WEIGHTS = _parse_weights(os.getenv("VOLCENGINE_TENANT_WEIGHTS"))   # 租户权重，未配置的为1
+SCHEDULER_DEFAULT_LANE = os.getenv("VOLCENGINE_LANE", "standard")        # 未指定时的通道
+SCHEDULER_DEFAULT_TENANT = os.getenv("VOLCENGINE_TENANT", "default")     # 未指定时的租户
+SCHEDULER_TURNS = 1              # 每个服务（req_key）同时在占用配额和并发名额的提交请求数
+SCHEDULER_QUANTUM = 1.0          # 权重为1的队列每轮获得的份额（按任务数）
+SCHEDULER_WAIT_TIMEOUT = None    # 排队等待的最长时间（秒），None 表示只受截止时间限制
+
+# 作业队列与 worker 配置（python volcengine_ai.py worker，见 modules/job_queue.py、modules/job_worker.py）
+JOB_QUEUE_BACKEND = os.getenv("VOLCENGINE_JOB_QUEUE", "")          # 空: 本机SQLite；sqlite:路径；redis://主机:端口/库
+JOB_QUEUE_PATH = os.getenv("VOLCENGINE_JOB_DB", "data/jobs.db")    # 默认SQLite路径
+JOB_QUEUE_KEY_PREFIX = "volc:jobs:"                                # Redis 键前缀
+JOB_LANE_PRIORITY = {"interactive": 0, "standard": 1, "bulk": 2}   # 领取优先级（越小越先领取）
+JOB_MAX_ATTEMPTS = 3             # 作业最大尝试次数
+JOB_RETRY_DELAY = 30             # 失败后首次重试间隔（秒），之后逐次加倍
+JOB_WORKER_CONCURRENCY = 16      # 每个 worker 进程同时处理的作业数
+JOB_LEASE_SECONDS = 120          # 作业租约（秒），worker 每1/3租约续期一次
+JOB_POLL_INTERVAL = 2            # 队列为空时的领取间隔（秒）
+JOB_DRAIN_TIMEOUT = 60           # 停止时等待处理中作业的最长时间（秒）
+JOB_TIMEOUT = 3600               # 单个作业等待任务完成的默认最长时间（秒）
+JOB_OUTPUT_DIR = os.getenv("VOLCENGINE_JOB_OUTPUT", "output/jobs")   # 结果视频保存目录
+
+# HTTP 网关配置（python volcengine_ai.py serve，见 modules/gateway.py）
+GATEWAY_HOST = os.getenv("VOLCENGINE_GATEWAY_HOST", "127.0.0.1")      # 监听地址
+GATEWAY_PORT = int(os.getenv("VOLCENGINE_GATEWAY_PORT", "8080"))       # 监听端口
+GATEWAY_TOKEN = os.getenv("VOLCENGINE_GATEWAY_TOKEN", "")              # 访问令牌（Authorization: Bearer），空表示不校验
+GATEWAY_COALESCE_TTL = 600       # 相同的提交请求在任务完成后继续合并的时间（秒）
+GATEWAY_RESULT_TTL = 3600        # 任务结束后保留结果的时间（秒）
+GATEWAY_MAX_WAIT = 60            # 结果接口单次长轮询的最长等待时间（秒）
+GATEWAY_TASK_TIMEOUT = 3600      # 单个任务后台轮询的最长时间（秒）
+GATEWAY_MAX_FOREIGN = 1000       # 同时跟踪的非本网关提交的任务数上限（状态/结果接口按需轮询的任务）
+GATEWAY_MAX_BODY = 1048576       # 请求体大小上限（字节）
+
+# 图片预检配置
+IMAGE_PREFLIGHT_WORKERS = None   # 缩放进程数，None 表示按CPU核数
+IMAGE_PREFLIGHT_QUALITY = 90     # 重新压缩的JPEG初始质量（超过大小上限时逐步降低）
+IMAGE_HEADER_BYTES = 65536       # 远程图片预检时最多读取的字节数
+
+# 请求体编码配置（本地图片以base64放入请求体时使用）
+PAYLOAD_ENCODE_WORKERS = 4       # 并行编码线程数
+PAYLOAD_CHUNK_SIZE = 786432      # 每次读取并编码的原始字节数（768KB，需为3的倍数）
+
+# 媒体探测配置（提交前通过Range请求读取音视频时长）
+MEDIA_PROBE_ENABLED = os.getenv("VOLCENGINE_MEDIA_PROBE", "") == "1"   # 是否在提交前检查时长（默认关闭，由服务端校验）
+MEDIA_PROBE_HEAD_BYTES = 65536        # 首次读取的字节数
+MEDIA_PROBE_MAX_MOOV = 8388608        # MP4 moov盒的读取上限（8MB）
+MEDIA_PROBE_CACHE_SIZE = 1024         # 缓存的URL数
+MEDIA_PROBE_CACHE_TTL = 300           # 缓存免验证时间（秒），过期后按ETag重新验证
+
+# 本地媒体处理配置
+FFMPEG_BINARY = os.getenv("VOLCENGINE_FFMPEG", "ffmpeg")   # ffmpeg 可执行文件
+
+# 长音频模式配置（超过服务时长上限的音频按静音切分后并行渲染）
+LONG_AUDIO_SAMPLE_RATE = 44100   # 非WAV音频解码后的采样率
+LONG_AUDIO_MARGIN = 1.0          # 每段比服务上限短的秒数
+LONG_AUDIO_MAX_PARALLEL = 8      # 同时渲染的片段数
+
+# 输入URL校验配置（提交前并发检查URL可达性、内容类型和大小）
+URL_CHECK_ENABLED = os.getenv("VOLCENGINE_URL_CHECK", "") == "1"   # 是否在提交前检查（默认关闭，只做语法检查）
+URL_CHECK_TIMEOUT = 5            # 单个检查请求的读取超时（秒）
+URL_CHECK_WORKERS = 16           # 并发检查线程数
+URL_CHECK_CACHE_SIZE = 4096      # 缓存的URL数
+URL_CHECK_CACHE_TTL = 600        # 检查结果有效期（秒）
+URL_CHECK_ALLOW_PRIVATE = os.getenv("VOLCENGINE_URL_ALLOW_PRIVATE", "") == "1"   # 是否允许内网地址
+
+# 任务记录配置（SQLite，记录任务结果和结果文件的本地镜像路径）
+# 默认不记录；启用结果镜像或任务所有权时自动启用。默认路径在用户数据目录（$XDG_DATA_HOME 或 ~/.local/share）下
+TASK_STORE_ENABLED = os.getenv("VOLCENGINE_TASK_STORE", "") == "1"
+TASK_STORE_PATH = os.getenv("VOLCENGINE_TASK_DB") or os.path.join(
+    os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"), "volcengine", "tasks.db"
+)
+
+# 任务所有权配置（多个节点共用租约存储时，每个任务只由持有租约的节点轮询，见 modules/task_ownership.py）
+TASK_OWNERSHIP_ENABLED = os.getenv("VOLCENGINE_TASK_OWNERSHIP", "") == "1"   # 是否启用
+TASK_OWNERSHIP_NODE_ID = os.getenv("VOLCENGINE_NODE_ID", "")                 # 节点标识，空表示 主机名:进程号
+TASK_LEASE_BACKEND = os.getenv("VOLCENGINE_TASK_LEASE_BACKEND", "")          # 租约存储，空: 任务记录所在的SQLite（仅单机多进程）；redis://主机:端口/库 多机
+TASK_LEASE_KEY_PREFIX = "volc:tasks:"                                        # Redis 键前缀
+TASK_LEASE_SECONDS = 60          # 任务租约（秒），超过该时间未轮询的任务交还给其他节点
+TASK_OWNERSHIP_HEARTBEAT = 15    # 续期租约、节点心跳和孤儿任务扫描的间隔（秒），不超过租约的1/3
+TASK_OWNERSHIP_VNODES = 64       # 一致性哈希环上每个节点的虚拟节点数
+TASK_ORPHAN_SCAN_LIMIT = 500     # 每次扫描最多检查的孤儿任务数
+
+# 结果镜像配置（任务完成后在后台下载结果中的临时URL）
+RESULT_MIRROR_ENABLED = os.getenv("VOLCENGINE_RESULT_MIRROR", "") == "1"   # 是否启用（默认关闭）
+RESULT_MIRROR_WORKERS = 4        # 同时下载的文件数
+RESULT_MIRROR_RETRY_DELAY = 10   # 下载失败后的首次重试间隔（秒），之后逐次加倍
+RESULT_URL_TTL = 3600            # 无法从URL解析过期时间时假定的有效期（秒）
+
+# 资源存储配置（按内容寻址，下载结果去重，见 modules/asset_store.py）
+ASSET_STORE_DIR = os.getenv("VOLCENGINE_ASSET_DIR", "data/assets")                 # 存储目录
+ASSET_STORE_MAX_BYTES = int(os.getenv("VOLCENGINE_ASSET_MAX_BYTES", str(2 * 1024 ** 3)))   # 总大小上限（字节，默认2GB），0 表示不限制
+
+# 提交生成视频时表示形象（resource_id）不存在或已失效的业务错误码（逗号分隔），
+# 复用的形象遇到这些错误码、或视频任务在服务端失败时，重新创建形象再生成一次
+AVATAR_INVALID_CODES = {int(code) for code in os.getenv("VOLCENGINE_AVATAR_INVALID_CODES", "").split(",") if code.strip().isdigit()}
+
+# 形象预热池配置（提前为常用图片创建形象，见 modules/avatar_pool.py）
+AVATAR_POOL_IMAGES = [url.strip() for url in os.getenv("VOLCENGINE_AVATAR_POOL_IMAGES", "").split(",") if url.strip()]   # 预热的图片URL
+AVATAR_POOL_MODES = [mode.strip() for mode in os.getenv("VOLCENGINE_AVATAR_POOL_MODES", "normal").split(",") if mode.strip()]   # 预热的模式
+AVATAR_POOL_WORKERS = 4            # 同时创建的形象数
+AVATAR_POOL_CHECK_INTERVAL = 300   # 后台检查间隔（秒）
+AVATAR_POOL_MAX_AGE = 7 * 86400    # 形象使用期限（秒），超过后重新创建
+AVATAR_POOL_REFRESH_AHEAD = 86400  # 距使用期限不足该时间时提前在后台重新创建（秒）
+AVATAR_POOL_RETRY_DELAY = 60       # 创建失败后的首次重试间隔（秒），之后逐次加倍
+AVATAR_POOL_CREATE_TIMEOUT = 1800  # 单个形象创建的最长等待时间（秒）
+
+# OmniHuman 多主体生成配置
+OMNI_DETECT_CACHE_SIZE = 256       # 缓存的对象检测结果数（按图片）
+OMNI_DETECT_CACHE_TTL = 3600       # 检测结果缓存时间（秒），不超过mask图链接的有效期
+OMNI_FANOUT_MAX_PARALLEL = 8       # 同时进行的变体任务数
+
+# 服务路由配置（在功能等价的服务间按近期耗时选择，见 modules/service_router.py）
+ROUTER_WINDOW_SIZE = 50          # 每个服务保留的近期样本数
+ROUTER_SAMPLE_MAX_AGE = 10800    # 样本有效期（秒），排队时间随时段变化，只看近期
+ROUTER_MIN_SAMPLES = 3           # 样本数少于N时视为未知
+ROUTER_EXPLORE_RATIO = 0.1       # 选择样本不足或过旧的服务的概率
+ROUTER_STALE_AFTER = 1800        # 最新样本早于N秒时视为过旧
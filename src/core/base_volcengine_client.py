@@ -6,13 +6,46 @@
 提供所有VolcEngine服务的通用功能：签名、请求、错误处理等
 """
 
-import json
 import hmac
 import hashlib
+import time
 import requests
+from urllib3.exceptions import NewConnectionError
 from datetime import datetime
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Optional, Tuple
 from ..utils import validate_url
+from ..config import (
+    SERVER_ERROR_CODES, RATE_LIMIT_CODES, SUBMIT_ACTIONS, QUERY_ACTIONS, TERMINAL_STATUSES,
+    HEDGE_ENABLED, CONNECT_TIMEOUT, READ_TIMEOUT, URL_CHECK_ENABLED, ADAPTIVE_LIMIT_ENABLED, SCHEDULER_ENABLED,
+    MEDIA_PROBE_ENABLED
+)
+from ..modules.adaptive_limiter import adaptive_limiters, OK, THROTTLED, ERROR
+from ..modules.circuit_breaker import circuit_breakers
+from ..modules.request_hedging import hedging_policy
+from ..modules.deadline import Deadline, current_deadline
+from ..modules.credential_pool import Credential, credential_pool
+from ..modules.endpoint_registry import Endpoint, endpoint_registry
+from ..modules.fair_scheduler import fair_scheduler
+from ..modules.payload import RequestBody
+from ..modules.quota_coordinator import quota_coordinator, account_key
+from ..modules.media_probe import MediaInfo, MediaLimitError, media_probe, check_duration
+from ..modules.url_validator import url_validator
+
+
+class ApiError(Exception):
+    """API返回错误（HTTP错误响应），code 为响应中的业务错误码"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+def _connection_not_established(exc: requests.exceptions.ConnectionError) -> bool:
+    """连接是否根本没有建立（此时请求一定没有发出，提交请求可以安全地换接入点重发）"""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
 
 
 class BaseVolcengineClient:
@@ -23,7 +56,13 @@ class BaseVolcengineClient:
     - HMAC-SHA256签名生成
     - HTTP请求处理
     - 错误处理和重试机制
-    - 参数验证
+    - 按 req_key + action 熔断
+    - 查询接口的对冲请求（可选）
+    - 多账号凭证池（可选）：提交任务分摊到负载最低的账号，查询路由回任务所属账号
+    - 多接入点：按延迟选择接入点，查询固定到受理任务的接入点，连接失败时切换
+    - 全局配额协调（可选）：多进程/多机共用账号时按 账号+req_key 限制QPS和并发任务数
+    - 公平调度：提交任务按通道（interactive / standard / bulk）和租户权重轮流占用配额
+    - 参数验证：提交前并发检查输入URL的可达性、内容类型和大小
     """
 
     def __init__(self, access_key: str, secret_key: str):
@@ -36,11 +75,42 @@ class BaseVolcengineClient:
         """
         self.access_key = access_key
         self.secret_key = secret_key
-        self.base_url = "https://visual.volcengineapi.com"
-        self.region = "cn-north-1"
         self.service = "cv"
 
-    def _make_request(self, method: str, action: str, req_key: str, version: str = "2022-08-31", data: Optional[Dict] = None, task_id: Optional[str] = None, req_json: Optional[str] = None) -> Dict:
+        # 接入点注册表（进程内共享），请求按延迟和可用性选择接入点
+        self.endpoints = endpoint_registry
+        default_endpoint = endpoint_registry.endpoints()[0]
+        self.base_url = default_endpoint.url
+        self.region = default_endpoint.region
+
+        # 是否对查询类接口启用对冲请求
+        self.enable_hedging = HEDGE_ENABLED
+
+        # 是否在提交前检查输入URL的可达性
+        self.check_urls = URL_CHECK_ENABLED
+
+        # 是否在提交前探测音视频时长（每次提交多一次网络请求）
+        self.probe_media = MEDIA_PROBE_ENABLED
+
+        # 是否按 req_key 自适应限制同时进行的请求数（AIMD）
+        self.adaptive_limit = ADAPTIVE_LIMIT_ENABLED
+
+        # 凭证池（进程内共享）。显式传入的密钥只用于本客户端，请求不会换用池中其他账号签名；
+        # 未传入密钥，或将 use_credential_pool 设为 True 时（本客户端的密钥随之加入池中）才使用池中的账号
+        self.credential_pool = credential_pool
+        self.use_credential_pool = not (access_key and secret_key)
+
+        # 全局配额协调器（跨进程/跨机器共享，未配置 VOLCENGINE_QUOTA_BACKEND 时不限制）
+        self.quota = quota_coordinator
+
+        # 提交任务的公平调度（进程内共享），lane / tenant 为None时使用调用上下文或默认值
+        self.scheduler = fair_scheduler
+        self.fair_schedule = SCHEDULER_ENABLED
+        self.lane: Optional[str] = None
+        self.tenant: Optional[str] = None
+        self.credential = self._own_credential(access_key, secret_key)
+
+    def _make_request(self, method: str, action: str, req_key: str, version: str = "2022-08-31", data: Optional[Dict] = None, task_id: Optional[str] = None, req_json: Optional[str] = None, deadline: Optional[Deadline] = None) -> Dict:
         """
         发送API请求
 
@@ -52,6 +122,7 @@ class BaseVolcengineClient:
             data: 请求数据
             task_id: 任务ID
             req_json: 请求JSON配置
+            deadline: 截止时间（默认使用当前上下文中的截止时间）
 
         Returns:
             API响应
@@ -68,17 +139,160 @@ class BaseVolcengineClient:
         if data:
             body_data.update(data)
 
+        # 公平调度：提交请求按服务、通道和租户排队领取轮次，轮次内占用账号、全局配额和并发名额，之后交还
+        ticket = self.scheduler.enter(self.lane, self.tenant, deadline, scope=req_key) \
+            if self.fair_schedule and action in SUBMIT_ACTIONS else None
+
+        # 选择账号：提交任务用负载最低的账号，查询任务用提交该任务的账号
+        query_task_id = task_id or (data or {}).get("task_id")
+        try:
+            credential = self._acquire_credential(action, query_task_id)
+        except BaseException:
+            self.scheduler.leave(ticket)
+            raise
+
+        # 请求体只序列化和哈希一次，签名和重发时复用
+        body = RequestBody.build(body_data)
+
+        # 连接/读取超时分别设置，且不超过截止时间的剩余预算
+        deadline = deadline or current_deadline()
+        endpoint = None
+        result = None
+        account_ok = True
+        rate_limited = False
+        quota_holder = None
+
+        try:
+            # 全局配额：其他进程/机器上使用同一账号的请求共同受 QPS 和并发任务数限制
+            if self.quota.enabled:
+                quota_holder = self.quota.acquire(account_key(credential.access_key), req_key, credential.qps,
+                                                  credential.max_tasks, submit=action in SUBMIT_ACTIONS, deadline=deadline)
+            timeout = deadline.request_timeout() if deadline else (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+            # 熔断检查：该端点熔断时直接快速失败
+            breaker = circuit_breakers.get(req_key, action)
+            breaker.allow_request()
+            healthy = False
+            sent = False
+            limiter = adaptive_limiters.get(req_key) if self.adaptive_limit else None
+            permit = None
+
+            try:
+                # 自适应并发限制：限流或延迟升高时减少同时进行的请求，恢复后逐步增加；
+                # 查询优先拿名额，不排在等待中的提交后面
+                if limiter is not None:
+                    permit = limiter.acquire(deadline=deadline, operation=action, urgent=action in QUERY_ACTIONS)
+                    timeout = deadline.request_timeout() if deadline else timeout
+                self.scheduler.leave(ticket)
+                sent = True
+                endpoint, response = self._send_with_failover(method, action, query_params, body, credential, query_task_id, timeout)
+                response.raise_for_status()
+                result = response.json()
+                healthy = result.get("code") not in SERVER_ERROR_CODES
+                rate_limited = result.get("code") in RATE_LIMIT_CODES
+                return result
+            except requests.exceptions.Timeout:
+                raise Exception("API请求超时，请检查网络连接或稍后重试")
+            except requests.exceptions.ConnectionError:
+                raise Exception("网络连接失败，请检查网络设置")
+            except requests.exceptions.HTTPError as e:
+                # 4xx参数类错误说明服务本身可用，不计入熔断统计
+                status_code = e.response.status_code
+                healthy = status_code < 500 and status_code != 429
+                # 鉴权失败或限流说明账号本身不可用
+                account_ok = status_code not in (401, 403, 429)
+                rate_limited = status_code == 429
+                # 直接返回API的原始响应
+                try:
+                    error_json = e.response.json()
+                except ValueError:
+                    raise Exception(f"{e.response.text}")
+                if status_code < 500 and isinstance(error_json, dict):
+                    # 交给 _settle_task 判断查询是否返回了任务级错误
+                    result = error_json
+                if error_json.get("code") in SERVER_ERROR_CODES:
+                    healthy = False
+                if error_json.get("code") in RATE_LIMIT_CODES:
+                    rate_limited = True
+                raise ApiError(f"{error_json}", error_json.get("code"))
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"API请求失败: {str(e)}")
+            finally:
+                # 请求没有发出（本地排队超时等）时不计入熔断统计，半开状态下也不能当作探测成功
+                if sent:
+                    breaker.record(healthy)
+                else:
+                    breaker.cancel()
+                if permit is not None:
+                    limiter.release(permit, THROTTLED if rate_limited else OK if healthy else ERROR)
+        finally:
+            self.scheduler.leave(ticket)
+            self._settle_task(credential, endpoint, action, query_task_id, result, account_ok and not rate_limited, rate_limited,
+                              req_key, quota_holder)
+
+    def _send_with_failover(self, method: str, action: str, query_params: str, body: RequestBody, credential: Credential,
+                            task_id: Optional[str], timeout: Tuple[float, float]) -> Tuple[Endpoint, requests.Response]:
+        """
+        签名并发送请求，连接失败时切换接入点
+
+        提交请求使用最快的健康接入点；查询请求使用受理该任务的接入点，
+        只在同区域内切换（任务不会跨区域存在）。
+
+        Returns:
+            (实际使用的接入点, HTTP响应)
+        """
+        is_query = action in QUERY_ACTIONS
+        pinned = self.endpoints.for_task(task_id) if is_query else None
+        region = pinned.region if pinned else None
+        endpoint = pinned if pinned and pinned.healthy else self.endpoints.choose(region=region)
+        tried = []
+
+        while True:
+            url, headers = self._signed_request(method, endpoint, query_params, body, credential)
+
+            def send():
+                return requests.post(url, headers=headers, data=body.payload(), timeout=timeout)
+
+            start = time.monotonic()
+            try:
+                # 查询类接口可开启对冲请求，提交类接口永远只发送一次
+                if self.enable_hedging and hedging_policy.is_hedgeable(action):
+                    response = hedging_policy.call(action, send)
+                else:
+                    response = send()
+            except requests.exceptions.ConnectionError as e:
+                self.endpoints.record(endpoint, None, False)
+                tried.append(endpoint)
+                # 提交请求只在连接未建立时切换，避免重复创建任务
+                if not is_query and not _connection_not_established(e):
+                    raise
+                endpoint = self.endpoints.choose(exclude=tuple(tried), region=region)
+                if endpoint is None:
+                    raise
+                print(f"切换接入点: {endpoint.url}")
+                continue
+
+            self.endpoints.record(endpoint, time.monotonic() - start, True)
+            return endpoint, response
+
+    def _signed_request(self, method: str, endpoint: Endpoint, query_params: str, body: RequestBody,
+                        credential: Credential) -> Tuple[str, Dict[str, str]]:
+        """
+        为指定接入点构建请求地址和签名后的请求头
+
+        Returns:
+            (请求URL, 请求头)
+        """
         # 构建请求头（X-Content-Sha256基于完整的请求体）
         headers = {
             'Content-Type': 'application/json; charset=utf-8',
-            'Host': 'visual.volcengineapi.com',
-            'X-Content-Sha256': hashlib.sha256(json.dumps(body_data, ensure_ascii=False).encode('utf-8')).hexdigest()
+            'Host': endpoint.host,
+            'X-Content-Sha256': body.sha256
         }
 
-        body = json.dumps(body_data, ensure_ascii=False)
-
         # 生成签名
-        signature, authorization = self._generate_signature(method, "/", query_params, headers, body)
+        signature, authorization = self._generate_signature(method, "/", query_params, headers, "", credential, endpoint.region,
+                                                            payload_hash=body.sha256)
 
         # 添加认证头
         now = datetime.utcnow()
@@ -86,28 +300,86 @@ class BaseVolcengineClient:
         headers['Authorization'] = authorization
         headers['X-Date'] = timestamp
 
-        # 发送请求
-        url = f"{self.base_url}?{query_params}"
+        return f"{endpoint.url}?{query_params}", headers
 
-        try:
-            response = requests.post(url, headers=headers, data=body, timeout=30)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.Timeout:
-            raise Exception("API请求超时，请检查网络连接或稍后重试")
-        except requests.exceptions.ConnectionError:
-            raise Exception("网络连接失败，请检查网络设置")
-        except requests.exceptions.HTTPError as e:
-            # 直接返回API的原始响应
-            try:
-                error_json = e.response.json()
-                raise Exception(f"{error_json}")
-            except:
-                raise Exception(f"{e.response.text}")
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"API请求失败: {str(e)}")
+    def _own_credential(self, access_key: str, secret_key: str) -> Optional[Credential]:
+        """本客户端密钥对应的账号（池中已有同一账号时共用其配额状态，否则单独创建，不加入池中）"""
+        if not access_key or not secret_key:
+            return None
+        pooled = self.credential_pool.get(access_key)
+        if pooled is not None and pooled.secret_key == secret_key:
+            return pooled
+        return Credential(access_key, secret_key)
 
-    def _generate_signature(self, method: str, uri: str, query_params: str, headers: Dict[str, str], body: str) -> Tuple[str, str]:
+    def _acquire_credential(self, action: str, task_id: Optional[str]) -> Credential:
+        """
+        为请求选择账号
+
+        使用凭证池时提交任务用负载最低的账号、查询用提交该任务的账号；
+        否则所有请求都使用本客户端的密钥。
+
+        Args:
+            action: API动作
+            task_id: 查询的任务ID
+
+        Returns:
+            账号凭证
+        """
+        if not self.use_credential_pool:
+            if self.credential is None:
+                raise ValueError("未配置访问密钥，请设置 VOLCENGINE_ACCESS_KEY / VOLCENGINE_SECRET_KEY")
+            if action in QUERY_ACTIONS:
+                # 不按任务归属换账号：本客户端的任务一定由本客户端的密钥提交
+                return self.credential_pool.acquire_for_task(task_id, self.credential, follow_owner=False)
+            return self.credential_pool.acquire(task=action in SUBMIT_ACTIONS, only=self.credential)
+
+        if self.credential is not None and self.credential_pool.get(self.credential.access_key) is not self.credential:
+            self.credential = self.credential_pool.add(self.access_key, self.secret_key)
+        if not self.credential and not self.credential_pool.credentials():
+            raise ValueError("未配置访问密钥，请设置 VOLCENGINE_ACCESS_KEY / VOLCENGINE_SECRET_KEY")
+        if action in QUERY_ACTIONS:
+            fallback = self.credential or self.credential_pool.credentials()[0]
+            return self.credential_pool.acquire_for_task(task_id, fallback)
+        return self.credential_pool.acquire(task=action in SUBMIT_ACTIONS)
+
+    def _settle_task(self, credential: Credential, endpoint: Optional[Endpoint], action: str, task_id: Optional[str],
+                     result: Optional[Dict], account_ok: bool, rate_limited: bool, req_key: Optional[str] = None,
+                     quota_holder: Optional[str] = None):
+        """
+        请求结束后更新账号和接入点状态：记录任务归属的账号和接入点、
+        任务结束（终止状态，或查询返回任务级错误码）时归还并发名额（含全局配额名额）、维护账号健康状态
+        """
+        self.credential_pool.record(credential, account_ok, rate_limited)
+        success = bool(result) and result.get("code") == 10000
+        data = (result or {}).get("data") or {}
+        account = account_key(credential.access_key) if self.quota.enabled and req_key else None
+
+        if action in SUBMIT_ACTIONS:
+            new_task_id = data.get("task_id") if success else None
+            if new_task_id:
+                self.credential_pool.bind(new_task_id, credential)
+                if endpoint is not None:
+                    self.endpoints.pin(new_task_id, endpoint)
+                if account:
+                    self.quota.bind(account, req_key, quota_holder, new_task_id)
+            else:
+                self.credential_pool.release(credential)
+                if account:
+                    self.quota.release(account, req_key, quota_holder)
+        elif action in QUERY_ACTIONS and task_id and result:
+            code = result.get("code")
+            if success and data.get("status") not in TERMINAL_STATUSES:
+                if account:
+                    self.quota.renew(account, req_key, task_id)
+            elif success or (account_ok and isinstance(code, int)
+                             and code not in SERVER_ERROR_CODES and code not in RATE_LIMIT_CODES):
+                # 服务端故障、限流和鉴权失败不代表任务结束，其余错误码（任务不存在、已失败等）按结束处理
+                self.credential_pool.finish(task_id)
+                self.endpoints.unpin(task_id)
+                if account:
+                    self.quota.finish(account, req_key, task_id)
+
+    def _generate_signature(self, method: str, uri: str, query_params: str, headers: Dict[str, str], body: str, credential: Optional[Credential] = None, region: Optional[str] = None, payload_hash: Optional[str] = None) -> Tuple[str, str]:
         """
         生成签名
 
@@ -117,10 +389,17 @@ class BaseVolcengineClient:
             query_params: 查询参数
             headers: 请求头
             body: 请求体
+            credential: 签名使用的账号（默认使用本客户端的密钥）
+            region: 签名使用的区域（默认使用 self.region）
+            payload_hash: 预先计算的请求体SHA256（提供时不再对 body 计算哈希）
 
         Returns:
             签名和签名头信息
         """
+        access_key = credential.access_key if credential else self.access_key
+        secret_key = credential.secret_key if credential else self.secret_key
+        region = region or self.region
+
         # 计算请求时间
         now = datetime.utcnow()
         timestamp = now.strftime('%Y%m%dT%H%M%SZ')
@@ -133,22 +412,24 @@ class BaseVolcengineClient:
         canonical_headers, signed_headers = self._canonicalize_headers(headers)
 
         # 创建规范请求
-        canonical_request = f"{method}\n{uri}\n{canonical_querystring}\n{canonical_headers}\n{signed_headers}\n{hashlib.sha256(body.encode('utf-8')).hexdigest()}"
+        if payload_hash is None:
+            payload_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        canonical_request = f"{method}\n{uri}\n{canonical_querystring}\n{canonical_headers}\n{signed_headers}\n{payload_hash}"
 
         # 创建待签字符串
         algorithm = 'HMAC-SHA256'
-        credential_scope = f"{date_stamp}/{self.region}/{self.service}/request"
+        credential_scope = f"{date_stamp}/{region}/{self.service}/request"
         string_to_sign = f"{algorithm}\n{timestamp}\n{credential_scope}\n{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
 
         # 计算签名
-        k_date = hmac.new(self.secret_key.encode('utf-8'), date_stamp.encode('utf-8'), hashlib.sha256).digest()
-        k_region = hmac.new(k_date, self.region.encode('utf-8'), hashlib.sha256).digest()
+        k_date = hmac.new(secret_key.encode('utf-8'), date_stamp.encode('utf-8'), hashlib.sha256).digest()
+        k_region = hmac.new(k_date, region.encode('utf-8'), hashlib.sha256).digest()
         k_service = hmac.new(k_region, self.service.encode('utf-8'), hashlib.sha256).digest()
         k_signing = hmac.new(k_service, 'request'.encode('utf-8'), hashlib.sha256).digest()
         signature = hmac.new(k_signing, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
 
         # 创建授权头
-        authorization = f"{algorithm} Credential={self.access_key}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
+        authorization = f"{algorithm} Credential={access_key}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
 
         return signature, authorization
 
@@ -213,6 +494,49 @@ class BaseVolcengineClient:
         if not self._validate_url(url):
             raise ValueError("视频URL格式不正确")
 
+    def _check_urls(self, items: Dict[str, Tuple[Optional[str], Optional[int]]]) -> None:
+        """
+        提交前并发检查一批输入URL（可达性、内容类型、大小），避免失效的URL在付费提交并轮询后才失败
+
+        结果按URL缓存，同一URL被大量任务复用时只检查一次；无法判断时放行，由服务端校验。
+
+        Args:
+            items: {url: (素材类型 image/audio/video, 大小上限字节数)}，空URL会被忽略
+
+        Raises:
+            UrlValidationError: 存在不可用的URL
+        """
+        items = {url: spec for url, spec in items.items() if url}
+        if self.check_urls and items:
+            url_validator.validate(items)
+
+    def _check_media_duration(self, url: str, max_seconds: Optional[float] = None,
+                              min_seconds: Optional[float] = None, what: str = "音频") -> Optional[MediaInfo]:
+        """
+        提交前探测音视频时长，超出服务限制时直接拒绝，避免付费提交并轮询后才失败
+
+        未开启 probe_media 或无法探测时跳过检查，由服务端校验。
+
+        Args:
+            url: 音视频URL
+            max_seconds: 时长上限
+            min_seconds: 时长下限
+            what: 提示中使用的名称
+
+        Returns:
+            媒体信息，未开启或无法探测时返回None
+
+        Raises:
+            MediaLimitError: 时长超出限制
+        """
+        if not self.probe_media:
+            return None
+        info = media_probe.probe(url)
+        problem = check_duration(info, max_seconds, min_seconds, what)
+        if problem:
+            raise MediaLimitError(problem)
+        return info
+
     def _validate_audio_url(self, url: str) -> None:
         """
         验证音频URL并抛出异常
@@ -11,6 +11,11 @@ import json
 from typing import Dict, Any, Optional
 
 from .base_volcengine_client import BaseVolcengineClient
+from .task_waiter import PollJob, status_extractor
+from ..modules.deadline import Deadline, deadline_scope
+from ..modules.image_preflight import preflight_images
+from ..modules.payload import Base64File
+from ..modules.result_mirror import result_mirror
 
 
 class ImageOutfitClient(BaseVolcengineClient):
@@ -116,6 +121,8 @@ class ImageOutfitClient(BaseVolcengineClient):
         # 参数验证
         self._validate_image_url(model_url)
         self._validate_image_url(garment_url)
+        max_bytes = self.V1_CONFIG["max_file_size"] * 1024 * 1024
+        self._check_urls({model_url: ("image", max_bytes), garment_url: ("image", max_bytes)})
 
         # 默认推理配置 - 按照官方文档设置
         default_inference_config = {
@@ -284,7 +291,9 @@ class ImageOutfitClient(BaseVolcengineClient):
             protect_mask_url: 模特保护区域图URL（可选）
             inference_config: 推理配置
             req_image_store_type: 图片传入方式（0:base64, 1:URL）
-            binary_data_base64: base64图片数据列表（req_image_store_type=0时使用）
+            binary_data_base64: base64图片数据列表（req_image_store_type=0时使用），元素可以是base64字符串
+                或 Base64File（发送时才分块编码）；未提供时把 model_url / garment_urls 当作本地图片路径，
+                预检（必要时缩放）后按 Base64File 上传
 
         Returns:
             任务提交结果，包含task_id
@@ -293,8 +302,8 @@ class ImageOutfitClient(BaseVolcengineClient):
             ValueError: 参数验证失败
             Exception: 任务提交失败
         """
-        # 设置V2版服务标识
-        self.REQ_KEY = self.V2_CONFIG["req_key"]
+        # V2版服务标识（不修改 self.REQ_KEY，同一客户端可被多个线程共用）
+        req_key = self.V2_CONFIG["req_key"]
 
         # 参数验证
         if req_image_store_type == 1 and not model_url:
@@ -324,6 +333,8 @@ class ImageOutfitClient(BaseVolcengineClient):
             self._validate_image_url(model_url)
             for garment_url in garment_urls:
                 self._validate_image_url(garment_url)
+            max_bytes = self.V2_CONFIG["max_file_size"] * 1024 * 1024
+            self._check_urls({url: ("image", max_bytes) for url in [model_url] + list(garment_urls)})
 
         # 默认推理配置 - 按照V2版官方文档设置
         default_inference_config = {
@@ -346,6 +357,14 @@ class ImageOutfitClient(BaseVolcengineClient):
         if inference_config:
             final_inference_config.update(inference_config)
 
+        # base64模式且未提供数据时，按本地图片路径预检后编码（模特图在前，服装图在后）
+        if req_image_store_type == 0 and not binary_data_base64:
+            binary_data_base64 = self._preflight_local_images(
+                ([model_url] if model_url else []) + list(garment_urls),
+                self.V2_CONFIG,
+                final_inference_config.get("max_process_side_length")
+            )
+
         # 构建服装数据
         garment_data = []
         for i, (garment_url, garment_type) in enumerate(zip(garment_urls, garment_types)):
@@ -358,7 +377,7 @@ class ImageOutfitClient(BaseVolcengineClient):
 
         # 构建请求数据
         data = {
-            "req_key": self.REQ_KEY,
+            "req_key": req_key,
             "garment": {
                 "data": garment_data
             },
@@ -383,22 +402,38 @@ class ImageOutfitClient(BaseVolcengineClient):
 
         try:
             # V2版使用CVSubmitTask接口，异步返回task_id
-            response = self._make_request("POST", "CVSubmitTask", self.REQ_KEY, data=data)
+            response = self._make_request("POST", "CVSubmitTask", req_key, data=data)
 
             if response.get("code") != 10000:
                 error_msg = response.get("message", "未知错误")
                 raise Exception(f"图片换装任务提交失败: {error_msg}")
 
-            # 恢复V1版服务标识
-            self.REQ_KEY = self.V1_CONFIG["req_key"]
-
             return response["data"]
 
         except Exception as e:
-            # 恢复V1版服务标识
-            self.REQ_KEY = self.V1_CONFIG["req_key"]
             raise Exception(f"图片换装任务提交失败: {str(e)}")
 
+    def _preflight_local_images(self, paths: list, config: Dict, target_side: Optional[int] = None) -> list:
+        """
+        按服务限制预检本地图片，超出目标边长或大小上限的图片并行缩放
+
+        Args:
+            paths: 本地图片路径列表
+            config: 服务配置（V1_CONFIG / V2_CONFIG）
+            target_side: 目标边长（服务端处理时的最长边），默认取分辨率上限
+
+        Returns:
+            Base64File 列表（发送请求时才分块编码）
+        """
+        results = preflight_images(
+            paths,
+            max_file_size_mb=config["max_file_size"],
+            max_side=config["max_resolution"],
+            formats=config["supported_formats"],
+            target_side=target_side
+        )
+        return [Base64File(result["path"]) for result in results]
+
     def query_outfit_task_v2(
         self,
         task_id: str,
@@ -421,8 +456,8 @@ class ImageOutfitClient(BaseVolcengineClient):
         Raises:
             Exception: 查询失败
         """
-        # 设置V2版服务标识
-        self.REQ_KEY = self.V2_CONFIG["req_key"]
+        # V2版服务标识
+        req_key = self.V2_CONFIG["req_key"]
 
         # 默认水印配置
         default_logo_info = {
@@ -450,17 +485,14 @@ class ImageOutfitClient(BaseVolcengineClient):
 
         # 构建请求数据
         data = {
-            "req_key": self.REQ_KEY,
+            "req_key": req_key,
             "task_id": task_id,
             "req_json": json.dumps(req_json)
         }
 
         try:
             # V2版使用CVGetResult接口查询结果
-            response = self._make_request("POST", "CVGetResult", self.REQ_KEY, data=data)
-
-            # 恢复V1版服务标识
-            self.REQ_KEY = self.V1_CONFIG["req_key"]
+            response = self._make_request("POST", "CVGetResult", req_key, data=data)
 
             if response.get("code") != 10000:
                 error_msg = response.get("message", "未知错误")
@@ -469,10 +501,13 @@ class ImageOutfitClient(BaseVolcengineClient):
             return response["data"]
 
         except Exception as e:
-            # 恢复V1版服务标识
-            self.REQ_KEY = self.V1_CONFIG["req_key"]
             raise Exception(f"查询任务状态失败: {str(e)}")
 
+    def _poll_job(self, task_id: str, return_url: bool = True, check_interval: float = 15) -> PollJob:
+        """创建V2版任务的轮询状态（status 为 done 时完成，结果图片在 image_urls 中）"""
+        return PollJob(task_id, lambda: self.query_outfit_task_v2(task_id, return_url=return_url),
+                       status_extractor(()), self.V2_CONFIG["req_key"], check_interval)
+
     def generate_outfit_image_v2(
         self,
         garment_urls: list,
@@ -486,7 +521,9 @@ class ImageOutfitClient(BaseVolcengineClient):
         aigc_meta: Optional[Dict] = None,
         download: bool = True,
         filename: Optional[str] = None,
-        req_image_store_type: int = 1
+        req_image_store_type: int = 1,
+        max_wait_time: int = 600,
+        deadline: Optional[Deadline] = None
     ) -> Optional[str]:
         """
         一键生成换装图片 (V2版异步接口)
@@ -504,6 +541,8 @@ class ImageOutfitClient(BaseVolcengineClient):
             download: 是否下载图片
             filename: 保存文件名
             req_image_store_type: 图片传入方式（0:base64, 1:URL）
+            max_wait_time: 整个流程的最大等待时间（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
 
         Returns:
             下载的文件名或图片URL
@@ -511,6 +550,17 @@ class ImageOutfitClient(BaseVolcengineClient):
         Raises:
             Exception: 换装失败或下载失败
         """
+        deadline = deadline or Deadline(max_wait_time)
+        with deadline_scope(deadline) as deadline:
+            return self._generate_outfit_image_v2(
+                garment_urls, model_url, garment_types, return_url, model_id, protect_mask_url,
+                inference_config, logo_info, aigc_meta, download, filename, req_image_store_type, deadline
+            )
+
+    def _generate_outfit_image_v2(self, garment_urls, model_url, garment_types, return_url, model_id,
+                                  protect_mask_url, inference_config, logo_info, aigc_meta, download,
+                                  filename, req_image_store_type, deadline: Deadline) -> Optional[str]:
+        """V2版一键生成的实现，所有请求和等待共享同一个截止时间"""
         import time
 
         try:
@@ -533,10 +583,9 @@ class ImageOutfitClient(BaseVolcengineClient):
 
             # 查询任务状态（循环等待直到完成）
             start_time = time.time()
-            max_wait_time = 600  # 10分钟超时
             check_interval = 15  # 15秒检查一次
 
-            while time.time() - start_time < max_wait_time:
+            while not deadline.expired():
                 print(f"⏳ 查询任务状态... (已等待 {int(time.time() - start_time)}秒)")
 
                 query_result = self.query_outfit_task_v2(
@@ -550,6 +599,7 @@ class ImageOutfitClient(BaseVolcengineClient):
 
                 if status == "done":
                     print("🎉 换装任务完成！")
+                    result_mirror.enqueue(task_id, self.V2_CONFIG["req_key"], query_result)
 
                     # 获取图片URL
                     image_urls = query_result.get("image_urls", [])
@@ -567,7 +617,7 @@ class ImageOutfitClient(BaseVolcengineClient):
                         try:
                             # 使用现有的download_image函数
                             from ..utils import download_image
-                            downloaded_file = download_image(image_url, filename)
+                            downloaded_file = download_image(image_url, filename, task_id=task_id)
                             print(f"✅ 换装图片已保存到: {downloaded_file}")
                             return downloaded_file
                         except Exception as e:
@@ -577,8 +627,8 @@ class ImageOutfitClient(BaseVolcengineClient):
                         return image_url
 
                 elif status in ["in_queue", "generating"]:
-                    # 继续等待
-                    time.sleep(check_interval)
+                    # 继续等待（不超过截止时间）
+                    deadline.sleep(check_interval)
                     continue
 
                 elif status == "not_found":
@@ -7,10 +7,13 @@
 """
 
 import json
-import time
+import threading
 from typing import Dict, Any, Optional
 
 from .base_volcengine_client import BaseVolcengineClient
+from .task_handle import TaskHandle
+from .task_waiter import PollJob, status_extractor
+from ..modules.deadline import Deadline
 
 
 class VideoJimengMimicClient(BaseVolcengineClient):
@@ -31,7 +34,10 @@ class VideoJimengMimicClient(BaseVolcengineClient):
         """
         super().__init__(access_key, secret_key)
 
-    def submit_mimic_task(self, image_url: str, video_url: str, aigc_meta: Optional[Dict] = None) -> str:
+        # 服务标识
+        self.REQ_KEY = "jimeng_dream_actor_m1_gen_video_cv"
+
+    def submit_mimic_task(self, image_url: str, video_url: str, aigc_meta: Optional[Dict] = None) -> TaskHandle:
         """
         提交动作模仿任务
 
@@ -41,7 +47,7 @@ class VideoJimengMimicClient(BaseVolcengineClient):
             aigc_meta: 隐式标识配置
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
 
         Raises:
             ValueError: 参数验证失败
@@ -50,6 +56,7 @@ class VideoJimengMimicClient(BaseVolcengineClient):
         # 参数验证
         self._validate_image_url(image_url)
         self._validate_video_url(video_url)
+        self._check_urls({image_url: ("image", None), video_url: ("video", None)})
 
         # 构建请求数据
         data = {
@@ -64,14 +71,14 @@ class VideoJimengMimicClient(BaseVolcengineClient):
 
         try:
             # 使用同步转异步提交任务接口
-            response = self._make_request("POST", "CVSync2AsyncSubmitTask", "jimeng_dream_actor_m1_gen_video_cv", data=data, req_json=req_json)
+            response = self._make_request("POST", "CVSync2AsyncSubmitTask", self.REQ_KEY, data=data, req_json=req_json)
 
             if response.get("code") != 10000:
                 error_msg = response.get("message", "未知错误")
                 raise Exception(f"动作模仿任务提交失败: {error_msg}")
 
             task_id = response["data"]["task_id"]
-            return task_id
+            return TaskHandle(task_id, self._poll_job(task_id), self.REQ_KEY)
 
         except Exception as e:
             raise Exception(f"提交动作模仿任务失败: {str(e)}")
@@ -97,7 +104,7 @@ class VideoJimengMimicClient(BaseVolcengineClient):
 
         try:
             # 使用同步转异步查询结果接口
-            response = self._make_request("POST", "CVSync2AsyncGetResult", "jimeng_dream_actor_m1_gen_video_cv", task_id=task_id, req_json=req_json)
+            response = self._make_request("POST", "CVSync2AsyncGetResult", self.REQ_KEY, task_id=task_id, req_json=req_json)
 
             if response.get("code") != 10000:
                 error_msg = response.get("message", "未知错误")
@@ -109,7 +116,12 @@ class VideoJimengMimicClient(BaseVolcengineClient):
         except Exception as e:
             raise Exception(f"获取动作模仿结果失败: {str(e)}")
 
-    def wait_for_completion(self, task_id: str, max_wait_time: int = 600, check_interval: int = 15) -> Dict[str, Any]:
+    def _poll_job(self, task_id: str, check_interval: float = 15) -> PollJob:
+        """创建任务的轮询状态"""
+        return PollJob(task_id, lambda: self.get_mimic_result(task_id),
+                       status_extractor(("video_url",)), self.REQ_KEY, check_interval)
+
+    def wait_for_completion(self, task_id: str, max_wait_time: int = 600, check_interval: int = 15, deadline: Optional[Deadline] = None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
@@ -117,6 +129,8 @@ class VideoJimengMimicClient(BaseVolcengineClient):
             task_id: 任务ID
             max_wait_time: 最大等待时间（秒）
             check_interval: 检查间隔（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
 
         Returns:
             任务结果
@@ -124,30 +138,7 @@ class VideoJimengMimicClient(BaseVolcengineClient):
         Raises:
             Exception: 任务失败或超时
         """
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = self.get_mimic_result(task_id)
-
-                if result.get("status") == "done":
-                    return result
-                elif result.get("status") in ["not_found", "expired"]:
-                    raise Exception(f"任务异常: {result.get('status')}")
-                elif result.get("video_url"):
-                    # 如果有video_url说明任务已完成
-                    return result
-
-                print(f"任务进行中... 状态: {result.get('status', 'unknown')}")
-                time.sleep(check_interval)
-
-            except Exception as e:
-                if "任务异常" in str(e):
-                    raise
-                print(f"检查任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
-
-        raise Exception(f"等待超时 ({max_wait_time}秒)，任务可能仍在处理")
+        return self._poll_job(task_id, check_interval).wait(deadline or Deadline(max_wait_time), cancel_event)
 
 
 # 示例使用代码
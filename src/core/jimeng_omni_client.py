@@ -6,12 +6,31 @@
 """
 
 import json
+import random
+import threading
 import time
-from typing import Dict, Any, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, List, Optional, Union
 
 from .base_volcengine_client import BaseVolcengineClient
 from ..utils import retry
-from ..config import DEFAULT_TIMEOUT, MAX_RETRIES, RETRY_DELAY
+from ..config import (
+    MAX_RETRIES, RETRY_DELAY, LONG_AUDIO_MAX_PARALLEL,
+    OMNI_DETECT_CACHE_SIZE, OMNI_DETECT_CACHE_TTL, OMNI_FANOUT_MAX_PARALLEL
+)
+from .task_handle import TaskHandle
+from .task_waiter import PollJob, status_extractor
+from ..modules.asset_store import url_key
+from ..modules.deadline import Deadline, deadline_scope
+from ..modules.media_probe import media_probe, check_duration
+from ..modules.long_audio import AudioSegment, render_long_audio
+from ..modules.metrics import metrics
+from ..modules.result_mirror import parse_url_expiry
+
+# 对象检测结果缓存（所有客户端共用）：URL键 -> (检测结果, 过期时间)
+_detect_cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+_detect_cache_lock = threading.Lock()
 
 
 class VideoJimengClient(BaseVolcengineClient):
@@ -97,12 +116,15 @@ class VideoJimengClient(BaseVolcengineClient):
         return result
 
     @retry(max_retries=MAX_RETRIES, delay=RETRY_DELAY)
-    def detect_object(self, image_url: str) -> Dict[str, Any]:
+    def detect_object(self, image_url: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         对象检测（1.5版专用，检测图片中的所有主体，返回mask图）
 
+        同一图片（忽略签名参数）的检测结果会缓存，直到 OMNI_DETECT_CACHE_TTL 或mask图链接过期。
+
         Args:
             image_url: 图片URL链接
+            use_cache: 是否使用缓存的检测结果
 
         Returns:
             对象检测结果，包含mask图URL
@@ -110,6 +132,11 @@ class VideoJimengClient(BaseVolcengineClient):
         # 参数验证
         self._validate_image_url(image_url)
 
+        if use_cache:
+            cached = self._cached_detection(image_url)
+            if cached is not None:
+                return cached
+
         req_key = self.REQ_KEYS["1.5"]["detect_object"]
         version = "1.5"
         config = self.VERSION_CONFIG[version]
@@ -134,28 +161,57 @@ class VideoJimengClient(BaseVolcengineClient):
                     object_detection_result = resp_data_dict.get("object_detection_result", {})
                     mask_urls = object_detection_result.get("mask", {}).get("url", [])
                     print(f"✅ 检测到 {len(mask_urls)} 个对象")
-                    return {
+                    return self._cache_detection(image_url, {
                         "status": "done",
                         "contains_object": status,
                         "mask_urls": mask_urls,
                         "resp_data": resp_data_dict
-                    }
+                    })
                 else:
                     print("❌ 未检测到对象")
-                    return {
+                    return self._cache_detection(image_url, {
                         "status": "done",
                         "contains_object": status,
                         "mask_urls": [],
                         "resp_data": resp_data_dict
-                    }
+                    })
             except json.JSONDecodeError:
                 print(f"解析检测结果失败: {resp_data}")
                 return {"status": "error", "message": "解析检测结果失败"}
         else:
             return {"status": "error", "message": "未获取到检测数据"}
 
+    @staticmethod
+    def _cached_detection(image_url: str) -> Optional[Dict[str, Any]]:
+        """未过期的缓存检测结果"""
+        key = url_key(image_url)
+        with _detect_cache_lock:
+            cached = _detect_cache.get(key)
+            if cached and cached[1] > time.time():
+                _detect_cache.move_to_end(key)
+                metrics.inc("volcengine_detect_cache_total", result="hit")
+                return cached[0]
+            _detect_cache.pop(key, None)
+        metrics.inc("volcengine_detect_cache_total", result="miss")
+        return None
+
+    @staticmethod
+    def _cache_detection(image_url: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """缓存检测结果（mask图是临时链接，缓存不超过其中最早的过期时间，留出一次渲染的余量）"""
+        expires_at = time.time() + OMNI_DETECT_CACHE_TTL
+        for mask_url in result["mask_urls"]:
+            mask_expiry = parse_url_expiry(mask_url)
+            if mask_expiry is not None:
+                expires_at = min(expires_at, mask_expiry - 600)
+        with _detect_cache_lock:
+            _detect_cache[url_key(image_url)] = (result, expires_at)
+            _detect_cache.move_to_end(url_key(image_url))
+            while len(_detect_cache) > OMNI_DETECT_CACHE_SIZE:
+                _detect_cache.popitem(last=False)
+        return result
+
     @retry(max_retries=MAX_RETRIES, delay=RETRY_DELAY)
-    def generate_video(self, image_url: str, audio_url: str, version: str = "1.5", prompt: Optional[str] = None, mask_url: Optional[List[str]] = None, seed: Optional[int] = None, pe_fast_mode: bool = False, aigc_meta: Optional[Dict] = None, auto_detect: bool = True) -> str:
+    def generate_video(self, image_url: str, audio_url: str, version: str = "1.5", prompt: Optional[str] = None, mask_url: Optional[List[str]] = None, seed: Optional[int] = None, pe_fast_mode: bool = False, aigc_meta: Optional[Dict] = None, auto_detect: bool = True) -> TaskHandle:
         """
         生成数字人视频
 
@@ -171,12 +227,15 @@ class VideoJimengClient(BaseVolcengineClient):
             auto_detect: 是否自动进行主体检测（1.5版时建议开启）
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
         """
         # 参数验证
         self._validate_image_url(image_url)
 
         self._validate_audio_url(audio_url)
+        urls = {image_url: ("image", None), audio_url: ("audio", None)}
+        urls.update({url: ("image", None) for url in mask_url or []})
+        self._check_urls(urls)
 
         if version not in self.REQ_KEYS:
             raise ValueError(f"不支持的版本: {version}，支持的版本: 1.0, 1.5")
@@ -189,6 +248,15 @@ class VideoJimengClient(BaseVolcengineClient):
         print(f"收费标准: {config['price']}元/秒")
         print(f"音频长度限制: {config['max_audio_length']}秒")
 
+        # 1.5版严格限制音频时长，超出直接拒绝；1.0版的限制为建议值，只提示
+        if version == "1.5":
+            self._check_media_duration(audio_url, config["max_audio_length"])
+        elif self.probe_media:
+            audio_info = media_probe.probe(audio_url)
+            problem = check_duration(audio_info, config["max_audio_length"])
+            if problem:
+                print(f"⚠️ {problem}，生成效果可能下降")
+
         # 1.5版建议先进行主体检测
         if version == "1.5" and auto_detect:
             print("🔍 建议先进行主体检测以确保图片符合要求...")
@@ -242,7 +310,7 @@ class VideoJimengClient(BaseVolcengineClient):
 
         task_id = response["data"]["task_id"]
         print(f"数字人视频任务已提交，任务ID: {task_id}")
-        return task_id
+        return TaskHandle(task_id, self._poll_job(task_id, "generate", version), req_key)
 
     def get_result(self, task_id: str, operation_type: str = "generate", version: str = "1.5", aigc_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -294,7 +362,24 @@ class VideoJimengClient(BaseVolcengineClient):
         except Exception as e:
             raise Exception(f"获取结果失败: {str(e)}")
 
-    def wait_for_completion(self, task_id: str, operation_type: str, version: str, max_wait_time: int = 300, check_interval: int = 15) -> Dict[str, Any]:
+    def _poll_job(self, task_id: str, operation_type: str, version: str, check_interval: float = 15) -> PollJob:
+        """
+        创建任务的轮询状态
+
+        Args:
+            task_id: 任务ID
+            operation_type: 操作类型
+            version: 版本号
+            check_interval: 最长检查间隔（秒）
+
+        Returns:
+            轮询任务
+        """
+        req_key = self.REQ_KEYS.get(version, {}).get(operation_type)
+        return PollJob(task_id, lambda: self.get_result(task_id, operation_type, version),
+                       status_extractor(("video_url", "contains_subject", "contains_object")), req_key, check_interval)
+
+    def wait_for_completion(self, task_id: str, operation_type: str, version: str, max_wait_time: int = 300, check_interval: int = 15, deadline: Optional[Deadline] = None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
@@ -304,39 +389,15 @@ class VideoJimengClient(BaseVolcengineClient):
             version: 版本号
             max_wait_time: 最大等待时间（秒）
             check_interval: 检查间隔（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
 
         Returns:
             任务结果
         """
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = self.get_result(task_id, operation_type, version)
-
-                if result.get("status") == "done":
-                    return result
-                elif result.get("status") in ["not_found", "expired"]:
-                    raise Exception(f"任务异常: {result.get('status')}")
-                elif result.get("status") == "processing":
-                    # 1.5版特有状态：前置处理中
-                    print("任务前置处理中，请稍候...")
-                elif result.get("video_url") or result.get("contains_subject") is not None or result.get("contains_object") is not None:
-                    # 如果返回结果包含有效数据，说明任务已完成
-                    return result
-
-                print(f"任务进行中... 状态: {result.get('status', 'unknown')}")
-                time.sleep(check_interval)
-
-            except Exception as e:
-                if "任务异常" in str(e):
-                    raise
-                print(f"检查任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
-
-        raise TimeoutError(f"等待任务完成超时 ({max_wait_time}秒)")
+        return self._poll_job(task_id, operation_type, version, check_interval).wait(deadline or Deadline(max_wait_time), cancel_event)
 
-    def generate_video_from_image_audio(self, image_url: str, audio_url: str, version: str = "1.5", prompt: Optional[str] = None, mask_url: Optional[List[str]] = None, seed: Optional[int] = None, pe_fast_mode: bool = False, aigc_meta: Optional[Dict] = None, max_wait_time: int = 600) -> Dict[str, Any]:
+    def generate_video_from_image_audio(self, image_url: str, audio_url: str, version: str = "1.5", prompt: Optional[str] = None, mask_url: Optional[List[str]] = None, seed: Optional[int] = None, pe_fast_mode: bool = False, aigc_meta: Optional[Dict] = None, max_wait_time: int = 600, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """
         从图片和音频生成数字人视频（完整流程）
 
@@ -349,7 +410,8 @@ class VideoJimengClient(BaseVolcengineClient):
             seed: 随机种子（仅1.5版）
             pe_fast_mode: 快速模式（仅1.5版）
             aigc_meta: 隐式标识配置
-            max_wait_time: 最大等待时间（秒）
+            max_wait_time: 整个流程的最大等待时间（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
 
         Returns:
             生成结果
@@ -357,15 +419,145 @@ class VideoJimengClient(BaseVolcengineClient):
         config = self.VERSION_CONFIG[version]
         print(f"开始生成数字人视频（{config['name']}）")
 
-        # 步骤：生成视频（内部自动包含检测）
-        task_id = self.generate_video(image_url, audio_url, version, prompt, mask_url, seed, pe_fast_mode, aigc_meta)
+        deadline = deadline or Deadline(max_wait_time)
+        with deadline_scope(deadline) as deadline:
+            # 步骤：生成视频（内部自动包含检测）
+            task_id = self.generate_video(image_url, audio_url, version, prompt, mask_url, seed, pe_fast_mode, aigc_meta)
 
-        # 等待完成
-        result = self.wait_for_completion(task_id, "generate", version, max_wait_time=max_wait_time)
+            # 等待完成
+            result = self.wait_for_completion(task_id, "generate", version, deadline=deadline)
 
         # 直接返回原始API响应，不进行二次封装
         return result
 
+    def generate_long_video(self, image_url: str, audio: str, output: str, version: str = "1.5",
+                            uploader: Optional[Callable[[str], str]] = None, prompt: Optional[str] = None,
+                            mask_url: Optional[List[str]] = None, seed: Optional[int] = None, pe_fast_mode: bool = False,
+                            aigc_meta: Optional[Dict] = None, max_parallel: int = LONG_AUDIO_MAX_PARALLEL,
+                            deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        长音频模式：音频超过版本时长上限时按静音切分，各段并行生成后拼接为一个视频
+
+        Args:
+            image_url: 图片URL链接（所有片段共用）
+            audio: 音频本地路径或URL
+            output: 输出视频路径
+            version: 版本号
+            uploader: 上传音频片段的函数 uploader(本地路径) -> 公网URL
+            prompt: 提示词（仅1.5版支持）
+            mask_url: mask图URL列表（仅1.5版）
+            seed: 随机种子（仅1.5版），未指定时所有片段使用同一个随机种子，保持画面风格一致
+            pe_fast_mode: 快速模式（仅1.5版）
+            aigc_meta: 隐式标识配置
+            max_parallel: 同时生成的片段数
+            deadline: 截止时间
+
+        Returns:
+            {"video_path", "duration", "elapsed", "segments"}
+        """
+        if version not in self.VERSION_CONFIG:
+            raise ValueError(f"不支持的版本: {version}，支持的版本: 1.0, 1.5")
+        if version == "1.5" and seed is None:
+            seed = random.randint(0, 2 ** 31 - 1)
+
+        # 主体检测只在第一个片段做一次
+        def submit(audio_url: str, segment: AudioSegment) -> TaskHandle:
+            return self.generate_video(image_url, audio_url, version, prompt, mask_url, seed, pe_fast_mode,
+                                       aigc_meta, auto_detect=segment.index == 0)
+
+        return render_long_audio(audio, self.VERSION_CONFIG[version]["max_audio_length"], submit,
+                                 uploader, output, max_parallel, deadline=deadline)
+
+    def generate_multi_subject(self, image_url: str, audio_url: Union[str, List[str]], subjects: Optional[List[int]] = None,
+                               prompt: Optional[str] = None, seed: Optional[int] = None, pe_fast_mode: bool = False,
+                               aigc_meta: Optional[Dict] = None, max_parallel: int = OMNI_FANOUT_MAX_PARALLEL,
+                               on_result: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                               deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        """
+        多主体并行生成（1.5版）：对象检测一次，然后为每个主体（或每条音轨）各提交一个视频任务
+
+        - audio_url 为单个URL：每个选中的主体各生成一个视频（同一段音频由不同主体说出）
+        - audio_url 为列表且与选中的主体数相同：第 i 条音轨由第 i 个主体说出（多人对话各自的片段）
+        - audio_url 为列表而图片只选中一个主体（或未检测到对象）：每条音轨各生成一个视频
+
+        所有变体使用同一个随机种子，画面风格一致。某个变体失败不影响其他变体。
+
+        Args:
+            image_url: 图片URL链接
+            audio_url: 音频URL，或音频URL列表
+            subjects: 选中的主体序号（对应检测结果中 mask_urls 的下标），None 表示全部
+            prompt: 提示词
+            seed: 随机种子，未指定时随机选择一个，所有变体共用
+            pe_fast_mode: 快速模式
+            aigc_meta: 隐式标识配置
+            max_parallel: 同时进行的任务数
+            on_result: 每个变体结束时（按完成顺序）调用 on_result(变体结果)
+            deadline: 截止时间
+
+        Returns:
+            按变体顺序排列的结果列表：[{"index", "subject", "mask_url", "audio_url", "task_id", "video_url",
+            "result", "error"}]，失败的变体 error 为异常说明
+
+        Raises:
+            ValueError: 主体序号越界，或音轨数与主体数无法对应
+        """
+        detection = self.detect_object(image_url)
+        if detection.get("status") != "done":
+            raise Exception(f"对象检测失败: {detection.get('message', '未知错误')}")
+        masks = detection["mask_urls"]
+        if subjects is None:
+            subjects = list(range(len(masks)))
+        for subject in subjects:
+            if not 0 <= subject < len(masks):
+                raise ValueError(f"主体序号 {subject} 超出范围，检测到 {len(masks)} 个对象")
+
+        audio_urls = [audio_url] if isinstance(audio_url, str) else list(audio_url)
+        if len(audio_urls) == 1:
+            variants = [(subject, audio_urls[0]) for subject in subjects] or [(None, audio_urls[0])]
+        elif len(subjects) == len(audio_urls):
+            variants = list(zip(subjects, audio_urls))
+        elif len(subjects) <= 1:
+            variants = [(subjects[0] if subjects else None, url) for url in audio_urls]
+        else:
+            raise ValueError(f"{len(audio_urls)} 条音轨无法对应 {len(subjects)} 个主体，请用 subjects 选择主体")
+        if seed is None:
+            seed = random.randint(0, 2 ** 31 - 1)
+        print(f"🎭 多主体生成：{len(variants)} 个变体并行提交（检测到 {len(masks)} 个对象，随机种子 {seed}）")
+
+        def render(index: int, subject: Optional[int], variant_audio: str) -> Dict[str, Any]:
+            mask_url = masks[subject] if subject is not None else None
+            variant = {"index": index, "subject": subject, "mask_url": mask_url, "audio_url": variant_audio,
+                       "task_id": None, "video_url": None, "result": None, "error": None}
+            try:
+                with deadline_scope(deadline) as scoped:
+                    # 对象检测已经做过，各变体不再单独做主体识别
+                    handle = self.generate_video(image_url, variant_audio, "1.5", prompt,
+                                                 [mask_url] if mask_url else None, seed, pe_fast_mode,
+                                                 aigc_meta, auto_detect=False)
+                    variant["task_id"] = str(handle)
+                    result = handle.result(scoped.remaining() if scoped else None)
+                variant["result"] = result
+                variant["video_url"] = result.get("video_url")
+            except Exception as e:
+                variant["error"] = str(e)
+            return variant
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(variants)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(variants))),
+                                thread_name_prefix="volc-omni-fanout") as pool:
+            futures = [pool.submit(render, index, subject, url) for index, (subject, url) in enumerate(variants)]
+            for future in as_completed(futures):
+                variant = future.result()
+                results[variant["index"]] = variant
+                metrics.inc("volcengine_omni_fanout_variants_total", result="failed" if variant["error"] else "done")
+                if variant["error"]:
+                    print(f"❌ 变体 {variant['index'] + 1}/{len(variants)} 失败: {variant['error']}")
+                else:
+                    print(f"✅ 变体 {variant['index'] + 1}/{len(variants)} 完成: {variant['video_url']}")
+                if on_result is not None:
+                    on_result(variant)
+        return results
+
 
 # 示例使用代码
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+任务句柄 - 所有提交方法的统一返回值
+接口参照 concurrent.futures.Future，可被线程池和 asyncio 代码组合使用
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Callable, Optional
+
+from ..config import TASK_HANDLE_MAX_WAIT
+from ..modules.deadline import Deadline
+from ..modules.task_store import task_store
+from .task_waiter import PollJob, poll_scheduler
+
+
+class TaskHandle(str):
+    """
+    异步任务句柄
+
+    继承自 str，值就是任务ID，原来把返回值当作 task_id 使用的代码无需修改。
+    额外提供：
+    - result(timeout): 阻塞等待任务结果
+    - done() / cancelled() / running(): 状态查询
+    - add_done_callback(fn): 任务结束后回调 fn(handle)
+    - cancel(): 停止本地轮询并丢弃尚未开始的轮询工作（不会取消服务端任务）
+    - await handle: 在 asyncio 中等待结果
+
+    后台轮询由共享的 poll_scheduler 调度，等待中的句柄不占用线程。
+    """
+
+    def __new__(cls, task_id: str, job: Optional[PollJob] = None, req_key: Optional[str] = None,
+                max_wait: float = TASK_HANDLE_MAX_WAIT):
+        """
+        Args:
+            task_id: 任务ID
+            job: 任务的轮询状态（各客户端的 _poll_job）
+            req_key: 服务标识
+            max_wait: 后台轮询的最长时间（秒）
+        """
+        handle = super().__new__(cls, task_id)
+        handle.task_id = str(task_id)
+        handle.req_key = req_key
+        handle.submitted_at = time.time()
+        handle.max_wait = max_wait
+        handle._job = job
+        handle._future = Future()
+        handle._cancel_event = threading.Event()
+        handle._poll_future = None
+        handle._lock = threading.Lock()
+        if job is not None:
+            task_store.record_submitted(handle.task_id, req_key)
+        return handle
+
+    def __reduce__(self):
+        # 序列化时只保留任务ID
+        return (str, (self.task_id,))
+
+    def _start(self):
+        """启动后台轮询（只启动一次）"""
+        with self._lock:
+            if self._poll_future is not None or self._future.done():
+                return
+            if self._job is None:
+                raise RuntimeError(f"任务 {self.task_id} 没有关联的轮询任务")
+            self._poll_future = poll_scheduler.submit(self._job, Deadline(self.max_wait), self._cancel_event)
+        self._poll_future.add_done_callback(self._on_polled)
+
+    def _on_polled(self, poll_future: Future):
+        """轮询结束后写入结果，任务已被取消时忽略"""
+        if poll_future.cancelled():
+            return
+        try:
+            exception = poll_future.exception()
+            if exception is not None:
+                self._future.set_exception(exception)
+            else:
+                self._future.set_result(poll_future.result())
+        except InvalidStateError:
+            pass
+
+    def done(self) -> bool:
+        """任务是否已结束（完成、失败或已取消）"""
+        return self._future.done()
+
+    def cancelled(self) -> bool:
+        """是否已取消"""
+        return self._future.cancelled()
+
+    def running(self) -> bool:
+        """是否正在后台轮询"""
+        return self._poll_future is not None and not self.done()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """
+        等待并返回任务结果
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            任务结果（与 wait_for_completion 的返回值相同）
+
+        Raises:
+            concurrent.futures.TimeoutError: 等待超时（任务仍在后台轮询）
+            concurrent.futures.CancelledError: 任务已取消
+            Exception: 任务失败
+        """
+        self._start()
+        return self._future.result(timeout)
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        """等待任务结束并返回其异常（成功时返回None）"""
+        self._start()
+        return self._future.exception(timeout)
+
+    def add_done_callback(self, fn: Callable[["TaskHandle"], Any]):
+        """
+        添加完成回调，任务结束（含取消）后以 fn(handle) 调用
+
+        添加回调会启动后台轮询。
+        """
+        self._future.add_done_callback(lambda _: fn(self))
+        if not self._future.done():
+            self._start()
+
+    def cancel(self) -> bool:
+        """
+        取消本地等待：停止轮询、丢弃尚未开始的轮询工作
+
+        Returns:
+            是否取消成功（任务已结束时返回False）
+        """
+        if self._future.done():
+            return False
+        self._cancel_event.set()
+        with self._lock:
+            if self._poll_future is not None:
+                self._poll_future.cancel()
+        return self._future.cancel()
+
+    def __await__(self):
+        self._start()
+        return asyncio.wrap_future(self._future).__await__()
+
+    def __repr__(self):
+        if self.cancelled():
+            state = "cancelled"
+        elif self.done():
+            state = "finished"
+        elif self._poll_future is not None:
+            state = "polling"
+        else:
+            state = "pending"
+        return f"TaskHandle({self.task_id!r}, state={state})"
+
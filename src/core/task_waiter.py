@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+任务轮询引擎 - 所有异步任务共用的等待逻辑
+
+- PollJob.step(): 查询一次任务状态，是唯一的轮询代码路径
+- 状态提取器: 把各服务不同格式的查询结果归一为 (状态, 说明)
+- 自适应间隔: 刚提交时查询较密，之后逐步放慢；按服务统计的耗时会推迟无意义的早期查询
+- PollScheduler: 共享的轮询调度器，大量任务等待时不必每个任务占用一个线程
+- 任务结束时写入任务记录，结果中的临时URL交给 result_mirror 在后台下载
+- 启用任务所有权时，只有持有租约的轮询方查询服务端，其他轮询方从任务记录读取结果
+- 排队耗时和总耗时交给 service_router，用于在等价服务间选择
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError, InvalidStateError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..config import TASK_POLL_WORKERS, POLL_MIN_INTERVAL, POLL_BACKOFF
+from ..modules.credential_pool import credential_pool
+from ..modules.deadline import Deadline, deadline_scope
+from ..modules.metrics import metrics
+from ..modules.result_mirror import result_mirror
+from ..modules.service_router import service_router
+from ..modules.task_ownership import task_ownership
+from ..modules.task_store import task_store, DONE as RECORD_DONE, FAILED as RECORD_FAILED
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 服务端的终止异常状态
+FAILED_STATUSES = ("not_found", "expired")
+
+
+class TaskFailedError(Exception):
+    """任务在服务端失败（终止状态），不应重试或继续轮询"""
+
+    retryable = False
+
+
+def find_task_failure(exc: BaseException) -> Optional[TaskFailedError]:
+    """沿异常链查找 TaskFailedError（查询方法会把原始异常包装一层）"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, TaskFailedError):
+            return exc
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+def raise_if_cancelled(cancel_event: Optional[threading.Event], task_id: str):
+    """
+    检查取消事件
+
+    Raises:
+        CancelledError: 已取消
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise CancelledError(f"任务 {task_id} 的等待已取消")
+
+
+def status_extractor(done_keys: Tuple[str, ...] = ("video_url",)) -> Callable[[Dict], Tuple[str, str]]:
+    """
+    创建解包后查询结果的状态提取器（get_xxx_result 返回的 data 或整理后的字典）
+
+    Args:
+        done_keys: 出现任一字段即视为已完成
+
+    Returns:
+        提取函数 result -> (状态, 说明)
+    """
+    def extract(result: Dict) -> Tuple[str, str]:
+        status = result.get("status", "unknown")
+        if status == "done" or any(result.get(key) is not None for key in done_keys):
+            return DONE, "任务完成"
+        if status in FAILED_STATUSES:
+            return FAILED, f"任务异常: {status}"
+        return RUNNING, result.get("message") or f"任务状态: {status}"
+
+    return extract
+
+
+def raw_response_status(result: Dict) -> Tuple[str, str]:
+    """
+    原始API响应（含 code / data）的状态提取器
+
+    Raises:
+        Exception: API返回错误码（按查询出错处理，继续轮询）
+    """
+    if result.get("code") != 10000:
+        raise Exception(f"API错误: {result}")
+    data = result.get("data") or {}
+    status = data.get("status", "unknown")
+    if status == "done":
+        return DONE, "任务完成"
+    if status in FAILED_STATUSES:
+        return FAILED, f"任务异常: {status}"
+    return RUNNING, data.get("message") or f"任务状态: {status}"
+
+
+def _raw_status(result: Dict) -> Optional[str]:
+    """查询结果中服务端的原始状态（in_queue / generating / done ...）"""
+    if not isinstance(result, dict):
+        return None
+    data = result.get("data")
+    return result.get("status") or (data.get("status") if isinstance(data, dict) else None)
+
+
+class CompletionStats:
+    """按服务统计任务完成耗时（指数滑动平均），用于推迟过早的查询"""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._expected: Dict[str, float] = {}
+
+    def observe(self, key: str, seconds: float):
+        """记录一次任务完成耗时"""
+        with self._lock:
+            previous = self._expected.get(key)
+            self._expected[key] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def expected(self, key: str) -> Optional[float]:
+        """预计完成耗时，没有样本时返回None"""
+        with self._lock:
+            return self._expected.get(key)
+
+
+# 全局完成耗时统计
+completion_stats = CompletionStats()
+
+
+class PollJob:
+    """单个任务的轮询状态"""
+
+    def __init__(self, task_id: str, fetch: Callable[[], Dict], extract: Callable[[Dict], Tuple[str, str]] = None,
+                 req_key: Optional[str] = None, max_interval: float = 15, min_interval: float = POLL_MIN_INTERVAL):
+        """
+        Args:
+            task_id: 任务ID
+            fetch: 查询一次任务结果的函数
+            extract: 状态提取器，默认按解包后的结果判断
+            req_key: 服务标识（用于耗时统计和指标）
+            max_interval: 最长轮询间隔（秒）
+            min_interval: 最短轮询间隔（秒）
+        """
+        self.task_id = task_id
+        self.fetch = fetch
+        self.extract = extract or status_extractor()
+        self.req_key = req_key or "unknown"
+        self.max_interval = max(max_interval, min_interval)
+        self.min_interval = min_interval
+
+        self.started_at = time.monotonic()
+        self.queue_seconds: Optional[float] = None
+        self.polls = 0
+        self.finished = False
+        self.result: Optional[Dict] = None
+        self.error: Optional[BaseException] = None
+
+    def step(self) -> Optional[float]:
+        """
+        查询一次任务状态
+
+        Returns:
+            距下次查询应等待的秒数；任务已结束时返回None（见 result / error）
+        """
+        if not task_ownership.claim(self.task_id, self):
+            return self._follow()
+        self.polls += 1
+        metrics.inc("volcengine_task_polls_total", req_key=self.req_key)
+
+        try:
+            result = self.fetch()
+            state, message = self.extract(result)
+        except Exception as e:
+            failure = find_task_failure(e)
+            if failure is not None:
+                return self._finish(error=failure)
+            metrics.inc("volcengine_task_poll_errors_total", req_key=self.req_key)
+            print(f"检查任务状态时出错: {str(e)}")
+            return self.next_interval()
+
+        if state == DONE:
+            completion_stats.observe(self.req_key, time.monotonic() - self.started_at)
+            return self._finish(result=result)
+        if state == FAILED:
+            return self._finish(error=TaskFailedError(message))
+
+        if self.queue_seconds is None and _raw_status(result) == "generating":
+            # 首次看到开始生成：排队结束（精度为一个轮询间隔）
+            self.queue_seconds = time.monotonic() - self.started_at
+            service_router.observe_queue(self.req_key, self.queue_seconds)
+        print(f"任务进行中... {message}")
+        return self.next_interval()
+
+    def _follow(self) -> Optional[float]:
+        """其他轮询方持有任务租约：只读取任务结果，持有方写入结果后结束"""
+        record = task_ownership.outcome(self.task_id)
+        status = record["status"] if record else None
+        if status == RECORD_DONE:
+            self.finished, self.result = True, record["result"]
+        elif status == RECORD_FAILED:
+            self.finished, self.error = True, TaskFailedError(record["error"] or f"任务 {self.task_id} 失败")
+        else:
+            return self.next_interval()
+        credential_pool.finish(self.task_id)
+        return None
+
+    def next_interval(self) -> float:
+        """自适应轮询间隔"""
+        elapsed = time.monotonic() - self.started_at
+        expected = completion_stats.expected(self.req_key)
+        if expected is not None and elapsed < expected:
+            # 距预计完成时间还远时少查几次
+            interval = (expected - elapsed) / 2
+        else:
+            interval = self.min_interval * (POLL_BACKOFF ** max(0, self.polls - 1))
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def outcome(self) -> Dict:
+        """
+        任务结果
+
+        Raises:
+            Exception: 任务失败
+        """
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def wait(self, deadline: Deadline, cancel_event: Optional[threading.Event] = None) -> Dict:
+        """
+        在当前线程轮询直到任务结束
+
+        Args:
+            deadline: 截止时间
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
+
+        Returns:
+            任务结果
+
+        Raises:
+            TaskFailedError: 任务失败
+            TimeoutError: 超过截止时间
+            CancelledError: 已取消
+        """
+        try:
+            with deadline_scope(deadline) as deadline:
+                while not deadline.expired():
+                    raise_if_cancelled(cancel_event, self.task_id)
+                    delay = self.step()
+                    if delay is None:
+                        return self.outcome()
+                    deadline.sleep(delay, cancel_event)
+
+            raise_if_cancelled(cancel_event, self.task_id)
+            raise TimeoutError(f"等待任务完成超时 ({deadline.seconds}秒)")
+        except (TimeoutError, CancelledError):
+            self.abandon()
+            raise
+
+    def abandon(self):
+        """放弃等待（超时、取消）：归还任务占用的账号并发名额，任务归属保留，之后仍可再次等待"""
+        if not self.finished:
+            credential_pool.abandon(self.task_id)
+
+    def _finish(self, result: Optional[Dict] = None, error: Optional[BaseException] = None) -> None:
+        self.finished = True
+        self.result = result
+        self.error = error
+        metrics.inc("volcengine_tasks_finished_total", req_key=self.req_key, outcome="failed" if error else "done")
+        service_router.observe(self.req_key, time.monotonic() - self.started_at, success=error is None)
+        # 记录结果，并在链接过期前把结果文件镜像到本地
+        if error is not None:
+            task_store.record_finished(self.task_id, self.req_key, error=error)
+        else:
+            result_mirror.enqueue(self.task_id, self.req_key, result)
+        task_ownership.finish(self.task_id, self, result, error)
+        credential_pool.finish(self.task_id)
+        return None
+
+
+class PollScheduler:
+    """
+    共享轮询调度器
+
+    所有等待中的任务按下次查询时间放入一个小顶堆，调度线程到点后把 step()
+    交给线程池执行。等待中的任务不占用线程，线程数只取决于同时进行的查询数。
+    """
+
+    def __init__(self, workers: int = TASK_POLL_WORKERS):
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._pool = None
+        self._thread = None
+
+    def submit(self, job: PollJob, deadline: Deadline, cancel_event: Optional[threading.Event] = None) -> Future:
+        """
+        提交轮询任务
+
+        Args:
+            job: 轮询任务
+            deadline: 截止时间
+            cancel_event: 取消事件
+
+        Returns:
+            Future，结果与 job.wait() 相同
+        """
+        future = Future()
+        self._schedule(time.monotonic(), (job, deadline, cancel_event, future))
+        return future
+
+    def pending(self) -> int:
+        """等待中的轮询任务数"""
+        with self._cond:
+            return len(self._heap)
+
+    def _schedule(self, at: float, entry: tuple):
+        with self._cond:
+            heapq.heappush(self._heap, (at, next(self._seq), entry))
+            if self._thread is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="volc-poll")
+                self._thread = threading.Thread(target=self._dispatch, name="volc-poll-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _dispatch(self):
+        """调度线程：到点的任务交给线程池"""
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                _, _, entry = heapq.heappop(self._heap)
+            self._pool.submit(self._run_step, entry)
+
+    def _run_step(self, entry: tuple):
+        job, deadline, cancel_event, future = entry
+        if future.cancelled():
+            job.abandon()
+            return
+        if cancel_event is not None and cancel_event.is_set():
+            job.abandon()
+            future.cancel()
+            return
+        try:
+            if deadline.expired():
+                raise TimeoutError(f"等待任务完成超时 ({deadline.seconds}秒)")
+            with deadline_scope(deadline):
+                delay = job.step()
+        except BaseException as e:
+            job.abandon()
+            self._settle(future, error=e)
+            return
+
+        if delay is None:
+            self._settle(future, result=job.result, error=job.error)
+            return
+
+        remaining = deadline.remaining()
+        if remaining is not None:
+            delay = min(delay, remaining)
+        self._schedule(time.monotonic() + delay, entry)
+
+    @staticmethod
+    def _settle(future: Future, result: Any = None, error: Optional[BaseException] = None):
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+
+# 全局轮询调度器
+poll_scheduler = PollScheduler()
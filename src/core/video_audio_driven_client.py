@@ -4,13 +4,18 @@
 """
 
 import json
-import time
-from typing import Dict, Any
-from urllib.parse import quote
+import threading
+from typing import Callable, Dict, Any, Optional
 
-from .base_volcengine_client import BaseVolcengineClient
-from ..utils import retry, validate_mode, get_mode_description, get_supported_audio_length, format_duration
-from ..config import DEFAULT_TIMEOUT, MAX_RETRIES, RETRY_DELAY
+from .base_volcengine_client import ApiError, BaseVolcengineClient
+from ..utils import retry, validate_mode, get_mode_description, get_supported_audio_length
+from ..config import MAX_RETRIES, RETRY_DELAY, LONG_AUDIO_MAX_PARALLEL, AVATAR_INVALID_CODES
+from .task_handle import TaskHandle
+from .task_waiter import PollJob, TaskFailedError, find_task_failure, status_extractor
+from ..modules.avatar_manager import avatar_manager, image_digest
+from ..modules.deadline import Deadline, deadline_scope
+from ..modules.long_audio import render_long_audio
+from ..modules.metrics import metrics
 
 
 class VideoAudioDrivenClient(BaseVolcengineClient):
@@ -43,7 +48,7 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
         }
 
     @retry(max_retries=MAX_RETRIES, delay=RETRY_DELAY)
-    def create_role(self, image_url: str, mode: str = "normal") -> str:
+    def create_role(self, image_url: str, mode: str = "normal") -> TaskHandle:
         """
         创建数字形象
 
@@ -52,10 +57,11 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             mode: 模式，可选值: normal(普通模式), loopy(灵动模式), loopyb(大画幅灵动模式)
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
         """
         # 参数验证
         self._validate_image_url(image_url)
+        self._check_urls({image_url: ("image", None)})
 
         if not validate_mode(mode):
             raise ValueError(f"不支持的模式: {mode}，支持的模式: normal, loopy, loopyb")
@@ -71,7 +77,55 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
 
         task_id = response["data"]["task_id"]
         print(f"形象创建任务已提交，任务ID: {task_id}")
-        return task_id
+        return TaskHandle(task_id, self._poll_job(task_id, mode, "role"), req_key)
+
+    def find_or_create_role(self, image_url: str, mode: str = "normal", deadline: Optional[Deadline] = None,
+                            reuse: bool = True) -> Dict[str, Any]:
+        """
+        获取图片对应的形象：同一图片（URL相同或内容相同）已有同模式的形象时直接复用，否则创建并保存
+
+        复用时省去一次完整的形象创建（通常需要数分钟）。
+
+        Args:
+            image_url: 图片URL链接
+            mode: 模式，可选值: normal, loopy, loopyb
+            deadline: 等待形象创建的截止时间
+            reuse: 是否允许复用已有形象（False 时总是重新创建，新形象仍会被记录）
+
+        Returns:
+            形象信息（resource_id / role_type / face_position），另含 task_id（创建任务ID）和 reused（是否复用）
+        """
+        digest = None
+        if reuse:
+            avatar = avatar_manager.find_avatar(mode, image_url=image_url)
+            if avatar is None:
+                digest = image_digest(image_url)
+                avatar = avatar_manager.find_avatar(mode, image_digest=digest) if digest else None
+            if avatar is not None:
+                metrics.inc("volcengine_avatar_lookups_total", mode=mode, result="reused")
+                print(f"♻️ 复用已有形象: {avatar['resource_id']}（{mode}模式，创建任务ID: {avatar['task_id']}）")
+                return {
+                    "resource_id": avatar["resource_id"],
+                    "role_type": avatar.get("role_type", "unknown"),
+                    "face_position": avatar.get("face_position", []),
+                    "task_id": avatar["task_id"],
+                    "reused": True
+                }
+
+        role_task_id = self.create_role(image_url, mode)
+        # 形象创建期间计算图片摘要，不增加等待时间
+        if digest is None:
+            digest = image_digest(image_url)
+        role_result = self.wait_for_completion(role_task_id, mode, "role", deadline=deadline)
+        metrics.inc("volcengine_avatar_lookups_total", mode=mode, result="created")
+
+        # 保存形象信息到本地（记录图片URL和摘要，供之后复用）
+        try:
+            avatar_manager.save_avatar(role_task_id, role_result, mode, role_result.get("resp_data"),
+                                       image_url=image_url, image_digest=digest)
+        except Exception as e:
+            print(f"⚠️ 形象保存失败: {str(e)}")
+        return dict(role_result, task_id=str(role_task_id), reused=False)
 
     def get_role_result(self, task_id: str, mode: str = "normal") -> Dict[str, Any]:
         """
@@ -112,7 +166,7 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
                         "resp_data": resp_data
                     }
                 else:
-                    raise Exception(f"形象创建失败: {resp_data.get('msg', '未知错误')}")
+                    raise TaskFailedError(f"形象创建失败: {resp_data.get('msg', '未知错误')}")
             else:
                 return {"status": status, "message": f"任务状态: {status}"}
 
@@ -120,7 +174,7 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             raise Exception(f"获取形象创建结果失败: {str(e)}")
 
     @retry(max_retries=MAX_RETRIES, delay=RETRY_DELAY)
-    def generate_video(self, resource_id: str, audio_url: str, mode: str = "normal", aigc_meta: Optional[Dict] = None) -> str:
+    def generate_video(self, resource_id: str, audio_url: str, mode: str = "normal", aigc_meta: Optional[Dict] = None) -> TaskHandle:
         """
         生成视频
 
@@ -131,19 +185,21 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             aigc_meta: 隐式标识配置
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
         """
         # 参数验证
         if not resource_id or not isinstance(resource_id, str):
             raise ValueError("形象ID不能为空")
 
         self._validate_audio_url(audio_url)
+        self._check_urls({audio_url: ("audio", None)})
 
         if not validate_mode(mode):
             raise ValueError(f"不支持的模式: {mode}，支持的模式: normal, loopy, loopyb")
 
         req_key = self.REQ_KEYS[mode]["generate_video"]
         max_audio_length = get_supported_audio_length(mode)
+        self._check_media_duration(audio_url, max_audio_length)
         print(f"开始生成视频，模式: {get_mode_description(mode)}")
         print(f"注意：该模式支持的最大音频长度为 {max_audio_length} 秒")
 
@@ -152,15 +208,22 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             "audio_url": audio_url
         }
 
-        response = self._make_request("POST", "CVSubmitTask", req_key, data=data)
+        try:
+            response = self._make_request("POST", "CVSubmitTask", req_key, data=data)
+        except ApiError as e:
+            if e.code in AVATAR_INVALID_CODES:
+                raise TaskFailedError(f"形象 {resource_id} 不可用: {str(e)}") from e
+            raise
 
         if response.get("code") != 10000:
             error_msg = response.get("message", "未知错误")
+            if response.get("code") in AVATAR_INVALID_CODES:
+                raise TaskFailedError(f"形象 {resource_id} 不可用: {error_msg}")
             raise Exception(f"视频生成任务提交失败: {error_msg}")
 
         task_id = response["data"]["task_id"]
         print(f"视频生成任务已提交，任务ID: {task_id}")
-        return task_id
+        return TaskHandle(task_id, self._poll_job(task_id, mode, "video"), req_key)
 
     def get_video_result(self, task_id: str, mode: str = "normal", aigc_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -223,14 +286,37 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
 
                     return result
                 else:
-                    raise Exception(f"视频生成失败: {resp_data.get('msg', '未知错误')}")
+                    raise TaskFailedError(f"视频生成失败: {resp_data.get('msg', '未知错误')}")
             else:
                 return {"status": status, "message": f"任务状态: {status}"}
 
         except Exception as e:
             raise Exception(f"获取视频生成结果失败: {str(e)}")
 
-    def wait_for_completion(self, task_id: str, mode: str, operation_type: str, max_wait_time: int = 300, check_interval: int = 15) -> Dict[str, Any]:
+    def _poll_job(self, task_id: str, mode: str, operation_type: str, check_interval: float = 15) -> PollJob:
+        """
+        创建任务的轮询状态
+
+        Args:
+            task_id: 任务ID
+            mode: 模式
+            operation_type: 操作类型 (role 或 video)
+            check_interval: 最长检查间隔（秒）
+
+        Returns:
+            轮询任务
+        """
+        if operation_type == "role":
+            req_key = self.REQ_KEYS[mode]["create_role"]
+            return PollJob(task_id, lambda: self.get_role_result(task_id, mode),
+                           status_extractor(("resource_id",)), req_key, check_interval)
+        if operation_type == "video":
+            req_key = self.REQ_KEYS[mode]["generate_video"]
+            return PollJob(task_id, lambda: self.get_video_result(task_id, mode),
+                           status_extractor(("video_url",)), req_key, check_interval)
+        raise ValueError(f"不支持的操作类型: {operation_type}")
+
+    def wait_for_completion(self, task_id: str, mode: str, operation_type: str, max_wait_time: int = 300, check_interval: int = 15, deadline: Optional[Deadline] = None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
@@ -238,48 +324,17 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             task_id: 任务ID
             mode: 模式
             operation_type: 操作类型 (role 或 video)
-            max_wait_time: 最大等待时间（秒）
+            max_wait_time: 最大等待时间（秒），0 表示不限制
             check_interval: 检查间隔（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
 
         Returns:
             任务结果
         """
-        start_time = time.time()
-
-        while max_wait_time == 0 or time.time() - start_time < max_wait_time:
-            try:
-                if operation_type == "role":
-                    result = self.get_role_result(task_id, mode)
-                elif operation_type == "video":
-                    result = self.get_video_result(task_id, mode)
-                else:
-                    raise ValueError(f"不支持的操作类型: {operation_type}")
+        return self._poll_job(task_id, mode, operation_type, check_interval).wait(deadline or Deadline(max_wait_time or None), cancel_event)
 
-                # 检查API响应状态
-                if result.get("code") == 10000:  # API成功
-                    data = result.get("data", {})
-                    status = data.get("status")
-
-                    if status == "done":
-                        return result
-                    elif status in ["not_found", "expired"]:
-                        raise Exception(f"任务异常: {status}")
-                    elif "resource_id" in result or "video_url" in result:
-                        # 如果返回结果包含resource_id或video_url，说明任务已完成
-                        return result
-
-                print(f"任务进行中... 状态: {result.get('status', 'unknown')}")
-                time.sleep(check_interval)
-
-            except Exception as e:
-                if "任务异常" in str(e):
-                    raise
-                print(f"检查任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
-
-        raise TimeoutError(f"等待任务完成超时 ({max_wait_time}秒)")
-
-    def generate_video_from_image_audio(self, image_url: str, audio_url: str, mode: str = "normal", aigc_meta: Optional[Dict] = None, max_wait_time: int = 600) -> Dict[str, Any]:
+    def generate_video_from_image_audio(self, image_url: str, audio_url: str, mode: str = "normal", aigc_meta: Optional[Dict] = None, max_wait_time: int = 600, deadline: Optional[Deadline] = None, reuse_avatar: bool = True) -> Dict[str, Any]:
         """
         从图片和音频生成视频（完整流程）
 
@@ -288,33 +343,45 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             audio_url: 音频URL链接
             mode: 模式，可选值: normal(普通模式), loopy(灵动模式), loopyb(大画幅灵动模式)
             aigc_meta: 隐式标识配置
-            max_wait_time: 最大等待时间（秒）
+            max_wait_time: 整个流程的最大等待时间（秒），0 表示不限制
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            reuse_avatar: 同一图片已有形象时是否直接复用
 
         Returns:
             生成结果
         """
+        deadline = deadline or Deadline(max_wait_time or None)
+        with deadline_scope(deadline) as deadline:
+            return self._generate_video_from_image_audio(image_url, audio_url, mode, aigc_meta, deadline, reuse_avatar)
+
+    def _generate_video_from_image_audio(self, image_url: str, audio_url: str, mode: str, aigc_meta: Optional[Dict], deadline: Deadline, reuse_avatar: bool = True) -> Dict[str, Any]:
+        """完整流程的实现，所有请求和等待共享同一个截止时间"""
         print(f"开始生成视频，模式: {mode}")
 
-        # 步骤1：创建形象
+        # 步骤1：获取形象（同一图片已有形象时直接复用）
         print("步骤1：创建数字形象...")
-        role_task_id = self.create_role(image_url, mode)
-        role_result = self.wait_for_completion(role_task_id, mode, "role")
-        resource_id = role_result["resource_id"]
+        role = self.find_or_create_role(image_url, mode, deadline, reuse=reuse_avatar)
+        resource_id = role["resource_id"]
 
-        print(f"形象创建完成，ID: {resource_id}")
-
-        # 保存形象信息到本地
-        try:
-            from src.modules.avatar_manager import avatar_manager
-            avatar_manager.save_avatar(role_task_id, role_result, mode, role_result.get("resp_data"))
-        except Exception as e:
-            print(f"⚠️ 形象保存失败: {str(e)}")
+        print(f"形象{'已复用' if role['reused'] else '创建完成'}，ID: {resource_id}")
 
         # 步骤2：生成视频
         print("步骤2：生成视频...")
-        video_task_id = self.generate_video(resource_id, audio_url, mode, aigc_meta)
-        # max_wait_time=0 表示无限制等待
-        video_result = self.wait_for_completion(video_task_id, mode, "video", max_wait_time=0 if max_wait_time == 0 else max_wait_time)
+        try:
+            video_task_id = self.generate_video(resource_id, audio_url, mode, aigc_meta)
+            video_result = self.wait_for_completion(video_task_id, mode, "video", deadline=deadline)
+        except Exception as e:
+            # 只有服务端明确失败（视频任务失败，或提交返回形象失效错误码）才可能是形象的问题；
+            # 超时、熔断、配额/并发/调度等待超时、网络错误等与形象无关，直接抛出
+            if not role["reused"] or find_task_failure(e) is None:
+                raise
+            # 复用的形象可能已在服务端失效：标记后重新创建形象再生成一次
+            print(f"⚠️ 使用复用的形象生成失败（{str(e)}），重新创建形象")
+            avatar_manager.invalidate_avatar(resource_id)
+            role = self.find_or_create_role(image_url, mode, deadline, reuse=False)
+            resource_id = role["resource_id"]
+            video_task_id = self.generate_video(resource_id, audio_url, mode, aigc_meta)
+            video_result = self.wait_for_completion(video_task_id, mode, "video", deadline=deadline)
 
         print("视频生成完成！")
         return {
@@ -324,6 +391,34 @@ class VideoAudioDrivenClient(BaseVolcengineClient):
             "aigc_meta_tagged": video_result.get("aigc_meta_tagged")
         }
 
+    def generate_long_video(self, resource_id: str, audio: str, output: str, mode: str = "normal",
+                            uploader: Optional[Callable[[str], str]] = None, aigc_meta: Optional[Dict] = None,
+                            max_parallel: int = LONG_AUDIO_MAX_PARALLEL, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """
+        长音频模式：音频超过模式时长上限时按静音切分，各段并行生成后拼接为一个视频
+
+        Args:
+            resource_id: 形象ID（所有片段共用）
+            audio: 音频本地路径或URL
+            output: 输出视频路径
+            mode: 模式，可选值: normal, loopy, loopyb
+            uploader: 上传音频片段的函数 uploader(本地路径) -> 公网URL
+            aigc_meta: 隐式标识配置
+            max_parallel: 同时生成的片段数
+            deadline: 截止时间
+
+        Returns:
+            {"video_path", "duration", "elapsed", "segments"}
+        """
+        if not validate_mode(mode):
+            raise ValueError(f"不支持的模式: {mode}，支持的模式: normal, loopy, loopyb")
+
+        return render_long_audio(
+            audio, get_supported_audio_length(mode),
+            lambda audio_url, segment: self.generate_video(resource_id, audio_url, mode, aigc_meta),
+            uploader, output, max_parallel, deadline=deadline
+        )
+
 
 # 示例使用代码
 if __name__ == "__main__":
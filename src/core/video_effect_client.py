@@ -5,12 +5,14 @@
 """
 
 import json
-import time
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Optional
 
 from .base_volcengine_client import BaseVolcengineClient
 from ..utils import retry
-from ..config import DEFAULT_TIMEOUT
+from .task_handle import TaskHandle
+from .task_waiter import PollJob, raw_response_status
+from ..modules.deadline import Deadline, deadline_scope
 
 
 class VideoEffectClient(BaseVolcengineClient):
@@ -145,7 +147,7 @@ class VideoEffectClient(BaseVolcengineClient):
 
     
     @retry(max_retries=3, delay=2)
-    def submit_task(self, image_url: str, template_id: str, final_stitch_switch: bool = True) -> str:
+    def submit_task(self, image_url: str, template_id: str, final_stitch_switch: bool = True) -> TaskHandle:
         """
         提交特效视频生成任务
 
@@ -155,7 +157,7 @@ class VideoEffectClient(BaseVolcengineClient):
             final_stitch_switch: 分屏设置（仅V2版本支持）
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
         """
         # 参数验证
         if not image_url:
@@ -192,6 +194,8 @@ class VideoEffectClient(BaseVolcengineClient):
             if not self._validate_url(image_url):
                 raise ValueError("图片URL格式不正确")
 
+        self._check_urls({url.strip(): ("image", None) for url in image_url.split("|")})
+
         # 构建请求数据
         data = {
             "image_input": image_url,
@@ -227,7 +231,7 @@ class VideoEffectClient(BaseVolcengineClient):
             print(f"特效视频任务已提交，任务ID: {task_id}")
             if is_dual_template:
                 print(f"💕 使用双图模式，已传入2张图片")
-            return task_id
+            return TaskHandle(task_id, self._poll_job(task_id, req_key), req_key)
 
         except Exception as e:
             raise Exception(f"提交任务失败: {str(e)}")
@@ -314,7 +318,31 @@ class VideoEffectClient(BaseVolcengineClient):
         except Exception as e:
             raise Exception(f"获取结果失败: {str(e)}")
 
-    def wait_for_completion(self, task_id: str, max_wait_time: int = 600, check_interval: int = 15, req_key: str = None) -> Dict[str, Any]:
+    def _poll_job(self, task_id: str, req_key: str = None, check_interval: float = 15) -> PollJob:
+        """
+        创建任务的轮询状态
+
+        Args:
+            task_id: 任务ID
+            req_key: 服务标识（可选，未提供时在首次查询时检测并缓存）
+            check_interval: 最长检查间隔（秒）
+
+        Returns:
+            轮询任务
+        """
+        detected = {"req_key": req_key}
+
+        def fetch():
+            if not detected["req_key"]:
+                # 版本检测返回格式为"req_key|response"，只需要req_key
+                detected["req_key"] = self.get_task_req_key(task_id).split("|", 1)[0]
+            result = self.get_result(task_id, detected["req_key"])
+            print(f"API响应: {result}")
+            return result
+
+        return PollJob(task_id, fetch, raw_response_status, req_key, check_interval)
+
+    def wait_for_completion(self, task_id: str, max_wait_time: int = 600, check_interval: int = 15, req_key: str = None, deadline: Optional[Deadline] = None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
@@ -322,52 +350,16 @@ class VideoEffectClient(BaseVolcengineClient):
             task_id: 任务ID
             max_wait_time: 最大等待时间（秒）
             check_interval: 检查间隔（秒）
+            req_key: 服务标识（可选）
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
 
         Returns:
             任务结果
         """
-        start_time = time.time()
-        req_key = None  # 缓存检测到的req_key
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = self.get_result(task_id, req_key)
-
-                # 直接显示API完整响应
-                print(f"API响应: {result}")
-
-                # 检查是否完成
-                if result.get("code") == 10000:  # 成功
-                    data = result.get("data", {})
-                    status = data.get("status")
-
-                    if status == "done":
-                        return result
-                    elif status in ["not_found", "expired"]:
-                        raise Exception(f"任务异常: {status}")
-                    else:
-                        # 任务还在处理中，继续等待
-                        if not req_key:
-                            # 自动检测req_key
-                            req_key = self.get_task_req_key(task_id)
-                            # 版本检测返回格式为"req_key|response"，需要提取req_key
-                            if "|" in req_key:
-                                req_key = req_key.split("|")[0]
-                else:
-                    # API返回错误，直接抛出异常
-                    raise Exception(f"API错误: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                if "任务异常" in str(e):
-                    raise
-                print(f"检查任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
+        return self._poll_job(task_id, req_key, check_interval).wait(deadline or Deadline(max_wait_time), cancel_event)
 
-        raise TimeoutError(f"等待任务完成超时 ({max_wait_time}秒)")
-
-    def generate_video_from_image(self, image_url: str, template_id: str, final_stitch_switch: bool = True, max_wait_time: int = 600) -> Dict[str, Any]:
+    def generate_video_from_image(self, image_url: str, template_id: str, final_stitch_switch: bool = True, max_wait_time: int = 600, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """
         从图片生成特效视频（完整流程）
 
@@ -375,22 +367,25 @@ class VideoEffectClient(BaseVolcengineClient):
             image_url: 图片URL链接
             template_id: 特效模板ID
             final_stitch_switch: 分屏设置
-            max_wait_time: 最大等待时间（秒）
+            max_wait_time: 整个流程的最大等待时间（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
 
         Returns:
             生成结果
         """
         print(f"开始生成特效视频（模板: {template_id}）")
 
-        # 步骤1：提交任务
-        task_id = self.submit_task(image_url, template_id, final_stitch_switch)
+        deadline = deadline or Deadline(max_wait_time)
+        with deadline_scope(deadline) as deadline:
+            # 步骤1：提交任务
+            task_id = self.submit_task(image_url, template_id, final_stitch_switch)
 
-        # 步骤2：等待完成，直接使用对应的req_key避免版本检测
-        if template_id in self.V2_TEMPLATES:
-            req_key = "i2v_template_cv_v2"
-        else:
-            req_key = "i2v_bytedance_effects_v1"
-        result = self.wait_for_completion(task_id, max_wait_time, 15, req_key)
+            # 步骤2：等待完成，直接使用对应的req_key避免版本检测
+            if template_id in self.V2_TEMPLATES:
+                req_key = "i2v_template_cv_v2"
+            else:
+                req_key = "i2v_bytedance_effects_v1"
+            result = self.wait_for_completion(task_id, check_interval=15, req_key=req_key, deadline=deadline)
 
         if result.get("code") == 10000:
             data = result.get("data", {})
@@ -5,12 +5,18 @@
 """
 
 import json
-import time
-from typing import Dict, Any
+import os
+import threading
+from typing import Callable, Dict, Any, Optional
 
 from .base_volcengine_client import BaseVolcengineClient
-from ..utils import retry
-from ..config import DEFAULT_TIMEOUT, MAX_RETRIES, RETRY_DELAY
+from ..utils import retry, validate_url
+from ..config import MAX_RETRIES, RETRY_DELAY, LONG_AUDIO_MAX_PARALLEL
+from .task_handle import TaskHandle
+from .task_waiter import PollJob, TaskFailedError, status_extractor
+from ..modules.deadline import Deadline, deadline_scope
+from ..modules.ffmpeg_tools import cut_video
+from ..modules.long_audio import AudioSegment, render_long_audio
 
 
 class VideoLipSyncClient(BaseVolcengineClient):
@@ -54,7 +60,7 @@ class VideoLipSyncClient(BaseVolcengineClient):
 
     
     @retry(max_retries=MAX_RETRIES, delay=RETRY_DELAY)
-    def submit_lip_sync_task(self, video_url: str, audio_url: str, mode: str = "lite", **kwargs) -> str:
+    def submit_lip_sync_task(self, video_url: str, audio_url: str, mode: str = "lite", **kwargs) -> TaskHandle:
         """
         提交视频改口型任务
 
@@ -65,11 +71,12 @@ class VideoLipSyncClient(BaseVolcengineClient):
             **kwargs: 其他可选参数
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
         """
         # 参数验证
         self._validate_video_url(video_url)
         self._validate_audio_url(audio_url)
+        self._check_urls({video_url: ("video", None), audio_url: ("audio", None)})
 
         if mode not in self.REQ_KEYS:
             raise ValueError(f"不支持的模式: {mode}，支持的模式: lite, basic")
@@ -77,6 +84,9 @@ class VideoLipSyncClient(BaseVolcengineClient):
         req_key = self.REQ_KEYS[mode]
         config = self.MODE_CONFIG[mode]
 
+        # 提交前检查音频时长
+        self._check_media_duration(audio_url, config["max_audio_length"], config["min_audio_length"])
+
         print(f"开始提交视频改口型任务，模式: {config['name']} - {config['description']}")
 
         # 构建请求数据
@@ -117,7 +127,7 @@ class VideoLipSyncClient(BaseVolcengineClient):
         task_id = response["data"]["task_id"]
         print(f"视频改口型任务已提交，任务ID: {task_id}")
         print(f"注意：该模式支持音频长度 {config['min_audio_length']}-{config['max_audio_length']} 秒")
-        return task_id
+        return TaskHandle(task_id, self._poll_job(task_id, mode), req_key)
 
     def get_lip_sync_result(self, task_id: str, mode: str = "lite", aigc_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -171,14 +181,19 @@ class VideoLipSyncClient(BaseVolcengineClient):
 
                     return result
                 else:
-                    raise Exception(f"视频改口型失败: {resp_data.get('msg', '未知错误')}")
+                    raise TaskFailedError(f"视频改口型失败: {resp_data.get('msg', '未知错误')}")
             else:
                 return {"status": status, "message": f"任务状态: {status}"}
 
         except Exception as e:
             raise Exception(f"获取视频改口型结果失败: {str(e)}")
 
-    def wait_for_completion(self, task_id: str, mode: str, max_wait_time: int = 600, check_interval: int = 15) -> Dict[str, Any]:
+    def _poll_job(self, task_id: str, mode: str, check_interval: float = 15) -> PollJob:
+        """创建任务的轮询状态"""
+        return PollJob(task_id, lambda: self.get_lip_sync_result(task_id, mode),
+                       status_extractor(("video_url",)), self.REQ_KEYS[mode], check_interval)
+
+    def wait_for_completion(self, task_id: str, mode: str, max_wait_time: int = 600, check_interval: int = 15, deadline: Optional[Deadline] = None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
@@ -187,43 +202,15 @@ class VideoLipSyncClient(BaseVolcengineClient):
             mode: 模式
             max_wait_time: 最大等待时间（秒）
             check_interval: 检查间隔（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
 
         Returns:
             任务结果
         """
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = self.get_lip_sync_result(task_id, mode)
-
-                # 检查API响应状态
-                if result.get("code") == 10000:  # API成功
-                    data = result.get("data", {})
-                    status = data.get("status")
-
-                    if status == "done":
-                        return result
-                    elif status in ["not_found", "expired"]:
-                        raise Exception(f"任务异常: {status}")
-                    elif "video_url" in result:
-                        # 如果返回结果包含video_url，说明任务已完成
-                        return result
-
-                # 优先使用API返回的中文message，如果没有则使用status
-                message = result.get("message", f"任务状态: {result.get('status', 'unknown')}")
-                print(f"任务进行中... {message}")
-                time.sleep(check_interval)
-
-            except Exception as e:
-                if "任务异常" in str(e):
-                    raise
-                print(f"检查任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
-
-        raise TimeoutError(f"等待任务完成超时 ({max_wait_time}秒)")
-
-    def change_lip_sync(self, video_url: str, audio_url: str, mode: str = "lite", aigc_meta: Optional[Dict] = None, max_wait_time: int = 600, **kwargs) -> Dict[str, Any]:
+        return self._poll_job(task_id, mode, check_interval).wait(deadline or Deadline(max_wait_time), cancel_event)
+
+    def change_lip_sync(self, video_url: str, audio_url: str, mode: str = "lite", aigc_meta: Optional[Dict] = None, max_wait_time: int = 600, deadline: Optional[Deadline] = None, **kwargs) -> Dict[str, Any]:
         """
         视频改口型（完整流程）
 
@@ -232,7 +219,8 @@ class VideoLipSyncClient(BaseVolcengineClient):
             audio_url: 纯人声音频URL
             mode: 模式，可选值: lite(Lite模式), basic(Basic模式)
             aigc_meta: 隐式标识配置
-            max_wait_time: 最大等待时间（秒）
+            max_wait_time: 整个流程的最大等待时间（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
             **kwargs: 其他可选参数
 
         Returns:
@@ -240,11 +228,13 @@ class VideoLipSyncClient(BaseVolcengineClient):
         """
         print(f"开始视频改口型，模式: {mode}")
 
-        # 步骤1：提交任务
-        task_id = self.submit_lip_sync_task(video_url, audio_url, mode, **kwargs)
+        deadline = deadline or Deadline(max_wait_time)
+        with deadline_scope(deadline) as deadline:
+            # 步骤1：提交任务
+            task_id = self.submit_lip_sync_task(video_url, audio_url, mode, **kwargs)
 
-        # 步骤2：等待完成
-        result = self.wait_for_completion(task_id, mode, max_wait_time=max_wait_time)
+            # 步骤2：等待完成
+            result = self.wait_for_completion(task_id, mode, deadline=deadline)
 
         if result.get("status") == "done":
             print("🎉 视频改口型完成！")
@@ -257,6 +247,61 @@ class VideoLipSyncClient(BaseVolcengineClient):
         else:
             raise Exception(f"视频改口型失败: {result}")
 
+    def change_lip_sync_sharded(self, video: str, audio: str, output: str, mode: str = "lite",
+                                uploader: Optional[Callable[[str], str]] = None,
+                                max_parallel: int = LONG_AUDIO_MAX_PARALLEL, deadline: Optional[Deadline] = None,
+                                **kwargs) -> Dict[str, Any]:
+        """
+        分片改口型：音频按静音切分为不超过模式上限的窗口，视频按相同窗口对齐，
+        各分片同时提交、共用轮询调度器，完成后按顺序拼接
+
+        - Lite模式：不切视频，每个分片提交完整视频并用 templ_start_seconds 指定对齐的起点
+        - Basic模式：不支持 templ_start_seconds，用 ffmpeg 截取对应窗口的视频片段后上传
+
+        Args:
+            video: 视频素材本地路径或URL
+            audio: 纯人声音频本地路径或URL（与视频从同一时刻开始）
+            output: 输出视频路径
+            mode: 模式，可选值: lite, basic
+            uploader: 上传片段的函数 uploader(本地路径) -> 公网URL
+            max_parallel: 同时处理的分片数
+            deadline: 截止时间
+            **kwargs: 其他可选参数（同 submit_lip_sync_task，templ_start_seconds 作为整体起点）
+
+        Returns:
+            {"video_path", "duration", "elapsed", "segments"}
+        """
+        if mode not in self.REQ_KEYS:
+            raise ValueError(f"不支持的模式: {mode}，支持的模式: lite, basic")
+
+        offset = kwargs.pop("templ_start_seconds", 0) or 0
+        video_url = video if validate_url(video) else None
+
+        if mode == "lite":
+            if video_url is None:
+                if uploader is None:
+                    raise ValueError("本地视频需要上传，请提供 uploader(本地路径) -> 公网URL")
+                video_url = uploader(video)
+
+            def submit(audio_url: str, segment: AudioSegment) -> TaskHandle:
+                return self.submit_lip_sync_task(video_url, audio_url, mode,
+                                                 templ_start_seconds=round(offset + segment.start, 3), **kwargs)
+        else:
+            def submit(audio_url: str, segment: AudioSegment) -> TaskHandle:
+                # 无需切分时直接使用原视频
+                if segment.count == 1 and offset == 0 and video_url:
+                    shard_url = video_url
+                else:
+                    shard = cut_video(video, offset + segment.start, segment.duration,
+                                      os.path.join(os.path.dirname(segment.path), f"shard_{segment.index:03d}.mp4"))
+                    if uploader is None:
+                        raise ValueError("分片视频需要上传，请提供 uploader(本地路径) -> 公网URL")
+                    shard_url = uploader(shard)
+                return self.submit_lip_sync_task(shard_url, audio_url, mode, **kwargs)
+
+        return render_long_audio(audio, self.MODE_CONFIG[mode]["max_audio_length"], submit,
+                                 uploader, output, max_parallel, deadline=deadline)
+
 
 # 示例使用代码
 if __name__ == "__main__":
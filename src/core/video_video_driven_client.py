@@ -8,10 +8,15 @@
 """
 
 import json
-import time
+import threading
 from typing import Dict, Any, Optional
 
 from .base_volcengine_client import BaseVolcengineClient
+from .task_handle import TaskHandle
+from .task_waiter import PollJob, status_extractor
+from ..modules.deadline import Deadline
+from ..modules.image_preflight import read_remote_image_info, check_image
+from ..modules.media_probe import MediaLimitError
 
 
 class VideoVideoDrivenClient(BaseVolcengineClient):
@@ -51,7 +56,7 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
             "features": ["表情驱动", "肢体动作驱动", "全身驱动", "半身驱动", "肖像驱动"]
         }
 
-    def submit_driven_task(self, image_url: str, video_url: str, aigc_meta: Optional[Dict] = None) -> str:
+    def submit_driven_task(self, image_url: str, video_url: str, aigc_meta: Optional[Dict] = None) -> TaskHandle:
         """
         提交单图视频驱动任务
 
@@ -61,7 +66,7 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
             aigc_meta: 隐式标识配置
 
         Returns:
-            任务ID
+            任务句柄（TaskHandle，可直接当作任务ID字符串使用）
 
         Raises:
             ValueError: 参数验证失败
@@ -70,6 +75,9 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
         # 参数验证
         self._validate_image_url(image_url)
         self._validate_video_url(video_url)
+        self._check_urls({image_url: ("image", None), video_url: ("video", None)})
+        self._preflight_image(image_url)
+        self._preflight_video(video_url)
 
         # 构建请求数据
         data = {
@@ -94,11 +102,49 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
                 raise Exception(f"单图视频驱动任务提交失败: {error_msg}")
 
             task_id = response["data"]["task_id"]
-            return task_id
+            return TaskHandle(task_id, self._poll_job(task_id), self.REQ_KEY)
 
         except Exception as e:
             raise Exception(f"提交单图视频驱动任务失败: {str(e)}")
 
+    def _preflight_image(self, image_url: str):
+        """
+        提交前读取图片文件头检查分辨率和格式，避免不合格的图片在付费请求后才失败
+
+        无法读取文件头时跳过检查，由服务端校验。
+
+        Raises:
+            ValueError: 图片不符合要求
+        """
+        info = read_remote_image_info(image_url)
+        if info is None:
+            return
+        problems = check_image(
+            info,
+            max_side=self.CONFIG["max_image_resolution"],
+            min_side=self.CONFIG["min_image_resolution"],
+            formats=self.CONFIG["supported_image_formats"]
+        )
+        if problems:
+            raise ValueError(f"图片不符合要求: {'; '.join(problems)}")
+
+    def _preflight_video(self, video_url: str):
+        """
+        提交前探测驱动视频的时长和分辨率
+
+        Raises:
+            MediaLimitError: 视频不符合要求
+        """
+        info = self._check_media_duration(video_url, self.CONFIG["max_video_duration"], what="驱动视频")
+        if info is None or not info.has_video:
+            return
+        short_side, long_side = min(info.width, info.height), max(info.width, info.height)
+        if short_side < self.CONFIG["min_video_resolution"] or long_side > self.CONFIG["max_video_resolution"]:
+            raise MediaLimitError(
+                f"驱动视频分辨率 {info.width}x{info.height} 不在 "
+                f"{self.CONFIG['min_video_resolution']}-{self.CONFIG['max_video_resolution']} 范围内"
+            )
+
     def get_driven_result(self, task_id: str, aigc_meta: Optional[Dict] = None) -> Dict[str, Any]:
         """
         获取单图视频驱动任务结果
@@ -132,7 +178,12 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
         except Exception as e:
             raise Exception(f"获取单图视频驱动结果失败: {str(e)}")
 
-    def wait_for_completion(self, task_id: str, max_wait_time: int = 600, check_interval: int = 15) -> Dict[str, Any]:
+    def _poll_job(self, task_id: str, check_interval: float = 15) -> PollJob:
+        """创建任务的轮询状态"""
+        return PollJob(task_id, lambda: self.get_driven_result(task_id),
+                       status_extractor(("video_url",)), self.REQ_KEY, check_interval)
+
+    def wait_for_completion(self, task_id: str, max_wait_time: int = 600, check_interval: int = 15, deadline: Optional[Deadline] = None, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         等待任务完成
 
@@ -140,6 +191,8 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
             task_id: 任务ID
             max_wait_time: 最大等待时间（秒）
             check_interval: 检查间隔（秒）
+            deadline: 截止时间（提供时忽略 max_wait_time）
+            cancel_event: 取消事件，被设置时停止轮询并抛出 CancelledError
 
         Returns:
             任务结果
@@ -147,30 +200,7 @@ class VideoVideoDrivenClient(BaseVolcengineClient):
         Raises:
             Exception: 任务失败或超时
         """
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = self.get_driven_result(task_id)
-
-                if result.get("status") == "done":
-                    return result
-                elif result.get("status") in ["not_found", "expired"]:
-                    raise Exception(f"任务异常: {result.get('status')}")
-                elif result.get("video_url"):
-                    # 如果有video_url说明任务已完成
-                    return result
-
-                print(f"任务进行中... 状态: {result.get('status', 'unknown')}")
-                time.sleep(check_interval)
-
-            except Exception as e:
-                if "任务异常" in str(e):
-                    raise
-                print(f"检查任务状态时出错: {str(e)}")
-                time.sleep(check_interval)
-
-        raise Exception(f"等待超时 ({max_wait_time}秒)，任务可能仍在处理")
+        return self._poll_job(task_id, check_interval).wait(deadline or Deadline(max_wait_time), cancel_event)
 
 
 # 示例使用代码
@@ -0,0 +1,240 @@
+"""
+自适应并发限制 - 按 req_key 用 AIMD（加性增、乘性减）调整同时进行的请求数
+
+固定的并发数要么太低（浪费配额），要么太高（被限流后反复重试），合适的值还随时段变化。
+每个 req_key 的提交和查询请求共用一个并发上限：
+
+- 加性增：请求成功且延迟正常、并发上限被用满时，每个请求把上限提高 1/上限（约每轮提高1）
+- 乘性减：返回限流错误码（50429 / 50430 / HTTP 429）、延迟明显高于基线，或近期错误率过高时，上限乘以 ADAPTIVE_LIMIT_BACKOFF
+- 延迟基线按请求类型（提交 / 查询等 API 动作）分别统计：提交请求通常比查询慢得多，共用基线时
+  提交会被误判为延迟升高，查询的升高则被提交拉高的基线掩盖
+- 同一波请求只减一次：减小之前发出的请求再返回限流不会重复减小
+- 优先请求（查询）先拿名额：有查询在等待时，等待中的提交不占用空出的名额。查询数量受进行中的任务数限制，
+  不会让提交一直等待；提交之间的顺序由公平调度器（fair_scheduler）决定
+- 当前上限导出为指标 volcengine_adaptive_limit{req_key}
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from ..config import (
+    ADAPTIVE_LIMIT_INITIAL, ADAPTIVE_LIMIT_MIN, ADAPTIVE_LIMIT_MAX, ADAPTIVE_LIMIT_BACKOFF,
+    ADAPTIVE_LATENCY_RATIO, ADAPTIVE_LATENCY_SLACK, ADAPTIVE_ERROR_WINDOW, ADAPTIVE_ERROR_RATE,
+    ADAPTIVE_ACQUIRE_TIMEOUT
+)
+from .deadline import Deadline, current_deadline
+from .metrics import metrics
+
+# 请求结果
+OK = "ok"
+THROTTLED = "throttled"
+ERROR = "error"
+
+# 延迟基线至少需要的样本数
+_BASELINE_MIN_SAMPLES = 10
+_BASELINE_ALPHA = 0.05
+
+
+class ConcurrencyLimitTimeout(Exception):
+    """等待并发名额超时（可重试）"""
+
+
+class Permit:
+    """一次请求占用的并发名额"""
+
+    __slots__ = ("started_at", "operation")
+
+    def __init__(self, started_at: float, operation: str = ""):
+        self.started_at = started_at
+        self.operation = operation
+
+
+class AdaptiveLimiter:
+    """单个 req_key 的 AIMD 并发限制器"""
+
+    def __init__(self, req_key: str, initial: float = ADAPTIVE_LIMIT_INITIAL, min_limit: float = ADAPTIVE_LIMIT_MIN,
+                 max_limit: float = ADAPTIVE_LIMIT_MAX, backoff: float = ADAPTIVE_LIMIT_BACKOFF,
+                 latency_ratio: float = ADAPTIVE_LATENCY_RATIO, latency_slack: float = ADAPTIVE_LATENCY_SLACK,
+                 error_window: int = ADAPTIVE_ERROR_WINDOW, error_rate: float = ADAPTIVE_ERROR_RATE):
+        """
+        Args:
+            req_key: 服务标识
+            initial: 初始并发上限
+            min_limit: 并发上限下限
+            max_limit: 并发上限上限
+            backoff: 拥塞时上限乘以的系数
+            latency_ratio: 延迟超过基线的倍数视为拥塞
+            latency_slack: 延迟至少超过基线的秒数才视为拥塞（避免毫秒级波动触发）
+            error_window: 统计错误率的最近请求数
+            error_rate: 错误率超过该值视为拥塞
+        """
+        self.req_key = req_key
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_ratio = latency_ratio
+        self.latency_slack = latency_slack
+        self.error_rate = error_rate
+
+        self._cond = threading.Condition()
+        self._limit = float(max(min_limit, min(max_limit, initial)))
+        self._in_flight = 0
+        self._waiting = 0
+        self._urgent_waiting = 0
+        self._outcomes = deque(maxlen=error_window)
+        # 请求类型 -> [延迟基线, 样本数]
+        self._baselines: Dict[str, list] = {}
+        self._decreased_at = 0.0
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        with self._cond:
+            return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """进行中的请求数"""
+        with self._cond:
+            return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = ADAPTIVE_ACQUIRE_TIMEOUT, deadline: Optional[Deadline] = None,
+                operation: str = "", urgent: bool = False) -> Permit:
+        """
+        等待并占用一个并发名额
+
+        Args:
+            timeout: 最长等待时间（秒）
+            deadline: 截止时间（默认使用当前上下文中的截止时间），等待不超过其剩余时间
+            operation: 请求类型（如 API 动作），不同类型各自维护延迟基线
+            urgent: 是否优先请求，空出的名额先交给等待中的优先请求
+
+        Returns:
+            名额，请求结束后交给 release()
+
+        Raises:
+            ConcurrencyLimitTimeout: 等待超时
+        """
+        deadline = deadline or current_deadline()
+        if deadline is not None and deadline.remaining() is not None:
+            timeout = deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            waited = False
+            while self._in_flight >= int(self._limit) or (not urgent and self._urgent_waiting):
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    metrics.inc("volcengine_adaptive_limit_timeouts_total", req_key=self.req_key)
+                    raise ConcurrencyLimitTimeout(
+                        f"服务 {self.req_key} 并发已满（上限 {int(self._limit)}），等待超时"
+                    )
+                waited = True
+                self._waiting += 1
+                self._urgent_waiting += urgent
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    self._urgent_waiting -= urgent
+                    if urgent and not self._urgent_waiting:
+                        # 让被优先请求挡住的普通请求重新检查
+                        self._cond.notify_all()
+            if waited:
+                metrics.inc("volcengine_adaptive_limit_waits_total", req_key=self.req_key)
+            self._in_flight += 1
+            metrics.set_gauge("volcengine_adaptive_in_flight", self._in_flight, req_key=self.req_key)
+            return Permit(time.monotonic(), operation)
+
+    def release(self, permit: Permit, outcome: str = OK, latency: Optional[float] = None):
+        """
+        释放名额并按结果调整并发上限
+
+        Args:
+            permit: acquire() 返回的名额
+            outcome: ok（成功）/ throttled（被限流）/ error（服务端或网络错误）
+            latency: 请求耗时（秒），None 表示按名额占用时间计算
+        """
+        latency = time.monotonic() - permit.started_at if latency is None else latency
+        with self._cond:
+            saturated = self._in_flight >= int(self._limit) or self._waiting > 0
+            self._in_flight -= 1
+            self._outcomes.append(outcome == ERROR)
+
+            congested = outcome == THROTTLED
+            if outcome == OK:
+                baseline = self._baselines.setdefault(permit.operation, [None, 0])
+                if self._is_latency_spike(baseline, latency):
+                    congested = True
+                self._update_baseline(baseline, latency)
+            elif len(self._outcomes) == self._outcomes.maxlen and \
+                    sum(self._outcomes) / len(self._outcomes) > self.error_rate:
+                congested = True
+
+            if congested:
+                # 同一波请求只减一次：上次减小之前发出的请求不再触发
+                if permit.started_at >= self._decreased_at:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self._decreased_at = time.monotonic()
+                    metrics.inc("volcengine_adaptive_limit_decreases_total", req_key=self.req_key,
+                                reason=outcome if outcome != OK else "latency")
+            elif outcome == OK and saturated:
+                # 只在上限被用满（或有请求在等待）时增加，空闲时上限不会无限增长
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+            self._publish()
+            self._cond.notify_all()
+
+    def _is_latency_spike(self, baseline: list, latency: float) -> bool:
+        average, samples = baseline
+        if average is None or samples < _BASELINE_MIN_SAMPLES:
+            return False
+        return latency > max(average * self.latency_ratio, average + self.latency_slack)
+
+    @staticmethod
+    def _update_baseline(baseline: list, latency: float):
+        # 缓慢跟随，延迟长期变化后基线也会随之调整
+        baseline[1] += 1
+        if baseline[0] is None:
+            baseline[0] = latency
+        else:
+            baseline[0] += _BASELINE_ALPHA * (latency - baseline[0])
+
+    def _publish(self):
+        metrics.set_gauge("volcengine_adaptive_limit", int(self._limit), req_key=self.req_key)
+        metrics.set_gauge("volcengine_adaptive_in_flight", self._in_flight, req_key=self.req_key)
+
+
+class AdaptiveLimiterRegistry:
+    """自适应限制器注册表，进程内所有客户端共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+
+    def get(self, req_key: str) -> AdaptiveLimiter:
+        """获取（或创建）指定服务的限制器"""
+        limiter = self._limiters.get(req_key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(req_key)
+                if limiter is None:
+                    limiter = AdaptiveLimiter(req_key)
+                    self._limiters[req_key] = limiter
+        return limiter
+
+    def limits(self) -> Dict[str, int]:
+        """各服务当前的并发上限"""
+        with self._lock:
+            return {req_key: limiter.limit for req_key, limiter in self._limiters.items()}
+
+    def reset(self):
+        """清空所有限制器（测试或配置变更时使用）"""
+        with self._lock:
+            self._limiters.clear()
+
+
+# 全局自适应限制器注册表
+adaptive_limiters = AdaptiveLimiterRegistry()
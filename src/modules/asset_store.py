@@ -0,0 +1,405 @@
+"""
+资源存储 - 按内容寻址的本地文件存储，下载结果自动去重
+
+- 下载时边写入边计算 SHA-256，文件按摘要存放在分层目录 objects/ab/cd/<摘要><扩展名>
+- 内容相同的文件只保存一份；调用方指定的文件名不额外占用空间：文件系统支持时用写时复制克隆
+  （独立可写的副本），否则硬链接到存储中的文件（存储中的文件是只读的，不会被原地修改），
+  跨文件系统时才复制
+- 索引（SQLite）记录 URL -> 摘要、任务ID -> 摘要；再次下载同一结果时直接从本地取得，
+  签名URL重新签名后（只有签名参数不同）也能命中
+- 只有签名URL（结果文件等内容不会变化的对象）按URL命中；不带签名的URL可能在原地址更新内容，
+  总是重新下载（内容未变时仍按摘要去重，不重复占用空间）
+- 同一URL同时被多个线程下载时只下载一次
+- 按最近访问时间（LRU）和总大小上限（默认2GB）清理（gc）；调用方文件不受清理影响（硬链接只删除存储中的名字）
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 没有 fcntl，直接复制
+    fcntl = None
+
+from ..config import ASSET_STORE_DIR, ASSET_STORE_MAX_BYTES
+from ..utils import download_file
+from .deadline import Deadline
+from .metrics import metrics
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest      TEXT PRIMARY KEY,
+    ext         TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_lru ON blobs (accessed_at);
+CREATE TABLE IF NOT EXISTS urls (
+    url    TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT NOT NULL,
+    digest  TEXT NOT NULL,
+    PRIMARY KEY (task_id, digest)
+);
+"""
+
+# 签名相关的查询参数（重新签名后会变化，不参与URL索引）
+_SIGNATURE_PREFIXES = ("x-tos-", "x-amz-", "x-oss-", "x-signature", "x-expires")
+_SIGNATURE_KEYS = {"expires", "signature", "ossaccesskeyid", "accesskeyid", "auth_key"}
+
+# Linux 写时复制克隆（btrfs / XFS 等支持 reflink 的文件系统）
+_FICLONE = 0x40049409
+
+
+def url_key(url: str) -> str:
+    """
+    URL 的索引键：去掉签名参数和片段，同一对象重新签名后键不变
+
+    Args:
+        url: 文件URL
+
+    Returns:
+        索引键
+    """
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(_SIGNATURE_PREFIXES) and key.lower() not in _SIGNATURE_KEYS]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(sorted(query)), ""))
+
+
+def is_signed_url(url: str) -> bool:
+    """是否为签名URL（签名URL指向的对象内容不会变化，可以按URL复用已下载的文件）"""
+    return any(key.lower().startswith(_SIGNATURE_PREFIXES) or key.lower() in _SIGNATURE_KEYS
+               for key, _ in parse_qsl(urlsplit(url).query, keep_blank_values=True))
+
+
+def _extension(name: str) -> str:
+    extension = os.path.splitext(name)[1].lower()
+    return extension if 1 < len(extension) <= 6 and extension[1:].isalnum() else ""
+
+
+class StoredAsset:
+    """存储中的一个文件"""
+
+    def __init__(self, digest: str, path: str, size: int, cached: bool = False):
+        self.digest = digest    # SHA-256（十六进制）
+        self.path = path        # 存储中的文件路径
+        self.size = size        # 字节数
+        self.cached = cached    # 是否直接从本地取得（没有下载）
+
+    def __repr__(self):
+        source = "cached" if self.cached else "downloaded"
+        return f"StoredAsset({self.digest[:12]}, {self.size / 1024:.0f}KB, {source})"
+
+
+class AssetStore:
+    """按内容寻址的本地文件存储（线程安全）"""
+
+    def __init__(self, root: str = ASSET_STORE_DIR, max_bytes: int = ASSET_STORE_MAX_BYTES):
+        """
+        Args:
+            root: 存储目录
+            max_bytes: 总大小上限（字节），超出后按LRU自动清理；0 表示不限制
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inflight: Dict[str, threading.Event] = {}
+
+    # ------------------------------------------------------------------
+    # 对外接口
+    # ------------------------------------------------------------------
+
+    def fetch(self, url: str, filename: Optional[str] = None, task_id: Optional[str] = None,
+              deadline: Optional[Deadline] = None, extension: Optional[str] = None,
+              progress: Optional[Callable[[int, int], None]] = None) -> StoredAsset:
+        """
+        取得URL对应的文件：签名URL已在存储中时直接使用，否则下载（边下载边计算摘要）
+
+        Args:
+            url: 文件URL
+            filename: 调用方文件名（克隆或硬链接存储中的文件），None 表示只放入存储
+            task_id: 所属任务ID（记录到索引）
+            deadline: 下载截止时间
+            extension: 扩展名（URL和响应的 Content-Type 都无法确定扩展名时使用，如 ".mp4"）
+            progress: 下载进度回调 progress(已下载字节数, 总字节数)
+
+        Returns:
+            存储中的文件
+
+        Raises:
+            Exception: 下载失败
+        """
+        # 不带签名的URL内容可能已更新，不按URL复用
+        key = url_key(url) if is_signed_url(url) else None
+        asset = None
+        while key is not None:
+            asset = self._lookup_url(key)
+            if asset is not None:
+                metrics.inc("volcengine_asset_store_total", result="hit")
+                break
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            # 其他线程正在下载同一URL，等它结束后重新查找
+            event.wait()
+
+        if asset is None and key is None:
+            asset = self._download(url, extension, deadline, progress)
+        elif asset is None:
+            try:
+                asset = self._download(url, extension, deadline, progress)
+                self._execute("INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (key, asset.digest))
+            finally:
+                with self._lock:
+                    self._inflight.pop(key).set()
+
+        if task_id:
+            self._execute("INSERT OR IGNORE INTO tasks (task_id, digest) VALUES (?, ?)", (task_id, asset.digest))
+        if filename:
+            self.materialize(asset, filename)
+        if not asset.cached and self.max_bytes:
+            self.gc(self.max_bytes)
+        return asset
+
+    def put_file(self, path: str, task_id: Optional[str] = None, url: Optional[str] = None) -> StoredAsset:
+        """
+        把本地文件放入存储（复制，原文件保持不变）
+
+        Args:
+            path: 本地文件路径
+            task_id: 所属任务ID
+            url: 文件来源URL（签名URL才记录到索引）
+
+        Returns:
+            存储中的文件
+        """
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        temp = self._temp_path()
+        self._clone_or_copy(path, temp)
+        asset = self._commit(temp, hasher.hexdigest(), _extension(path))
+        if url and is_signed_url(url):
+            self._execute("INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (url_key(url), asset.digest))
+        if task_id:
+            self._execute("INSERT OR IGNORE INTO tasks (task_id, digest) VALUES (?, ?)", (task_id, asset.digest))
+        return asset
+
+    def lookup(self, url: str) -> Optional[StoredAsset]:
+        """按URL查找已存储的文件（不下载，只查找签名URL）"""
+        return self._lookup_url(url_key(url)) if is_signed_url(url) else None
+
+    def task_assets(self, task_id: str) -> List[StoredAsset]:
+        """任务的全部已存储文件"""
+        rows = self._execute("SELECT b.* FROM tasks t JOIN blobs b ON b.digest = t.digest WHERE t.task_id = ?",
+                             (task_id,))
+        assets = [self._existing(row) for row in rows]
+        return [asset for asset in assets if asset is not None]
+
+    def materialize(self, asset: StoredAsset, filename: str) -> str:
+        """
+        在调用方文件名处生成存储中的文件（支持时写时复制克隆，否则硬链接，跨文件系统时复制）
+
+        硬链接的文件与存储中的文件是同一个只读文件，需要修改时先复制或删除后重新写入。
+
+        Args:
+            asset: 存储中的文件
+            filename: 目标文件名（已存在时覆盖）
+
+        Returns:
+            目标文件名
+        """
+        if os.path.exists(filename) and os.path.samefile(asset.path, filename):
+            return filename
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        temp = f"{filename}.{uuid.uuid4().hex[:8]}.tmp"
+        self._clone_or_copy(asset.path, temp, link=True)
+        os.replace(temp, filename)
+        return filename
+
+    def gc(self, max_bytes: Optional[int] = None, max_age: Optional[float] = None) -> Dict[str, int]:
+        """
+        清理存储：删除超过 max_age 未访问的文件，再按最近访问时间删除最旧的文件直到总大小不超过 max_bytes
+
+        Args:
+            max_bytes: 总大小上限（字节），None 表示使用构造时的上限（0 表示不按大小清理）
+            max_age: 最长未访问时间（秒）
+
+        Returns:
+            {"removed": 删除的文件数, "freed": 释放的字节数, "remaining": 剩余字节数}
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        rows = self._execute("SELECT digest, ext, size, accessed_at FROM blobs ORDER BY accessed_at")
+        total = sum(row["size"] for row in rows)
+        cutoff = time.time() - max_age if max_age else None
+        removed, freed = 0, 0
+        for row in rows:
+            expired = cutoff is not None and row["accessed_at"] < cutoff
+            if not expired and (not max_bytes or total <= max_bytes):
+                break
+            self._remove_blob(row["digest"], row["ext"])
+            total -= row["size"]
+            removed += 1
+            freed += row["size"]
+        if removed:
+            metrics.inc("volcengine_asset_store_evicted_total", removed)
+            print(f"🧹 资源存储已清理 {removed} 个文件，释放 {freed / 1024 / 1024:.1f}MB")
+        metrics.set_gauge("volcengine_asset_store_bytes", total)
+        return {"removed": removed, "freed": freed, "remaining": total}
+
+    def stats(self) -> Dict[str, int]:
+        """存储统计：文件数、总字节数、已索引的URL数和任务数"""
+        blobs = self._execute("SELECT COUNT(*) AS n, COALESCE(SUM(size), 0) AS total FROM blobs")
+        urls = self._execute("SELECT COUNT(*) AS n FROM urls")
+        tasks = self._execute("SELECT COUNT(DISTINCT task_id) AS n FROM tasks")
+        return {"files": blobs[0]["n"], "bytes": blobs[0]["total"], "urls": urls[0]["n"], "tasks": tasks[0]["n"]}
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.root, "index.db"), check_same_thread=False,
+                                   isolation_level=None, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _blob_path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:4], digest + ext)
+
+    def _temp_path(self) -> str:
+        directory = os.path.join(self.root, "tmp")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, uuid.uuid4().hex + ".part")
+
+    @staticmethod
+    def _clone_or_copy(source: str, target: str, link: bool = False):
+        """
+        复制文件：文件系统支持时用写时复制克隆（不占额外空间），否则完整复制
+
+        Args:
+            link: 不支持克隆时先尝试硬链接（用于只读的存储文件，跨文件系统时才复制）
+        """
+        if fcntl is not None:
+            try:
+                with open(source, "rb") as src, open(target, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return
+            except OSError:
+                if os.path.exists(target):
+                    os.remove(target)
+        if link:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(source, target)
+
+    def _existing(self, row: sqlite3.Row, cached: bool = True) -> Optional[StoredAsset]:
+        """索引中的文件仍存在时返回，已被删除时清除索引"""
+        path = self._blob_path(row["digest"], row["ext"])
+        if not os.path.exists(path):
+            self._remove_blob(row["digest"], row["ext"])
+            return None
+        return StoredAsset(row["digest"], path, row["size"], cached)
+
+    def _lookup_url(self, key: str) -> Optional[StoredAsset]:
+        rows = self._execute("SELECT b.* FROM urls u JOIN blobs b ON b.digest = u.digest WHERE u.url = ?", (key,))
+        asset = self._existing(rows[0]) if rows else None
+        if asset is not None:
+            self._execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), asset.digest))
+        return asset
+
+    def _download(self, url: str, fallback_ext: Optional[str], deadline: Optional[Deadline],
+                  progress: Optional[Callable[[int, int], None]]) -> StoredAsset:
+        """下载到临时文件并放入存储；扩展名依次取自 URL 路径、响应的 Content-Type、fallback_ext"""
+        hasher = hashlib.sha256()
+        downloaded = 0
+        content_type = ""
+
+        def on_response(headers):
+            nonlocal content_type
+            mime = headers.get("content-type", "").split(";")[0].strip().lower()
+            # 只采用媒体类型（application/octet-stream 等通用类型没有意义的扩展名）
+            content_type = mime if mime.startswith(("image/", "video/", "audio/")) else ""
+
+        def on_chunk(chunk: bytes, total: int):
+            nonlocal downloaded
+            hasher.update(chunk)
+            downloaded += len(chunk)
+            if progress:
+                progress(downloaded, total)
+
+        temp = self._temp_path()
+        try:
+            download_file(url, temp, deadline, on_chunk=on_chunk, on_response=on_response)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        metrics.inc("volcengine_asset_store_total", result="download")
+        metrics.inc("volcengine_asset_store_downloaded_bytes_total", downloaded)
+        ext = _extension(urlsplit(url).path) or _extension("file" + (mimetypes.guess_extension(content_type) or "")) \
+            or fallback_ext or ""
+        return self._commit(temp, hasher.hexdigest(), ext)
+
+    def _commit(self, temp: str, digest: str, ext: str) -> StoredAsset:
+        """把临时文件放到摘要对应的位置；内容已存在时丢弃临时文件（去重）"""
+        rows = self._execute("SELECT * FROM blobs WHERE digest = ?", (digest,))
+        existing = self._existing(rows[0], cached=False) if rows else None
+        if existing is not None:
+            os.remove(temp)
+            metrics.inc("volcengine_asset_store_total", result="dedup")
+            self._execute("UPDATE blobs SET accessed_at = ? WHERE digest = ?", (time.time(), digest))
+            return existing
+
+        path = self._blob_path(digest, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 只读：调用方文件可能是硬链接，不能原地修改存储中的内容
+        os.chmod(temp, 0o444)
+        os.replace(temp, path)
+        size = os.path.getsize(path)
+        now = time.time()
+        self._execute("INSERT OR REPLACE INTO blobs (digest, ext, size, created_at, accessed_at) "
+                      "VALUES (?, ?, ?, ?, ?)", (digest, ext, size, now, now))
+        return StoredAsset(digest, path, size)
+
+    def _remove_blob(self, digest: str, ext: str):
+        path = self._blob_path(digest, ext)
+        if os.path.exists(path):
+            os.chmod(path, 0o644)
+            os.remove(path)
+        self._execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        self._execute("DELETE FROM urls WHERE digest = ?", (digest,))
+        self._execute("DELETE FROM tasks WHERE digest = ?", (digest,))
+
+
+# 全局资源存储
+asset_store = AssetStore()
@@ -1,20 +1,44 @@
 """
 形象管理器 - 保存和管理形象ID
+
+按 (模式, 图片URL) 和 (模式, 图片内容摘要) 建立索引，同一图片再次生成视频时可直接复用已有形象。
+只有签名URL（指向的内容不会变化）按URL匹配；不带签名的URL可能在原地址换了图片，总是按内容摘要匹配。
 """
 
 import json
 import os
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+
+from .asset_store import asset_store, is_signed_url, url_key
 
 AVATAR_DATA_FILE = "data/avatars.json"
 
 
+def image_digest(image_url: str) -> Optional[str]:
+    """
+    图片内容的SHA-256（经过资源存储，同一图片只下载一次）
+
+    Args:
+        image_url: 图片URL
+
+    Returns:
+        内容摘要，无法下载时返回None（只能按URL匹配已有形象）
+    """
+    try:
+        return asset_store.fetch(image_url).digest
+    except Exception as e:
+        print(f"⚠️ 无法读取图片内容，仅按URL匹配已有形象: {str(e)}")
+        return None
+
+
 class AvatarManager:
     """形象管理器"""
 
     def __init__(self, data_file: str = AVATAR_DATA_FILE):
         self.data_file = data_file
+        self._lock = threading.RLock()
         self._load_data()
 
     def _load_data(self):
@@ -27,14 +51,46 @@ class AvatarManager:
                 self.data = {"avatars": {}, "created_at": datetime.now().isoformat()}
         else:
             self.data = {"avatars": {}, "created_at": datetime.now().isoformat()}
+        self._build_index()
+
+    def _build_index(self):
+        """建立图片索引：(模式, URL键) / (模式, 内容摘要) -> 任务ID（同一图片有多个形象时保留最新的）"""
+        self._by_url: Dict[Tuple[str, str], str] = {}
+        self._by_digest: Dict[Tuple[str, str], str] = {}
+        avatars = sorted(self.data["avatars"].items(), key=lambda item: item[1].get("created_at", ""))
+        for task_id, avatar_info in avatars:
+            self._index_avatar(task_id, avatar_info)
+
+    def _index_avatar(self, task_id: str, avatar_info: Dict[str, Any]):
+        if avatar_info.get("invalid"):
+            return
+        mode = avatar_info.get("mode")
+        if avatar_info.get("image_url") and is_signed_url(avatar_info["image_url"]):
+            self._by_url[(mode, url_key(avatar_info["image_url"]))] = task_id
+        if avatar_info.get("image_digest"):
+            self._by_digest[(mode, avatar_info["image_digest"])] = task_id
 
     def _save_data(self):
-        """保存形象数据"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
+        """保存形象数据（先写临时文件再替换，避免写入中断损坏数据）"""
+        os.makedirs(os.path.dirname(self.data_file) or ".", exist_ok=True)
+        temp_file = f"{self.data_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
             json.dump(self.data, f, ensure_ascii=False, indent=2)
-
-    def save_avatar(self, task_id: str, result: Dict[str, Any], mode: str, resp_data: Dict[str, Any] = None):
-        """保存形象结果"""
+        os.replace(temp_file, self.data_file)
+
+    def save_avatar(self, task_id: str, result: Dict[str, Any], mode: str, resp_data: Dict[str, Any] = None,
+                    image_url: Optional[str] = None, image_digest: Optional[str] = None):
+        """
+        保存形象结果
+
+        Args:
+            task_id: 形象创建任务ID
+            result: 形象创建结果（需包含 resource_id）
+            mode: 模式
+            resp_data: 接口返回的原始数据（用于记录时间）
+            image_url: 创建形象使用的图片URL（用于复用）
+            image_digest: 图片内容的SHA-256（用于复用，URL不同但内容相同时也能命中）
+        """
         if "resource_id" not in result:
             return False
 
@@ -60,10 +116,16 @@ class AvatarManager:
                 "finished_at": resp_data.get("finished_at")
             } if resp_data else None
         }
+        if image_url:
+            avatar_info["image_url"] = image_url
+        if image_digest:
+            avatar_info["image_digest"] = image_digest
 
-        self.data["avatars"][task_id] = avatar_info
-        self.data["last_updated"] = datetime.now().isoformat()
-        self._save_data()
+        with self._lock:
+            self.data["avatars"][task_id] = avatar_info
+            self.data["last_updated"] = datetime.now().isoformat()
+            self._index_avatar(task_id, avatar_info)
+            self._save_data()
 
         print(f"✅ 形象已保存: {result['resource_id']} ({mode}模式)")
         return True
@@ -121,6 +183,45 @@ class AvatarManager:
         avatar_info = self.get_avatar_by_task_id(task_id)
         return avatar_info["resource_id"] if avatar_info else None
 
+    def find_avatar(self, mode: str, image_url: Optional[str] = None,
+                    image_digest: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        查找同一图片已创建的可用形象
+
+        Args:
+            mode: 模式（不同模式的形象不能混用）
+            image_url: 图片URL（只匹配签名URL，忽略签名参数）
+            image_digest: 图片内容的SHA-256
+
+        Returns:
+            形象信息，没有时返回None
+        """
+        with self._lock:
+            task_id = None
+            if image_url and is_signed_url(image_url):
+                task_id = self._by_url.get((mode, url_key(image_url)))
+            if task_id is None and image_digest:
+                task_id = self._by_digest.get((mode, image_digest))
+            return self.data["avatars"].get(task_id) if task_id else None
+
+    def invalidate_avatar(self, resource_id: str) -> bool:
+        """
+        标记形象不可用（如服务端已失效），之后不再被复用
+
+        Returns:
+            是否找到该形象
+        """
+        with self._lock:
+            found = False
+            for avatar_info in self.data["avatars"].values():
+                if avatar_info["resource_id"] == resource_id and not avatar_info.get("invalid"):
+                    avatar_info["invalid"] = True
+                    found = True
+            if found:
+                self._build_index()
+                self._save_data()
+            return found
+
 
 # 全局形象管理器实例
 avatar_manager = AvatarManager()
\ No newline at end of file
@@ -0,0 +1,293 @@
+"""
+形象预热池 - 为常用图片提前创建好各模式的形象，交互式生成视频时无需等待形象创建
+
+- 配置的图片 × 模式（normal / loopy / loopyb）在后台并发创建，已有可用形象的直接复用（见 avatar_manager）
+- get() 只查一次内存字典（O(1)），不发起任何请求；未就绪时返回None并安排创建
+- 后台定期检查：形象被标记为不可用（生成视频失败，见 invalidate_avatar）时立即重新创建；
+  接近使用期限时提前重新创建，新形象就绪前继续使用旧形象
+- 创建失败按退避间隔重试
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..config import (
+    AVATAR_POOL_IMAGES, AVATAR_POOL_MODES, AVATAR_POOL_WORKERS, AVATAR_POOL_CHECK_INTERVAL,
+    AVATAR_POOL_MAX_AGE, AVATAR_POOL_REFRESH_AHEAD, AVATAR_POOL_RETRY_DELAY, AVATAR_POOL_CREATE_TIMEOUT
+)
+from .asset_store import url_key
+from .avatar_manager import AvatarManager, avatar_manager
+from .deadline import Deadline
+from .metrics import metrics
+
+# 形象状态
+READY = "ready"
+BUILDING = "building"
+PENDING = "pending"
+FAILED = "failed"
+
+
+def _created_timestamp(avatar_info: Optional[Dict[str, Any]]) -> float:
+    """形象记录中的创建时间（无法解析时视为刚创建）"""
+    try:
+        return datetime.fromisoformat(avatar_info["created_at"]).timestamp()
+    except (TypeError, KeyError, ValueError):
+        return time.time()
+
+
+class AvatarPool:
+    """形象预热池（线程安全）"""
+
+    def __init__(self, images: Iterable[str] = AVATAR_POOL_IMAGES, modes: Iterable[str] = AVATAR_POOL_MODES,
+                 manager: AvatarManager = avatar_manager, workers: int = AVATAR_POOL_WORKERS,
+                 check_interval: float = AVATAR_POOL_CHECK_INTERVAL, max_age: float = AVATAR_POOL_MAX_AGE,
+                 refresh_ahead: float = AVATAR_POOL_REFRESH_AHEAD, retry_delay: float = AVATAR_POOL_RETRY_DELAY,
+                 create_timeout: float = AVATAR_POOL_CREATE_TIMEOUT):
+        """
+        Args:
+            images: 需要预热的图片URL
+            modes: 每张图片预热的模式
+            manager: 保存形象的形象管理器
+            workers: 同时创建的形象数
+            check_interval: 后台检查间隔（秒）
+            max_age: 形象使用期限（秒），超过后不再交出
+            refresh_ahead: 距使用期限不足该时间时在后台重新创建（秒）
+            retry_delay: 创建失败后的首次重试间隔（秒），之后逐次加倍
+            create_timeout: 单个形象创建的最长等待时间（秒）
+        """
+        self.modes = tuple(modes)
+        self.manager = manager
+        self.workers = workers
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.refresh_ahead = refresh_ahead
+        self.retry_delay = retry_delay
+        self.create_timeout = create_timeout
+        self.client = None
+        self._cond = threading.Condition()
+        self._targets: Dict[Tuple[str, str], str] = {}            # (模式, URL键) -> 图片URL
+        self._ready: Dict[Tuple[str, str], Dict[str, Any]] = {}   # (模式, URL键) -> 就绪的形象
+        self._building: Dict[Tuple[str, str], bool] = {}          # 创建中的形象 -> 是否强制重新创建
+        self._failures: Dict[Tuple[str, str], Tuple[float, int]] = {}   # -> (下次重试时间, 连续失败次数)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        for image_url in images:
+            self.add(image_url)
+
+    def start(self, client):
+        """
+        绑定客户端并启动后台创建和检查（只启动一次）
+
+        Args:
+            client: VideoAudioDrivenClient（使用 find_or_create_role 创建形象）
+        """
+        with self._cond:
+            self.client = client
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="volc-avatar-pool")
+            self._thread = threading.Thread(target=self._check_loop, name="volc-avatar-pool-check", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台检查（正在创建的形象会继续完成）"""
+        self._stop.set()
+        with self._cond:
+            self._thread = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def add(self, image_url: str, modes: Optional[Iterable[str]] = None):
+        """
+        加入需要预热的图片（已启动时立即安排创建）
+
+        Args:
+            image_url: 图片URL
+            modes: 预热的模式，None 表示使用池的默认模式
+        """
+        with self._cond:
+            for mode in modes or self.modes:
+                key = (mode, url_key(image_url))
+                self._targets.setdefault(key, image_url)
+                if self._executor is not None and key not in self._ready:
+                    self._schedule(key, fresh=False)
+
+    def get(self, image_url: str, mode: str = "normal") -> Optional[str]:
+        """
+        取出已就绪的形象ID（不发起任何请求）
+
+        Args:
+            image_url: 图片URL（忽略签名参数）
+            mode: 模式
+
+        Returns:
+            形象ID，未就绪时返回None（已在池中的图片会安排创建）
+        """
+        key = (mode, url_key(image_url))
+        with self._cond:
+            entry = self._ready.get(key)
+            if entry is not None and not self._usable(key, entry, time.time()):
+                entry = None
+            metrics.inc("volcengine_avatar_pool_requests_total", mode=mode, result="hit" if entry else "miss")
+            return entry["resource_id"] if entry else None
+
+    def acquire(self, image_url: str, mode: str = "normal", timeout: Optional[float] = None) -> str:
+        """
+        取出形象ID，未就绪时加入池中并等待创建完成
+
+        Args:
+            image_url: 图片URL
+            mode: 模式
+            timeout: 最长等待时间（秒），None 表示不限制
+
+        Returns:
+            形象ID
+
+        Raises:
+            TimeoutError: 超时仍未就绪
+        """
+        resource_id = self.get(image_url, mode)
+        if resource_id:
+            return resource_id
+        self.add(image_url, [mode])
+        deadline = Deadline(timeout)
+        key = (mode, url_key(image_url))
+        with self._cond:
+            while True:
+                entry = self._ready.get(key)
+                if entry is not None and self._usable(key, entry, time.time()):
+                    return entry["resource_id"]
+                if deadline.expired():
+                    raise TimeoutError(f"等待形象就绪超时 ({timeout}秒): {image_url} ({mode}模式)")
+                self._cond.wait(deadline.remaining())
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        各图片和模式的预热状态
+
+        Returns:
+            [{"image_url", "mode", "state", "resource_id", "age"}]
+        """
+        now = time.time()
+        with self._cond:
+            rows = []
+            for key, image_url in self._targets.items():
+                entry = self._ready.get(key)
+                if entry is not None:
+                    state = READY
+                elif key in self._building:
+                    state = BUILDING
+                elif key in self._failures:
+                    state = FAILED
+                else:
+                    state = PENDING
+                rows.append({
+                    "image_url": image_url,
+                    "mode": key[0],
+                    "state": state,
+                    "resource_id": entry["resource_id"] if entry else None,
+                    "age": now - entry["created_at"] if entry else None
+                })
+            return rows
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待所有图片预热完成（失败的不再等待）
+
+        Returns:
+            是否全部就绪
+        """
+        deadline = Deadline(timeout)
+        with self._cond:
+            while self._building or any(key not in self._ready and key not in self._failures for key in self._targets):
+                if deadline.expired():
+                    return False
+                self._cond.wait(deadline.remaining())
+            return len(self._ready) == len(self._targets)
+
+    def check(self):
+        """检查所有形象：补建缺失的、重新创建已失效或接近使用期限的"""
+        now = time.time()
+        with self._cond:
+            for key in self._targets:
+                if key in self._building:
+                    continue
+                entry = self._ready.get(key)
+                if entry is None:
+                    retry_at, _ = self._failures.get(key, (0, 0))
+                    if retry_at <= now:
+                        self._schedule(key, fresh=False)
+                elif not self._usable(key, entry, now):
+                    continue
+                elif now - entry["created_at"] >= self.max_age - self.refresh_ahead:
+                    # 提前重新创建，新形象就绪前继续交出旧形象
+                    self._schedule(key, fresh=True)
+            metrics.set_gauge("volcengine_avatar_pool_ready", len(self._ready))
+
+    def _usable(self, key: Tuple[str, str], entry: Dict[str, Any], now: float) -> bool:
+        """形象仍可交出；已失效或超过使用期限时移出并重新创建（需持有锁）"""
+        avatar_info = self.manager.get_avatar_by_task_id(entry["task_id"])
+        invalid = avatar_info is not None and avatar_info.get("invalid")
+        if not invalid and now - entry["created_at"] < self.max_age:
+            return True
+        del self._ready[key]
+        metrics.inc("volcengine_avatar_pool_evictions_total", mode=key[0], reason="invalid" if invalid else "expired")
+        if key in self._targets and key not in self._building and self._executor is not None:
+            self._schedule(key, fresh=True)
+        return False
+
+    def _schedule(self, key: Tuple[str, str], fresh: bool):
+        """安排后台创建（需持有锁）"""
+        if key in self._building or self._executor is None:
+            return
+        self._building[key] = fresh
+        try:
+            self._executor.submit(self._create, key, fresh)
+        except RuntimeError:  # 已停止
+            del self._building[key]
+
+    def _create(self, key: Tuple[str, str], fresh: bool):
+        mode, image_url = key[0], self._targets[key]
+        try:
+            role = self.client.find_or_create_role(image_url, mode, Deadline(self.create_timeout), reuse=not fresh)
+        except Exception as e:
+            with self._cond:
+                del self._building[key]
+                _, failures = self._failures.get(key, (0, 0))
+                delay = self.retry_delay * (2 ** failures)
+                self._failures[key] = (time.time() + delay, failures + 1)
+                self._cond.notify_all()
+            metrics.inc("volcengine_avatar_pool_builds_total", mode=mode, result="failed")
+            print(f"⚠️ 形象预热失败，{delay:.0f}秒后重试: {image_url} ({mode}模式): {str(e)}")
+            return
+
+        entry = {
+            "resource_id": role["resource_id"],
+            "task_id": role["task_id"],
+            "created_at": _created_timestamp(self.manager.get_avatar_by_task_id(role["task_id"]))
+        }
+        with self._cond:
+            del self._building[key]
+            self._failures.pop(key, None)
+            self._ready[key] = entry
+            metrics.set_gauge("volcengine_avatar_pool_ready", len(self._ready))
+            self._cond.notify_all()
+        metrics.inc("volcengine_avatar_pool_builds_total", mode=mode, result="reused" if role.get("reused") else "created")
+
+    def _check_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception as e:  # 检查线程不能退出
+                print(f"⚠️ 形象预热池检查出错: {str(e)}")
+            self._stop.wait(self.check_interval)
+
+
+# 全局形象预热池（调用 start(client) 后开始预热配置的图片）
+avatar_pool = AvatarPool()
@@ -0,0 +1,172 @@
+"""
+熔断器 - 按 req_key + action 维度隔离故障服务
+
+某个能力（如 jimeng_realman_avatar_picture_omni_v15）持续出错时快速失败，
+避免重试占满线程、拖慢同进程内其他健康服务。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Tuple
+
+from ..config import (
+    CIRCUIT_WINDOW_SIZE, CIRCUIT_MIN_REQUESTS, CIRCUIT_ERROR_RATE,
+    CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_PROBES
+)
+from .metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 指标中的状态取值
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时抛出，调用方不应重试"""
+
+    retryable = False
+
+
+class CircuitBreaker:
+    """
+    单个端点的熔断器
+
+    - closed: 正常放行，统计最近 window_size 次请求的错误率
+    - open: 错误率超过阈值后打开，open_seconds 内直接拒绝
+    - half_open: 冷却结束后放行少量探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, req_key: str, action: str, window_size: int = CIRCUIT_WINDOW_SIZE,
+                 min_requests: int = CIRCUIT_MIN_REQUESTS, error_rate: float = CIRCUIT_ERROR_RATE,
+                 open_seconds: float = CIRCUIT_OPEN_SECONDS, half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES):
+        self.req_key = req_key
+        self.action = action
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._publish_state()
+
+    @property
+    def state(self) -> str:
+        """当前状态（会处理 open -> half_open 的超时转换）"""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow_request(self):
+        """
+        请求前检查
+
+        Raises:
+            CircuitOpenError: 熔断器打开或探测名额已满
+        """
+        with self._lock:
+            self._maybe_half_open()
+
+            if self._state == CLOSED:
+                return
+
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return
+
+            metrics.inc("volcengine_circuit_rejected_total", req_key=self.req_key, action=self.action)
+            retry_after = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            raise CircuitOpenError(
+                f"服务 {self.req_key}/{self.action} 已熔断，{retry_after:.0f}秒后重新探测"
+            )
+
+    def record(self, success: bool):
+        """记录一次请求结果"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if success:
+                    self._transition(CLOSED)
+                else:
+                    self._transition(OPEN)
+                return
+
+            self._outcomes.append(success)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_requests:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.error_rate:
+                    self._transition(OPEN)
+
+    def cancel(self):
+        """
+        放行后请求没有发出（如本地排队超时）：不记录结果，只归还半开状态的探测名额
+
+        本地等待失败不能说明服务已恢复，不能当作探测成功关闭熔断器。
+        """
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _maybe_half_open(self):
+        """冷却时间结束后进入半开状态（调用方需持有锁）"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, state: str):
+        """切换状态（调用方需持有锁）"""
+        if state == self._state:
+            return
+
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            print(f"⚠️ 熔断器打开: {self.req_key}/{self.action}，{self.open_seconds}秒内快速失败")
+        elif state == CLOSED:
+            self._outcomes.clear()
+            print(f"✅ 熔断器恢复: {self.req_key}/{self.action}")
+        self._probes_in_flight = 0
+
+        metrics.inc("volcengine_circuit_transitions_total", req_key=self.req_key, action=self.action, state=state)
+        self._publish_state()
+
+    def _publish_state(self):
+        metrics.set_gauge("volcengine_circuit_state", STATE_VALUES[self._state], req_key=self.req_key, action=self.action)
+
+
+class CircuitBreakerRegistry:
+    """熔断器注册表，进程内所有客户端共享"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, req_key: str, action: str) -> CircuitBreaker:
+        """获取（或创建）指定端点的熔断器"""
+        key = (req_key, action)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(req_key, action)
+                self._breakers[key] = breaker
+            return breaker
+
+    def states(self) -> Dict[str, str]:
+        """所有熔断器的状态，键为 "req_key/action" """
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {f"{b.req_key}/{b.action}": b.state for b in breakers}
+
+    def reset(self):
+        """清空所有熔断器"""
+        with self._lock:
+            self._breakers.clear()
+
+
+# 全局熔断器注册表
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,296 @@
+"""
+凭证池 - 多个账号分摊QPS和并发任务配额
+
+每个账号有独立的QPS限制、并发任务上限、健康状态和进行中任务数。
+提交任务时选择负载最低的健康账号，查询时路由回提交该任务的账号
+（任务只能用创建它的账号查询）。
+
+并发名额在任务结束（查询到终止状态或任务级错误）、本地放弃等待（超时、取消）
+或超过 ACCOUNT_TASK_IDLE 秒没有被查询（句柄被丢弃等）时归还。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from ..config import (
+    ACCESS_KEY, SECRET_KEY, CREDENTIALS, ACCOUNT_QPS, ACCOUNT_MAX_TASKS, ACCOUNT_TASK_IDLE,
+    ACCOUNT_COOLDOWN, ACCOUNT_ACQUIRE_TIMEOUT, TASK_HANDLE_MAX_WAIT
+)
+from .deadline import current_deadline
+from .metrics import metrics
+
+
+class CredentialPoolExhausted(Exception):
+    """所有账号的配额都已用满（稍后可重试）"""
+
+
+class Credential:
+    """单个账号的凭证与配额状态"""
+
+    def __init__(self, access_key: str, secret_key: str, name: Optional[str] = None,
+                 qps: float = ACCOUNT_QPS, max_tasks: int = ACCOUNT_MAX_TASKS):
+        """
+        Args:
+            access_key: 访问密钥
+            secret_key: 秘密密钥
+            name: 账号名称（用于日志和指标，默认取访问密钥前8位）
+            qps: 每秒请求数上限
+            max_tasks: 同时进行的异步任务上限（0 表示不限制）
+        """
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.name = name or access_key[:8]
+        self.qps = qps
+        self.max_tasks = max_tasks
+
+        self.in_flight = 0            # 已提交未结束的任务数
+        self.cooldown_until = 0.0     # 冷却结束时间（单调时钟）
+        self.consecutive_failures = 0
+        self._request_times = deque()
+
+    @property
+    def healthy(self) -> bool:
+        """是否不在冷却期"""
+        return time.monotonic() >= self.cooldown_until
+
+    @property
+    def load(self) -> float:
+        """并发任务占用比例"""
+        return self.in_flight / self.max_tasks if self.max_tasks else 0.0
+
+    def rate_wait(self, now: float) -> float:
+        """距下一个QPS名额可用还需等待的秒数（调用方需持有池的锁）"""
+        while self._request_times and now - self._request_times[0] >= 1.0:
+            self._request_times.popleft()
+        if not self.qps or len(self._request_times) < self.qps:
+            return 0.0
+        return 1.0 - (now - self._request_times[0])
+
+    def take_rate(self, now: float):
+        """占用一个QPS名额（调用方需持有池的锁）"""
+        self._request_times.append(now)
+
+    def __repr__(self):
+        return f"Credential({self.name}, in_flight={self.in_flight}/{self.max_tasks}, healthy={self.healthy})"
+
+
+class CredentialPool:
+    """凭证池（线程安全）"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._credentials: Dict[str, Credential] = {}
+        # task_id -> [账号, 最近一次提交/查询时间, 是否仍占用并发名额]
+        self._owners: Dict[str, list] = {}
+        self._pruned_at = 0.0
+
+    def add(self, access_key: str, secret_key: str, name: Optional[str] = None,
+            qps: float = ACCOUNT_QPS, max_tasks: int = ACCOUNT_MAX_TASKS) -> Credential:
+        """
+        添加账号（已存在时返回原有账号）
+
+        Returns:
+            账号凭证
+        """
+        with self._cond:
+            credential = self._credentials.get(access_key)
+            if credential is None:
+                credential = Credential(access_key, secret_key, name, qps, max_tasks)
+                self._credentials[access_key] = credential
+                self._publish(credential)
+                self._cond.notify_all()
+            return credential
+
+    def get(self, access_key: str) -> Optional[Credential]:
+        """按访问密钥查找账号"""
+        with self._cond:
+            return self._credentials.get(access_key)
+
+    def credentials(self) -> List[Credential]:
+        """所有账号"""
+        with self._cond:
+            return list(self._credentials.values())
+
+    def acquire(self, task: bool = True, timeout: Optional[float] = None,
+                only: Optional[Credential] = None) -> Credential:
+        """
+        为新请求选择账号：健康、有QPS名额且（提交任务时）并发未满的账号中负载最低的一个
+
+        Args:
+            task: 是否为异步任务提交（占用一个并发名额，直到任务结束）
+            timeout: 最长等待时间（秒），默认取当前截止时间的剩余预算
+            only: 只使用该账号（可以不在池中，如客户端显式传入的密钥）
+
+        Returns:
+            账号凭证
+
+        Raises:
+            CredentialPoolExhausted: 等待超时仍没有可用账号
+        """
+        timeout = self._timeout(timeout)
+        give_up_at = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._prune()
+                now = time.monotonic()
+                best, wait = None, None
+                for credential in ([only] if only is not None else self._credentials.values()):
+                    if task and credential.max_tasks and credential.in_flight >= credential.max_tasks:
+                        continue
+                    delay = max(credential.rate_wait(now), credential.cooldown_until - now, 0.0)
+                    if delay == 0.0:
+                        if best is None or (credential.load, credential.in_flight) < (best.load, best.in_flight):
+                            best = credential
+                    elif wait is None or delay < wait:
+                        wait = delay
+
+                if best is not None:
+                    best.take_rate(now)
+                    if task:
+                        best.in_flight += 1
+                        self._publish(best)
+                    return best
+
+                if now >= give_up_at:
+                    metrics.inc("volcengine_credential_exhausted_total")
+                    raise CredentialPoolExhausted("所有账号的配额都已用满，请稍后重试")
+                # 并发名额要等任务结束时唤醒，QPS名额/冷却按时间等待
+                self._cond.wait(min(give_up_at - now, wait if wait is not None else give_up_at - now))
+
+    def acquire_for_task(self, task_id: Optional[str], fallback: Credential, timeout: Optional[float] = None,
+                         follow_owner: bool = True) -> Credential:
+        """
+        为任务查询选择账号：提交该任务的账号，未知任务使用 fallback
+
+        只等待QPS名额，不占用并发名额。
+
+        Args:
+            task_id: 任务ID
+            fallback: 任务归属未知时使用的账号
+            timeout: 最长等待时间（秒）
+            follow_owner: 是否按任务归属选择账号，False 时总是使用 fallback
+        """
+        timeout = self._timeout(timeout)
+        give_up_at = time.monotonic() + timeout
+        with self._cond:
+            owner = self._owners.get(task_id) if task_id else None
+            if owner:
+                owner[1] = time.monotonic()
+            credential = owner[0] if owner and follow_owner else fallback
+            while True:
+                now = time.monotonic()
+                delay = credential.rate_wait(now)
+                if delay == 0.0:
+                    credential.take_rate(now)
+                    return credential
+                if now >= give_up_at:
+                    metrics.inc("volcengine_credential_exhausted_total")
+                    raise CredentialPoolExhausted(f"账号 {credential.name} 的QPS已用满，请稍后重试")
+                self._cond.wait(min(delay, give_up_at - now))
+
+    def bind(self, task_id: str, credential: Credential):
+        """记录任务归属（提交成功后调用）"""
+        with self._cond:
+            self._prune()
+            self._owners[task_id] = [credential, time.monotonic(), True]
+
+    def release(self, credential: Credential):
+        """归还未形成任务的并发名额（提交失败时调用）"""
+        with self._cond:
+            credential.in_flight = max(0, credential.in_flight - 1)
+            self._publish(credential)
+            self._cond.notify_all()
+
+    def finish(self, task_id: str):
+        """任务结束（查询到终止状态或任务级错误），归还其账号的并发名额（重复调用无影响）"""
+        with self._cond:
+            owner = self._owners.pop(task_id, None)
+        if owner and owner[2]:
+            self.release(owner[0])
+
+    def abandon(self, task_id: str):
+        """
+        本地放弃等待任务（超时、取消）：归还并发名额，保留任务归属
+
+        之后再次查询该任务时仍使用提交它的账号。重复调用无影响。
+        """
+        with self._cond:
+            owner = self._owners.get(task_id)
+            if not owner or not owner[2]:
+                return
+            owner[2] = False
+        self.release(owner[0])
+
+    def owner_of(self, task_id: str) -> Optional[Credential]:
+        """任务所属账号"""
+        with self._cond:
+            owner = self._owners.get(task_id)
+            return owner[0] if owner else None
+
+    def record(self, credential: Credential, success: bool, rate_limited: bool = False):
+        """
+        记录请求结果，维护账号健康状态
+
+        Args:
+            credential: 账号
+            success: 账号本身是否正常（鉴权失败、限流等记为失败）
+            rate_limited: 是否被限流（立即冷却）
+        """
+        with self._cond:
+            if success:
+                credential.consecutive_failures = 0
+                return
+            credential.consecutive_failures += 1
+            if rate_limited or credential.consecutive_failures >= 3:
+                credential.cooldown_until = time.monotonic() + ACCOUNT_COOLDOWN
+                metrics.inc("volcengine_credential_cooldowns_total", account=credential.name)
+                print(f"⚠️ 账号 {credential.name} 暂停使用 {ACCOUNT_COOLDOWN} 秒")
+
+    def _prune(self):
+        """
+        归还长时间没有被查询的任务的并发名额，清理超过任务结果有效期的归属记录
+        （调用方需持有锁，每秒最多执行一次）
+        """
+        now = time.monotonic()
+        if now - self._pruned_at < 1.0:
+            return
+        self._pruned_at = now
+        released = False
+        for task_id, owner in list(self._owners.items()):
+            credential, active_at, counted = owner
+            if counted and now - active_at > ACCOUNT_TASK_IDLE:
+                owner[2] = False
+                credential.in_flight = max(0, credential.in_flight - 1)
+                self._publish(credential)
+                released = True
+            if now - active_at > TASK_HANDLE_MAX_WAIT:
+                del self._owners[task_id]
+        if released:
+            self._cond.notify_all()
+
+    @staticmethod
+    def _timeout(timeout: Optional[float]) -> float:
+        if timeout is not None:
+            return timeout
+        deadline = current_deadline()
+        remaining = deadline.remaining() if deadline else None
+        return ACCOUNT_ACQUIRE_TIMEOUT if remaining is None else min(remaining, ACCOUNT_ACQUIRE_TIMEOUT)
+
+    @staticmethod
+    def _publish(credential: Credential):
+        metrics.set_gauge("volcengine_credential_in_flight", credential.in_flight, account=credential.name)
+
+
+def _load_credentials(pool: CredentialPool):
+    """从配置加载账号：VOLCENGINE_CREDENTIALS 中的账号，以及默认账号"""
+    for spec in CREDENTIALS:
+        pool.add(**spec)
+    if ACCESS_KEY and SECRET_KEY:
+        pool.add(ACCESS_KEY, SECRET_KEY)
+
+
+# 全局凭证池实例
+credential_pool = CredentialPool()
+_load_credentials(credential_pool)
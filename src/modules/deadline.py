@@ -0,0 +1,122 @@
+"""
+截止时间 - 在一次完整调用内传递剩余时间预算
+
+高层调用（如 change_lip_sync）创建一个 Deadline，内部的每次签名请求、
+轮询间隔的等待和重试都只使用剩余预算，保证工作在截止时间准时停止。
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from ..config import CONNECT_TIMEOUT, READ_TIMEOUT
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("volcengine_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """截止时间已到，不应再重试"""
+
+    retryable = False
+
+
+class Deadline:
+    """截止时间（基于单调时钟）"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        Args:
+            seconds: 从现在起的时间预算（秒），None 表示不限制
+        """
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，不限制时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """是否已到截止时间"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, what: str = "操作"):
+        """
+        检查截止时间
+
+        Raises:
+            DeadlineExceeded: 已到截止时间
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"{what}超过截止时间 ({self.seconds}秒)")
+
+    def request_timeout(self, connect: float = CONNECT_TIMEOUT, read: float = READ_TIMEOUT) -> Tuple[float, float]:
+        """
+        计算单次HTTP请求的 (连接超时, 读取超时)，不超过剩余预算
+
+        Raises:
+            DeadlineExceeded: 已到截止时间
+        """
+        self.check("请求")
+        remaining = self.remaining()
+        if remaining is None:
+            return (connect, read)
+        return (min(connect, remaining), min(read, remaining))
+
+    def sleep(self, seconds: float, cancel_event: Optional[threading.Event] = None) -> bool:
+        """
+        等待指定时间，但不超过截止时间
+
+        Args:
+            seconds: 等待秒数
+            cancel_event: 取消事件，被设置时立即结束等待
+
+        Returns:
+            等待结束后是否仍在截止时间之内
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        if seconds > 0:
+            if cancel_event is not None:
+                cancel_event.wait(seconds)
+            else:
+                time.sleep(seconds)
+        return not self.expired()
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining()})"
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前调用上下文中的截止时间"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """
+    在上下文中设置截止时间，内部的 _make_request / retry 会自动使用
+
+    已有更早的截止时间时保留更早的那个。
+    """
+    outer = _current_deadline.get()
+    if deadline is None or (outer is not None and outer.expires_at is not None and
+                            (deadline.expires_at is None or outer.expires_at <= deadline.expires_at)):
+        deadline = outer
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def request_timeout(connect: float = CONNECT_TIMEOUT, read: float = READ_TIMEOUT) -> Tuple[float, float]:
+    """按当前截止时间计算HTTP请求的 (连接超时, 读取超时)"""
+    deadline = current_deadline()
+    if deadline is None:
+        return (connect, read)
+    return deadline.request_timeout(connect, read)
@@ -0,0 +1,186 @@
+"""
+接入点注册表 - 多接入点/多区域的选择与故障切换
+
+- 后台探测各接入点的延迟和可用性（请求本身的耗时也会计入）
+- 新提交的任务使用最快的健康接入点
+- 任务查询固定使用受理该任务的接入点（不可用时只切换到同区域的其他接入点）
+- 连接失败时标记接入点不可用并切换到下一个
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from ..config import ENDPOINTS, ENDPOINT_PROBE_INTERVAL, ENDPOINT_PROBE_TIMEOUT, ENDPOINT_RETRY_AFTER, TASK_HANDLE_MAX_WAIT
+from .metrics import metrics
+
+
+class Endpoint:
+    """单个接入点"""
+
+    def __init__(self, url: str, region: str):
+        """
+        Args:
+            url: 接入点地址，如 https://visual.volcengineapi.com
+            region: 签名使用的区域
+        """
+        self.url = url.rstrip("/")
+        self.region = region
+        self.host = urlparse(self.url).netloc
+
+        self.latency: Optional[float] = None   # 延迟（秒，指数滑动平均）
+        self.down_until = 0.0                   # 不可用状态的结束时间（单调时钟）
+
+    @property
+    def healthy(self) -> bool:
+        """是否可用"""
+        return time.monotonic() >= self.down_until
+
+    def __repr__(self):
+        latency = "?" if self.latency is None else f"{self.latency * 1000:.0f}ms"
+        return f"Endpoint({self.url}, region={self.region}, latency={latency}, healthy={self.healthy})"
+
+
+class EndpointRegistry:
+    """接入点注册表（线程安全）"""
+
+    def __init__(self, probe_interval: float = ENDPOINT_PROBE_INTERVAL, alpha: float = 0.3):
+        """
+        Args:
+            probe_interval: 后台探测间隔（秒），0 表示不探测
+            alpha: 延迟滑动平均系数
+        """
+        self.probe_interval = probe_interval
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._endpoints: List[Endpoint] = []
+        # task_id -> (接入点, 提交时间)
+        self._pins: Dict[str, tuple] = {}
+        self._probe_thread = None
+        self._stop = threading.Event()
+
+    def add(self, url: str, region: str) -> Endpoint:
+        """添加接入点（已存在时返回原有接入点）"""
+        with self._lock:
+            for endpoint in self._endpoints:
+                if endpoint.url == url.rstrip("/"):
+                    return endpoint
+            endpoint = Endpoint(url, region)
+            self._endpoints.append(endpoint)
+            return endpoint
+
+    def endpoints(self) -> List[Endpoint]:
+        """所有接入点"""
+        with self._lock:
+            return list(self._endpoints)
+
+    def choose(self, exclude: tuple = (), region: Optional[str] = None) -> Optional[Endpoint]:
+        """
+        选择最快的健康接入点
+
+        Args:
+            exclude: 本次请求已失败的接入点
+            region: 只在指定区域内选择
+
+        Returns:
+            接入点；没有健康接入点时返回最早恢复的那个，没有候选时返回None
+        """
+        self._ensure_probing()
+        with self._lock:
+            candidates = [e for e in self._endpoints
+                          if e not in exclude and (region is None or e.region == region)]
+        if not candidates:
+            return None
+        healthy = [e for e in candidates if e.healthy]
+        if not healthy:
+            return min(candidates, key=lambda e: e.down_until)
+        # 尚无延迟数据的接入点按配置顺序排在最后
+        return min(healthy, key=lambda e: e.latency if e.latency is not None else float("inf"))
+
+    def for_task(self, task_id: Optional[str]) -> Optional[Endpoint]:
+        """受理该任务的接入点，未知任务返回None"""
+        with self._lock:
+            pin = self._pins.get(task_id) if task_id else None
+            return pin[0] if pin else None
+
+    def pin(self, task_id: str, endpoint: Endpoint):
+        """记录受理任务的接入点（提交成功后调用）"""
+        with self._lock:
+            expired_before = time.monotonic() - TASK_HANDLE_MAX_WAIT
+            for stale in [t for t, (_, at) in self._pins.items() if at < expired_before]:
+                del self._pins[stale]
+            self._pins[task_id] = (endpoint, time.monotonic())
+
+    def unpin(self, task_id: str):
+        """任务结束后清除记录"""
+        with self._lock:
+            self._pins.pop(task_id, None)
+
+    def record(self, endpoint: Endpoint, latency: Optional[float], success: bool):
+        """
+        记录一次请求/探测结果
+
+        Args:
+            endpoint: 接入点
+            latency: 耗时（秒）
+            success: 是否连通（收到任意HTTP响应即视为连通）
+        """
+        with self._lock:
+            if success:
+                if latency is not None:
+                    endpoint.latency = latency if endpoint.latency is None else \
+                        endpoint.latency + self.alpha * (latency - endpoint.latency)
+                if not endpoint.healthy:
+                    print(f"✅ 接入点恢复: {endpoint.url}")
+                endpoint.down_until = 0.0
+            else:
+                if endpoint.healthy:
+                    print(f"⚠️ 接入点不可用: {endpoint.url}，{ENDPOINT_RETRY_AFTER}秒内切换到其他接入点")
+                endpoint.down_until = time.monotonic() + ENDPOINT_RETRY_AFTER
+                metrics.inc("volcengine_endpoint_failures_total", endpoint=endpoint.host)
+        metrics.set_gauge("volcengine_endpoint_healthy", 1 if success else 0, endpoint=endpoint.host)
+        if endpoint.latency is not None:
+            metrics.set_gauge("volcengine_endpoint_latency_seconds", round(endpoint.latency, 4), endpoint=endpoint.host)
+
+    def probe(self, endpoint: Endpoint):
+        """探测一次接入点的延迟和可用性"""
+        start = time.monotonic()
+        try:
+            requests.get(endpoint.url, timeout=ENDPOINT_PROBE_TIMEOUT)
+        except requests.exceptions.RequestException:
+            self.record(endpoint, None, False)
+        else:
+            self.record(endpoint, time.monotonic() - start, True)
+
+    def probe_all(self):
+        """探测所有接入点"""
+        for endpoint in self.endpoints():
+            self.probe(endpoint)
+
+    def stop(self):
+        """停止后台探测"""
+        self._stop.set()
+
+    def _ensure_probing(self):
+        """有多个接入点时启动后台探测线程"""
+        if self._probe_thread is not None or self.probe_interval <= 0:
+            return
+        with self._lock:
+            if self._probe_thread is not None or len(self._endpoints) < 2:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="volc-endpoint-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.probe_interval)
+
+
+# 全局接入点注册表
+endpoint_registry = EndpointRegistry()
+for _endpoint in ENDPOINTS:
+    endpoint_registry.add(_endpoint["url"], _endpoint["region"])
@@ -0,0 +1,296 @@
+"""
+公平调度 - 按优先级通道和租户权重分配提交任务的配额（赤字轮询 DRR）
+
+交互请求和批量回填共用账号时，先到先得会让上万个批量任务占满并发任务名额，交互任务只能排在后面。
+调度器放在所有客户端的提交路径前：提交请求先排队领取"轮次"，拿到轮次后才去占用账号/全局配额
+和自适应并发名额，都拿到（或放弃）后交还轮次。配额或并发名额紧张时，下一个名额总是交给调度器选中的请求：
+
+- 通道（interactive / standard / bulk）之间按 SCHEDULER_LANE_WEIGHTS 加权赤字轮询
+- 同一通道内的租户之间按 SCHEDULER_TENANT_WEIGHTS 加权赤字轮询（未配置的租户权重为1）
+- 每次提交消耗1个单位（配额按任务数计算）
+
+- 每个服务（req_key）单独排队：各服务的并发名额互不相关，一个服务名额已满不会挡住其他服务的提交
+
+默认权重下配额紧张时，interactive : standard : bulk 约为 8 : 4 : 1；
+交互请求最多等待正在进行的轮次和一轮内其他通道的份额，不会被批量任务的队列长度拖住。
+没有竞争时直接拿到轮次，几乎没有额外开销。
+
+通道和租户通过 scheduling_scope() 在调用上下文中设置，或设置客户端的 lane / tenant 属性，
+默认值来自 VOLCENGINE_LANE / VOLCENGINE_TENANT。
+"""
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import (
+    SCHEDULER_LANE_WEIGHTS, SCHEDULER_TENANT_WEIGHTS, SCHEDULER_DEFAULT_LANE, SCHEDULER_DEFAULT_TENANT,
+    SCHEDULER_TURNS, SCHEDULER_QUANTUM, SCHEDULER_WAIT_TIMEOUT
+)
+from .deadline import Deadline, current_deadline
+from .metrics import metrics
+
+_current_scheduling: contextvars.ContextVar = contextvars.ContextVar("volcengine_scheduling", default=(None, None))
+
+
+class SchedulerTimeout(Exception):
+    """排队等待提交轮次超时（稍后可重试）"""
+
+
+def current_scheduling() -> Tuple[Optional[str], Optional[str]]:
+    """当前调用上下文中的 (通道, 租户)，未设置的为None"""
+    return _current_scheduling.get()
+
+
+@contextmanager
+def scheduling_scope(lane: Optional[str] = None, tenant: Optional[str] = None):
+    """
+    在上下文中设置提交任务的通道和租户，内部的 _make_request 会自动使用
+
+    Args:
+        lane: 通道（interactive / standard / bulk），None 表示沿用外层设置
+        tenant: 租户标识，None 表示沿用外层设置
+    """
+    outer_lane, outer_tenant = _current_scheduling.get()
+    token = _current_scheduling.set((lane or outer_lane, tenant or outer_tenant))
+    try:
+        yield
+    finally:
+        _current_scheduling.reset(token)
+
+
+class _DeficitRoundRobin:
+    """加权赤字轮询：队列轮到时加一个份额（权重 × 基本份额），赤字够一次消耗就服务，不够就轮到下一个"""
+
+    def __init__(self, quantum: float):
+        self.quantum = quantum
+        self._active: "OrderedDict[str, float]" = OrderedDict()   # 有排队的队列 -> 赤字，第一个为当前队列
+        self._credited = False   # 当前队列本轮是否已加过份额
+
+    def activate(self, key: str):
+        """队列有新的排队请求（已在轮询中时不变）"""
+        self._active.setdefault(key, 0.0)
+
+    def deactivate(self, key: str):
+        """队列已空：移出轮询，赤字清零（空闲时不积攒份额）"""
+        if key in self._active:
+            if next(iter(self._active)) == key:
+                self._credited = False
+            del self._active[key]
+
+    def pick(self, weight_of, cost: float = 1.0) -> Optional[str]:
+        """选出下一个被服务的队列并扣除消耗，没有排队的队列时返回None"""
+        while self._active:
+            key = next(iter(self._active))
+            if not self._credited:
+                self._active[key] += self.quantum * max(weight_of(key), 1e-6)
+                self._credited = True
+            if self._active[key] >= cost:
+                self._active[key] -= cost
+                return key
+            self._active.move_to_end(key)
+            self._credited = False
+        return None
+
+
+class Ticket:
+    """一个排队中的提交请求"""
+
+    __slots__ = ("lane", "tenant", "scope", "enqueued_at", "granted")
+
+    def __init__(self, lane: str, tenant: str, scope: str = ""):
+        self.lane = lane
+        self.tenant = tenant
+        self.scope = scope
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class _Scope:
+    """一个服务（req_key）的排队状态"""
+
+    def __init__(self, lanes, quantum: float):
+        self.lanes = _DeficitRoundRobin(quantum)
+        self.tenants: Dict[str, _DeficitRoundRobin] = {lane: _DeficitRoundRobin(quantum) for lane in lanes}
+        self.queues: Dict[Tuple[str, str], deque] = {}
+        self.busy = 0
+
+
+class FairScheduler:
+    """提交任务的公平调度器（线程安全）"""
+
+    def __init__(self, lane_weights: Optional[Dict[str, float]] = None, tenant_weights: Optional[Dict[str, float]] = None,
+                 turns: int = SCHEDULER_TURNS, quantum: float = SCHEDULER_QUANTUM,
+                 default_lane: str = SCHEDULER_DEFAULT_LANE, default_tenant: str = SCHEDULER_DEFAULT_TENANT,
+                 wait_timeout: Optional[float] = SCHEDULER_WAIT_TIMEOUT):
+        """
+        Args:
+            lane_weights: 通道权重，未列出的通道不被接受
+            tenant_weights: 租户权重，未列出的租户权重为1
+            turns: 每个服务同时发出的轮次数（同时在占用配额和并发名额的提交请求数）
+            quantum: 权重为1的队列每轮获得的份额
+            default_lane: 未指定通道时使用的通道
+            default_tenant: 未指定租户时使用的租户
+            wait_timeout: 排队等待的最长时间（秒），None 表示只受截止时间限制
+        """
+        self.lane_weights = dict(lane_weights if lane_weights is not None else SCHEDULER_LANE_WEIGHTS)
+        self.tenant_weights = dict(tenant_weights if tenant_weights is not None else SCHEDULER_TENANT_WEIGHTS)
+        self.turns = turns
+        self.default_lane = default_lane
+        self.default_tenant = default_tenant
+        self.wait_timeout = wait_timeout
+        self.quantum = quantum
+        self._cond = threading.Condition()
+        self._scopes: Dict[str, _Scope] = {}
+        self._granted: Dict[Tuple[str, str], int] = {}
+
+    def resolve(self, lane: Optional[str] = None, tenant: Optional[str] = None) -> Tuple[str, str]:
+        """
+        确定请求的通道和租户：显式参数 > 调用上下文 > 默认值
+
+        Raises:
+            ValueError: 未知的通道
+        """
+        scoped_lane, scoped_tenant = current_scheduling()
+        lane = lane or scoped_lane or self.default_lane
+        tenant = tenant or scoped_tenant or self.default_tenant
+        if lane not in self.lane_weights:
+            raise ValueError(f"未知的调度通道: {lane}，支持: {', '.join(self.lane_weights)}")
+        return lane, tenant
+
+    def enter(self, lane: Optional[str] = None, tenant: Optional[str] = None,
+              deadline: Optional[Deadline] = None, scope: str = "") -> Ticket:
+        """
+        排队等待提交轮次
+
+        Args:
+            lane: 通道，None 表示使用调用上下文或默认值
+            tenant: 租户，None 表示使用调用上下文或默认值
+            deadline: 截止时间（默认使用当前上下文中的截止时间），等待不超过其剩余时间
+            scope: 排队范围（服务 req_key），不同范围的轮次互不影响
+
+        Returns:
+            已拿到轮次的票据，占用配额和并发名额后交给 leave()
+
+        Raises:
+            ValueError: 未知的通道
+            SchedulerTimeout: 等待超时
+        """
+        lane, tenant = self.resolve(lane, tenant)
+        deadline = deadline or current_deadline()
+        timeout = self.wait_timeout
+        if deadline is not None and deadline.remaining() is not None:
+            timeout = deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+        end = None if timeout is None else time.monotonic() + timeout
+
+        ticket = Ticket(lane, tenant, scope)
+        with self._cond:
+            state = self._scopes.get(scope)
+            if state is None:
+                state = self._scopes[scope] = _Scope(self.lane_weights, self.quantum)
+            state.queues.setdefault((lane, tenant), deque()).append(ticket)
+            state.tenants[lane].activate(tenant)
+            state.lanes.activate(lane)
+            self._dispatch(scope)
+            while not ticket.granted:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._withdraw(ticket)
+                    metrics.inc("volcengine_scheduler_timeouts_total", lane=lane)
+                    raise SchedulerTimeout(f"提交排队超时（通道 {lane}，租户 {tenant}）")
+                self._cond.wait(remaining)
+        waited = time.monotonic() - ticket.enqueued_at
+        metrics.set_gauge("volcengine_scheduler_wait_seconds", waited, lane=lane)
+        metrics.inc("volcengine_scheduler_granted_total", lane=lane, tenant=tenant)
+        return ticket
+
+    def leave(self, ticket: Optional[Ticket]):
+        """交还轮次（已占到配额和并发名额，或放弃提交），重复调用无影响"""
+        if ticket is None:
+            return
+        with self._cond:
+            if not ticket.granted:
+                return
+            ticket.granted = False
+            self._scopes[ticket.scope].busy -= 1
+            self._dispatch(ticket.scope)
+
+    @contextmanager
+    def turn(self, lane: Optional[str] = None, tenant: Optional[str] = None, deadline: Optional[Deadline] = None,
+             scope: str = ""):
+        """在轮次内执行（with 块结束时交还轮次）"""
+        ticket = self.enter(lane, tenant, deadline, scope)
+        try:
+            yield ticket
+        finally:
+            self.leave(ticket)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        各通道/租户的排队情况
+
+        Returns:
+            [{"lane", "tenant", "waiting", "oldest_wait", "granted"}]
+        """
+        now = time.monotonic()
+        with self._cond:
+            waiting: Dict[Tuple[str, str], List[Ticket]] = {}
+            for state in self._scopes.values():
+                for key, queue in state.queues.items():
+                    waiting.setdefault(key, []).extend(queue)
+            keys = set(waiting) | set(self._granted)
+            return [{
+                "lane": lane,
+                "tenant": tenant,
+                "waiting": len(waiting.get((lane, tenant), ())),
+                "oldest_wait": max((now - ticket.enqueued_at for ticket in waiting.get((lane, tenant), ())), default=0.0),
+                "granted": self._granted.get((lane, tenant), 0)
+            } for lane, tenant in sorted(keys)]
+
+    def _dispatch(self, scope: str):
+        """范围内有空闲轮次时按两级赤字轮询发出（需持有锁）"""
+        state = self._scopes[scope]
+        while state.busy < self.turns:
+            lane = state.lanes.pick(lambda key: self.lane_weights.get(key, 1.0))
+            if lane is None:
+                break
+            tenant = state.tenants[lane].pick(lambda key: self.tenant_weights.get(key, 1.0))
+            queue = state.queues[(lane, tenant)]
+            ticket = queue.popleft()
+            if not queue:
+                self._drop_queue(state, lane, tenant)
+            ticket.granted = True
+            state.busy += 1
+            self._granted[(lane, tenant)] = self._granted.get((lane, tenant), 0) + 1
+            self._cond.notify_all()
+        if not state.busy and not state.queues:
+            # 空闲的范围不保留状态（赤字本来就会清零）
+            del self._scopes[scope]
+        metrics.set_gauge("volcengine_scheduler_waiting",
+                          sum(len(queue) for other in self._scopes.values() for queue in other.queues.values()))
+
+    def _withdraw(self, ticket: Ticket):
+        """从队列中移除超时的票据（需持有锁）"""
+        state = self._scopes.get(ticket.scope)
+        queue = state.queues.get((ticket.lane, ticket.tenant)) if state is not None else None
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if not queue:
+            self._drop_queue(state, ticket.lane, ticket.tenant)
+        self._dispatch(ticket.scope)
+
+    @staticmethod
+    def _drop_queue(state: _Scope, lane: str, tenant: str):
+        """移除已空的租户队列，通道内没有排队时移出通道轮询（需持有锁）"""
+        del state.queues[(lane, tenant)]
+        state.tenants[lane].deactivate(tenant)
+        if not any(key[0] == lane for key in state.queues):
+            state.lanes.deactivate(lane)
+
+
+# 全局公平调度器（进程内所有客户端的提交请求共用）
+fair_scheduler = FairScheduler()
@@ -0,0 +1,110 @@
+"""
+ffmpeg 工具 - 音频解码、视频截取与拼接
+
+需要系统中安装 ffmpeg（可选依赖，只有长音频等本地处理功能会用到）。
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import List
+
+from ..config import FFMPEG_BINARY
+
+
+def require_ffmpeg() -> str:
+    """
+    检查 ffmpeg 是否可用
+
+    Returns:
+        ffmpeg 可执行文件路径
+
+    Raises:
+        RuntimeError: 未安装 ffmpeg
+    """
+    binary = shutil.which(FFMPEG_BINARY)
+    if not binary:
+        raise RuntimeError("未找到 ffmpeg，请先安装（如 apt install ffmpeg / brew install ffmpeg），"
+                           "或通过 VOLCENGINE_FFMPEG 指定路径")
+    return binary
+
+
+def run_ffmpeg(args: List[str], stdout=subprocess.DEVNULL) -> subprocess.CompletedProcess:
+    """
+    执行 ffmpeg 命令
+
+    Args:
+        args: ffmpeg 参数（不含可执行文件本身）
+        stdout: 标准输出去向
+
+    Raises:
+        RuntimeError: ffmpeg 执行失败
+    """
+    result = subprocess.run([require_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y"] + args,
+                            stdout=stdout, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg 执行失败: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result
+
+
+def decode_audio(source: str, sample_rate: int) -> bytes:
+    """
+    把音频解码为单声道 16位 PCM
+
+    Args:
+        source: 本地文件路径或URL
+        sample_rate: 输出采样率
+
+    Returns:
+        PCM 数据（小端 int16）
+    """
+    result = run_ffmpeg(["-i", source, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"],
+                        stdout=subprocess.PIPE)
+    return result.stdout
+
+
+def concat_videos(paths: List[str], output: str) -> str:
+    """
+    按顺序无损拼接视频（各片段需编码参数一致，如同一服务的输出）
+
+    Args:
+        paths: 视频文件路径列表
+        output: 输出文件路径
+
+    Returns:
+        输出文件路径
+    """
+    fd, list_file = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output])
+    finally:
+        os.remove(list_file)
+    return output
+
+
+def cut_video(source: str, start: float, duration: float, output: str, keep_audio: bool = False) -> str:
+    """
+    截取视频片段（重新编码，保证从指定时间精确开始）
+
+    Args:
+        source: 本地文件路径或URL
+        start: 起点（秒）
+        duration: 时长（秒）
+        output: 输出文件路径
+        keep_audio: 是否保留音轨
+
+    Returns:
+        输出文件路径
+    """
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    args = ["-ss", f"{start:.3f}", "-i", source, "-t", f"{duration:.3f}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p"]
+    args += ["-c:a", "aac"] if keep_audio else ["-an"]
+    run_ffmpeg(args + ["-movflags", "+faststart", output])
+    return output
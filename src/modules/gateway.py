@@ -0,0 +1,490 @@
+"""
+HTTP 网关 - 多个服务通过 HTTP 共用同一套客户端访问火山引擎
+
+各服务分别嵌入本库时，每个进程都有自己的连接池、限流状态和轮询线程。网关进程只持有一个
+VolcEngineAI（共享连接池、账号池、限流和熔断）和一个共享轮询调度器（poll_scheduler），
+调用方通过 HTTP 提交任务、查询状态和等待结果：
+
+- POST /v1/{kind}                       提交任务，body: {"params": {...}, "lane", "tenant", "coalesce"}
+- GET  /v1/{kind}/{task_id}             查询任务状态（不阻塞）
+- GET  /v1/{kind}/{task_id}/result      等待任务结果，?wait=N 最多等待N秒（长轮询）
+- GET  /v1/kinds、/v1/stats、/healthz、/metrics
+
+kind 与作业队列相同（VolcEngineAI.JOB_KINDS）。请求合并：
+- 同一租户下参数相同的提交请求在任务进行中（及完成后 GATEWAY_COALESCE_TTL 秒内）合并为同一个任务，
+  并发的相同提交只向服务端提交一次；coalesce 为 false 时总是提交新任务。使用凭证池时合并只按租户区分
+  （账号由凭证池在提交时选择，查询会路由回提交任务的账号）；网关显式指定账号时再按账号区分
+- 同一任务的所有状态/结果请求共用一个后台轮询，查询次数与调用方数量无关
+
+网关重启或任务由其他网关实例提交时，状态/结果接口按需开始轮询；轮询需要的参数
+（mode、template_id、version）通过查询字符串传入。这类任务同时最多跟踪 GATEWAY_MAX_FOREIGN 个，
+超出时先丢弃已结束的，仍然超出则返回 503。
+"""
+
+import hashlib
+import json
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from ..config import (
+    GATEWAY_HOST, GATEWAY_PORT, GATEWAY_TOKEN, GATEWAY_COALESCE_TTL, GATEWAY_RESULT_TTL, GATEWAY_MAX_WAIT,
+    GATEWAY_TASK_TIMEOUT, GATEWAY_MAX_FOREIGN, GATEWAY_MAX_BODY
+)
+from ..core.task_waiter import find_task_failure, poll_scheduler
+from .adaptive_limiter import ConcurrencyLimitTimeout
+from .circuit_breaker import CircuitOpenError
+from .credential_pool import CredentialPoolExhausted
+from .deadline import Deadline
+from .fair_scheduler import SchedulerTimeout, fair_scheduler, scheduling_scope
+from .metrics import metrics
+from .quota_coordinator import QuotaTimeout, account_key
+from .result_mirror import extract_result_urls
+from .task_ownership import task_ownership
+
+
+
+class GatewayBusy(Exception):
+    """跟踪的非本网关提交的任务已达上限（稍后可重试）"""
+
+
+# 稍后重试即可成功的错误（返回 503）
+_BUSY_ERRORS = (SchedulerTimeout, QuotaTimeout, ConcurrencyLimitTimeout, CredentialPoolExhausted, CircuitOpenError,
+                GatewayBusy)
+
+
+def _find_cause(exc: Optional[BaseException], types) -> Optional[BaseException]:
+    """沿异常链查找指定类型的异常（客户端方法会把原始异常包装一层）"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, types):
+            return exc
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return None
+
+
+class GatewayError(Exception):
+    """返回给调用方的错误（带HTTP状态码）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _Tracked:
+    """网关正在轮询（或已结束、结果仍保留）的任务"""
+
+    __slots__ = ("kind", "task_id", "job", "future", "cancel_event", "foreign", "started_at", "finished_at")
+
+    def __init__(self, kind: str, task_id: str, job, future: Future, cancel_event: threading.Event, foreign: bool):
+        self.kind = kind
+        self.task_id = task_id
+        self.job = job
+        self.future = future
+        self.cancel_event = cancel_event
+        self.foreign = foreign   # 不是本网关提交（或接手）的任务
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+
+class Gateway:
+    """提交合并 + 共享轮询（线程安全，与HTTP无关）"""
+
+    def __init__(self, runner, coalesce_ttl: float = GATEWAY_COALESCE_TTL, result_ttl: float = GATEWAY_RESULT_TTL,
+                 max_wait: float = GATEWAY_MAX_WAIT, task_timeout: float = GATEWAY_TASK_TIMEOUT,
+                 max_foreign: int = GATEWAY_MAX_FOREIGN):
+        """
+        Args:
+            runner: 任务执行器，提供 JOB_KINDS、submit_job(kind, params) 和 job_poller(kind, task_id, params)
+            coalesce_ttl: 相同提交在任务完成后继续合并的时间（秒）
+            result_ttl: 任务结束后保留结果的时间（秒）
+            max_wait: 结果接口单次最长等待时间（秒）
+            task_timeout: 单个任务后台轮询的最长时间（秒）
+            max_foreign: 同时跟踪的非本网关提交的任务数上限
+        """
+        self.runner = runner
+        self.coalesce_ttl = coalesce_ttl
+        self.result_ttl = result_ttl
+        self.max_wait = max_wait
+        self.task_timeout = task_timeout
+        self.max_foreign = max_foreign
+        self._lock = threading.Lock()
+        self._submissions: Dict[str, Tuple[Future, Optional[_Tracked]]] = {}   # 合并键 -> (任务ID, 任务)
+        self._tracked: Dict[Tuple[str, str], _Tracked] = {}
+        self._evicted_at = 0.0
+
+    @property
+    def kinds(self) -> Tuple[str, ...]:
+        return tuple(self.runner.JOB_KINDS)
+
+    def submit(self, kind: str, params: Dict[str, Any], lane: Optional[str] = None, tenant: Optional[str] = None,
+               coalesce: bool = True) -> Tuple[str, bool]:
+        """
+        提交任务（参数相同的进行中任务直接复用）
+
+        Args:
+            kind: 任务类型（见 kinds）
+            params: 任务参数
+            lane: 调度通道
+            tenant: 租户
+            coalesce: 是否与同一租户下参数相同的任务合并
+
+        Returns:
+            (任务ID, 是否为合并的请求)
+
+        Raises:
+            ValueError: 不支持的任务类型或参数错误
+            Exception: 提交失败（合并的请求收到同一个异常）
+        """
+        if kind not in self.kinds:
+            raise ValueError(f"不支持的任务类型: {kind}，支持: {', '.join(self.kinds)}")
+        key = self._coalesce_key(kind, params, tenant)
+        with self._lock:
+            self._evict()
+            entry = self._submissions.get(key) if coalesce else None
+            if entry is None:
+                entry = (Future(), None)
+                if coalesce:
+                    self._submissions[key] = entry
+                leader = True
+            else:
+                leader = False
+        future = entry[0]
+
+        if not leader:
+            metrics.inc("volcengine_gateway_coalesced_total", kind=kind, stage="submit")
+            return future.result(), True
+
+        try:
+            with scheduling_scope(lane, tenant):
+                task_id = str(self.runner.submit_job(kind, params))
+            task_ownership.register(task_id, kind, params)
+            tracked = self._track(kind, task_id, params, foreign=False)
+        except BaseException as e:
+            with self._lock:
+                if self._submissions.get(key) is entry:
+                    del self._submissions[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if self._submissions.get(key) is entry:
+                self._submissions[key] = (future, tracked)
+        future.set_result(task_id)
+        metrics.inc("volcengine_gateway_submits_total", kind=kind)
+        return task_id, False
+
+    def _coalesce_key(self, kind: str, params: Dict[str, Any], tenant: Optional[str]) -> str:
+        """
+        合并键：任务类型、租户和参数都相同的提交才合并（不同租户的任务互不可见）
+
+        使用凭证池时提交所用的账号在提交时才选出，合并只按租户区分；runner 显式指定账号时键中包含该账号。
+        """
+        tenant = fair_scheduler.resolve(None, tenant)[1]
+        pooled = getattr(self.runner, "use_credential_pool", True)
+        access_key = getattr(self.runner, "access_key", None)
+        account = account_key(access_key) if access_key and not pooled else ""
+        payload = json.dumps([kind, tenant, account, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def status(self, kind: str, task_id: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        查询任务状态（不阻塞，未在轮询的任务开始后台轮询）
+
+        Raises:
+            GatewayBusy: 跟踪的非本网关提交的任务已达上限
+        """
+        return self._describe(self._track(kind, task_id, params or {}))
+
+    def adopt(self, kind: str, task_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """接手其他节点留下的任务（任务所有权回调，不受 max_foreign 限制）"""
+        return self._describe(self._track(kind, task_id, params, foreign=False))
+
+    def result(self, kind: str, task_id: str, params: Optional[Dict[str, Any]] = None,
+               wait: float = 0) -> Dict[str, Any]:
+        """
+        等待任务结果
+
+        Args:
+            wait: 最长等待时间（秒），不超过 max_wait；超时后返回进行中的状态
+
+        Returns:
+            任务状态（见 _describe）
+
+        Raises:
+            GatewayBusy: 跟踪的非本网关提交的任务已达上限
+        """
+        tracked = self._track(kind, task_id, params or {})
+        try:
+            tracked.future.result(max(0.0, min(wait, self.max_wait)))
+        except Exception:
+            pass   # 仍在进行（FutureTimeoutError）或已失败，见 _describe
+        return self._describe(tracked)
+
+    def stats(self) -> Dict[str, Any]:
+        """网关状态：合并中的提交、轮询中的任务、共享轮询调度器和公平调度器的排队情况、任务租约"""
+        with self._lock:
+            tracked = list(self._tracked.values())
+            submissions = len(self._submissions)
+        polling = sum(1 for item in tracked if not item.future.done())
+        return {
+            "submissions": submissions,
+            "tracked": len(tracked),
+            "polling": polling,
+            "poll_pending": poll_scheduler.pending(),
+            "scheduler": fair_scheduler.status(),
+            "ownership": task_ownership.status()
+        }
+
+    def _track(self, kind: str, task_id: str, params: Dict[str, Any], foreign: bool = True) -> _Tracked:
+        """
+        返回任务的共享轮询，还没有时创建
+
+        Args:
+            foreign: 是否为不是本网关提交的任务（按需轮询，数量受 max_foreign 限制）
+
+        Raises:
+            GatewayBusy: foreign 任务已达上限
+        """
+        if kind not in self.kinds:
+            raise ValueError(f"不支持的任务类型: {kind}，支持: {', '.join(self.kinds)}")
+        with self._lock:
+            self._evict()
+            tracked = self._tracked.get((kind, task_id))
+            if tracked is not None:
+                tracked.foreign = tracked.foreign and foreign
+                metrics.inc("volcengine_gateway_coalesced_total", kind=kind, stage="poll")
+                return tracked
+            if foreign:
+                self._make_room()
+            try:
+                job = self.runner.job_poller(kind, task_id, params)
+            except KeyError as e:
+                raise ValueError(f"查询 {kind} 任务需要参数: {e.args[0]}")
+            cancel_event = threading.Event()
+            future = poll_scheduler.submit(job, Deadline(self.task_timeout), cancel_event)
+            tracked = _Tracked(kind, task_id, job, future, cancel_event, foreign)
+            self._tracked[(kind, task_id)] = tracked
+        future.add_done_callback(lambda _: setattr(tracked, "finished_at", time.time()))
+        metrics.set_gauge("volcengine_gateway_tracked_tasks", len(self._tracked))
+        return tracked
+
+    def _describe(self, tracked: _Tracked) -> Dict[str, Any]:
+        """
+        Returns:
+            {"kind", "task_id", "status"(running / done / failed), "polls", "elapsed",
+             "result", "urls"（完成时）, "error", "retryable"（失败时）}
+        """
+        info = {
+            "kind": tracked.kind,
+            "task_id": tracked.task_id,
+            "status": "running",
+            "polls": tracked.job.polls,
+            "elapsed": round((tracked.finished_at or time.time()) - tracked.started_at, 3)
+        }
+        future = tracked.future
+        if not future.done():
+            return info
+        error = future.exception() if not future.cancelled() else Exception("轮询已取消")
+        if error is None:
+            result = future.result() or {}
+            info.update(status="done", result=result, urls=extract_result_urls(result))
+        else:
+            # 服务端任务失败不可重试；等待超时等本地错误可稍后重新查询
+            info.update(status="failed", error=str(error), retryable=find_task_failure(error) is None)
+        return info
+
+    def _evict(self):
+        """清理过期的合并记录和任务结果（需持有锁，最多每秒一次）"""
+        now = time.time()
+        if now - self._evicted_at < 1:
+            return
+        self._evicted_at = now
+        for key, (future, tracked) in list(self._submissions.items()):
+            if tracked is None or tracked.finished_at is None:
+                continue
+            if tracked.future.exception() is not None or now - tracked.finished_at > self.coalesce_ttl:
+                del self._submissions[key]
+        for key, tracked in list(self._tracked.items()):
+            if tracked.finished_at is None:
+                continue
+            # 本地轮询失败（如等待超时）的任务立即移除，下次查询重新开始轮询
+            failed = tracked.future.exception() is not None and find_task_failure(tracked.future.exception()) is None
+            if failed or now - tracked.finished_at > self.result_ttl:
+                del self._tracked[key]
+        metrics.set_gauge("volcengine_gateway_tracked_tasks", len(self._tracked))
+
+    def _make_room(self):
+        """
+        foreign 任务达到上限时丢弃已结束的（最早结束的优先），仍然达到上限时拒绝（需持有锁）
+
+        Raises:
+            GatewayBusy: 进行中的 foreign 任务已达上限
+        """
+        foreign = [(key, tracked) for key, tracked in self._tracked.items() if tracked.foreign]
+        excess = len(foreign) - self.max_foreign + 1
+        if excess <= 0:
+            return
+        finished = sorted((item for item in foreign if item[1].finished_at is not None), key=lambda item: item[1].finished_at)
+        for key, _ in finished[:excess]:
+            del self._tracked[key]
+        if excess > len(finished):
+            metrics.inc("volcengine_gateway_rejected_total", reason="foreign_limit")
+            raise GatewayBusy(f"按需轮询的任务已达上限（{self.max_foreign}），请稍后重试")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """网关的HTTP处理器（每个连接一个线程，耗时的等待在共享轮询调度器中进行）"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "VolcEngineGateway/1.0"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method: str):
+        gateway: Gateway = self.server.gateway
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        parts = [part for part in url.path.split("/") if part]
+        route = "other"
+        started = time.monotonic()
+        self._code = 0
+        try:
+            if method == "GET" and parts == ["healthz"]:
+                route = "healthz"
+                return self._send(200, {"ok": True})
+            if GATEWAY_TOKEN and self.headers.get("Authorization", "") != f"Bearer {GATEWAY_TOKEN}":
+                raise GatewayError(401, "未授权")
+            if method == "GET" and parts == ["metrics"]:
+                route = "metrics"
+                return self._send_text(200, metrics.render_text())
+            if len(parts) < 2 or parts[0] != "v1":
+                raise GatewayError(404, f"未知的路径: {url.path}")
+            if method == "GET" and parts[1:] == ["kinds"]:
+                route = "kinds"
+                return self._send(200, {"kinds": list(gateway.kinds)})
+            if method == "GET" and parts[1:] == ["stats"]:
+                route = "stats"
+                return self._send(200, gateway.stats())
+
+            kind = parts[1]
+            if method == "POST" and len(parts) == 2:
+                route = "submit"
+                body = self._read_json()
+                params = body.get("params", {})
+                if not isinstance(params, dict):
+                    raise GatewayError(400, "params 必须是对象")
+                task_id, coalesced = gateway.submit(kind, params, body.get("lane"), body.get("tenant"),
+                                                    body.get("coalesce", True) is not False)
+                base = f"/v1/{kind}/{task_id}"
+                return self._send(202, {"kind": kind, "task_id": task_id, "coalesced": coalesced,
+                                        "status_url": base, "result_url": f"{base}/result"})
+            if method == "GET" and len(parts) == 3:
+                route = "status"
+                return self._send(200, gateway.status(kind, parts[2], query))
+            if method == "GET" and len(parts) == 4 and parts[3] == "result":
+                route = "result"
+                try:
+                    wait = float(query.pop("wait", 0))
+                except ValueError:
+                    raise GatewayError(400, "wait 必须是数字")
+                info = gateway.result(kind, parts[2], query, wait)
+                code = {"done": 200, "running": 202}.get(info["status"], 502)
+                return self._send(code, info)
+            raise GatewayError(404 if method == "GET" else 405, f"不支持的请求: {method} {url.path}")
+        except GatewayError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            if _find_cause(e, _BUSY_ERRORS) is not None:
+                self._send(503, {"error": str(e), "retryable": True}, {"Retry-After": "5"})
+            elif _find_cause(e, ValueError) is not None:
+                self._send(400, {"error": str(e)})
+            else:
+                self._send(502, {"error": str(e), "retryable": find_task_failure(e) is None})
+        finally:
+            metrics.inc("volcengine_gateway_requests_total", route=route, code=getattr(self, "_code", 0))
+            metrics.set_gauge("volcengine_gateway_request_seconds", time.monotonic() - started, route=route)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > GATEWAY_MAX_BODY:
+            raise GatewayError(413, f"请求体过大（上限 {GATEWAY_MAX_BODY} 字节）")
+        raw = self.rfile.read(length) if length else b"{}"
+        try:
+            body = json.loads(raw.decode("utf-8"))
+        except ValueError:
+            raise GatewayError(400, "请求体不是合法的JSON")
+        if not isinstance(body, dict):
+            raise GatewayError(400, "请求体必须是JSON对象")
+        return body
+
+    def _send(self, code: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self._write(code, body, "application/json; charset=utf-8", headers)
+
+    def _send_text(self, code: int, text: str):
+        self._write(code, text.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+
+    def _write(self, code: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self._code = code
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _GatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128   # 默认的监听队列（5）在突发的并发请求下会拒绝连接
+
+    def __init__(self, address: Tuple[str, int], gateway: Gateway):
+        super().__init__(address, _Handler)
+        self.gateway = gateway
+
+
+def create_server(gateway: Gateway, host: str = GATEWAY_HOST, port: int = GATEWAY_PORT) -> ThreadingHTTPServer:
+    """创建网关HTTP服务（尚未开始处理请求）"""
+    return _GatewayServer((host, port), gateway)
+
+
+def serve(gateway: Gateway, host: str = GATEWAY_HOST, port: int = GATEWAY_PORT):
+    """
+    运行网关直到收到 SIGTERM / SIGINT（只能在主线程调用）
+
+    Args:
+        gateway: 网关
+        host: 监听地址
+        port: 监听端口
+    """
+    server = create_server(gateway, host, port)
+
+    def handle(signum, frame):
+        print(f"🛑 收到信号 {signum}，停止网关...")
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle)
+    signal.signal(signal.SIGINT, handle)
+    # 启用任务所有权时，接手其他节点留下的任务（结果可通过状态/结果接口查询）
+    task_ownership.start(gateway.adopt)
+    print(f"🌐 网关已启动: http://{server.server_address[0]}:{server.server_address[1]}"
+          f"（支持: {', '.join(gateway.kinds)}）")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        task_ownership.stop()
+    print("👋 网关已停止")
@@ -0,0 +1,304 @@
+"""
+图片预检 - 上传前在本地检查并缩放图片
+
+- 只读取文件头即可得到格式和宽高（JPEG/PNG/GIF/BMP/WEBP），不做完整解码
+- 超过目标边长、文件大小或格式不受支持时，在进程池中并行缩放并重新压缩
+- 缩放依赖 Pillow（可选依赖），只做检查时不需要安装
+"""
+
+import hashlib
+import io
+import os
+import struct
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Sequence, Union
+
+import requests
+
+from ..config import IMAGE_PREFLIGHT_WORKERS, IMAGE_PREFLIGHT_QUALITY, IMAGE_HEADER_BYTES
+from .deadline import request_timeout
+
+# JPEG 中携带尺寸的 SOF 标记（排除 DHT/JPG/DAC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# 缩放结果的缓存目录
+_CACHE_DIR = os.path.join(tempfile.gettempdir(), "volcengine_preflight")
+
+
+class ImageInfo:
+    """图片基本信息（来自文件头）"""
+
+    def __init__(self, format: str, width: int, height: int, size: int):
+        self.format = format   # JPEG / PNG / GIF / BMP / WEBP
+        self.width = width
+        self.height = height
+        self.size = size       # 文件字节数
+
+    @property
+    def long_side(self) -> int:
+        return max(self.width, self.height)
+
+    @property
+    def short_side(self) -> int:
+        return min(self.width, self.height)
+
+    def __repr__(self):
+        return f"ImageInfo({self.format}, {self.width}x{self.height}, {self.size / 1024:.0f}KB)"
+
+
+def read_image_info(source: Union[str, bytes]) -> ImageInfo:
+    """
+    读取图片格式和宽高（只解析文件头）
+
+    Args:
+        source: 本地文件路径或图片数据
+
+    Returns:
+        图片信息
+
+    Raises:
+        ValueError: 无法识别的图片格式
+    """
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            return _parse_header(io.BytesIO(source), len(source))
+        with open(source, "rb") as f:
+            return _parse_header(f, os.path.getsize(source))
+    except struct.error:
+        raise ValueError("图片文件不完整，无法读取尺寸")
+
+
+def read_remote_image_info(url: str, max_bytes: int = IMAGE_HEADER_BYTES) -> Optional[ImageInfo]:
+    """
+    读取远程图片的格式和宽高（只下载文件开头部分）
+
+    Args:
+        url: 图片URL
+        max_bytes: 最多读取的字节数
+
+    Returns:
+        图片信息（size 为 Content-Length，未知时为0）；无法读取或解析时返回None，由服务端校验
+    """
+    try:
+        with requests.get(url, headers={"Range": f"bytes=0-{max_bytes - 1}"}, stream=True,
+                          timeout=request_timeout()) as response:
+            if response.status_code not in (200, 206):
+                return None
+            head = b""
+            for chunk in response.iter_content(8192):
+                head += chunk
+                if len(head) >= max_bytes:
+                    break
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if not total.isdigit():
+                total = response.headers.get("Content-Length", "") if response.status_code == 200 else ""
+        info = _parse_header(io.BytesIO(head), len(head))
+    except (requests.exceptions.RequestException, ValueError, struct.error):
+        return None
+    info.size = int(total) if total.isdigit() else 0
+    return info
+
+
+def _parse_header(f: BinaryIO, size: int) -> ImageInfo:
+    head = f.read(32)
+
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        width, height = struct.unpack(">II", head[16:24])
+        return ImageInfo("PNG", width, height, size)
+
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", head[6:10])
+        return ImageInfo("GIF", width, height, size)
+
+    if head.startswith(b"BM"):
+        width, height = struct.unpack("<ii", head[18:26])
+        return ImageInfo("BMP", width, abs(height), size)
+
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return ImageInfo("WEBP", width & 0x3FFF, height & 0x3FFF, size)
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return ImageInfo("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, size)
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return ImageInfo("WEBP", width, height, size)
+
+    if head.startswith(b"\xff\xd8"):
+        return _parse_jpeg(f, size)
+
+    raise ValueError("无法识别的图片格式（支持 JPEG/PNG/GIF/BMP/WEBP）")
+
+
+def _parse_jpeg(f: BinaryIO, size: int) -> ImageInfo:
+    """逐个跳过 JPEG 段，直到找到 SOF 段（EXIF 等大段不会被读入内存）"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            break
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            segment = f.read(5)
+            if len(segment) < 5:
+                break
+            height, width = struct.unpack(">HH", segment[1:5])
+            return ImageInfo("JPEG", width, height, size)
+        f.seek(length - 2, os.SEEK_CUR)
+    raise ValueError("JPEG文件不完整，未找到图片尺寸")
+
+
+def check_image(info: ImageInfo, max_file_size_mb: Optional[float] = None, max_side: Optional[int] = None,
+                min_side: Optional[int] = None, formats: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    按服务限制检查图片
+
+    Args:
+        info: 图片信息
+        max_file_size_mb: 文件大小上限（MB）
+        max_side: 边长上限（像素）
+        min_side: 边长下限（像素）
+        formats: 支持的格式，如 ["JPG", "JPEG", "PNG"]
+
+    Returns:
+        不符合的项目说明，全部符合时为空列表
+    """
+    problems = []
+    if max_file_size_mb and info.size > max_file_size_mb * 1024 * 1024:
+        problems.append(f"文件大小 {info.size / 1024 / 1024:.1f}MB 超过 {max_file_size_mb}MB")
+    if max_side and info.long_side > max_side:
+        problems.append(f"分辨率 {info.width}x{info.height} 超过 {max_side}px")
+    if min_side and info.short_side < min_side:
+        problems.append(f"分辨率 {info.width}x{info.height} 低于 {min_side}px")
+    if formats and not _format_supported(info.format, formats):
+        problems.append(f"格式 {info.format} 不受支持（支持 {', '.join(formats)}）")
+    return problems
+
+
+def _format_supported(image_format: str, formats: Sequence[str]) -> bool:
+    names = {name.upper() for name in formats}
+    if "JPG" in names or "JFIF" in names:
+        names.add("JPEG")
+    return image_format.upper() in names
+
+
+def preflight_images(paths: Sequence[str], max_file_size_mb: Optional[float] = None, max_side: Optional[int] = None,
+                     min_side: Optional[int] = None, formats: Optional[Sequence[str]] = None,
+                     target_side: Optional[int] = None, workers: Optional[int] = IMAGE_PREFLIGHT_WORKERS) -> List[Dict]:
+    """
+    上传前预检一批本地图片，需要时并行缩放
+
+    Args:
+        paths: 本地图片路径列表
+        max_file_size_mb: 文件大小上限（MB）
+        max_side: 边长上限（像素）
+        min_side: 边长下限（像素），低于下限直接报错（放大不会增加细节）
+        formats: 支持的格式
+        target_side: 目标边长，长边超过时缩小到该值（如换装V2的 max_process_side_length），默认等于 max_side
+        workers: 缩放进程数，默认为CPU核数
+
+    Returns:
+        每张图片的结果 {"path": 实际上传的文件, "source": 原文件, "info": ImageInfo, "resized": bool}
+
+    Raises:
+        ValueError: 图片无法识别或分辨率过低
+        ImportError: 需要缩放但未安装 Pillow
+    """
+    target_side = min(filter(None, (target_side, max_side)), default=None)
+    max_bytes = int(max_file_size_mb * 1024 * 1024) if max_file_size_mb else None
+
+    results, jobs = [], []
+    for path in paths:
+        info = read_image_info(path)
+        if min_side and info.short_side < min_side:
+            raise ValueError(f"图片 {path} 分辨率 {info.width}x{info.height} 低于 {min_side}px")
+
+        needs_resize = bool(
+            (target_side and info.long_side > target_side)
+            or (max_bytes and info.size > max_bytes)
+            or (formats and not _format_supported(info.format, formats))
+        )
+        result = {"path": path, "source": path, "info": info, "resized": needs_resize}
+        results.append(result)
+        if needs_resize:
+            jobs.append((result, (path, _cache_path(path, target_side, max_bytes), target_side, max_bytes)))
+
+    if not jobs:
+        return results
+
+    _require_pillow()
+    if len(jobs) == 1:
+        outputs = [_resize_image(*jobs[0][1])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+            outputs = list(pool.map(_resize_image, *zip(*(args for _, args in jobs))))
+
+    for (result, _), output in zip(jobs, outputs):
+        result["path"] = output
+        result["info"] = read_image_info(output)
+        print(f"🖼️ 图片已预处理: {result['source']} {result['info'].width}x{result['info'].height}, "
+              f"{result['info'].size / 1024:.0f}KB")
+    return results
+
+
+def _cache_path(path: str, target_side: Optional[int], max_bytes: Optional[int]) -> str:
+    """缩放结果的缓存文件（源文件和参数不变时复用）"""
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{target_side}|{max_bytes}"
+    return os.path.join(_CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+
+def _require_pillow():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ImportError("图片需要缩放或转换格式，请先安装 Pillow: pip install Pillow")
+
+
+def _resize_image(path: str, output: str, target_side: Optional[int], max_bytes: Optional[int]) -> str:
+    """
+    缩放并压缩为JPEG（在子进程中执行）
+
+    Returns:
+        输出文件路径
+    """
+    if os.path.exists(output):
+        return output
+
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if target_side and max(image.size) > target_side:
+            image.thumbnail((target_side, target_side), Image.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        quality = IMAGE_PREFLIGHT_QUALITY
+        while True:
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality, optimize=True)
+            if not max_bytes or buffer.tell() <= max_bytes or quality <= 50:
+                break
+            quality -= 10
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp = f"{output}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp, output)
+    return output
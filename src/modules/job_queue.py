@@ -0,0 +1,455 @@
+"""
+作业队列 - worker 模式的持久化任务队列（至少执行一次）
+
+- 作业（job）是一条待处理的生成请求：类型（kind）+ 参数，按通道（interactive / standard / bulk）排优先级
+- worker 领取作业时获得租约（lease），处理期间定期续期；进程崩溃后租约到期，作业被重新领取
+- 提交成功后把服务端任务ID写回作业，重新领取时继续轮询该任务，不会重复提交
+- 只有结果写回后作业才算完成，因此每个作业至少执行一次（极端情况下可能执行多次）
+- 失败的作业按退避间隔重试，超过最大尝试次数后标记为失败；参数错误等不可重试的错误直接失败
+
+存储后端（VOLCENGINE_JOB_QUEUE）：
+- 空或 sqlite:路径：本机 SQLite（默认 data/jobs.db），多个进程通过 BEGIN IMMEDIATE 互斥领取
+- redis://主机:端口/库：多机共享，用Lua脚本保证原子性，需要安装 redis 包
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config import (
+    JOB_QUEUE_BACKEND, JOB_QUEUE_PATH, JOB_QUEUE_KEY_PREFIX, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY, JOB_LANE_PRIORITY
+)
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - 可选依赖
+    redis = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind          TEXT NOT NULL,
+    params        TEXT NOT NULL,
+    lane          TEXT NOT NULL,
+    tenant        TEXT,
+    priority      INTEGER NOT NULL,
+    status        TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    available_at  REAL NOT NULL,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    task_id       TEXT,
+    result        TEXT,
+    error         TEXT,
+    created_at    REAL NOT NULL,
+    started_at    REAL,
+    finished_at   REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, id);
+CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (status, lease_expires);
+"""
+
+# 作业状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+STATUSES = (QUEUED, RUNNING, DONE, FAILED)
+
+
+class Job:
+    """一个作业"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.id = int(row["id"])
+        self.kind = row["kind"]
+        self.params: Dict[str, Any] = json.loads(row["params"]) if isinstance(row["params"], str) else row["params"]
+        self.lane = row["lane"]
+        self.tenant = row.get("tenant") or None
+        self.status = row["status"]
+        self.attempts = int(row.get("attempts") or 0)
+        self.max_attempts = int(row["max_attempts"])
+        self.task_id = row.get("task_id") or None
+        self.result = json.loads(row["result"]) if row.get("result") else None
+        self.error = row.get("error") or None
+        self.lease_owner = row.get("lease_owner") or None
+        self.created_at = float(row["created_at"])
+        self.finished_at = float(row["finished_at"]) if row.get("finished_at") else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """可序列化的作业信息"""
+        return {
+            "id": self.id, "kind": self.kind, "params": self.params, "lane": self.lane, "tenant": self.tenant,
+            "status": self.status, "attempts": self.attempts, "max_attempts": self.max_attempts,
+            "task_id": self.task_id, "result": self.result, "error": self.error,
+            "created_at": self.created_at, "finished_at": self.finished_at
+        }
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.kind}, {self.status}, attempts={self.attempts}/{self.max_attempts})"
+
+
+def _priority(lane: str) -> int:
+    if lane not in JOB_LANE_PRIORITY:
+        raise ValueError(f"未知的作业通道: {lane}，支持: {', '.join(JOB_LANE_PRIORITY)}")
+    return JOB_LANE_PRIORITY[lane]
+
+
+def _retry_delay(attempts: int) -> float:
+    return JOB_RETRY_DELAY * (2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    """SQLite 作业队列（线程安全，同一数据库文件可被多个进程同时使用）"""
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        """
+        Args:
+            path: 数据库文件路径（首次使用时创建）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, work):
+        """在写事务中执行 work(conn)（BEGIN IMMEDIATE，多个进程互斥）"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def enqueue(self, kind: str, params: Dict[str, Any], lane: str = "standard", tenant: Optional[str] = None,
+                max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """
+        加入作业
+
+        Args:
+            kind: 作业类型
+            params: 作业参数（需可JSON序列化）
+            lane: 通道（决定领取优先级和提交时的调度通道）
+            tenant: 租户
+            max_attempts: 最大尝试次数
+
+        Returns:
+            作业ID
+
+        Raises:
+            ValueError: 未知的通道
+        """
+        priority = _priority(lane)
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "INSERT INTO jobs (kind, params, lane, tenant, priority, status, max_attempts, available_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, json.dumps(params, ensure_ascii=False), lane, tenant, priority, QUEUED, max_attempts, now, now)
+        ).lastrowid)
+
+    def claim(self, owner: str, lease: float) -> Optional[Job]:
+        """
+        领取一个作业：优先级最高的待处理作业，或租约已过期的处理中作业
+
+        Args:
+            owner: 领取者标识（worker ID）
+            lease: 租约时长（秒）
+
+        Returns:
+            作业，没有可领取的作业时返回None
+        """
+        def work(conn):
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY priority, id LIMIT 1", (QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= row["max_attempts"]:
+                    # 租约过期的作业已用完尝试次数（多次处理中崩溃）
+                    conn.execute("UPDATE jobs SET status = ?, error = COALESCE(error, ?), finished_at = ?, "
+                                 "lease_owner = NULL WHERE id = ?",
+                                 (FAILED, "超过最大尝试次数（处理中断）", now, row["id"]))
+                    continue
+                conn.execute("UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, "
+                             "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                             (RUNNING, owner, now + lease, now, row["id"]))
+                job = dict(row)
+                job.update(status=RUNNING, attempts=row["attempts"] + 1, lease_owner=owner)
+                return Job(job)
+        return self._transaction(work)
+
+    def _owned_update(self, job_id: int, owner: str, sql: str, params: tuple) -> bool:
+        """只在作业仍由 owner 持有时更新，返回是否更新成功"""
+        return self._transaction(lambda conn: conn.execute(
+            f"UPDATE jobs SET {sql} WHERE id = ? AND status = ? AND lease_owner = ?",
+            params + (job_id, RUNNING, owner)
+        ).rowcount > 0)
+
+    def heartbeat(self, job_id: int, owner: str, lease: float) -> bool:
+        """续期租约，返回False表示作业已不归 owner 所有（已被其他 worker 领取）"""
+        return self._owned_update(job_id, owner, "lease_expires = ?", (time.time() + lease,))
+
+    def set_task(self, job_id: int, owner: str, task_id: str) -> bool:
+        """记录作业提交的服务端任务ID（重新领取时继续轮询，不再重复提交）"""
+        return self._owned_update(job_id, owner, "task_id = ?", (task_id,))
+
+    def complete(self, job_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        """写回结果并完成作业"""
+        return self._owned_update(job_id, owner, "status = ?, result = ?, error = NULL, finished_at = ?, lease_owner = NULL",
+                                  (DONE, json.dumps(result, ensure_ascii=False, default=str), time.time()))
+
+    def fail(self, job_id: int, owner: str, error: str, retry: bool = True) -> bool:
+        """
+        作业失败：还有尝试次数且可重试时按退避间隔重新排队，否则标记为失败
+
+        重新排队时清除任务ID，下次尝试重新提交。
+        """
+        def work(conn):
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                               (job_id, RUNNING, owner)).fetchone()
+            if row is None:
+                return False
+            now = time.time()
+            if retry and row["attempts"] < row["max_attempts"]:
+                conn.execute("UPDATE jobs SET status = ?, error = ?, task_id = NULL, lease_owner = NULL, "
+                             "available_at = ? WHERE id = ?",
+                             (QUEUED, error, now + _retry_delay(row["attempts"]), job_id))
+            else:
+                conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL WHERE id = ?",
+                             (FAILED, error, now, job_id))
+            return True
+        return self._transaction(work)
+
+    def release(self, job_id: int, owner: str) -> bool:
+        """交还未处理完的作业（停止时），不计入尝试次数，保留任务ID以便继续轮询"""
+        return self._owned_update(job_id, owner, "status = ?, attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+                                  "available_at = ?", (QUEUED, time.time()))
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """查询作业"""
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return Job(dict(rows[0])) if rows else None
+
+    def list(self, status: Optional[str] = None, limit: int = 20) -> List[Job]:
+        """最近的作业（可按状态过滤）"""
+        if status:
+            rows = self._query("SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit))
+        else:
+            rows = self._query("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [Job(dict(row)) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的作业数"""
+        counts = {status: 0 for status in STATUSES}
+        for row in self._query("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 领取：到期的重试作业和租约过期的作业放回就绪队列，再取出优先级最高的作业
+# KEYS: ready, delayed, leases；ARGV: 作业键前缀, 领取者, 租约秒数
+_CLAIM_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+for _, key in ipairs({KEYS[2], KEYS[3]}) do
+  for _, id in ipairs(redis.call('ZRANGEBYSCORE', key, '-inf', now)) do
+    redis.call('ZREM', key, id)
+    redis.call('ZADD', KEYS[1], redis.call('HGET', ARGV[1] .. id, 'score'), id)
+  end
+end
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if #popped == 0 then return false end
+local id = popped[1]
+local job = ARGV[1] .. id
+redis.call('HINCRBY', job, 'attempts', 1)
+redis.call('HSET', job, 'status', 'running', 'lease_owner', ARGV[2], 'lease_expires', tostring(now + tonumber(ARGV[3])))
+redis.call('HSETNX', job, 'started_at', tostring(now))
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[3]), id)
+return redis.call('HGETALL', job)
+"""
+
+# 持有者检查后更新：KEYS: 作业, ready, delayed, leases；ARGV: 作业ID, 领取者, 操作, 参数...
+_UPDATE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' or redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[2] then
+  return 0
+end
+local op = ARGV[3]
+if op == 'heartbeat' then
+  redis.call('HSET', KEYS[1], 'lease_expires', tostring(now + tonumber(ARGV[4])))
+  redis.call('ZADD', KEYS[4], now + tonumber(ARGV[4]), ARGV[1])
+elseif op == 'set_task' then
+  redis.call('HSET', KEYS[1], 'task_id', ARGV[4])
+elseif op == 'complete' then
+  redis.call('HSET', KEYS[1], 'status', 'done', 'result', ARGV[4], 'error', '', 'lease_owner', '', 'finished_at', tostring(now))
+  redis.call('ZREM', KEYS[4], ARGV[1])
+elseif op == 'fail' then
+  redis.call('ZREM', KEYS[4], ARGV[1])
+  local attempts = tonumber(redis.call('HGET', KEYS[1], 'attempts'))
+  if ARGV[5] == '1' and attempts < tonumber(redis.call('HGET', KEYS[1], 'max_attempts')) then
+    redis.call('HSET', KEYS[1], 'status', 'queued', 'error', ARGV[4], 'task_id', '', 'lease_owner', '')
+    redis.call('ZADD', KEYS[3], now + tonumber(ARGV[6]), ARGV[1])
+  else
+    redis.call('HSET', KEYS[1], 'status', 'failed', 'error', ARGV[4], 'lease_owner', '', 'finished_at', tostring(now))
+  end
+elseif op == 'release' then
+  redis.call('ZREM', KEYS[4], ARGV[1])
+  redis.call('HINCRBY', KEYS[1], 'attempts', -1)
+  redis.call('HSET', KEYS[1], 'status', 'queued', 'lease_owner', '')
+  redis.call('ZADD', KEYS[2], redis.call('HGET', KEYS[1], 'score'), ARGV[1])
+end
+return 1
+"""
+
+
+class RedisJobQueue:
+    """Redis 作业队列（多机共享，接口与 JobQueue 相同）"""
+
+    def __init__(self, url: Optional[str] = None, prefix: str = JOB_QUEUE_KEY_PREFIX, client=None):
+        """
+        Args:
+            url: 连接地址，如 redis://127.0.0.1:6379/0
+            prefix: 键前缀
+            client: 已有的客户端对象
+        """
+        if client is None:
+            if redis is None:
+                raise ImportError("Redis 作业队列需要 redis 包，请先安装: pip install redis")
+            client = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=5, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self._ready, self._delayed, self._leases = f"{prefix}ready", f"{prefix}delayed", f"{prefix}leases"
+        self._claim = client.register_script(_CLAIM_SCRIPT)
+        self._update = client.register_script(_UPDATE_SCRIPT)
+
+    def _job_key(self, job_id: int) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def _owned(self, job_id: int, owner: str, op: str, *args) -> bool:
+        keys = [self._job_key(job_id), self._ready, self._delayed, self._leases]
+        return bool(int(self._update(keys=keys, args=[job_id, owner, op] + list(args))))
+
+    def enqueue(self, kind: str, params: Dict[str, Any], lane: str = "standard", tenant: Optional[str] = None,
+                max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """加入作业（见 JobQueue.enqueue）"""
+        priority = _priority(lane)
+        job_id = int(self.client.incr(f"{self.prefix}seq"))
+        # 优先级在前、ID在后，ZPOPMIN 取出的就是优先级最高的最早作业
+        score = priority * 10 ** 12 + job_id
+        pipe = self.client.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            "id": job_id, "kind": kind, "params": json.dumps(params, ensure_ascii=False), "lane": lane,
+            "tenant": tenant or "", "status": QUEUED, "attempts": 0, "max_attempts": max_attempts,
+            "score": score, "created_at": time.time()
+        })
+        pipe.zadd(self._ready, {job_id: score})
+        pipe.execute()
+        return job_id
+
+    def claim(self, owner: str, lease: float) -> Optional[Job]:
+        """领取一个作业（见 JobQueue.claim）"""
+        while True:
+            values = self._claim(keys=[self._ready, self._delayed, self._leases], args=[f"{self.prefix}job:", owner, lease])
+            if not values:
+                return None
+            job = Job(dict(zip(values[::2], values[1::2])))
+            if job.attempts > job.max_attempts:
+                self._owned(job.id, owner, "fail", "超过最大尝试次数（处理中断）", 0, 0)
+                continue
+            return job
+
+    def heartbeat(self, job_id: int, owner: str, lease: float) -> bool:
+        return self._owned(job_id, owner, "heartbeat", lease)
+
+    def set_task(self, job_id: int, owner: str, task_id: str) -> bool:
+        return self._owned(job_id, owner, "set_task", task_id)
+
+    def complete(self, job_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        return self._owned(job_id, owner, "complete", json.dumps(result, ensure_ascii=False, default=str))
+
+    def fail(self, job_id: int, owner: str, error: str, retry: bool = True) -> bool:
+        job = self.get(job_id)
+        delay = _retry_delay(job.attempts) if job else JOB_RETRY_DELAY
+        return self._owned(job_id, owner, "fail", error, 1 if retry else 0, delay)
+
+    def release(self, job_id: int, owner: str) -> bool:
+        return self._owned(job_id, owner, "release")
+
+    def get(self, job_id: int) -> Optional[Job]:
+        values = self.client.hgetall(self._job_key(job_id))
+        return Job(values) if values else None
+
+    def list(self, status: Optional[str] = None, limit: int = 20) -> List[Job]:
+        """最近的作业（按ID倒序扫描）"""
+        jobs = []
+        job_id = int(self.client.get(f"{self.prefix}seq") or 0)
+        while job_id > 0 and len(jobs) < limit:
+            job = self.get(job_id)
+            if job is not None and (status is None or job.status == status):
+                jobs.append(job)
+            job_id -= 1
+        return jobs
+
+    def stats(self) -> Dict[str, int]:
+        """待处理和处理中的作业数（已结束的作业不单独计数）"""
+        return {
+            QUEUED: int(self.client.zcard(self._ready)) + int(self.client.zcard(self._delayed)),
+            RUNNING: int(self.client.zcard(self._leases))
+        }
+
+    def close(self):
+        self.client.close()
+
+
+def create_job_queue(spec: str = JOB_QUEUE_BACKEND):
+    """
+    按配置创建作业队列
+
+    Args:
+        spec: 空（默认SQLite路径） / sqlite:路径 / redis://...
+
+    Raises:
+        ValueError: 不支持的配置
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return JobQueue(JOB_QUEUE_PATH)
+    if spec.startswith("sqlite:"):
+        return JobQueue(spec[len("sqlite:"):])
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobQueue(spec)
+    raise ValueError(f"不支持的作业队列: {spec}，支持: sqlite:路径, redis://主机:端口/库")
@@ -0,0 +1,282 @@
+"""
+作业 worker - 长期运行的进程，从作业队列领取作业并处理
+
+每个进程使用一套共享的客户端、共享的轮询调度器（poll_scheduler）和资源存储（asset_store）：
+1. 领取作业（带租约），在作业的通道/租户调度范围内提交任务，把任务ID写回作业
+2. 等待交给 poll_scheduler，等待中的作业不占用线程，并发作业数只受 concurrency 限制
+3. 任务完成后下载结果视频，把结果写回作业
+后台线程定期为处理中的作业续期租约；续期失败说明作业已被其他 worker 领取，本地停止处理。
+
+优雅停止（SIGTERM / SIGINT）：不再领取新作业，等待处理中的作业完成（最多 drain_timeout 秒），
+仍未完成的作业交还队列（保留任务ID，其他 worker 继续轮询，不重复提交）。
+"""
+
+import math
+import os
+import signal
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from ..config import (
+    JOB_WORKER_CONCURRENCY, JOB_LEASE_SECONDS, JOB_POLL_INTERVAL, JOB_DRAIN_TIMEOUT, JOB_TIMEOUT, JOB_OUTPUT_DIR
+)
+from ..core.task_waiter import find_task_failure, poll_scheduler
+from .asset_store import asset_store
+from .deadline import Deadline
+from .fair_scheduler import scheduling_scope
+from .job_queue import Job
+from .metrics import metrics
+from .result_mirror import extract_result_urls
+from .task_ownership import task_ownership
+
+
+def _permanent(error: BaseException) -> bool:
+    """重试也不会成功的错误：参数错误、服务端任务失败（retryable = False）"""
+    return isinstance(error, ValueError) or find_task_failure(error) is not None or \
+        getattr(error, "retryable", True) is False
+
+
+def _max_wait(params: Dict[str, Any]) -> float:
+    """
+    作业的最长等待时间（秒）：参数 max_wait_time，未设置时为 JOB_TIMEOUT
+
+    命令行 --param k=v 入队的作业参数是字符串，这里统一转换。
+
+    Raises:
+        ValueError: max_wait_time 不是正数
+    """
+    value = params.get("max_wait_time")
+    if value is None or value == "":
+        return JOB_TIMEOUT
+    try:
+        timeout = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"max_wait_time 必须是正数: {value!r}")
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise ValueError(f"max_wait_time 必须是正数: {value!r}")
+    return timeout
+
+
+class JobWorker:
+    """单个进程内的作业处理循环"""
+
+    def __init__(self, queue, runner, concurrency: int = JOB_WORKER_CONCURRENCY, lease: float = JOB_LEASE_SECONDS,
+                 poll_interval: float = JOB_POLL_INTERVAL, drain_timeout: float = JOB_DRAIN_TIMEOUT,
+                 output_dir: Optional[str] = JOB_OUTPUT_DIR, worker_id: Optional[str] = None):
+        """
+        Args:
+            queue: 作业队列（JobQueue / RedisJobQueue）
+            runner: 作业执行器，提供 submit_job(kind, params) -> 任务ID 和 job_poller(kind, task_id, params) -> PollJob
+            concurrency: 同时处理的作业数
+            lease: 作业租约（秒）
+            poll_interval: 队列为空时的领取间隔（秒）
+            drain_timeout: 停止时等待处理中作业的最长时间（秒）
+            output_dir: 结果视频的保存目录，None 表示只放入资源存储
+            worker_id: worker 标识（默认 主机名:进程号:随机串）
+        """
+        self.queue = queue
+        self.runner = runner
+        self.concurrency = concurrency
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.output_dir = output_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._active: Dict[int, threading.Event] = {}   # 处理中的作业 -> 取消事件
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="volc-job")
+        self.processed = 0
+
+    def stop(self):
+        """请求停止（不再领取新作业，run() 在处理中的作业结束或交还后返回）"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def install_signal_handlers(self):
+        """收到 SIGTERM / SIGINT 时优雅停止（只能在主线程调用）"""
+        def handle(signum, frame):
+            print(f"🛑 收到信号 {signum}，停止领取新作业，等待处理中的作业完成...")
+            self.stop()
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
+
+    def run(self, max_jobs: Optional[int] = None):
+        """
+        处理作业直到被停止
+
+        Args:
+            max_jobs: 领取这么多作业后停止（None 表示一直运行）
+        """
+        print(f"👷 worker {self.worker_id} 已启动（并发 {self.concurrency}）")
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="volc-job-heartbeat", daemon=True)
+        heartbeat.start()
+        task_ownership.start(self._adopt)
+        claimed = 0
+        try:
+            while not self._stop.is_set() and (max_jobs is None or claimed < max_jobs):
+                with self._cond:
+                    while len(self._active) >= self.concurrency and not self._stop.is_set():
+                        self._cond.wait()
+                if self._stop.is_set():
+                    break
+                try:
+                    job = self.queue.claim(self.worker_id, self.lease)
+                except Exception as e:
+                    print(f"⚠️ 领取作业失败: {str(e)}")
+                    job = None
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                claimed += 1
+                self._start(job)
+        finally:
+            self._drain()
+            self._stop.set()
+            self._executor.shutdown(wait=False)
+            task_ownership.stop()
+        print(f"👋 worker {self.worker_id} 已停止（处理 {self.processed} 个作业）")
+
+    def _start(self, job: Job):
+        cancel_event = threading.Event()
+        with self._cond:
+            self._active[job.id] = cancel_event
+        metrics.set_gauge("volcengine_job_worker_active", len(self._active))
+        resumed = f"，继续轮询任务 {job.task_id}" if job.task_id else ""
+        print(f"📥 领取作业 {job.id}（{job.kind}，{job.lane}，第 {job.attempts} 次{resumed}）")
+        self._executor.submit(self._submit_stage, job, cancel_event)
+
+    def _submit_stage(self, job: Job, cancel_event: threading.Event):
+        """提交任务（或沿用已提交的任务）并交给共享轮询调度器"""
+        try:
+            # 参数错误在提交前发现，作业直接失败，不会留下无人等待的任务
+            timeout = _max_wait(job.params)
+            task_id = job.task_id
+            if not task_id:
+                with scheduling_scope(job.lane, job.tenant):
+                    task_id = str(self.runner.submit_job(job.kind, job.params))
+                task_ownership.register(task_id, job.kind, job.params)
+                if not self.queue.set_task(job.id, self.worker_id, task_id):
+                    return self._done(job, "lost")
+                job.task_id = task_id
+            poller = self.runner.job_poller(job.kind, task_id, job.params)
+            future = poll_scheduler.submit(poller, Deadline(timeout), cancel_event)
+        except Exception as e:
+            return self._settle(job, error=e)
+        future.add_done_callback(lambda f: self._on_polled(job, f, cancel_event))
+
+    def _on_polled(self, job: Job, future: Future, cancel_event: threading.Event):
+        try:
+            self._executor.submit(self._finish_stage, job, future, cancel_event)
+        except RuntimeError:  # 已停止，作业已交还队列
+            pass
+
+    def _finish_stage(self, job: Job, future: Future, cancel_event: threading.Event):
+        """下载结果并写回作业"""
+        if cancel_event.is_set() or future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            return self._settle(job, error=error)
+        result = future.result() or {}
+        try:
+            output = self._download(job, result)
+        except Exception as e:
+            return self._settle(job, error=e)
+        self._settle(job, result={"task_id": job.task_id, "output": output, "response": result})
+
+    def _download(self, job: Job, result: Dict[str, Any]) -> Optional[str]:
+        """把结果视频（换装作业为第一张结果图片）放入资源存储（并保存到输出目录），返回本地路径"""
+        urls = extract_result_urls(result)
+        item = next((item for item in urls if item["field"] == "video_url"), None) or \
+            next((item for item in urls if item["field"] == "image_urls"), None)
+        if item is None:
+            return None
+        extension = ".mp4" if item["field"] == "video_url" else ".png"
+        filename = job.params.get("output")
+        if not filename and self.output_dir:
+            filename = os.path.join(self.output_dir, f"{job.kind}_{job.id}{extension}")
+        if filename:
+            os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        asset = asset_store.fetch(item["url"], filename, task_id=job.task_id, deadline=Deadline(JOB_TIMEOUT),
+                                  extension=extension)
+        return filename or asset.path
+
+    def _settle(self, job: Job, result: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None):
+        """写回结果或失败（作业已不归本 worker 时忽略）"""
+        try:
+            if error is None:
+                owned = self.queue.complete(job.id, self.worker_id, result)
+                outcome = "done"
+                print(f"✅ 作业 {job.id} 完成" + (f": {result['output']}" if result.get("output") else ""))
+            else:
+                retry = not _permanent(error)
+                owned = self.queue.fail(job.id, self.worker_id, str(error), retry=retry)
+                outcome = "retry" if retry and job.attempts < job.max_attempts else "failed"
+                print(f"❌ 作业 {job.id} 失败（{'稍后重试' if outcome == 'retry' else '不再重试'}）: {str(error)}")
+        except Exception as e:
+            # 写回失败：租约到期后作业会被重新领取（至少执行一次）
+            print(f"⚠️ 作业 {job.id} 结果写回失败，租约到期后将重新处理: {str(e)}")
+            owned, outcome = True, "unsaved"
+        self._done(job, outcome if owned else "lost")
+
+    def _done(self, job: Job, outcome: str):
+        metrics.inc("volcengine_jobs_processed_total", kind=job.kind, outcome=outcome)
+        with self._cond:
+            self._active.pop(job.id, None)
+            self.processed += 1
+            self._cond.notify_all()
+        metrics.set_gauge("volcengine_job_worker_active", len(self._active))
+
+    def _adopt(self, kind: str, task_id: str, params: Dict[str, Any]):
+        """接手其他节点留下的任务：只轮询到结束（结果写入任务记录），不对应作业"""
+        poll_scheduler.submit(self.runner.job_poller(kind, task_id, params), Deadline(JOB_TIMEOUT))
+
+    def _heartbeat_loop(self):
+        """续期处理中作业的租约；作业已被其他 worker 领取时停止本地处理"""
+        while not self._stop.wait(self.lease / 3):
+            self._heartbeat()
+
+    def _heartbeat(self):
+        with self._cond:
+            active = list(self._active.items())
+        for job_id, cancel_event in active:
+            try:
+                owned = self.queue.heartbeat(job_id, self.worker_id, self.lease)
+            except Exception as e:
+                print(f"⚠️ 作业 {job_id} 续期失败: {str(e)}")
+                continue
+            if not owned:
+                print(f"⚠️ 作业 {job_id} 的租约已失效，停止处理")
+                cancel_event.set()
+                with self._cond:
+                    self._active.pop(job_id, None)
+                    self._cond.notify_all()
+
+    def _drain(self):
+        """等待处理中的作业完成，超时后交还队列"""
+        deadline = Deadline(self.drain_timeout)
+        with self._cond:
+            if self._active:
+                print(f"⏳ 等待 {len(self._active)} 个处理中的作业完成（最多 {self.drain_timeout:.0f} 秒）...")
+            while self._active and not deadline.expired():
+                self._cond.wait(min(deadline.remaining(), self.lease / 3))
+                if self._active:
+                    self._cond.release()
+                    try:
+                        self._heartbeat()   # 停止期间继续续期
+                    finally:
+                        self._cond.acquire()
+            remaining = list(self._active.items())
+            self._active.clear()
+        for job_id, cancel_event in remaining:
+            cancel_event.set()
+            try:
+                self.queue.release(job_id, self.worker_id)
+                print(f"↩️ 作业 {job_id} 未完成，已交还队列")
+            except Exception as e:
+                print(f"⚠️ 作业 {job_id} 交还失败，租约到期后将重新处理: {str(e)}")
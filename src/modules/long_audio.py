@@ -0,0 +1,268 @@
+"""
+长音频模式 - 超过服务时长上限的音频按静音切分、并行渲染后按顺序拼接
+
+- 用 NumPy 按帧计算 RMS 能量（向量化），按最少段数均分，在均分位置附近选择最安静的位置切分
+- 各片段上传后同时提交渲染，共用同一形象/图片，总耗时接近单个片段的渲染时间
+- 渲染结果按顺序下载并用 ffmpeg 无损拼接
+
+需要 NumPy（可选依赖）；非WAV音频的解码和视频拼接需要 ffmpeg。
+服务只接受公网URL，切分出的音频片段通过调用方提供的 uploader(本地路径) -> URL 上传。
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import LONG_AUDIO_SAMPLE_RATE, LONG_AUDIO_MARGIN, LONG_AUDIO_MAX_PARALLEL
+from ..utils import download_file, format_duration, validate_url
+from .deadline import Deadline, deadline_scope
+from .ffmpeg_tools import decode_audio, concat_videos
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+
+class AudioSegment:
+    """切分出的音频片段"""
+
+    def __init__(self, index: int, start: float, end: float, path: str, count: int = 1):
+        self.index = index
+        self.count = count   # 片段总数
+        self.start = start   # 在原音频中的起点（秒）
+        self.end = end       # 在原音频中的终点（秒）
+        self.path = path     # 片段文件（WAV）
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"AudioSegment({self.index}, {self.start:.2f}-{self.end:.2f}s)"
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("长音频模式需要 NumPy，请先安装: pip install numpy")
+
+
+def load_audio(source: str, sample_rate: int = LONG_AUDIO_SAMPLE_RATE) -> Tuple["np.ndarray", int]:
+    """
+    读取音频为 int16 数组
+
+    16位PCM的本地WAV直接读取（保留原采样率和声道），其他格式用 ffmpeg 解码为单声道。
+
+    Args:
+        source: 本地文件路径或URL
+        sample_rate: ffmpeg 解码时的采样率
+
+    Returns:
+        (形状为 (采样数, 声道数) 的数组, 采样率)
+    """
+    _require_numpy()
+    if os.path.isfile(source):
+        try:
+            with wave.open(source, "rb") as wav:
+                if wav.getsampwidth() == 2 and wav.getcomptype() == "NONE":
+                    frames = wav.readframes(wav.getnframes())
+                    samples = np.frombuffer(frames, dtype="<i2").reshape(-1, wav.getnchannels())
+                    return samples, wav.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    pcm = decode_audio(source, sample_rate)
+    return np.frombuffer(pcm, dtype="<i2").reshape(-1, 1), sample_rate
+
+
+def find_split_points(samples: "np.ndarray", sample_rate: int, max_seconds: float,
+                      slack_ratio: float = 0.2, frame_ms: int = 20, smooth_ms: int = 300) -> List[int]:
+    """
+    查找切分位置：按最少段数均分，每个切分点在均分位置附近选能量最低处，且每段不超过 max_seconds
+
+    各段并行处理时总耗时取决于最长的一段，所以尽量均分，而不是每段都用满上限。
+
+    Args:
+        samples: 音频数组 (采样数, 声道数)
+        sample_rate: 采样率
+        max_seconds: 每段最长时长
+        slack_ratio: 切分点可偏离均分位置的范围（占平均段长的比例）
+        frame_ms: 能量分析的帧长（毫秒）
+        smooth_ms: 能量平滑窗口（毫秒），选择持续安静的位置而不是单个静音帧
+
+    Returns:
+        切分位置（采样序号），不含起点和终点
+    """
+    _require_numpy()
+    frame = max(1, sample_rate * frame_ms // 1000)
+    max_frames = int(max_seconds * sample_rate) // frame
+    # 不足一帧的尾部补零，保证最后一段也按整帧计算时长
+    frames = -(-len(samples) // frame)
+    if frames <= max_frames:
+        return []
+
+    mono = np.zeros(frames * frame, dtype=np.float32)
+    mono[:len(samples)] = samples.astype(np.float32).mean(axis=1)
+    rms = np.sqrt(np.mean(mono.reshape(frames, frame) ** 2, axis=1))
+    window = max(1, smooth_ms // frame_ms)
+    smooth = np.convolve(rms, np.ones(window, dtype=np.float32) / window, mode="same")
+
+    cuts, start = [], 0
+    while frames - start > max_frames:
+        remaining = frames - start
+        shards = -(-remaining // max_frames)
+        target = remaining / shards
+        slack = max(1, int(target * slack_ratio))
+        # 切分后剩余部分仍需能分成 shards - 1 段
+        low = max(start + 1, int(start + target) - slack, frames - (shards - 1) * max_frames)
+        high = max(min(start + max_frames, int(start + target) + slack) + 1, low + 1)
+        cut = low + int(np.argmin(smooth[low:high]))
+        cuts.append(cut)
+        start = cut
+    return [cut * frame for cut in cuts]
+
+
+def split_audio(source: str, max_seconds: float, output_dir: str) -> List[AudioSegment]:
+    """
+    按静音位置切分音频，每段写为WAV文件
+
+    Args:
+        source: 本地文件路径或URL
+        max_seconds: 每段最长时长
+        output_dir: 片段输出目录
+
+    Returns:
+        音频片段列表（按时间顺序）
+    """
+    samples, sample_rate = load_audio(source)
+    bounds = [0] + find_split_points(samples, sample_rate, max_seconds) + [len(samples)]
+
+    os.makedirs(output_dir, exist_ok=True)
+    segments = []
+    for index, (begin, end) in enumerate(zip(bounds, bounds[1:])):
+        path = os.path.join(output_dir, f"audio_{index:03d}.wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(samples.shape[1])
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(samples[begin:end].astype("<i2").tobytes())
+        segments.append(AudioSegment(index, begin / sample_rate, end / sample_rate, path, len(bounds) - 1))
+    return segments
+
+
+def render_long_audio(audio: str, max_seconds: float, submit: Callable[[str, AudioSegment], Any],
+                      uploader: Optional[Callable[[str], str]], output: str,
+                      max_parallel: int = LONG_AUDIO_MAX_PARALLEL, workdir: Optional[str] = None,
+                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    切分长音频、并行渲染各片段并拼接成一个视频
+
+    Args:
+        audio: 音频本地路径或URL
+        max_seconds: 服务允许的音频时长上限（每段会再短 LONG_AUDIO_MARGIN 秒）
+        submit: 提交一个片段的函数 submit(音频URL, 片段) -> TaskHandle，结果中需包含 video_url
+        uploader: 上传片段的函数 uploader(本地路径) -> 公网URL（音频本身是URL且无需切分时可以不提供）
+        output: 输出视频路径
+        max_parallel: 同时渲染的片段数
+        workdir: 中间文件目录，默认新建临时目录（结束后删除）
+        deadline: 截止时间
+
+    Returns:
+        {"video_path": 输出路径, "duration": 总时长, "elapsed": 耗时, "segments": [各片段信息]}
+
+    Raises:
+        Exception: 任一片段渲染失败（其余片段的等待会被取消）
+    """
+    started = time.monotonic()
+    created = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="volcengine_long_audio_")
+    futures = []
+    try:
+        segments = split_audio(audio, max(1.0, max_seconds - LONG_AUDIO_MARGIN), workdir)
+        total = segments[-1].end if segments else 0.0
+        print(f"🎵 音频时长 {format_duration(total)}，切分为 {len(segments)} 段并行渲染")
+        # 无需切分的URL音频直接使用原地址
+        reuse_source = len(segments) == 1 and validate_url(audio)
+        if uploader is None and not reuse_source:
+            raise ValueError("长音频需要切分上传，请提供 uploader(本地路径) -> 公网URL")
+
+        lock = threading.Lock()
+        handles = {}
+        failed = []
+
+        def render(segment: AudioSegment) -> Dict[str, Any]:
+            with deadline_scope(deadline) as scoped:
+                if failed:
+                    raise Exception("其他片段已失败，跳过")
+                audio_url = audio if reuse_source else uploader(segment.path)
+                handle = submit(audio_url, segment)
+                with lock:
+                    handles[segment.index] = handle
+                    if failed:
+                        # 提交期间其他片段已失败：取消刚提交的任务，不再等待
+                        handle.cancel()
+                        raise Exception("其他片段已失败，跳过")
+                remaining = scoped.remaining() if scoped else None
+                result = handle.result(remaining)
+                video_url = result.get("video_url")
+                if not video_url:
+                    raise Exception(f"片段结果中没有视频URL: {result}")
+                video_path = download_file(video_url, os.path.join(workdir, f"video_{segment.index:03d}.mp4"))
+                print(f"✅ 第 {segment.index + 1}/{len(segments)} 段完成 "
+                      f"({format_duration(segment.start)} - {format_duration(segment.end)})")
+                return {"index": segment.index, "start": segment.start, "end": segment.end,
+                        "audio_url": audio_url, "task_id": str(handle), "video_url": video_url,
+                        "video_path": video_path}
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(segments))),
+                                  thread_name_prefix="volc-long-audio")
+        futures = [pool.submit(render, segment) for segment in segments]
+        results = []
+        try:
+            for segment, future in zip(segments, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    with lock:
+                        failed.append(segment.index)
+                        pending = list(handles.values())
+                    for handle in pending:
+                        handle.cancel()
+                    raise Exception(f"第 {segment.index + 1} 段渲染失败: {str(e)}") from e
+        finally:
+            # 失败时不等待仍在上传、提交或下载的片段（它们的任务已取消或会在提交后立即取消）
+            pool.shutdown(wait=len(results) == len(segments), cancel_futures=True)
+
+        if len(results) == 1:
+            os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+            shutil.move(results[0]["video_path"], output)
+        else:
+            concat_videos([result["video_path"] for result in results], output)
+        elapsed = time.monotonic() - started
+        print(f"🎬 长音频视频已拼接: {output}（耗时 {format_duration(elapsed)}）")
+        return {"video_path": output, "duration": total, "elapsed": elapsed, "segments": results}
+    finally:
+        if created:
+            _remove_when_done(futures, workdir)
+
+
+def _remove_when_done(futures: List[Future], path: str):
+    """所有片段结束后删除自动创建的中间文件目录（失败时仍在运行的片段结束后再删除）"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            shutil.rmtree(path, ignore_errors=True)
+
+    if not futures:
+        shutil.rmtree(path, ignore_errors=True)
+    for future in futures:
+        future.add_done_callback(done)
@@ -0,0 +1,419 @@
+"""
+媒体探测 - 提交前通过HTTP Range请求读取音视频的时长、编码和分辨率
+
+- 只下载解析所需的字节：WAV 的 fmt/data 块头、MP3 的首帧（含 Xing/VBRI 头）、
+  MP4/M4A/MOV 的 moov 盒（moov 在文件末尾时跳过 mdat 直接读取）
+- 结果按URL缓存，过期后带 ETag 条件请求重新验证，文件未变时不再解析
+- 无法探测（服务器不可达、格式不支持等）时返回None，由服务端校验
+"""
+
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+
+from ..config import MEDIA_PROBE_HEAD_BYTES, MEDIA_PROBE_MAX_MOOV, MEDIA_PROBE_CACHE_SIZE, MEDIA_PROBE_CACHE_TTL
+from .deadline import request_timeout
+from .metrics import metrics
+
+
+class MediaInfo:
+    """音视频基本信息"""
+
+    def __init__(self, format: str, duration: Optional[float], codec: Optional[str] = None,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 sample_rate: Optional[int] = None, size: Optional[int] = None):
+        self.format = format            # MP3 / WAV / MP4
+        self.duration = duration        # 时长（秒）
+        self.codec = codec              # 如 mp3 / pcm / mp4a / avc1
+        self.width = width              # 视频宽度（纯音频为None）
+        self.height = height
+        self.sample_rate = sample_rate  # 音频采样率
+        self.size = size                # 文件字节数
+
+    @property
+    def has_video(self) -> bool:
+        return bool(self.width and self.height)
+
+    def __repr__(self):
+        duration = "?" if self.duration is None else f"{self.duration:.2f}s"
+        video = f", {self.width}x{self.height}" if self.has_video else ""
+        return f"MediaInfo({self.format}, {duration}, codec={self.codec}{video})"
+
+
+class MediaLimitError(ValueError):
+    """音视频不符合服务限制（重试也不会成功）"""
+
+    retryable = False
+
+
+class _NotModified(Exception):
+    """条件请求返回304，缓存仍然有效"""
+
+
+class _RangeReader:
+    """按需通过Range请求读取远程文件，首个数据块缓存在内存中"""
+
+    def __init__(self, url: str, etag: Optional[str] = None):
+        self.url = url
+        self.etag = etag
+        self.size: Optional[int] = None
+        self.requests = 0
+        self._head = b""
+        self._ranges_supported = True
+
+    def open(self, length: int = MEDIA_PROBE_HEAD_BYTES) -> bytes:
+        """
+        读取文件开头，同时得到文件大小和ETag
+
+        Raises:
+            _NotModified: 文件未变化（使用了缓存的ETag）
+        """
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        self._head = self._fetch(0, length, headers, first=True)
+        return self._head
+
+    def read(self, offset: int, length: int) -> bytes:
+        """读取指定范围（超出文件末尾时返回较短的数据）"""
+        if offset + length <= len(self._head) or self._head_is_whole():
+            return self._head[offset:offset + length]
+        if not self._ranges_supported:
+            # 不能再发起范围读取时只返回已读到的部分
+            if offset < len(self._head):
+                return self._head[offset:offset + length]
+            raise ValueError("服务器不支持Range请求")
+        return self._fetch(offset, length)
+
+    def _head_is_whole(self) -> bool:
+        """首个数据块是否已包含整个文件"""
+        return self.size is not None and len(self._head) >= self.size
+
+    def _fetch(self, offset: int, length: int, extra_headers: Optional[Dict] = None, first: bool = False) -> bytes:
+        headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+        headers.update(extra_headers or {})
+        self.requests += 1
+        with requests.get(self.url, headers=headers, stream=True, timeout=request_timeout()) as response:
+            if response.status_code == 304:
+                raise _NotModified()
+            if response.status_code not in (200, 206):
+                raise ValueError(f"HTTP {response.status_code}")
+            if first:
+                self.etag = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if response.status_code == 206 and total.isdigit():
+                self.size = int(total)
+            elif response.status_code == 200:
+                # 服务器忽略了Range：只读取需要的部分，之后不再发起范围读取
+                self._ranges_supported = False
+                length_header = response.headers.get("Content-Length", "")
+                self.size = int(length_header) if length_header.isdigit() else None
+            skip = offset if response.status_code == 200 else 0
+            data = b""
+            for chunk in response.iter_content(65536):
+                data += chunk
+                if len(data) >= skip + length:
+                    break
+        return data[skip:skip + length]
+
+
+class MediaProbe:
+    """带缓存的媒体探测器（线程安全）"""
+
+    def __init__(self, cache_size: int = MEDIA_PROBE_CACHE_SIZE, ttl: float = MEDIA_PROBE_CACHE_TTL):
+        """
+        Args:
+            cache_size: 最多缓存的URL数
+            ttl: 缓存免验证的时间（秒），过期后带ETag重新验证
+        """
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # url -> (MediaInfo, etag, 验证时间)
+        self._cache: "OrderedDict[str, Tuple[MediaInfo, Optional[str], float]]" = OrderedDict()
+
+    def probe(self, url: str) -> Optional[MediaInfo]:
+        """
+        探测远程音视频
+
+        Args:
+            url: 音视频URL
+
+        Returns:
+            媒体信息，无法探测时返回None
+        """
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached:
+                self._cache.move_to_end(url)
+        if cached and time.monotonic() - cached[2] < self.ttl:
+            metrics.inc("volcengine_media_probe_total", result="cached")
+            return cached[0]
+
+        reader = _RangeReader(url, etag=cached[1] if cached else None)
+        try:
+            info = _parse(reader)
+        except _NotModified:
+            metrics.inc("volcengine_media_probe_total", result="revalidated")
+            self._store(url, cached[0], cached[1])
+            return cached[0]
+        except (requests.exceptions.RequestException, ValueError, struct.error, IndexError) as e:
+            metrics.inc("volcengine_media_probe_total", result="failed")
+            print(f"⚠️ 无法探测媒体信息，交由服务端校验: {url} ({e})")
+            return None
+
+        metrics.inc("volcengine_media_probe_total", result="probed")
+        metrics.inc("volcengine_media_probe_requests_total", reader.requests)
+        self._store(url, info, reader.etag)
+        return info
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    def _store(self, url: str, info: MediaInfo, etag: Optional[str]):
+        with self._lock:
+            self._cache[url] = (info, etag, time.monotonic())
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+def check_duration(info: Optional[MediaInfo], max_seconds: Optional[float] = None,
+                   min_seconds: Optional[float] = None, what: str = "音频") -> Optional[str]:
+    """
+    检查时长
+
+    Args:
+        info: 媒体信息（None 或时长未知时视为通过）
+        max_seconds: 时长上限
+        min_seconds: 时长下限
+        what: 说明中使用的名称
+
+    Returns:
+        不符合时的说明，符合时返回None
+    """
+    if info is None or info.duration is None:
+        return None
+    if max_seconds is not None and info.duration > max_seconds:
+        return f"{what}时长 {info.duration:.1f} 秒，超过上限 {max_seconds} 秒"
+    if min_seconds is not None and info.duration < min_seconds:
+        return f"{what}时长 {info.duration:.1f} 秒，低于下限 {min_seconds} 秒"
+    return None
+
+
+# ---------------------------------------------------------------------------
+# 格式解析
+# ---------------------------------------------------------------------------
+
+def _parse(reader: _RangeReader) -> MediaInfo:
+    head = reader.open()
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return _parse_wav(reader)
+    if len(head) >= 8 and head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+        return _parse_mp4(reader)
+    if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return _parse_mp3(reader, head)
+    raise ValueError("不支持的媒体格式（支持 MP3/WAV/M4A/MP4/MOV）")
+
+
+def _parse_wav(reader: _RangeReader) -> MediaInfo:
+    offset = 12
+    byte_rate = sample_rate = audio_format = None
+    for _ in range(64):
+        header = reader.read(offset, 8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = header[:4], struct.unpack("<I", header[4:8])[0]
+        if chunk_id == b"fmt ":
+            audio_format, _, sample_rate, byte_rate = struct.unpack("<HHII", reader.read(offset + 8, 12))
+        elif chunk_id == b"data":
+            if not byte_rate:
+                break
+            # 流式写入的WAV可能把data大小记为0或0xFFFFFFFF
+            if chunk_size in (0, 0xFFFFFFFF) and reader.size:
+                chunk_size = reader.size - offset - 8
+            codec = {1: "pcm", 3: "pcm_float", 6: "alaw", 7: "mulaw"}.get(audio_format, f"wav_{audio_format}")
+            return MediaInfo("WAV", chunk_size / byte_rate, codec, sample_rate=sample_rate, size=reader.size)
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError("WAV文件缺少fmt或data块")
+
+
+# MPEG音频比特率表（kbps），键为 (是否MPEG1, 层)
+_MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# 采样率表，键为版本位（3: MPEG1, 2: MPEG2, 0: MPEG2.5）
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _mp3_frame(data: bytes, pos: int) -> Optional[Tuple[int, int, int, int, bool, bool]]:
+    """解析帧头，返回 (帧长, 比特率kbps, 采样率, 每帧采样数, 是否MPEG1, 是否单声道)"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, rate_index, padding = b2 >> 4, (b2 >> 2) & 3, (b2 >> 1) & 1
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index]
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return length, bitrate, sample_rate, samples, mpeg1, (b3 >> 6) == 3
+
+
+def _parse_mp3(reader: _RangeReader, head: bytes) -> MediaInfo:
+    offset = 0
+    if head[:3] == b"ID3":
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        offset = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+
+    data = reader.read(offset, MEDIA_PROBE_HEAD_BYTES)
+    # 找到第一个后面紧跟着另一个有效帧的帧头，避免把数据中的0xFF误认为同步字
+    for pos in range(len(data) - 4):
+        frame = _mp3_frame(data, pos)
+        if frame and (pos + frame[0] + 4 > len(data) or _mp3_frame(data, pos + frame[0])):
+            break
+    else:
+        raise ValueError("未找到MP3帧")
+
+    length, bitrate, sample_rate, samples, mpeg1, mono = frame
+    codec = "mp3"
+
+    # VBR文件：Xing/Info 或 VBRI 头中记录了总帧数
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = pos + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+        if flags & 1:
+            frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+            return MediaInfo("MP3", frames * samples / sample_rate, codec, sample_rate=sample_rate, size=reader.size)
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI":
+        frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+        return MediaInfo("MP3", frames * samples / sample_rate, codec, sample_rate=sample_rate, size=reader.size)
+
+    # CBR文件：按文件大小和比特率估算
+    if not reader.size:
+        raise ValueError("无法获取文件大小")
+    duration = (reader.size - offset - pos) * 8 / (bitrate * 1000)
+    return MediaInfo("MP3", duration, codec, sample_rate=sample_rate, size=reader.size)
+
+
+def _boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """遍历 [start, end) 范围内的盒，返回 (类型, 内容起点, 内容终点)"""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _child(data: bytes, start: int, end: int, box_type: bytes) -> Optional[Tuple[int, int]]:
+    for found, body_start, body_end in _boxes(data, start, end):
+        if found == box_type:
+            return body_start, body_end
+    return None
+
+
+def _find_moov(reader: _RangeReader) -> bytes:
+    """沿顶层盒查找 moov，只读取盒头，跳过 mdat"""
+    offset = 0
+    for _ in range(64):
+        header = reader.read(offset, 16)
+        if len(header) < 8:
+            break
+        size, box_type = struct.unpack(">I4s", header[:8])
+        header_size = 8
+        if size == 1:
+            size, header_size = struct.unpack(">Q", header[8:16])[0], 16
+        elif size == 0:
+            if reader.size is None:
+                break
+            size = reader.size - offset
+        if box_type == b"moov":
+            if size > MEDIA_PROBE_MAX_MOOV:
+                raise ValueError(f"moov盒过大 ({size}字节)")
+            moov = reader.read(offset + header_size, size - header_size)
+            if len(moov) < size - header_size:
+                raise ValueError("moov盒不完整")
+            return moov
+        if size < header_size:
+            break
+        offset += size
+    raise ValueError("未找到moov盒")
+
+
+def _parse_mp4(reader: _RangeReader) -> MediaInfo:
+    moov = _find_moov(reader)
+    end = len(moov)
+
+    duration = None
+    mvhd = _child(moov, 0, end, b"mvhd")
+    if mvhd:
+        start = mvhd[0]
+        if moov[start] == 1:
+            timescale, length = struct.unpack(">IQ", moov[start + 20:start + 32])
+        else:
+            timescale, length = struct.unpack(">II", moov[start + 12:start + 20])
+        duration = length / timescale if timescale else None
+
+    width = height = sample_rate = None
+    video_codec = audio_codec = None
+    for box_type, trak_start, trak_end in _boxes(moov, 0, end):
+        if box_type != b"trak":
+            continue
+        mdia = _child(moov, trak_start, trak_end, b"mdia")
+        if not mdia:
+            continue
+        hdlr = _child(moov, mdia[0], mdia[1], b"hdlr")
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12] if hdlr else b""
+        codec = None
+        minf = _child(moov, mdia[0], mdia[1], b"minf")
+        stbl = _child(moov, minf[0], minf[1], b"stbl") if minf else None
+        stsd = _child(moov, stbl[0], stbl[1], b"stsd") if stbl else None
+        if stsd:
+            codec = moov[stsd[0] + 12:stsd[0] + 16].decode("latin-1").strip()
+
+        if handler == b"vide" and video_codec is None:
+            video_codec = codec
+            tkhd = _child(moov, trak_start, trak_end, b"tkhd")
+            if tkhd:
+                at = tkhd[0] + (88 if moov[tkhd[0]] == 1 else 76)
+                w, h = struct.unpack(">II", moov[at:at + 8])
+                width, height = w >> 16, h >> 16
+        elif handler == b"soun" and audio_codec is None:
+            audio_codec = codec
+            mdhd = _child(moov, mdia[0], mdia[1], b"mdhd")
+            if mdhd:
+                at = mdhd[0] + (20 if moov[mdhd[0]] == 1 else 12)
+                sample_rate = struct.unpack(">I", moov[at:at + 4])[0]
+
+    return MediaInfo("MP4", duration, video_codec or audio_codec, width, height, sample_rate, reader.size)
+
+
+# 全局媒体探测器
+media_probe = MediaProbe()
@@ -0,0 +1,73 @@
+"""
+运行指标 - 进程内的计数器与仪表盘指标
+"""
+
+import threading
+from typing import Dict, Any, Tuple
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple:
+    """把标签字典转换为可哈希的键"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """指标注册表（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauges: Dict[str, Dict[Tuple, float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """累加计数器"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """设置仪表盘指标的当前值"""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def get(self, name: str, **labels) -> float:
+        """读取单个指标值，不存在时返回0"""
+        key = _label_key(labels)
+        with self._lock:
+            for table in (self._gauges, self._counters):
+                if name in table and key in table[name]:
+                    return table[name][key]
+        return 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出所有指标
+
+        Returns:
+            {"counters": {...}, "gauges": {...}}，每个指标是 [{"labels": {...}, "value": ...}] 列表
+        """
+        def dump(table):
+            return {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in table.items()
+            }
+
+        with self._lock:
+            return {"counters": dump(self._counters), "gauges": dump(self._gauges)}
+
+    def render_text(self) -> str:
+        """以 Prometheus 文本格式导出指标"""
+        lines = []
+        snapshot = self.snapshot()
+        for table in ("counters", "gauges"):
+            for name, series in snapshot[table].items():
+                for item in series:
+                    labels = ",".join(f'{k}="{v}"' for k, v in item["labels"].items())
+                    lines.append(f"{name}{{{labels}}} {item['value']}" if labels else f"{name} {item['value']}")
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标实例
+metrics = MetricsRegistry()
@@ -0,0 +1,151 @@
+"""
+请求体 - 序列化一次、哈希一次，签名和重发时复用
+
+- 普通请求体序列化为 UTF-8 字节，计算一次 SHA256，换接入点重发和对冲请求都直接复用
+- 请求数据中的 Base64File 在序列化时按需编码：通过内存映射分块读取文件、分块编码，
+  多张图片并行编码，按请求体顺序增量计算哈希；编码结果以分块形式直接发送，
+  不再拼接成完整字符串，每张图片在内存中只保留一份编码结果
+"""
+
+import binascii
+import hashlib
+import json
+import mmap
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from ..config import PAYLOAD_ENCODE_WORKERS, PAYLOAD_CHUNK_SIZE
+
+
+class Base64File:
+    """以base64编码形式放入请求体的本地文件（发送前才读取和编码）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 本地文件路径
+        """
+        self.path = path
+        self.size = os.path.getsize(path)
+
+    @property
+    def encoded_length(self) -> int:
+        """编码后的长度（无需编码即可得到）"""
+        return (self.size + 2) // 3 * 4
+
+    def encode(self, chunk_size: int = PAYLOAD_CHUNK_SIZE) -> List[bytes]:
+        """
+        分块编码文件
+
+        Args:
+            chunk_size: 每块读取的原始字节数（取3的倍数，保证各块编码后可直接拼接）
+
+        Returns:
+            编码结果分块
+        """
+        if self.size == 0:
+            return []
+        chunk_size -= chunk_size % 3
+        chunks = []
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(mapped), chunk_size):
+                    chunks.append(binascii.b2a_base64(view[offset:offset + chunk_size], newline=False))
+            finally:
+                view.release()
+        return chunks
+
+    def __repr__(self):
+        return f"Base64File({self.path}, {self.size / 1024:.0f}KB)"
+
+
+class RequestBody:
+    """
+    已序列化的请求体
+
+    由若干字节分块组成，sha256 在构建时计算一次。普通请求体只有一个分块。
+    """
+
+    def __init__(self, chunks: List[bytes], sha256: str):
+        self.chunks = chunks
+        self.sha256 = sha256
+        self._length = sum(len(chunk) for chunk in chunks)
+
+    @classmethod
+    def build(cls, body_data: Dict[str, Any]) -> "RequestBody":
+        """
+        序列化请求数据
+
+        Args:
+            body_data: 请求数据，可以包含 Base64File（单独或放在列表中）
+
+        Returns:
+            请求体
+        """
+        files: List[Base64File] = []
+        marker = f"volc-b64-{uuid.uuid4().hex}-"
+
+        def placeholder(value):
+            if isinstance(value, Base64File):
+                files.append(value)
+                return f"{marker}{len(files) - 1}"
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+        text = json.dumps(body_data, ensure_ascii=False, default=placeholder)
+        if not files:
+            data = text.encode("utf-8")
+            return cls([data], hashlib.sha256(data).hexdigest())
+
+        # 按占位符切分：偶数位置是JSON文本，奇数位置是文件序号
+        parts = text.split(marker)
+        segments: List[Union[bytes, int]] = [parts[0].encode("utf-8")]
+        for part in parts[1:]:
+            index, _, rest = part.partition('"')
+            segments.append(int(index))
+            segments.append(('"' + rest).encode("utf-8"))
+
+        # 并行编码各文件，按请求体顺序增量计算哈希（前面的文件编码完即可开始哈希）
+        futures = [_encoder().submit(f.encode) for f in files]
+        hasher = hashlib.sha256()
+        chunks: List[bytes] = []
+        for segment in segments:
+            pieces = futures[segment].result() if isinstance(segment, int) else [segment]
+            for piece in pieces:
+                hasher.update(piece)
+            chunks.extend(pieces)
+        return cls(chunks, hasher.hexdigest())
+
+    def payload(self) -> Union[bytes, "RequestBody"]:
+        """
+        传给 requests 的请求体
+
+        单个分块时直接返回字节；多个分块时返回自身（可迭代且有长度，
+        requests 会设置 Content-Length 并逐块发送）。
+        """
+        return self.chunks[0] if len(self.chunks) == 1 else self
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.chunks)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __repr__(self):
+        return f"RequestBody({self._length / 1024:.0f}KB, {len(self.chunks)} chunks)"
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _encoder() -> ThreadPoolExecutor:
+    """编码线程池（延迟创建）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PAYLOAD_ENCODE_WORKERS, thread_name_prefix="volc-encode")
+        return _executor
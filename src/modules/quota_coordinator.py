@@ -0,0 +1,467 @@
+"""
+配额协调 - 多个进程/多台机器共用账号时，在全局范围内限制QPS和并发任务数
+
+凭证池（credential_pool）和自适应限制（adaptive_limiter）只在本进程内生效，
+16个进程同时使用一个账号时各自的限制加起来会远超账号配额。协调器把配额状态放到共享存储中：
+
+- 令牌桶：按 账号 + req_key 限制每秒请求数（提交和查询都消耗令牌）
+- 并发任务名额：按 账号 + req_key 限制已提交未结束的任务数；提交前占用，
+  提交失败立即归还，提交成功后名额转到任务ID名下，任何进程查询到任务结束时归还
+- 名额带租约：轮询任务时续期，进程崩溃后名额在租约到期后自动回收
+
+存储后端（VOLCENGINE_QUOTA_BACKEND）：
+- 空：不启用（默认）
+- file:/路径：单机多进程，用文件锁保护一个JSON状态文件
+- redis://主机:端口/库：多机，用Lua脚本保证原子性，需要安装 redis 包
+- memory：进程内存储，接口与共享后端一致，用于测试和单进程
+共享存储不可用时放行请求（只打印警告），不因协调器故障阻塞业务。
+后端在首次使用时才创建，配置错误（或缺少 redis 包）在第一次请求时报错，不影响导入。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from ..config import (
+    QUOTA_BACKEND, QUOTA_KEY_PREFIX, QUOTA_TASK_LEASE, QUOTA_SLOT_POLL_INTERVAL, QUOTA_ACQUIRE_TIMEOUT,
+    QUOTA_ERROR_LOG_INTERVAL
+)
+from .deadline import Deadline, current_deadline
+from .metrics import metrics
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - 可选依赖
+    redis = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows 没有 fcntl
+    fcntl = None
+
+
+class QuotaTimeout(Exception):
+    """等待全局配额超时（稍后可重试）"""
+
+
+class QuotaBackend:
+    """配额存储后端接口（所有操作都必须是原子的）"""
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        """
+        从令牌桶取一个令牌
+
+        Returns:
+            0 表示已取得；否则为还需等待的秒数
+        """
+        raise NotImplementedError
+
+    def acquire_slot(self, key: str, holder: str, limit: int, ttl: float) -> bool:
+        """名额未满时以 holder 占用一个名额（租约 ttl 秒），返回是否成功"""
+        raise NotImplementedError
+
+    def set_slot(self, key: str, holder: str, ttl: float):
+        """占用或续期 holder 的名额（不检查上限，用于转移和续期）"""
+        raise NotImplementedError
+
+    def release_slot(self, key: str, holder: str):
+        """归还 holder 的名额（不存在时忽略）"""
+        raise NotImplementedError
+
+    def slots(self, key: str) -> int:
+        """当前有效的名额占用数"""
+        raise NotImplementedError
+
+
+def _refill(bucket: Optional[Dict[str, float]], rate: float, burst: float, now: float) -> Tuple[Dict[str, float], float]:
+    """按时间补充令牌并尝试取一个，返回 (新状态, 需等待秒数)"""
+    tokens, updated = (bucket["tokens"], bucket["ts"]) if bucket else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1.0:
+        return {"tokens": tokens - 1.0, "ts": now}, 0.0
+    return {"tokens": tokens, "ts": now}, (1.0 - tokens) / rate
+
+
+class MemoryQuotaBackend(QuotaBackend):
+    """进程内存储（与共享后端语义一致，用于测试和单进程）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, float]] = {}
+        self._slots: Dict[str, Dict[str, float]] = {}
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        with self._lock:
+            self._buckets[key], wait = _refill(self._buckets.get(key), rate, burst, time.monotonic())
+            return wait
+
+    def _live(self, key: str, now: float) -> Dict[str, float]:
+        holders = self._slots.setdefault(key, {})
+        for holder in [h for h, expires in holders.items() if expires <= now]:
+            del holders[holder]
+        return holders
+
+    def acquire_slot(self, key: str, holder: str, limit: int, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            holders = self._live(key, now)
+            if len(holders) >= limit:
+                return False
+            holders[holder] = now + ttl
+            return True
+
+    def set_slot(self, key: str, holder: str, ttl: float):
+        with self._lock:
+            self._slots.setdefault(key, {})[holder] = time.monotonic() + ttl
+
+    def release_slot(self, key: str, holder: str):
+        with self._lock:
+            self._slots.get(key, {}).pop(holder, None)
+
+    def slots(self, key: str) -> int:
+        with self._lock:
+            return len(self._live(key, time.monotonic()))
+
+
+class FileQuotaBackend(QuotaBackend):
+    """单机多进程：状态保存在一个JSON文件中，每次操作持有文件排他锁"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 状态文件路径（同一台机器上的进程需使用同一路径）
+        """
+        if fcntl is None:
+            raise ImportError("文件配额后端依赖 fcntl 文件锁，当前平台不支持，请改用 redis:// 后端")
+        self.path = os.path.abspath(os.path.expanduser(path))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()   # flock 按文件描述符生效，同进程内的线程另外加锁
+
+    def _update(self, change):
+        """在文件锁内读取状态、修改并写回，返回 change 的返回值"""
+        with self._lock, open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                state.setdefault("buckets", {})
+                state.setdefault("slots", {})
+                result = change(state, time.time())
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state, separators=(",", ":")))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _live(state: Dict, key: str, now: float) -> Dict[str, float]:
+        holders = {h: expires for h, expires in state["slots"].get(key, {}).items() if expires > now}
+        if holders:
+            state["slots"][key] = holders
+        else:
+            state["slots"].pop(key, None)
+        return holders
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        def change(state, now):
+            state["buckets"][key], wait = _refill(state["buckets"].get(key), rate, burst, now)
+            return wait
+        return self._update(change)
+
+    def acquire_slot(self, key: str, holder: str, limit: int, ttl: float) -> bool:
+        def change(state, now):
+            holders = self._live(state, key, now)
+            if len(holders) >= limit:
+                return False
+            holders[holder] = now + ttl
+            state["slots"][key] = holders
+            return True
+        return self._update(change)
+
+    def set_slot(self, key: str, holder: str, ttl: float):
+        def change(state, now):
+            holders = self._live(state, key, now)
+            holders[holder] = now + ttl
+            state["slots"][key] = holders
+        self._update(change)
+
+    def release_slot(self, key: str, holder: str):
+        def change(state, now):
+            holders = self._live(state, key, now)
+            holders.pop(holder, None)
+            if not holders:
+                state["slots"].pop(key, None)
+        self._update(change)
+
+    def slots(self, key: str) -> int:
+        return self._update(lambda state, now: len(self._live(state, key, now)))
+
+
+# 令牌桶：KEYS[1] 哈希 {tokens, ts}；ARGV 速率、容量。使用服务端时间，避免各机器时钟不一致
+_TOKEN_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens, ts = tonumber(state[1]) or burst, tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return tostring(wait)
+"""
+
+# 并发名额：KEYS[1] 有序集合 成员=持有者 分数=租约到期时间；ARGV 持有者、上限、租约秒数、是否检查上限
+_SLOT_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if ARGV[4] == '1' and redis.call('ZSCORE', KEYS[1], ARGV[1]) == false
+   and redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+  return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3])) + 60)
+return 1
+"""
+
+# 有效名额数：按服务端时间清理过期租约后计数
+_COUNT_SCRIPT = """
+local t = redis.call('TIME')
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(t[1]) + tonumber(t[2]) / 1000000)
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+class RedisQuotaBackend(QuotaBackend):
+    """多机：状态保存在 Redis（或兼容的存储）中，每个操作是一次 Lua 脚本调用"""
+
+    def __init__(self, url: Optional[str] = None, prefix: str = QUOTA_KEY_PREFIX, client=None):
+        """
+        Args:
+            url: 连接地址，如 redis://127.0.0.1:6379/0
+            prefix: 键前缀
+            client: 已有的客户端对象（需支持 register_script / zrem）
+        """
+        if client is None:
+            if redis is None:
+                raise ImportError("Redis 配额后端需要 redis 包，请先安装: pip install redis")
+            client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self.client = client
+        self.prefix = prefix
+        self._token = client.register_script(_TOKEN_SCRIPT)
+        self._slot = client.register_script(_SLOT_SCRIPT)
+        self._count = client.register_script(_COUNT_SCRIPT)
+
+    def take_token(self, key: str, rate: float, burst: float) -> float:
+        return float(self._token(keys=[f"{self.prefix}rate:{key}"], args=[rate, burst]))
+
+    def acquire_slot(self, key: str, holder: str, limit: int, ttl: float) -> bool:
+        return bool(int(self._slot(keys=[f"{self.prefix}slots:{key}"], args=[holder, limit, ttl, 1])))
+
+    def set_slot(self, key: str, holder: str, ttl: float):
+        self._slot(keys=[f"{self.prefix}slots:{key}"], args=[holder, 0, ttl, 0])
+
+    def release_slot(self, key: str, holder: str):
+        self.client.zrem(f"{self.prefix}slots:{key}", holder)
+
+    def slots(self, key: str) -> int:
+        return int(self._count(keys=[f"{self.prefix}slots:{key}"]))
+
+
+def create_backend(spec: str) -> Optional[QuotaBackend]:
+    """
+    按配置创建存储后端
+
+    Args:
+        spec: 空 / memory / file:路径 / redis://...
+
+    Returns:
+        存储后端，空配置时返回None（不启用）
+
+    Raises:
+        ValueError: 不支持的配置
+    """
+    spec = (spec or "").strip()
+    if not spec or spec in ("0", "none", "off"):
+        return None
+    if spec == "memory":
+        return MemoryQuotaBackend()
+    if spec.startswith("file:"):
+        return FileQuotaBackend(spec[len("file:"):])
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQuotaBackend(spec)
+    raise ValueError(f"不支持的配额后端: {spec}，支持: memory, file:路径, redis://主机:端口/库")
+
+
+def account_key(access_key: str) -> str:
+    """账号在共享存储中的标识（访问密钥的哈希，各机器上一致且不暴露密钥）"""
+    return hashlib.sha256(access_key.encode("utf-8")).hexdigest()[:16]
+
+
+class QuotaCoordinator:
+    """全局配额协调器（线程安全，未配置后端时所有操作直接放行）"""
+
+    def __init__(self, backend: Optional[QuotaBackend] = None, task_lease: float = QUOTA_TASK_LEASE,
+                 poll_interval: float = QUOTA_SLOT_POLL_INTERVAL, acquire_timeout: float = QUOTA_ACQUIRE_TIMEOUT,
+                 spec: Optional[str] = None):
+        """
+        Args:
+            backend: 存储后端，None 表示不启用
+            task_lease: 任务名额的租约（秒），轮询任务时续期
+            poll_interval: 名额已满时重新尝试的间隔（秒）
+            acquire_timeout: 等待配额的最长时间（秒）
+            spec: 后端配置（见 create_backend），首次使用时才创建后端；提供时忽略 backend
+        """
+        self._backend = backend
+        self._spec = spec or None
+        self._backend_lock = threading.Lock()
+        self.task_lease = task_lease
+        self.poll_interval = poll_interval
+        self.acquire_timeout = acquire_timeout
+        self._last_error_log = 0.0
+
+    @property
+    def backend(self) -> Optional[QuotaBackend]:
+        """
+        存储后端（按配置首次使用时创建）
+
+        Raises:
+            ValueError: 不支持的配置
+            ImportError: 缺少后端需要的依赖
+        """
+        if self._spec is not None:
+            with self._backend_lock:
+                if self._spec is not None:
+                    self._backend = create_backend(self._spec)
+                    self._spec = None
+        return self._backend
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了存储后端"""
+        return self.backend is not None
+
+    def configure(self, backend: Optional[QuotaBackend]):
+        """更换存储后端（None 表示停用）"""
+        with self._backend_lock:
+            self._backend = backend
+            self._spec = None
+
+    def acquire(self, account: str, req_key: str, rate: float, max_tasks: int, submit: bool = False,
+                deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        等待全局配额：提交请求先占用并发任务名额，所有请求再取一个QPS令牌
+
+        Args:
+            account: 账号标识（account_key）
+            req_key: 服务标识
+            rate: 该账号该服务的每秒请求数上限
+            max_tasks: 该账号该服务同时进行的任务上限（0 表示不限制）
+            submit: 是否为提交任务的请求
+            deadline: 截止时间（默认使用当前上下文中的截止时间），等待不超过其剩余时间
+
+        Returns:
+            提交请求占用的名额持有者标识（交给 bind / release），其他请求返回None
+
+        Raises:
+            QuotaTimeout: 等待超时
+        """
+        if self.backend is None:
+            return None
+        key = f"{account}:{req_key}"
+        deadline = deadline or current_deadline()
+        timeout = self.acquire_timeout
+        if deadline is not None and deadline.remaining() is not None:
+            timeout = min(timeout, deadline.remaining())
+        give_up_at = time.monotonic() + timeout
+
+        holder = None
+        if submit and max_tasks:
+            holder = uuid.uuid4().hex
+            if not self._wait(lambda: 0.0 if self.backend.acquire_slot(key, holder, max_tasks, self.task_lease)
+                              else self.poll_interval, give_up_at):
+                metrics.inc("volcengine_quota_timeouts_total", req_key=req_key, kind="tasks")
+                raise QuotaTimeout(f"服务 {req_key} 的全局并发任务数已满（上限 {max_tasks}），等待超时")
+        try:
+            if rate and not self._wait(lambda: self.backend.take_token(key, rate, max(rate, 1.0)), give_up_at):
+                metrics.inc("volcengine_quota_timeouts_total", req_key=req_key, kind="qps")
+                raise QuotaTimeout(f"服务 {req_key} 的全局QPS已用满（上限 {rate}），等待超时")
+        except QuotaTimeout:
+            if holder:
+                self.release(account, req_key, holder)
+            raise
+        return holder
+
+    def bind(self, account: str, req_key: str, holder: Optional[str], task_id: str):
+        """提交成功：名额转到任务ID名下，之后任何进程都可以按任务ID续期和归还"""
+        if self.backend is None or not holder:
+            return
+        key = f"{account}:{req_key}"
+        self._safely(lambda: (self.backend.set_slot(key, task_id, self.task_lease),
+                              self.backend.release_slot(key, holder)))
+
+    def release(self, account: str, req_key: str, holder: Optional[str]):
+        """提交失败：归还名额"""
+        if self.backend is None or not holder:
+            return
+        self._safely(lambda: self.backend.release_slot(f"{account}:{req_key}", holder))
+
+    def renew(self, account: str, req_key: str, task_id: str):
+        """任务仍在进行：续期名额租约"""
+        if self.backend is None:
+            return
+        self._safely(lambda: self.backend.set_slot(f"{account}:{req_key}", task_id, self.task_lease))
+
+    def finish(self, account: str, req_key: str, task_id: str):
+        """任务结束：归还名额"""
+        if self.backend is None:
+            return
+        self._safely(lambda: self.backend.release_slot(f"{account}:{req_key}", task_id))
+
+    def in_flight(self, account: str, req_key: str) -> int:
+        """全局进行中的任务数"""
+        if self.backend is None:
+            return 0
+        return self._safely(lambda: self.backend.slots(f"{account}:{req_key}")) or 0
+
+    def _wait(self, attempt, give_up_at: float) -> bool:
+        """重复 attempt（返回需等待的秒数，0 表示成功）直到成功或超时；存储不可用时放行"""
+        waited = False
+        while True:
+            wait = self._safely(attempt)
+            if not wait:
+                if waited:
+                    metrics.inc("volcengine_quota_waits_total")
+                return True
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                return False
+            waited = True
+            time.sleep(min(wait, remaining))
+
+    def _safely(self, operation):
+        """执行存储操作，失败时记录并返回None（放行）"""
+        try:
+            return operation()
+        except Exception as e:
+            metrics.inc("volcengine_quota_backend_errors_total")
+            now = time.monotonic()
+            if now - self._last_error_log >= QUOTA_ERROR_LOG_INTERVAL:
+                self._last_error_log = now
+                print(f"⚠️ 配额协调存储不可用，暂不限制: {str(e)}")
+            return None
+
+
+# 全局配额协调器（按 VOLCENGINE_QUOTA_BACKEND 配置后端，首次使用时创建）
+quota_coordinator = QuotaCoordinator(spec=QUOTA_BACKEND)
@@ -0,0 +1,163 @@
+"""
+对冲请求 - 降低只读查询接口的长尾延迟
+
+主请求超过该接口近期 p95 延迟仍未返回时，再发送一个相同的请求，
+取先返回的结果。对冲次数受预算限制，只占总流量的一小部分。
+不会对冲的请求（样本不足或预算用完）直接在调用线程上发送；可能对冲的请求，主请求在单独的线程上立即发送
+（调用线程要能在对冲先返回时取走结果），只有对冲请求使用线程池，线程池大小不限制同时进行的查询数，
+排队时间也不计入延迟。
+只能用于幂等的查询类接口（CVGetResult、CVSync2AsyncGetResult），提交类接口绝不对冲。
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeout
+from typing import Callable, Dict, Optional, Any
+
+from ..config import (
+    HEDGEABLE_ACTIONS, HEDGE_BUDGET_RATIO, HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_DELAY, HEDGE_MAX_WORKERS
+)
+from .metrics import metrics
+
+
+class HedgingPolicy:
+    """对冲策略：按接口统计延迟，控制对冲时机和预算"""
+
+    def __init__(self, budget_ratio: float = HEDGE_BUDGET_RATIO, min_samples: int = HEDGE_MIN_SAMPLES,
+                 min_delay: float = HEDGE_MIN_DELAY, max_workers: int = HEDGE_MAX_WORKERS, window_size: int = 200):
+        """
+        Args:
+            budget_ratio: 对冲请求占总请求的最大比例
+            min_samples: 至少积累多少个延迟样本后才开始对冲
+            min_delay: 对冲延迟下限（秒）
+            max_workers: 对冲线程池大小
+            window_size: 每个接口保留的延迟样本数
+        """
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window_size = window_size
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        # 每个请求积累 budget_ratio 个令牌，每次对冲消耗1个
+        self._tokens = 0.0
+        self._max_tokens = 10.0
+        self._executor = None
+
+    def is_hedgeable(self, action: str) -> bool:
+        """判断接口是否允许对冲"""
+        return action in HEDGEABLE_ACTIONS
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """
+        计算对冲延迟（近期p95）
+
+        Returns:
+            延迟秒数，样本不足时返回None（不对冲）
+        """
+        with self._lock:
+            samples = self._latencies.get(key)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(self.min_delay, p95)
+
+    def call(self, key: str, send: Callable[[], Any]) -> Any:
+        """
+        执行可对冲的请求
+
+        Args:
+            key: 延迟统计维度（通常为 action）
+            send: 发送请求的函数，可被重复调用
+
+        Returns:
+            最先成功返回的结果
+        """
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self.budget_ratio)
+
+        delay = self.hedge_delay(key)
+        if delay is None or not self._has_budget():
+            return self._timed(key, send)
+
+        start = time.monotonic()
+        primary = Future()
+        threading.Thread(target=_run, args=(primary, send), name="volc-hedge-primary", daemon=True).start()
+        try:
+            result = primary.result(timeout=delay)
+            self._observe(key, time.monotonic() - start)
+            return result
+        except FuturesTimeout:
+            pass
+
+        if not self._spend_token():
+            result = primary.result()
+            self._observe(key, time.monotonic() - start)
+            return result
+
+        metrics.inc("volcengine_hedged_requests_total", action=key)
+        hedge = self._get_executor().submit(send)
+        pending = {primary, hedge}
+        first_error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.inc("volcengine_hedge_wins_total", action=key)
+                    self._observe(key, time.monotonic() - start)
+                    return future.result()
+                first_error = first_error or future.exception()
+
+        raise first_error
+
+    def _timed(self, key: str, send: Callable[[], Any]) -> Any:
+        start = time.monotonic()
+        result = send()
+        self._observe(key, time.monotonic() - start)
+        return result
+
+    def _observe(self, key: str, latency: float):
+        with self._lock:
+            samples = self._latencies.get(key)
+            if samples is None:
+                samples = self._latencies[key] = deque(maxlen=self.window_size)
+            samples.append(latency)
+
+    def _has_budget(self) -> bool:
+        with self._lock:
+            return self._tokens >= 1.0
+
+    def _spend_token(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            metrics.inc("volcengine_hedge_budget_exhausted_total")
+            return False
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="volc-hedge")
+            return self._executor
+
+
+def _run(future: Future, send: Callable[[], Any]):
+    """在当前线程执行 send，结果写入 future"""
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(send())
+    except BaseException as e:
+        future.set_exception(e)
+
+
+# 全局对冲策略实例
+hedging_policy = HedgingPolicy()
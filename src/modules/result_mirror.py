@@ -0,0 +1,273 @@
+"""
+结果镜像 - 任务完成后立即在后台下载结果中的临时URL，避免链接过期后只能重新生成
+
+默认关闭（VOLCENGINE_RESULT_MIRROR=1 启用），关闭时只记录任务结果和结果URL。
+
+- 轮询到任务完成时自动加入队列（video_url / preview_url / image_urls）
+- 按链接过期时间排队（先过期的先下载），固定数量的下载线程控制并发
+- 过期时间从签名URL参数中解析（X-Tos-Expires / X-Amz-Expires / x-expires / Expires），
+  解析不到时按 RESULT_URL_TTL 估计
+- 下载失败时在过期前按退避间隔重试
+- 文件保存在资源存储（asset_store，按内容去重）中，本地路径记录在任务记录（task_store）中；
+  进程重启后继续镜像未完成且未过期的文件
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, parse_qsl
+
+from ..config import RESULT_MIRROR_ENABLED, RESULT_MIRROR_WORKERS, RESULT_MIRROR_RETRY_DELAY, RESULT_URL_TTL
+from .asset_store import AssetStore, asset_store
+from .deadline import Deadline
+from .metrics import metrics
+from .task_store import TaskStore, task_store, ASSET_MIRRORED, ASSET_EXPIRED
+
+# 结果中的临时URL字段
+RESULT_URL_FIELDS = ("video_url", "preview_url", "image_urls")
+
+_DEFAULT_EXTENSIONS = {"video_url": ".mp4", "preview_url": ".mp4", "image_urls": ".png"}
+
+
+def parse_url_expiry(url: str) -> Optional[float]:
+    """
+    从签名URL中解析过期时间
+
+    Args:
+        url: 结果URL
+
+    Returns:
+        过期时间（Unix时间戳），无法解析时返回None
+    """
+    params = {key.lower(): value for key, value in parse_qsl(urlsplit(url).query)}
+    # 签名时间 + 有效秒数（TOS / S3 V4 签名）
+    for prefix in ("x-tos-", "x-amz-"):
+        expires, date = params.get(prefix + "expires"), params.get(prefix + "date")
+        if expires and expires.isdigit() and date:
+            try:
+                signed = datetime.strptime(date, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+                return signed.timestamp() + int(expires)
+            except ValueError:
+                pass
+    # 绝对过期时间戳（CDN 签名 / S3 V2 签名）
+    for key in ("x-expires", "expires", "x-signature-expires"):
+        value = params.get(key, "")
+        if value.isdigit() and int(value) > 1000000000:
+            return float(value)
+    return None
+
+
+def extract_result_urls(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    提取任务结果中的临时URL
+
+    Args:
+        result: 任务结果（解包后的结果，或含 code / data 的原始响应）
+
+    Returns:
+        [{"field", "idx", "url", "expires_at"}]
+    """
+    if isinstance(result.get("data"), dict) and "code" in result:
+        result = result["data"]
+    # 部分服务（如创意特效）把结果放在 resp_data JSON 字符串中
+    if isinstance(result.get("resp_data"), str) and not any(result.get(field) for field in RESULT_URL_FIELDS):
+        try:
+            resp_data = json.loads(result["resp_data"])
+        except ValueError:
+            resp_data = None
+        if isinstance(resp_data, dict):
+            result = resp_data
+    now = time.time()
+    assets = []
+    for field in RESULT_URL_FIELDS:
+        value = result.get(field)
+        urls = [value] if isinstance(value, str) else value if isinstance(value, list) else []
+        for idx, url in enumerate(urls):
+            if isinstance(url, str) and url.startswith(("http://", "https://")):
+                expires_at = parse_url_expiry(url) or now + RESULT_URL_TTL
+                assets.append({"field": field, "idx": idx, "url": url, "expires_at": expires_at})
+    return assets
+
+
+class ResultMirror:
+    """结果镜像下载队列（线程安全）"""
+
+    def __init__(self, store: TaskStore = task_store, assets: AssetStore = asset_store,
+                 workers: int = RESULT_MIRROR_WORKERS, enabled: bool = RESULT_MIRROR_ENABLED):
+        """
+        Args:
+            store: 任务记录
+            assets: 保存文件的资源存储
+            workers: 同时下载的文件数
+            enabled: 是否启用（关闭时只记录任务结果，不下载）
+        """
+        self.store = store
+        self.assets = assets
+        self.workers = workers
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._heap = []                      # (过期时间, 序号, 文件)
+        self._delayed = []                   # (重试时间, 序号, 文件)
+        self._keys = set()                   # 排队或下载中的 (task_id, field, idx)
+        self._seq = itertools.count()
+        self._pending: Dict[str, int] = {}   # task_id -> 未完成的文件数
+        self._threads: List[threading.Thread] = []
+
+    def enqueue(self, task_id: str, req_key: Optional[str], result: Dict[str, Any]) -> int:
+        """
+        记录任务结果，并把其中的临时URL加入镜像队列
+
+        Args:
+            task_id: 任务ID
+            req_key: 服务标识
+            result: 任务结果
+
+        Returns:
+            加入队列的文件数
+        """
+        self.store.record_finished(task_id, req_key, result)
+        assets = extract_result_urls(result) if isinstance(result, dict) else []
+        if not assets:
+            return 0
+        self.store.add_assets(task_id, assets)
+        if not self.enabled:
+            return 0
+        self.start()
+        for asset in assets:
+            self._push(dict(asset, task_id=task_id, req_key=req_key, attempts=0))
+        return len(assets)
+
+    def wait(self, task_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        等待镜像完成
+
+        Args:
+            task_id: 只等待该任务的文件，None 表示等待全部
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否已全部完成（超时返回False）
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending.get(task_id, 0) if task_id else self._pending:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def pending(self) -> int:
+        """尚未完成的文件数"""
+        with self._cond:
+            return sum(self._pending.values())
+
+    def local_path(self, url: str) -> Optional[str]:
+        """已镜像的本地文件路径"""
+        return self.store.local_path(url)
+
+    def start(self):
+        """启动下载线程（只启动一次），并继续镜像之前进程未完成且未过期的文件"""
+        with self._cond:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"volc-mirror-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        for asset in self.store.pending_assets():
+            self._push(dict(asset, attempts=0))
+
+    def _push(self, item: Dict[str, Any], not_before: Optional[float] = None):
+        with self._cond:
+            if not_before is None:
+                key = (item["task_id"], item["field"], item["idx"])
+                if key in self._keys:
+                    return
+                self._keys.add(key)
+                self._pending[item["task_id"]] = self._pending.get(item["task_id"], 0) + 1
+                heapq.heappush(self._heap, (item["expires_at"] or float("inf"), next(self._seq), item))
+            else:
+                heapq.heappush(self._delayed, (not_before, next(self._seq), item))
+            metrics.set_gauge("volcengine_result_mirror_pending", sum(self._pending.values()))
+            self._cond.notify_all()
+
+    def _take(self) -> Dict[str, Any]:
+        """取出最先过期的文件（等待重试的文件到时间后才参与排序）"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, item = heapq.heappop(self._delayed)
+                    heapq.heappush(self._heap, (item["expires_at"] or float("inf"), seq, item))
+                if self._heap:
+                    return heapq.heappop(self._heap)[2]
+                self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def _done(self, item: Dict[str, Any]):
+        with self._cond:
+            task_id = item["task_id"]
+            self._keys.discard((task_id, item["field"], item["idx"]))
+            self._pending[task_id] -= 1
+            if self._pending[task_id] <= 0:
+                del self._pending[task_id]
+            metrics.set_gauge("volcengine_result_mirror_pending", sum(self._pending.values()))
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            item = self._take()
+            retry_at = None
+            try:
+                retry_at = self._mirror(item)
+            except Exception as e:  # 下载线程不能退出
+                print(f"⚠️ 结果镜像出错: {str(e)}")
+            # 每个取出的文件只在这里结束或重新排队一次
+            if retry_at is None:
+                self._done(item)
+            else:
+                self._push(item, not_before=retry_at)
+
+    def _mirror(self, item: Dict[str, Any]) -> Optional[float]:
+        """
+        镜像一个文件
+
+        Returns:
+            需要重试时返回重试时间（单调时钟），否则返回None（已完成、已过期或放弃）
+        """
+        remaining = (item["expires_at"] or float("inf")) - time.time()
+        if remaining <= 0:
+            self.store.update_asset(item["task_id"], item["field"], item["idx"], ASSET_EXPIRED)
+            metrics.inc("volcengine_result_mirror_total", result="expired")
+            print(f"⚠️ 结果链接已过期，未能镜像: 任务 {item['task_id']} {item['field']}[{item['idx']}]")
+            return None
+
+        started = time.monotonic()
+        try:
+            asset = self.assets.fetch(item["url"], task_id=item["task_id"],
+                                      deadline=Deadline(max(60.0, min(remaining, 3600.0))),
+                                      extension=_DEFAULT_EXTENSIONS.get(item["field"]))
+        except Exception as e:
+            item["attempts"] += 1
+            delay = RESULT_MIRROR_RETRY_DELAY * (2 ** (item["attempts"] - 1))
+            if delay < remaining:
+                metrics.inc("volcengine_result_mirror_total", result="retry")
+                print(f"⚠️ 结果镜像失败，{delay}秒后重试: 任务 {item['task_id']} ({str(e)})")
+                return time.monotonic() + delay
+            self.store.update_asset(item["task_id"], item["field"], item["idx"], ASSET_EXPIRED)
+            metrics.inc("volcengine_result_mirror_total", result="failed")
+            print(f"❌ 结果镜像失败: 任务 {item['task_id']} ({str(e)})")
+            return None
+
+        self.store.update_asset(item["task_id"], item["field"], item["idx"], ASSET_MIRRORED, asset.path)
+        metrics.inc("volcengine_result_mirror_total", result="mirrored")
+        metrics.inc("volcengine_result_mirror_seconds_total", time.monotonic() - started)
+        return None
+
+
+# 全局结果镜像
+result_mirror = ResultMirror()
@@ -0,0 +1,248 @@
+"""
+服务路由 - 在功能等价的服务之间按近期实际耗时选择
+
+部分能力有多个可互换的服务（如动作模仿与单图视频驱动、OmniHuman 与单图音频驱动灵动模式），
+各服务的排队时间在一天内变化很大。路由器按 req_key 统计近期任务的耗时：
+
+- 总耗时（提交到完成）：本进程轮询到的任务实时记录，启动时从任务记录（task_store）加载近期样本，跨进程共享
+- 排队耗时（提交到开始生成）：轮询时首次看到 generating 状态的时间，只在本进程内统计
+- 失败率：失败的任务按需要重新提交计入预计耗时（耗时 / 成功率）
+
+选择策略：
+- fastest: 预计耗时最短
+- cheapest: 预计耗时在 SLA 内的服务中价格最低（都不满足时选最快的）
+样本不足或样本过旧的服务按 ROUTER_EXPLORE_RATIO 的概率被选中，使估计跟上排队时间的变化；
+熔断中的服务不参与选择；提交失败时依次改用下一个候选服务。
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config import (
+    ROUTER_WINDOW_SIZE, ROUTER_SAMPLE_MAX_AGE, ROUTER_MIN_SAMPLES, ROUTER_EXPLORE_RATIO, ROUTER_STALE_AFTER
+)
+from .circuit_breaker import circuit_breakers, OPEN
+from .metrics import metrics
+from .task_store import TaskStore, task_store
+
+FASTEST = "fastest"
+CHEAPEST = "cheapest"
+
+
+class Backend:
+    """一个可选的服务"""
+
+    def __init__(self, name: str, req_key: str, submit: Callable[[], Any], price: Optional[float] = None,
+                 action: str = "CVSubmitTask"):
+        """
+        Args:
+            name: 显示名称
+            req_key: 服务标识（耗时按它统计）
+            submit: 提交任务的函数，返回 TaskHandle
+            price: 本次任务的预计费用（元），None 表示未知（cheapest 策略中排在最后）
+            action: 提交接口（用于检查熔断状态）
+        """
+        self.name = name
+        self.req_key = req_key
+        self.submit = submit
+        self.price = price
+        self.action = action
+
+    def __repr__(self):
+        return f"Backend({self.name}, {self.req_key}, price={self.price})"
+
+
+class ServiceStats:
+    """单个服务的近期耗时样本"""
+
+    def __init__(self, window_size: int = ROUTER_WINDOW_SIZE):
+        self.durations = deque(maxlen=window_size)    # (完成时间, 总耗时)
+        self.queue_times = deque(maxlen=window_size)  # (记录时间, 排队耗时)
+        self.outcomes = deque(maxlen=window_size)     # (完成时间, 是否成功)
+
+    @staticmethod
+    def _recent(samples: deque, now: float, max_age: float) -> List[float]:
+        return [value for at, value in samples if now - at <= max_age]
+
+    def estimate(self, now: float, max_age: float = ROUTER_SAMPLE_MAX_AGE) -> Dict[str, Any]:
+        """近期样本的统计（近期样本越新权重越大）"""
+        durations = [(at, value) for at, value in self.durations if now - at <= max_age]
+        latency = None
+        if durations:
+            # 按样本新旧线性加权，排队时间变化时估计更快跟上
+            weights = [1.0 + (at - now + max_age) / max_age for at, _ in durations]
+            latency = sum(w * value for w, (_, value) in zip(weights, durations)) / sum(weights)
+        queue_times = self._recent(self.queue_times, now, max_age)
+        outcomes = self._recent(self.outcomes, now, max_age)
+        return {
+            "samples": len(durations),
+            "latency": latency,
+            "queue": sum(queue_times) / len(queue_times) if queue_times else None,
+            "success_rate": sum(outcomes) / len(outcomes) if outcomes else None,
+            "last_sample": max((at for at, _ in self.durations), default=None)
+        }
+
+
+class ServiceRouter:
+    """按近期耗时在等价服务间路由（线程安全）"""
+
+    def __init__(self, store: Optional[TaskStore] = task_store, window_size: int = ROUTER_WINDOW_SIZE,
+                 max_age: float = ROUTER_SAMPLE_MAX_AGE, min_samples: int = ROUTER_MIN_SAMPLES,
+                 explore_ratio: float = ROUTER_EXPLORE_RATIO, stale_after: float = ROUTER_STALE_AFTER):
+        """
+        Args:
+            store: 加载历史样本的任务记录，None 表示只使用本进程的样本
+            window_size: 每个服务保留的样本数
+            max_age: 样本有效期（秒）
+            min_samples: 样本数少于该值时视为未知，需要探索
+            explore_ratio: 选择未知或样本过旧的服务的概率
+            stale_after: 最新样本早于该时间（秒）时视为过旧
+        """
+        self.store = store
+        self.window_size = window_size
+        self.max_age = max_age
+        self.min_samples = min_samples
+        self.explore_ratio = explore_ratio
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._stats: Dict[str, ServiceStats] = {}
+
+    def observe(self, req_key: str, seconds: Optional[float], success: bool = True):
+        """
+        记录一次任务结束
+
+        Args:
+            req_key: 服务标识
+            seconds: 提交到完成的耗时（失败时可为None）
+            success: 是否成功
+        """
+        now = time.time()
+        with self._lock:
+            stats = self._get(req_key)
+            stats.outcomes.append((now, success))
+            if success and seconds is not None:
+                stats.durations.append((now, seconds))
+
+    def observe_queue(self, req_key: str, seconds: float):
+        """记录一次排队耗时（提交到开始生成）"""
+        with self._lock:
+            self._get(req_key).queue_times.append((time.time(), seconds))
+        metrics.set_gauge("volcengine_router_queue_seconds", seconds, req_key=req_key)
+
+    def estimate(self, req_key: str) -> Dict[str, Any]:
+        """
+        服务的近期耗时估计
+
+        Returns:
+            {"samples", "latency", "queue", "success_rate", "last_sample", "expected"}，
+            expected 为计入失败重提交的预计耗时，样本不足时为None
+        """
+        now = time.time()
+        with self._lock:
+            estimate = self._get(req_key).estimate(now, self.max_age)
+        expected = None
+        if estimate["samples"] >= self.min_samples and estimate["latency"] is not None:
+            success_rate = estimate["success_rate"] if estimate["success_rate"] is not None else 1.0
+            expected = estimate["latency"] / max(success_rate, 0.1)
+        estimate["expected"] = expected
+        return estimate
+
+    def rank(self, backends: List[Backend], objective: str = FASTEST, sla: Optional[float] = None) -> List[Backend]:
+        """
+        按策略排列候选服务（第一个为首选，其余为提交失败时的备选）
+
+        Args:
+            backends: 等价的候选服务
+            objective: fastest（最快）或 cheapest（SLA 内最便宜）
+            sla: 可接受的预计耗时（秒），仅 cheapest 使用，None 表示不限制
+
+        Returns:
+            排好序的服务列表（熔断中的服务排在最后）
+        """
+        if objective not in (FASTEST, CHEAPEST):
+            raise ValueError(f"不支持的路由策略: {objective}，支持: {FASTEST}, {CHEAPEST}")
+        now = time.time()
+        scored = []
+        for backend in backends:
+            estimate = self.estimate(backend.req_key)
+            expected = estimate["expected"]
+            stale = expected is None or now - estimate["last_sample"] > self.stale_after
+            is_open = circuit_breakers.get(backend.req_key, backend.action).state == OPEN
+            scored.append((backend, expected, stale, is_open))
+
+        def speed(item: Tuple) -> Tuple:
+            backend, expected, _, is_open = item
+            return (is_open, expected is None, expected or 0.0)
+
+        if objective == CHEAPEST:
+            def key(item: Tuple) -> Tuple:
+                backend, expected, _, is_open = item
+                within_sla = expected is not None and (sla is None or expected <= sla)
+                price = backend.price if backend.price is not None else float("inf")
+                return (is_open, not within_sla, price if within_sla else 0.0) + speed(item)[1:]
+        else:
+            key = speed
+        ranked = sorted(scored, key=key)
+
+        # 探索：偶尔选择样本不足或过旧的服务，估计才能跟上排队时间的变化
+        explorable = [item for item in ranked[1:] if item[2] and not item[3]]
+        if explorable and random.random() < self.explore_ratio:
+            choice = random.choice(explorable)
+            ranked.remove(choice)
+            ranked.insert(0, choice)
+            metrics.inc("volcengine_router_explore_total", req_key=choice[0].req_key)
+        return [item[0] for item in ranked]
+
+    def submit(self, backends: List[Backend], objective: str = FASTEST, sla: Optional[float] = None) -> Tuple[Backend, Any]:
+        """
+        选择服务并提交（提交失败时依次尝试下一个服务，参数错误直接抛出）
+
+        Args:
+            backends: 等价的候选服务
+            objective: fastest 或 cheapest
+            sla: 可接受的预计耗时（秒）
+
+        Returns:
+            (选中的服务, 任务句柄)
+
+        Raises:
+            ValueError: 参数错误（换服务也不会成功）
+            Exception: 所有服务都提交失败（最后一个错误）
+        """
+        last_error = None
+        for backend in self.rank(backends, objective, sla):
+            estimate = self.estimate(backend.req_key)
+            expected = f"{estimate['expected']:.0f}秒" if estimate["expected"] is not None else "未知"
+            print(f"🧭 路由到 {backend.name}（{backend.req_key}，预计耗时 {expected}）")
+            try:
+                handle = backend.submit()
+            except ValueError:
+                raise
+            except Exception as e:
+                last_error = e
+                metrics.inc("volcengine_router_submit_failures_total", req_key=backend.req_key)
+                print(f"⚠️ {backend.name} 提交失败，尝试下一个服务: {str(e)}")
+                continue
+            metrics.inc("volcengine_router_routed_total", req_key=backend.req_key, objective=objective)
+            return backend, handle
+        raise last_error or ValueError("没有可用的服务")
+
+    def _get(self, req_key: str) -> ServiceStats:
+        """取得服务的样本（首次使用时从任务记录加载近期样本，需持有锁）"""
+        stats = self._stats.get(req_key)
+        if stats is None:
+            stats = self._stats[req_key] = ServiceStats(self.window_size)
+            if self.store is not None:
+                for finished_at, seconds, success in self.store.recent_durations(
+                        req_key, time.time() - self.max_age, self.window_size):
+                    stats.outcomes.append((finished_at, success))
+                    if success and seconds is not None:
+                        stats.durations.append((finished_at, seconds))
+        return stats
+
+
+# 全局服务路由器
+service_router = ServiceRouter()
@@ -0,0 +1,639 @@
+"""
+任务所有权 - 多个节点共用任务租约时，每个任务同一时刻只有一个节点查询服务端
+
+多个节点（网关、worker、普通进程）都在轮询时，同一个任务可能被多个节点重复查询；
+节点宕机后，只有它在轮询的任务又没人查询。所有权层把租约放在各节点共用的租约存储中：
+
+- 租约：轮询任务前先申请租约，持有租约的节点才查询服务端；其他节点（以及本节点的其他等待方）
+  只读取任务结果，任务结束后直接拿到持有节点写入的结果
+- 续期：后台线程定期续期本节点正在轮询的任务；超过一个租约时长没有轮询的任务交还，由其他节点接手
+- 分配：可接手任务的节点（调用 start(adopt) 的网关和 worker）组成一致性哈希环。
+  登记的新任务（记录了任务类型和参数）直接交给环上负责的节点轮询，其他节点只读取结果；
+  租约到期（节点失联或放弃轮询）的"孤儿任务"同样按环重新分配，节点加入或退出时只有少量任务换节点；
+  分到本节点的任务申请租约并交给接手函数开始轮询
+
+租约存储（VOLCENGINE_TASK_LEASE_BACKEND）：
+- 空或 sqlite：任务记录所在的 SQLite（task_store），只适用于同一台机器上的多个进程
+- redis://主机:端口/库：多机共享，用Lua脚本保证原子性并使用 Redis 服务端时间，需要安装 redis 包
+
+默认关闭（VOLCENGINE_TASK_OWNERSHIP=1 启用），关闭时不访问存储，没有额外开销。
+租约存储不可用时放行轮询（宁可重复查询，也不让任务无人轮询）。
+"""
+
+import atexit
+import bisect
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import (
+    TASK_OWNERSHIP_ENABLED, TASK_OWNERSHIP_NODE_ID, TASK_LEASE_SECONDS, TASK_OWNERSHIP_HEARTBEAT,
+    TASK_OWNERSHIP_VNODES, TASK_ORPHAN_SCAN_LIMIT, TASK_HANDLE_MAX_WAIT, TASK_LEASE_BACKEND, TASK_LEASE_KEY_PREFIX
+)
+from .metrics import metrics
+from .task_store import DONE, FAILED, LEASE_OWNED, TaskStore, task_store
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - 可选依赖
+    redis = None
+
+# 清理残留租约记录的间隔（秒）
+_PURGE_INTERVAL = 600
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """一致性哈希环（每个节点放置多个虚拟节点，节点增减时只有相邻区间的任务换节点）"""
+
+    def __init__(self, nodes: List[str], vnodes: int = TASK_OWNERSHIP_VNODES):
+        self.nodes = tuple(sorted(set(nodes)))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """负责该键的节点，环为空时返回None"""
+        if not self._points:
+            return None
+        return self._owners[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+
+class LeaseBackend:
+    """租约存储后端接口（所有操作都必须是原子的，出错时抛出 BACKEND_ERRORS 中的异常）"""
+
+    def claim_lease(self, task_id: str, owner: str, ttl: float, kind: Optional[str] = None,
+                    params: Optional[Dict[str, Any]] = None, defer: bool = False) -> str:
+        """申请或续期租约，返回 LEASE_OWNED / LEASE_TAKEN / LEASE_FINISHED（参数见 TaskStore.claim_lease）"""
+        raise NotImplementedError
+
+    def offer_lease(self, task_id: str, kind: str, params: Dict[str, Any]):
+        """登记任务类型和参数但不持有租约（由哈希环上负责的节点接手）"""
+        raise NotImplementedError
+
+    def renew_leases(self, task_ids: List[str], owner: str, ttl: float) -> List[str]:
+        """续期 owner 持有的租约，返回仍由 owner 持有的任务ID"""
+        raise NotImplementedError
+
+    def release_lease(self, task_id: str, owner: str):
+        """交还租约（立即到期，其他节点可以接手）"""
+        raise NotImplementedError
+
+    def finish_lease(self, task_id: str, owner: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """任务已结束：删除租约并记录结果（供其他节点上的等待方读取）"""
+        raise NotImplementedError
+
+    def outcome(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """任务结果 {"status", "result", "error"}，尚未结束时返回None"""
+        raise NotImplementedError
+
+    def orphaned_leases(self, since: float, limit: int) -> List[Dict[str, Any]]:
+        """租约已到期、尚未结束且登记了任务类型的任务 [{"task_id", "kind", "params"}]"""
+        raise NotImplementedError
+
+    def purge_leases(self, before: float) -> int:
+        """清理残留的租约记录，返回清理的条数"""
+        raise NotImplementedError
+
+    def heartbeat_node(self, node_id: str, ttl: float, join: bool = True) -> List[str]:
+        """记录节点心跳（join 为 False 时不加入），返回存活的节点ID"""
+        raise NotImplementedError
+
+    def remove_node(self, node_id: str):
+        """节点退出"""
+        raise NotImplementedError
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """单机：租约保存在任务记录（task_store）所在的 SQLite 中，只能协调同一台机器上的进程"""
+
+    def __init__(self, store: TaskStore = task_store):
+        self.store = store
+
+    def claim_lease(self, task_id: str, owner: str, ttl: float, kind: Optional[str] = None,
+                    params: Optional[Dict[str, Any]] = None, defer: bool = False) -> str:
+        return self.store.claim_lease(task_id, owner, ttl, kind, params, defer)
+
+    def offer_lease(self, task_id: str, kind: str, params: Dict[str, Any]):
+        self.store.offer_lease(task_id, kind, params)
+
+    def renew_leases(self, task_ids: List[str], owner: str, ttl: float) -> List[str]:
+        return self.store.renew_leases(task_ids, owner, ttl)
+
+    def release_lease(self, task_id: str, owner: str):
+        self.store.release_lease(task_id, owner)
+
+    def finish_lease(self, task_id: str, owner: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        # 结果已由持有节点写入共用的任务记录
+        self.store.release_lease(task_id, owner, finished=True)
+
+    def outcome(self, task_id: str) -> Optional[Dict[str, Any]]:
+        record = self.store.get(task_id)
+        return record if record and record["status"] in (DONE, FAILED) else None
+
+    def orphaned_leases(self, since: float, limit: int) -> List[Dict[str, Any]]:
+        return self.store.orphaned_leases(since, limit)
+
+    def purge_leases(self, before: float) -> int:
+        return self.store.purge_leases(before)
+
+    def heartbeat_node(self, node_id: str, ttl: float, join: bool = True) -> List[str]:
+        return self.store.heartbeat_node(node_id, ttl, join)
+
+    def remove_node(self, node_id: str):
+        self.store.remove_node(node_id)
+
+
+# 申请租约：KEYS: 租约, 到期集合, 结果；ARGV: 任务ID, 节点, 租约秒数, 任务类型, 参数, 是否让给负责节点, 记录保留秒数
+_CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then return 'finished' end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'owner', 'expires_at', 'kind')
+if state[1] and state[1] ~= ARGV[2] then
+  if (tonumber(state[2]) or 0) > now or (ARGV[6] == '1' and state[3] and state[3] ~= '') then return 'taken' end
+end
+local expires = now + tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 'owner', ARGV[2], 'expires_at', tostring(expires))
+if ARGV[4] ~= '' then redis.call('HSET', KEYS[1], 'kind', ARGV[4], 'params', ARGV[5]) end
+if redis.call('HSETNX', KEYS[1], 'created_at', tostring(now)) == 1 then
+  redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[7])))
+end
+redis.call('ZADD', KEYS[2], expires, ARGV[1])
+return 'owned'
+"""
+
+# 登记任务（不持有租约）：KEYS: 租约, 到期集合, 结果；ARGV: 任务ID, 任务类型, 参数, 记录保留秒数
+_OFFER_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then return 0 end
+if redis.call('HSETNX', KEYS[1], 'owner', '') == 1 then
+  local t = redis.call('TIME')
+  redis.call('HSET', KEYS[1], 'expires_at', '0', 'created_at', t[1])
+  redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[4])))
+  redis.call('ZADD', KEYS[2], 0, ARGV[1])
+end
+redis.call('HSETNX', KEYS[1], 'kind', ARGV[2])
+redis.call('HSETNX', KEYS[1], 'params', ARGV[3])
+return 1
+"""
+
+# 续期：KEYS: 到期集合, 各任务的租约；ARGV: 节点, 租约秒数, 各任务ID
+_RENEW_SCRIPT = """
+local t = redis.call('TIME')
+local expires = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[2])
+local kept = {}
+for i = 2, #KEYS do
+  if redis.call('HGET', KEYS[i], 'owner') == ARGV[1] then
+    redis.call('HSET', KEYS[i], 'expires_at', tostring(expires))
+    redis.call('ZADD', KEYS[1], expires, ARGV[i + 1])
+    kept[#kept + 1] = ARGV[i + 1]
+  end
+end
+return kept
+"""
+
+# 交还或结束：KEYS: 租约, 到期集合, 结果；ARGV: 任务ID, 节点, 结果JSON（空表示只交还）, 结果保留秒数
+_RELEASE_SCRIPT = """
+if ARGV[3] ~= '' then
+  redis.call('SET', KEYS[3], ARGV[3], 'EX', math.ceil(tonumber(ARGV[4])))
+end
+if redis.call('HGET', KEYS[1], 'owner') ~= ARGV[2] then return 0 end
+if ARGV[3] ~= '' then
+  redis.call('DEL', KEYS[1])
+  redis.call('ZREM', KEYS[2], ARGV[1])
+else
+  redis.call('HSET', KEYS[1], 'expires_at', '0')
+  redis.call('ZADD', KEYS[2], 0, ARGV[1])
+end
+return 1
+"""
+
+# 孤儿任务：KEYS: 到期集合；ARGV: 键前缀, 最多条数。顺带从到期集合中清理已结束、已过期和未登记类型的任务
+_ORPHANS_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local found = {}
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, tonumber(ARGV[2]))) do
+  local lease = ARGV[1] .. 'lease:' .. id
+  local state = redis.call('HMGET', lease, 'kind', 'params')
+  if redis.call('EXISTS', ARGV[1] .. 'done:' .. id) == 1 then
+    redis.call('DEL', lease)
+    redis.call('ZREM', KEYS[1], id)
+  elseif not state[1] then
+    redis.call('ZREM', KEYS[1], id)
+  else
+    found[#found + 1] = id
+    found[#found + 1] = state[1]
+    found[#found + 1] = state[2] or ''
+  end
+end
+return found
+"""
+
+# 节点心跳：KEYS: 节点集合；ARGV: 节点, 心跳有效秒数, 是否加入
+_NODES_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if ARGV[3] == '1' then redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1]) end
+return redis.call('ZRANGE', KEYS[1], 0, -1)
+"""
+
+
+class RedisLeaseBackend(LeaseBackend):
+    """多机：租约、节点和任务结果保存在 Redis 中，每个操作是一次 Lua 脚本调用（使用服务端时间）"""
+
+    def __init__(self, url: Optional[str] = None, prefix: str = TASK_LEASE_KEY_PREFIX,
+                 max_age: float = TASK_HANDLE_MAX_WAIT, client=None):
+        """
+        Args:
+            url: 连接地址，如 redis://127.0.0.1:6379/0
+            prefix: 键前缀
+            max_age: 租约记录和任务结果的保留时间（秒），过期后不再接手
+            client: 已有的客户端对象
+        """
+        if client is None:
+            if redis is None:
+                raise ImportError("Redis 租约存储需要 redis 包，请先安装: pip install redis")
+            client = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=5, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self.max_age = max_age
+        self._expiry, self._nodes = f"{prefix}expiry", f"{prefix}nodes"
+        self._claim = client.register_script(_CLAIM_SCRIPT)
+        self._offer = client.register_script(_OFFER_SCRIPT)
+        self._renew = client.register_script(_RENEW_SCRIPT)
+        self._release = client.register_script(_RELEASE_SCRIPT)
+        self._orphans = client.register_script(_ORPHANS_SCRIPT)
+        self._heartbeat = client.register_script(_NODES_SCRIPT)
+
+    def _keys(self, task_id: str) -> List[str]:
+        return [f"{self.prefix}lease:{task_id}", self._expiry, f"{self.prefix}done:{task_id}"]
+
+    def claim_lease(self, task_id: str, owner: str, ttl: float, kind: Optional[str] = None,
+                    params: Optional[Dict[str, Any]] = None, defer: bool = False) -> str:
+        params_json = json.dumps(params, ensure_ascii=False, default=str) if params is not None else ""
+        return self._claim(keys=self._keys(task_id),
+                           args=[task_id, owner, ttl, kind or "", params_json, 1 if defer else 0, self.max_age])
+
+    def offer_lease(self, task_id: str, kind: str, params: Dict[str, Any]):
+        self._offer(keys=self._keys(task_id),
+                    args=[task_id, kind, json.dumps(params, ensure_ascii=False, default=str), self.max_age])
+
+    def renew_leases(self, task_ids: List[str], owner: str, ttl: float) -> List[str]:
+        if not task_ids:
+            return []
+        keys = [self._expiry] + [f"{self.prefix}lease:{task_id}" for task_id in task_ids]
+        return list(self._renew(keys=keys, args=[owner, ttl] + list(task_ids)))
+
+    def release_lease(self, task_id: str, owner: str):
+        self._release(keys=self._keys(task_id), args=[task_id, owner, "", 0])
+
+    def finish_lease(self, task_id: str, owner: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        outcome = {"status": FAILED if error is not None else DONE, "result": result, "error": error}
+        self._release(keys=self._keys(task_id),
+                      args=[task_id, owner, json.dumps(outcome, ensure_ascii=False, default=str), self.max_age])
+
+    def outcome(self, task_id: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(f"{self.prefix}done:{task_id}")
+        return json.loads(value) if value else None
+
+    def orphaned_leases(self, since: float, limit: int) -> List[Dict[str, Any]]:
+        # 登记时间由记录过期（max_age）控制，不比较本机时钟
+        values = self._orphans(keys=[self._expiry], args=[self.prefix, limit])
+        return [{"task_id": task_id, "kind": kind, "params": json.loads(params) if params else {}}
+                for task_id, kind, params in zip(values[::3], values[1::3], values[2::3])]
+
+    def purge_leases(self, before: float) -> int:
+        # 租约记录和结果都带过期时间，扫描孤儿任务时顺带清理索引
+        return 0
+
+    def heartbeat_node(self, node_id: str, ttl: float, join: bool = True) -> List[str]:
+        return list(self._heartbeat(keys=[self._nodes], args=[node_id, ttl, 1 if join else 0]))
+
+    def remove_node(self, node_id: str):
+        self.client.zrem(self._nodes, node_id)
+
+
+def create_lease_backend(spec: str = TASK_LEASE_BACKEND) -> LeaseBackend:
+    """
+    按配置创建租约存储
+
+    Args:
+        spec: 空或 sqlite（任务记录所在的SQLite） / redis://...
+
+    Raises:
+        ValueError: 不支持的配置
+    """
+    spec = (spec or "").strip()
+    if not spec or spec == "sqlite":
+        return SQLiteLeaseBackend(task_store)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisLeaseBackend(spec)
+    raise ValueError(f"不支持的任务租约存储: {spec}，支持: sqlite, redis://主机:端口/库")
+
+
+# 租约存储不可用时的异常（放行轮询）
+BACKEND_ERRORS = (sqlite3.Error,) + ((redis.RedisError,) if redis is not None else ())
+
+
+class TaskOwnership:
+    """本节点持有的任务租约（线程安全）"""
+
+    def __init__(self, backend: Optional[LeaseBackend] = None, node_id: str = TASK_OWNERSHIP_NODE_ID,
+                 lease: float = TASK_LEASE_SECONDS, heartbeat: float = TASK_OWNERSHIP_HEARTBEAT,
+                 vnodes: int = TASK_OWNERSHIP_VNODES, scan_limit: int = TASK_ORPHAN_SCAN_LIMIT,
+                 max_age: float = TASK_HANDLE_MAX_WAIT, enabled: bool = TASK_OWNERSHIP_ENABLED,
+                 spec: str = TASK_LEASE_BACKEND):
+        """
+        Args:
+            backend: 租约存储（各节点共用），None 表示按 spec 在首次使用时创建
+            node_id: 节点标识（默认 主机名:进程号）
+            lease: 租约时长（秒）
+            heartbeat: 续期和扫描间隔（秒），不超过租约的1/3
+            vnodes: 每个节点的虚拟节点数
+            scan_limit: 每次扫描最多检查的孤儿任务数
+            max_age: 只接手此时间（秒）内登记的孤儿任务（更早的任务结果已过期）
+            enabled: 是否启用
+            spec: 租约存储配置（见 create_lease_backend），只在未提供 backend 时使用
+        """
+        self._backend = backend
+        self._spec = spec if backend is None else None
+        self._backend_lock = threading.Lock()
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease
+        self.interval = min(heartbeat, lease / 3)
+        self.vnodes = vnodes
+        self.scan_limit = scan_limit
+        self.max_age = max_age
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._heartbeat_lock = threading.Lock()   # 同一时间只进行一轮维护，旧的节点列表不会覆盖新的
+        self._held: Dict[str, list] = {}   # task_id -> [正在轮询的 PollJob（None 表示已登记、尚未轮询）, 最近一次轮询时间]
+        self._ring = HashRing([], vnodes)   # 可接手任务的存活节点，首次心跳后更新
+        self._adopt: Optional[Callable[[str, str, Dict[str, Any]], Any]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._purged_at = 0.0
+        self._error_logged_at = 0.0
+
+    @property
+    def backend(self) -> LeaseBackend:
+        """
+        租约存储（按配置首次使用时创建）
+
+        Raises:
+            ValueError: 不支持的配置
+            ImportError: 缺少存储需要的依赖
+        """
+        if self._spec is not None:
+            with self._backend_lock:
+                if self._spec is not None:
+                    self._backend = create_lease_backend(self._spec)
+                    self._spec = None
+        return self._backend
+
+    def start(self, adopt: Optional[Callable[[str, str, Dict[str, Any]], Any]] = None) -> "TaskOwnership":
+        """
+        启动后台续期线程（首次申请租约时也会自动启动）
+
+        Args:
+            adopt: 接手任务的函数 adopt(kind, task_id, params)，应开始轮询该任务；
+                   None 表示本节点只轮询自己等待的任务（不加入哈希环）
+        """
+        if adopt is not None:
+            self._adopt = adopt
+        if self.enabled:
+            self._ensure_started()
+        return self
+
+    def stop(self):
+        """停止续期，交还持有的租约并退出节点列表（其他节点立即接手），重复调用无影响"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        with self._lock:
+            held = list(self._held)
+            self._held.clear()
+            started = self._thread is not None
+        if not started:
+            return
+        for task_id in held:
+            self._safely(lambda: self.backend.release_lease(task_id, self.node_id))
+        self._safely(lambda: self.backend.remove_node(self.node_id))
+        metrics.set_gauge("volcengine_task_leases_held", 0)
+
+    def register(self, task_id: str, kind: str, params: Dict[str, Any]):
+        """
+        登记刚提交的任务（记录任务类型和参数，本节点失联后其他节点据此重新轮询）
+
+        哈希环上负责该任务的是其他节点时只登记不持有租约，由负责节点接手轮询（下一次心跳时），
+        本节点的等待方只读取结果。
+
+        Args:
+            task_id: 任务ID
+            kind: 任务类型（与作业类型相同）
+            params: 任务参数
+        """
+        if not self.enabled or self._stop.is_set():
+            return
+        self._ensure_started()
+        if self._ring.owner(task_id) not in (None, self.node_id):
+            self._safely(lambda: self.backend.offer_lease(task_id, kind, params))
+            metrics.inc("volcengine_task_handoffs_total", kind=kind)
+            return
+        outcome = self._safely(lambda: self.backend.claim_lease(task_id, self.node_id, self.lease, kind, params))
+        if outcome == LEASE_OWNED:
+            with self._lock:
+                self._held.setdefault(task_id, [None, time.time()])
+
+    def claim(self, task_id: str, holder: Any) -> bool:
+        """
+        轮询前申请（或确认）任务的租约
+
+        Args:
+            task_id: 任务ID
+            holder: 轮询方（PollJob），本节点同一任务的多个轮询方中只有一个查询服务端
+
+        Returns:
+            True 表示由调用方查询服务端；False 表示其他轮询方负责，调用方只读取任务记录
+        """
+        if not self.enabled or self._stop.is_set():
+            return True
+        self._ensure_started()
+        now = time.time()
+        with self._lock:
+            entry = self._held.get(task_id)
+            if entry is not None:
+                if entry[0] is None or entry[0] is holder or now - entry[1] > self.lease:
+                    entry[0], entry[1] = holder, now
+                    return True
+                return False
+        # 已登记的任务由哈希环上负责的节点轮询（其失联时租约到期、随节点列表更新换到新的负责节点）
+        defer = self._ring.owner(task_id) not in (None, self.node_id)
+        outcome = self._safely(lambda: self.backend.claim_lease(task_id, self.node_id, self.lease, defer=defer),
+                               LEASE_OWNED)
+        if outcome != LEASE_OWNED:
+            metrics.inc("volcengine_task_follows_total")
+            return False
+        with self._lock:
+            entry = self._held.setdefault(task_id, [holder, now])
+            metrics.set_gauge("volcengine_task_leases_held", len(self._held))
+            return entry[0] is holder
+
+    def finish(self, task_id: str, holder: Any, result: Optional[Dict] = None,
+               error: Optional[BaseException] = None):
+        """
+        任务已结束：删除租约并记录结果（其他节点上的等待方据此结束）
+
+        Args:
+            task_id: 任务ID
+            holder: 轮询方（PollJob）
+            result: 任务结果
+            error: 任务失败的异常
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._held.get(task_id)
+            if entry is None or entry[0] is not holder:
+                return
+            del self._held[task_id]
+        message = str(error) if error is not None else None
+        self._safely(lambda: self.backend.finish_lease(task_id, self.node_id, result, message))
+
+    def outcome(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        其他轮询方写入的任务结果
+
+        Returns:
+            {"status", "result", "error"}，任务尚未结束或租约存储不可用时返回None
+        """
+        return self._safely(lambda: self.backend.outcome(task_id))
+
+    def owner_of(self, task_id: str) -> Optional[str]:
+        """一致性哈希环上负责该任务的节点（环为空时返回None）"""
+        return self._ring.owner(task_id)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Returns:
+            {"enabled", "node_id", "nodes", "held"}
+        """
+        with self._lock:
+            held = len(self._held)
+        return {"enabled": self.enabled, "node_id": self.node_id, "nodes": list(self._ring.nodes), "held": held}
+
+    def _ensure_started(self):
+        self.backend  # 配置错误在调用方抛出，而不是在后台线程中
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="volc-task-ownership", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        self._heartbeat()
+        while not self._stop.wait(self.interval):
+            self._heartbeat()
+
+    def _heartbeat(self):
+        """一轮维护：节点心跳、续期/交还租约、接手分到本节点的任务"""
+        with self._heartbeat_lock:
+            self._maintain()
+
+    def _maintain(self):
+        try:
+            self._refresh_ring(self.backend.heartbeat_node(self.node_id, self.lease, join=self._adopt is not None))
+            self._renew()
+            if self._adopt is not None:
+                self._adopt_orphans()
+            now = time.time()
+            if now - self._purged_at > _PURGE_INTERVAL:
+                self._purged_at = now
+                self.backend.purge_leases(now - self.max_age)
+        except BACKEND_ERRORS as e:
+            self._log_error(e)
+
+    def _refresh_ring(self, nodes: List[str]):
+        if tuple(sorted(set(nodes))) == self._ring.nodes:
+            return
+        joined = set(nodes) - set(self._ring.nodes)
+        left = set(self._ring.nodes) - set(nodes)
+        self._ring = HashRing(nodes, self.vnodes)
+        metrics.set_gauge("volcengine_task_ownership_nodes", len(self._ring.nodes))
+        if joined - {self.node_id} or left:
+            print(f"🔁 轮询节点变化：加入 {sorted(joined) or '-'}，退出 {sorted(left) or '-'}，当前 {len(self._ring.nodes)} 个节点")
+
+    def _renew(self):
+        """续期最近轮询过的任务，交还超过一个租约时长没有轮询的任务"""
+        now = time.time()
+        with self._lock:
+            active = [task_id for task_id, entry in self._held.items() if now - entry[1] <= self.lease]
+            stale = [task_id for task_id, entry in self._held.items() if now - entry[1] > self.lease]
+            for task_id in stale:
+                del self._held[task_id]
+        for task_id in stale:
+            self.backend.release_lease(task_id, self.node_id)
+        kept = set(self.backend.renew_leases(active, self.node_id, self.lease))
+        lost = [task_id for task_id in active if task_id not in kept]
+        with self._lock:
+            for task_id in lost:
+                self._held.pop(task_id, None)
+            metrics.set_gauge("volcengine_task_leases_held", len(self._held))
+        if lost:
+            print(f"⚠️ {len(lost)} 个任务的租约已被其他节点接手，本节点停止查询")
+
+    def _adopt_orphans(self):
+        """接手登记后交给本节点或租约已到期、按哈希环分到本节点的任务"""
+        for orphan in self.backend.orphaned_leases(time.time() - self.max_age, self.scan_limit):
+            task_id = orphan["task_id"]
+            if self._stop.is_set():
+                return
+            if self._ring.owner(task_id) != self.node_id:
+                continue
+            with self._lock:
+                if task_id in self._held:
+                    continue
+            if self.backend.claim_lease(task_id, self.node_id, self.lease) != LEASE_OWNED:
+                continue
+            with self._lock:
+                self._held.setdefault(task_id, [None, time.time()])
+            try:
+                self._adopt(orphan["kind"], task_id, orphan["params"])
+            except Exception as e:
+                print(f"⚠️ 接手任务 {task_id} 失败: {str(e)}")
+                with self._lock:
+                    self._held.pop(task_id, None)
+                self.backend.release_lease(task_id, self.node_id)
+                continue
+            metrics.inc("volcengine_task_orphans_adopted_total", kind=orphan["kind"])
+            print(f"🔁 接手任务 {task_id}（{orphan['kind']}）")
+
+    def _safely(self, fn: Callable[[], Any], fallback: Any = None) -> Any:
+        """执行租约操作，租约存储不可用时返回 fallback（放行轮询）"""
+        try:
+            return fn()
+        except BACKEND_ERRORS as e:
+            self._log_error(e)
+            return fallback
+
+    def _log_error(self, error: BaseException):
+        metrics.inc("volcengine_task_ownership_errors_total")
+        now = time.monotonic()
+        if now - self._error_logged_at >= 60:
+            self._error_logged_at = now
+            print(f"⚠️ 任务租约操作失败，暂时放行轮询: {str(error)}")
+
+
+# 全局任务所有权（进程内所有轮询共用，按 VOLCENGINE_TASK_LEASE_BACKEND 配置租约存储，首次使用时创建）
+task_ownership = TaskOwnership(spec=TASK_LEASE_BACKEND)
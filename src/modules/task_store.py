@@ -0,0 +1,394 @@
+"""
+任务记录 - 用 SQLite 持久化任务的提交、结果和结果文件
+
+- tasks: 每个任务一行（服务标识、状态、提交/结束时间、结果JSON、错误）
+- assets: 任务结果中的临时URL（video_url / preview_url / image_urls）及其本地镜像路径
+- task_leases: 任务轮询租约（持有节点、到期时间）和重新轮询所需的参数（见 modules/task_ownership.py）
+- nodes: 共用任务记录的节点及其心跳到期时间
+  （租约和节点表只适用于同一台机器上的进程；多机部署使用 Redis 租约后端，见 modules/task_ownership.py）
+- 多线程共用一个连接（加锁），WAL 模式允许其他进程同时读取
+- 记录失败只打印警告，不影响任务本身（租约操作除外，由调用方决定如何处理）
+- 默认不记录（VOLCENGINE_TASK_STORE=1 启用，启用结果镜像或任务所有权时自动启用），
+  未启用时不创建数据库文件，记录操作直接返回
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config import TASK_STORE_ENABLED, TASK_STORE_PATH, RESULT_MIRROR_ENABLED, TASK_OWNERSHIP_ENABLED
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id      TEXT PRIMARY KEY,
+    req_key      TEXT,
+    status       TEXT NOT NULL,
+    submitted_at REAL,
+    finished_at  REAL,
+    result       TEXT,
+    error        TEXT
+);
+CREATE TABLE IF NOT EXISTS assets (
+    task_id     TEXT NOT NULL,
+    field       TEXT NOT NULL,
+    idx         INTEGER NOT NULL,
+    url         TEXT NOT NULL,
+    expires_at  REAL,
+    path        TEXT,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    mirrored_at REAL,
+    PRIMARY KEY (task_id, field, idx)
+);
+CREATE INDEX IF NOT EXISTS assets_pending ON assets (status, expires_at);
+CREATE TABLE IF NOT EXISTS task_leases (
+    task_id    TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    kind       TEXT,
+    params     TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS task_leases_expiry ON task_leases (expires_at);
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id    TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+"""
+
+# 任务状态
+SUBMITTED = "submitted"
+DONE = "done"
+FAILED = "failed"
+
+# UPDATE/DELETE ... RETURNING 需要 SQLite 3.35+，更早的版本在事务中先查询再更新
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 租约申请结果
+LEASE_OWNED = "owned"          # 已持有（新申请或续期）
+LEASE_TAKEN = "taken"          # 其他节点持有且未到期
+LEASE_FINISHED = "finished"    # 任务已结束，无需轮询
+
+# 结果文件状态
+ASSET_PENDING = "pending"
+ASSET_MIRRORED = "mirrored"
+ASSET_EXPIRED = "expired"
+
+
+class TaskStore:
+    """任务记录存储（线程安全）"""
+
+    def __init__(self, path: str = TASK_STORE_PATH,
+                 enabled: bool = TASK_STORE_ENABLED or RESULT_MIRROR_ENABLED or TASK_OWNERSHIP_ENABLED):
+        """
+        Args:
+            path: 数据库文件路径（首次写入时创建）
+            enabled: 是否记录任务（租约操作不受影响，只在启用任务所有权时调用）
+        """
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = (), many: bool = False, quiet: bool = True) -> List[sqlite3.Row]:
+        """
+        执行SQL
+
+        Args:
+            quiet: 出错时只打印警告并返回空列表（任务记录操作，未启用时直接返回空列表）；
+                   为False时抛出 sqlite3.Error（租约操作）
+        """
+        if quiet and not self.enabled:
+            return []
+        try:
+            with self._lock:
+                conn = self._connect()
+                cursor = conn.executemany(sql, params) if many else conn.execute(sql, params)
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            if not quiet:
+                raise
+            print(f"⚠️ 任务记录写入失败: {str(e)}")
+            return []
+
+    def record_submitted(self, task_id: str, req_key: Optional[str] = None):
+        """记录已提交的任务"""
+        self._execute(
+            "INSERT INTO tasks (task_id, req_key, status, submitted_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(task_id) DO NOTHING",
+            (task_id, req_key, SUBMITTED, time.time())
+        )
+
+    def record_finished(self, task_id: str, req_key: Optional[str] = None, result: Optional[Dict] = None,
+                        error: Optional[BaseException] = None):
+        """
+        记录任务结束
+
+        Args:
+            task_id: 任务ID
+            req_key: 服务标识
+            result: 任务结果（成功时）
+            error: 失败原因（失败时）
+        """
+        status = FAILED if error is not None else DONE
+        result_json = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        self._execute(
+            "INSERT INTO tasks (task_id, req_key, status, finished_at, result, error) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(task_id) DO UPDATE SET req_key = COALESCE(excluded.req_key, req_key), "
+            "status = excluded.status, finished_at = excluded.finished_at, "
+            "result = excluded.result, error = excluded.error",
+            (task_id, req_key, status, time.time(), result_json, str(error) if error is not None else None)
+        )
+
+    def add_assets(self, task_id: str, assets: List[Dict[str, Any]]):
+        """
+        记录任务的结果文件（已记录的不会覆盖）
+
+        Args:
+            task_id: 任务ID
+            assets: [{"field", "idx", "url", "expires_at"}]
+        """
+        self._execute(
+            "INSERT INTO assets (task_id, field, idx, url, expires_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(task_id, field, idx) DO NOTHING",
+            [(task_id, a["field"], a["idx"], a["url"], a.get("expires_at")) for a in assets],
+            many=True
+        )
+
+    def update_asset(self, task_id: str, field: str, idx: int, status: str, path: Optional[str] = None):
+        """更新结果文件的镜像状态和本地路径"""
+        self._execute(
+            "UPDATE assets SET status = ?, path = COALESCE(?, path), mirrored_at = ? "
+            "WHERE task_id = ? AND field = ? AND idx = ?",
+            (status, path, time.time() if status == ASSET_MIRRORED else None, task_id, field, idx)
+        )
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务记录
+
+        Returns:
+            任务记录（含 result 和 assets 列表），不存在时返回None
+        """
+        rows = self._execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
+        if not rows:
+            return None
+        record = dict(rows[0])
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        record["assets"] = [dict(row) for row in self._execute(
+            "SELECT field, idx, url, expires_at, path, status, mirrored_at FROM assets "
+            "WHERE task_id = ? ORDER BY field, idx", (task_id,)
+        )]
+        return record
+
+    def local_path(self, url: str) -> Optional[str]:
+        """已镜像到本地的结果文件路径（文件已被删除时返回None）"""
+        rows = self._execute("SELECT path FROM assets WHERE url = ? AND status = ? ORDER BY mirrored_at DESC",
+                             (url, ASSET_MIRRORED))
+        for row in rows:
+            if row["path"] and os.path.exists(row["path"]):
+                return row["path"]
+        return None
+
+    def recent_durations(self, req_key: str, since: float, limit: int) -> List[tuple]:
+        """
+        服务近期结束的任务耗时（服务路由使用）
+
+        Args:
+            req_key: 服务标识
+            since: 只返回此时间（Unix时间戳）之后结束的任务
+            limit: 最多返回的条数（取最新的）
+
+        Returns:
+            按结束时间升序的 [(结束时间, 耗时秒数或None, 是否成功)]
+        """
+        rows = self._execute(
+            "SELECT finished_at, finished_at - submitted_at AS seconds, status FROM tasks "
+            "WHERE req_key = ? AND finished_at >= ? AND status IN (?, ?) ORDER BY finished_at DESC LIMIT ?",
+            (req_key, since, DONE, FAILED, limit)
+        )
+        return [(row["finished_at"], row["seconds"], row["status"] == DONE) for row in reversed(rows)]
+
+    def pending_assets(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """尚未镜像且未过期的结果文件（进程重启后继续镜像）"""
+        now = time.time() if now is None else now
+        rows = self._execute(
+            "SELECT a.task_id, a.field, a.idx, a.url, a.expires_at, t.req_key FROM assets a "
+            "LEFT JOIN tasks t ON t.task_id = a.task_id "
+            "WHERE a.status = ? AND (a.expires_at IS NULL OR a.expires_at > ?) ORDER BY a.expires_at",
+            (ASSET_PENDING, now)
+        )
+        return [dict(row) for row in rows]
+
+    # 任务租约（出错时抛出 sqlite3.Error）
+    def _transaction(self, work):
+        """在写事务中执行 work(conn)（BEGIN IMMEDIATE，多个进程互斥）"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def claim_lease(self, task_id: str, owner: str, ttl: float, kind: Optional[str] = None,
+                    params: Optional[Dict[str, Any]] = None, defer: bool = False) -> str:
+        """
+        申请或续期任务的轮询租约
+
+        Args:
+            task_id: 任务ID
+            owner: 申请的节点
+            ttl: 租约时长（秒）
+            kind: 任务类型（提供时一并记录，节点失联后其他节点据此重新轮询）
+            params: 任务参数
+            defer: 任务已登记任务类型（可由其他节点接手）时不申请，留给哈希环上负责的节点
+
+        Returns:
+            LEASE_OWNED / LEASE_TAKEN / LEASE_FINISHED
+        """
+        params_json = json.dumps(params, ensure_ascii=False, default=str) if params is not None else None
+
+        def work(conn):
+            now = time.time()
+            row = conn.execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None and row["status"] in (DONE, FAILED):
+                return LEASE_FINISHED
+            lease = conn.execute("SELECT owner, expires_at, kind FROM task_leases WHERE task_id = ?",
+                                 (task_id,)).fetchone()
+            if lease is None:
+                conn.execute("INSERT INTO task_leases (task_id, owner, expires_at, kind, params, created_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", (task_id, owner, now + ttl, kind, params_json, now))
+                return LEASE_OWNED
+            if lease["owner"] != owner and (lease["expires_at"] > now or (defer and lease["kind"] is not None)):
+                return LEASE_TAKEN
+            conn.execute("UPDATE task_leases SET owner = ?, expires_at = ?, kind = COALESCE(?, kind), "
+                         "params = COALESCE(?, params) WHERE task_id = ?",
+                         (owner, now + ttl, kind, params_json, task_id))
+            return LEASE_OWNED
+        return self._transaction(work)
+
+    def offer_lease(self, task_id: str, kind: str, params: Dict[str, Any]):
+        """登记任务类型和参数但不持有租约（租约立即到期，由哈希环上负责的节点接手）"""
+        self._execute(
+            "INSERT INTO task_leases (task_id, owner, expires_at, kind, params, created_at) VALUES (?, '', 0, ?, ?, ?) "
+            "ON CONFLICT(task_id) DO UPDATE SET kind = COALESCE(kind, excluded.kind), "
+            "params = COALESCE(params, excluded.params)",
+            (task_id, kind, json.dumps(params, ensure_ascii=False, default=str), time.time()), quiet=False
+        )
+
+    def renew_leases(self, task_ids: List[str], owner: str, ttl: float) -> List[str]:
+        """
+        续期节点持有的租约
+
+        Returns:
+            仍由该节点持有的任务ID（其余已被其他节点接手）
+        """
+        if not task_ids:
+            return []
+        placeholders = ",".join("?" * len(task_ids))
+        if _HAS_RETURNING:
+            rows = self._execute(
+                f"UPDATE task_leases SET expires_at = ? WHERE owner = ? AND task_id IN ({placeholders}) "
+                "RETURNING task_id", (time.time() + ttl, owner, *task_ids), quiet=False
+            )
+            return [row["task_id"] for row in rows]
+
+        def work(conn):
+            kept = [row["task_id"] for row in conn.execute(
+                f"SELECT task_id FROM task_leases WHERE owner = ? AND task_id IN ({placeholders})", (owner, *task_ids)
+            )]
+            conn.execute(f"UPDATE task_leases SET expires_at = ? WHERE owner = ? AND task_id IN ({placeholders})",
+                         (time.time() + ttl, owner, *task_ids))
+            return kept
+        return self._transaction(work)
+
+    def release_lease(self, task_id: str, owner: str, finished: bool = False):
+        """
+        交还租约
+
+        Args:
+            finished: 任务已结束（删除租约记录）；否则只让租约立即到期，其他节点可以接手
+        """
+        if finished:
+            self._execute("DELETE FROM task_leases WHERE task_id = ? AND owner = ?", (task_id, owner), quiet=False)
+        else:
+            self._execute("UPDATE task_leases SET expires_at = 0 WHERE task_id = ? AND owner = ?",
+                          (task_id, owner), quiet=False)
+
+    def orphaned_leases(self, since: float, limit: int) -> List[Dict[str, Any]]:
+        """
+        租约已到期、尚未结束且记录了任务类型的任务（持有节点已失联或已放弃轮询）
+
+        Args:
+            since: 只返回此时间（Unix时间戳）之后登记的任务
+            limit: 最多返回的条数
+
+        Returns:
+            [{"task_id", "kind", "params"}]
+        """
+        rows = self._execute(
+            "SELECT l.task_id, l.kind, l.params FROM task_leases l LEFT JOIN tasks t ON t.task_id = l.task_id "
+            "WHERE l.expires_at <= ? AND l.kind IS NOT NULL AND l.created_at >= ? "
+            "AND (t.status IS NULL OR t.status = ?) ORDER BY l.expires_at LIMIT ?",
+            (time.time(), since, SUBMITTED, limit), quiet=False
+        )
+        return [{"task_id": row["task_id"], "kind": row["kind"],
+                 "params": json.loads(row["params"]) if row["params"] else {}} for row in rows]
+
+    def purge_leases(self, before: float) -> int:
+        """删除已结束任务的租约和早于 before 登记的租约（节点在记录结束后、交还租约前失联时会留下）"""
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM task_leases WHERE expires_at <= ? AND (created_at < ? OR task_id IN "
+            "(SELECT task_id FROM tasks WHERE status IN (?, ?)))",
+            (time.time(), before, DONE, FAILED)
+        ).rowcount)
+
+    def heartbeat_node(self, node_id: str, ttl: float, join: bool = True) -> List[str]:
+        """
+        记录节点心跳并清理失联节点
+
+        Args:
+            join: 是否加入节点列表（False 时只清理并返回存活节点，用于不接手任务的节点）
+
+        Returns:
+            存活的节点ID（join 时含自身）
+        """
+        now = time.time()
+        if join:
+            self._execute("INSERT INTO nodes (node_id, expires_at) VALUES (?, ?) "
+                          "ON CONFLICT(node_id) DO UPDATE SET expires_at = excluded.expires_at",
+                          (node_id, now + ttl), quiet=False)
+        self._execute("DELETE FROM nodes WHERE expires_at <= ?", (now,), quiet=False)
+        return [row["node_id"] for row in self._execute("SELECT node_id FROM nodes ORDER BY node_id", quiet=False)]
+
+    def remove_node(self, node_id: str):
+        """节点退出"""
+        self._execute("DELETE FROM nodes WHERE node_id = ?", (node_id,), quiet=False)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 全局任务记录
+task_store = TaskStore()
@@ -0,0 +1,262 @@
+"""
+URL 可达性校验 - 提交付费任务前批量检查输入URL
+
+- 语法检查：http/https、主机名合法
+- 主机检查：域名能否解析、是否为内网/回环地址（服务端无法访问）
+- 内容检查：HEAD 请求（不支持时改用 1 字节 Range GET）检查状态码、Content-Type 和 Content-Length
+- 同一批URL并发检查；结果按URL缓存，同一URL被大量任务复用时只检查一次
+- 本地网络原因无法判断（超时、连接失败、服务器5xx）时放行并且不缓存，由服务端校验
+"""
+
+import ipaddress
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+
+from ..config import (
+    CONNECT_TIMEOUT, URL_CHECK_TIMEOUT, URL_CHECK_WORKERS, URL_CHECK_CACHE_SIZE,
+    URL_CHECK_CACHE_TTL, URL_CHECK_ALLOW_PRIVATE
+)
+from .deadline import request_timeout
+from .metrics import metrics
+
+# 各类素材可接受的 Content-Type 主类型（audio 也接受 video/mp4 等容器类型）
+_KIND_TYPES = {
+    "image": ("image/",),
+    "audio": ("audio/", "video/"),
+    "video": ("video/",),
+}
+# 对象存储常用的通用二进制类型，无法判断具体内容，放行
+_GENERIC_TYPES = {"application/octet-stream", "binary/octet-stream", "application/binary", ""}
+_KIND_NAMES = {"image": "图片", "audio": "音频", "video": "视频"}
+
+
+class UrlValidationError(ValueError):
+    """输入URL不可用（重试也不会成功）"""
+
+    retryable = False
+
+
+class UrlCheck:
+    """单个URL的检查结果"""
+
+    def __init__(self, url: str, ok: bool, reason: Optional[str] = None, status: Optional[int] = None,
+                 content_type: Optional[str] = None, size: Optional[int] = None, definite: bool = True):
+        self.url = url
+        self.ok = ok                      # 是否可用（无法判断时为True）
+        self.reason = reason              # 不可用或无法判断的原因
+        self.status = status              # HTTP状态码
+        self.content_type = content_type  # 去掉参数后的小写 Content-Type
+        self.size = size                  # 文件字节数（未知为None）
+        self.definite = definite          # 结果是否确定（不确定的结果不缓存）
+
+    def problem(self, kind: Optional[str] = None, max_bytes: Optional[int] = None) -> Optional[str]:
+        """
+        按素材类型和大小上限检查
+
+        Args:
+            kind: image / audio / video，None 表示不检查类型
+            max_bytes: 文件大小上限
+
+        Returns:
+            不符合时的说明，符合时返回None
+        """
+        if not self.ok:
+            return self.reason
+        if kind and self.content_type is not None and self.content_type not in _GENERIC_TYPES:
+            if not self.content_type.startswith(_KIND_TYPES.get(kind, ())):
+                return f"内容类型为 {self.content_type}，不是{_KIND_NAMES.get(kind, kind)}"
+        if max_bytes is not None and self.size is not None and self.size > max_bytes:
+            return f"文件大小 {self.size / 1024 / 1024:.1f}MB，超过上限 {max_bytes / 1024 / 1024:.0f}MB"
+        return None
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"invalid: {self.reason}"
+        return f"UrlCheck({self.url}, {state}, status={self.status}, type={self.content_type}, size={self.size})"
+
+
+def parse_http_url(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    URL 语法检查
+
+    Args:
+        url: 要检查的URL
+
+    Returns:
+        (主机名, 错误说明)，语法正确时错误说明为None
+    """
+    if not url or not isinstance(url, str):
+        return None, "URL为空"
+    if any(ch.isspace() for ch in url):
+        return None, "URL包含空白字符"
+    try:
+        parts = urlsplit(url)
+        parts.port  # 端口不合法时抛出ValueError
+    except ValueError as e:
+        return None, f"URL格式不正确: {e}"
+    if parts.scheme.lower() not in ("http", "https"):
+        return None, "URL必须以 http:// 或 https:// 开头"
+    if not parts.hostname:
+        return None, "URL缺少主机名"
+    return parts.hostname, None
+
+
+def _is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+class UrlValidator:
+    """带缓存的URL校验器（线程安全）"""
+
+    def __init__(self, cache_size: int = URL_CHECK_CACHE_SIZE, ttl: float = URL_CHECK_CACHE_TTL,
+                 workers: int = URL_CHECK_WORKERS, allow_private: bool = URL_CHECK_ALLOW_PRIVATE):
+        """
+        Args:
+            cache_size: 最多缓存的URL数
+            ttl: 缓存有效期（秒）
+            workers: 并发检查的线程数
+            allow_private: 是否允许内网地址（服务端部署在同一内网时开启）
+        """
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.workers = workers
+        self.allow_private = allow_private
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[UrlCheck, float]]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def check(self, url: str) -> UrlCheck:
+        """
+        检查单个URL（优先使用缓存）
+
+        Args:
+            url: 要检查的URL
+
+        Returns:
+            检查结果
+        """
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached and time.monotonic() - cached[1] < self.ttl:
+                self._cache.move_to_end(url)
+                metrics.inc("volcengine_url_check_total", result="cached")
+                return cached[0]
+
+        result = self._check(url)
+        metrics.inc("volcengine_url_check_total",
+                    result="ok" if result.ok and result.definite else "unknown" if result.ok else "invalid")
+        if result.definite:
+            with self._lock:
+                self._cache[url] = (result, time.monotonic())
+                self._cache.move_to_end(url)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def check_many(self, urls: List[str]) -> Dict[str, UrlCheck]:
+        """
+        并发检查一批URL（重复的URL只检查一次）
+
+        Args:
+            urls: URL列表
+
+        Returns:
+            {url: 检查结果}
+        """
+        unique = list(dict.fromkeys(urls))
+        if len(unique) <= 1:
+            return {url: self.check(url) for url in unique}
+        return dict(zip(unique, self._pool().map(self.check, unique)))
+
+    def validate(self, items: Dict[str, Tuple[Optional[str], Optional[int]]]) -> Dict[str, UrlCheck]:
+        """
+        按素材类型和大小上限校验一批URL，任一不可用时抛出异常（列出全部问题）
+
+        Args:
+            items: {url: (素材类型 image/audio/video, 大小上限字节数)}
+
+        Returns:
+            {url: 检查结果}
+
+        Raises:
+            UrlValidationError: 存在不可用的URL
+        """
+        results = self.check_many(list(items))
+        problems = []
+        for url, (kind, max_bytes) in items.items():
+            problem = results[url].problem(kind, max_bytes)
+            if problem:
+                problems.append(f"{_KIND_NAMES.get(kind, '')}URL不可用 ({problem}): {url}")
+        if problems:
+            raise UrlValidationError("; ".join(problems))
+        for result in results.values():
+            if not result.definite:
+                print(f"⚠️ 无法确认URL可用，交由服务端校验: {result.url} ({result.reason})")
+        return results
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="volc-url-check")
+            return self._executor
+
+    def _check(self, url: str) -> UrlCheck:
+        host, error = parse_http_url(url)
+        if error:
+            return UrlCheck(url, False, error)
+
+        if not self.allow_private:
+            try:
+                addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+            except socket.gaierror as e:
+                if e.errno == socket.EAI_NONAME:
+                    return UrlCheck(url, False, f"域名无法解析: {host}")
+                return UrlCheck(url, True, f"域名解析失败: {e}", definite=False)
+            if not all(_is_public_address(address) for address in addresses):
+                return UrlCheck(url, False, f"{host} 是内网地址，服务端无法访问")
+
+        timeout = request_timeout(CONNECT_TIMEOUT, URL_CHECK_TIMEOUT)
+        try:
+            response = requests.head(url, allow_redirects=True, timeout=timeout)
+            if response.status_code >= 400 and response.status_code not in (404, 410):
+                # 部分服务器（及只对GET签名的预签名URL）不支持HEAD，改用1字节的Range GET
+                response = self._range_get(url, timeout)
+        except requests.exceptions.RequestException as e:
+            return UrlCheck(url, True, f"请求失败: {e.__class__.__name__}", definite=False)
+
+        status = response.status_code
+        if status >= 500:
+            return UrlCheck(url, True, f"HTTP {status}", status=status, definite=False)
+        if status >= 400:
+            return UrlCheck(url, False, f"HTTP {status}", status=status)
+
+        content_type = response.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        length = response.headers.get("Content-Length", "")
+        if status == 206:
+            size = int(total) if total.isdigit() else None
+        else:
+            size = int(length) if length.isdigit() else None
+        return UrlCheck(url, True, status=status, content_type=content_type, size=size)
+
+    @staticmethod
+    def _range_get(url: str, timeout) -> requests.Response:
+        with requests.get(url, headers={"Range": "bytes=0-0"}, stream=True,
+                          allow_redirects=True, timeout=timeout) as response:
+            return response
+
+
+# 全局URL校验器
+url_validator = UrlValidator()
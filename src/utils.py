@@ -4,7 +4,22 @@
 
 import time
 from functools import wraps
-from typing import Callable, Any
+from typing import Callable, Any, Optional
+
+from .config import CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT
+from .modules.deadline import Deadline, current_deadline
+from .modules.url_validator import parse_http_url
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """沿异常链检查是否允许重试（retryable = False 的异常不重试）"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if not getattr(exc, "retryable", True):
+            return False
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return True
 
 
 def retry(max_retries: int = 3, delay: int = 2, exceptions: tuple = (Exception,)):
@@ -26,9 +41,18 @@ def retry(max_retries: int = 3, delay: int = 2, exceptions: tuple = (Exception,)
                     return func(*args, **kwargs)
                 except exceptions as e:
                     last_exception = e
+                    # 熔断等快速失败类异常不重试（包括被包装过的）
+                    if not _is_retryable(e):
+                        raise
                     if attempt < max_retries:
                         print(f"操作失败：{str(e)}，{delay}秒后重试... (尝试 {attempt + 1}/{max_retries + 1})")
-                        time.sleep(delay)
+                        # 有截止时间时，等待不超过剩余预算，到期后不再重试
+                        deadline = current_deadline()
+                        if deadline is None:
+                            time.sleep(delay)
+                        elif not deadline.sleep(delay):
+                            print("已到截止时间，停止重试")
+                            break
                     else:
                         print(f"操作失败，已达到最大重试次数 ({max_retries + 1})")
                         break
@@ -41,7 +65,7 @@ def retry(max_retries: int = 3, delay: int = 2, exceptions: tuple = (Exception,)
 
 def validate_url(url: str) -> bool:
     """
-    验证URL格式
+    验证URL格式（http/https 且主机名合法；可达性检查见 modules.url_validator）
 
     Args:
         url: 要验证的URL
@@ -49,10 +73,8 @@ def validate_url(url: str) -> bool:
     Returns:
         是否为有效URL
     """
-    if not url or not isinstance(url, str):
-        return False
-
-    return (url.startswith('http://') or url.startswith('https://')) and len(url) > 10
+    _, error = parse_http_url(url)
+    return error is None
 
 
 def validate_mode(mode: str) -> bool:
@@ -153,13 +175,15 @@ def get_output_resolution(mode: str, aspect_ratio: str = None) -> tuple:
         return None  # 普通模式保持原图比例
 
 
-def download_image(url: str, filename: str) -> str:
+def download_image(url: str, filename: str, deadline: Optional[Deadline] = None, task_id: Optional[str] = None) -> str:
     """
-    下载图片文件
+    下载图片文件（经过资源存储：内容相同的文件只保存一份，已下载过的URL直接从本地取得）
 
     Args:
         url: 图片URL
         filename: 保存的文件名
+        deadline: 截止时间（默认使用当前上下文中的截止时间）
+        task_id: 所属任务ID（记录到资源存储的索引）
 
     Returns:
         下载的文件名
@@ -167,23 +191,60 @@ def download_image(url: str, filename: str) -> str:
     Raises:
         Exception: 下载失败
     """
-    import requests
-    import os
+    from .modules.asset_store import asset_store
 
     try:
         print(f"正在下载图片: {url}")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        asset = asset_store.fetch(url, filename, task_id=task_id, deadline=deadline)
+        if asset.cached:
+            print("♻️ 图片已在本地存储中，无需重复下载")
+        print(f"✅ 图片已保存到: {filename}")
+        return filename
 
-        # 确保目录存在
-        os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
+    except IOError as e:
+        raise Exception(f"文件写入失败: {str(e)}")
 
-        with open(filename, 'wb') as f:
-            f.write(response.content)
 
-        print(f"✅ 图片已保存到: {filename}")
-        return filename
+def download_file(url: str, filename: str, deadline: Optional[Deadline] = None,
+                  on_chunk: Optional[Callable[[bytes, int], None]] = None,
+                  on_response: Optional[Callable[[Any], None]] = None) -> str:
+    """
+    流式下载文件（不打印进度，供并行下载使用）
+
+    Args:
+        url: 文件URL
+        filename: 保存的文件名
+        deadline: 截止时间（默认使用当前上下文中的截止时间）
+        on_chunk: 每写入一块数据后调用 on_chunk(数据块, 文件总大小)，总大小未知时为0（用于边下载边计算哈希、显示进度）
+        on_response: 收到响应后调用 on_response(响应头)（如读取 Content-Type）
+
+    Returns:
+        下载的文件名
+
+    Raises:
+        Exception: 下载失败
+    """
+    import requests
+    import os
+
+    deadline = deadline or current_deadline()
+    timeout = deadline.request_timeout(CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT) if deadline else (CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)
 
+    try:
+        with requests.get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if on_response:
+                on_response(response.headers)
+            total_size = int(response.headers.get('content-length', 0) or 0)
+            os.makedirs(os.path.dirname(filename) if os.path.dirname(filename) else '.', exist_ok=True)
+            with open(filename, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    if deadline:
+                        deadline.check("文件下载")
+                    f.write(chunk)
+                    if on_chunk:
+                        on_chunk(chunk, total_size)
+        return filename
     except requests.exceptions.Timeout:
         raise Exception("下载超时，请检查网络连接")
     except requests.exceptions.ConnectionError:
@@ -192,5 +253,3 @@ def download_image(url: str, filename: str) -> str:
         raise Exception(f"下载失败: HTTP {e.response.status_code}")
     except requests.exceptions.RequestException as e:
         raise Exception(f"下载失败: {str(e)}")
-    except IOError as e:
-        raise Exception(f"文件写入失败: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# 测试使用临时任务记录，不下载结果文件
+os.environ.setdefault("VOLCENGINE_TASK_DB", os.path.join(tempfile.mkdtemp(prefix="volc-test-"), "tasks.db"))
+os.environ.setdefault("VOLCENGINE_RESULT_MIRROR", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
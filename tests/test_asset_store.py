@@ -0,0 +1,106 @@
+import os
+import stat
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.modules.asset_store import AssetStore
+
+
+class FileServer:
+    """本地文件服务：路径 -> (内容, Content-Type)，记录收到的请求"""
+
+    def __init__(self):
+        self.files = {}
+        self.hits = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                server.hits.append(path)
+                body, content_type = server.files[path]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = FileServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AssetStore(str(tmp_path / "assets"), max_bytes=0)
+
+
+def test_same_content_is_stored_once(server, store, tmp_path):
+    server.files["/a.mp4"] = (b"video-1", "video/mp4")
+    server.files["/b.mp4"] = (b"video-1", "video/mp4")
+    first = store.fetch(f"{server.url}/a.mp4", str(tmp_path / "out" / "a.mp4"))
+    second = store.fetch(f"{server.url}/b.mp4", str(tmp_path / "out" / "b.mp4"))
+    assert first.digest == second.digest
+    assert store.stats()["files"] == 1
+    assert (tmp_path / "out" / "b.mp4").read_bytes() == b"video-1"
+
+
+def test_caller_file_does_not_duplicate_or_alter_blob(server, store, tmp_path):
+    server.files["/v.mp4"] = (b"video-2", "video/mp4")
+    target = str(tmp_path / "v.mp4")
+    asset = store.fetch(f"{server.url}/v.mp4", target)
+    # 存储中的文件只读；调用方文件是硬链接（同一文件，不占额外空间）或写时复制克隆
+    assert not os.stat(asset.path).st_mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    if os.path.samefile(asset.path, target):
+        assert os.stat(target).st_nlink == 2
+    os.remove(target)
+    assert open(asset.path, "rb").read() == b"video-2"
+
+
+def test_signed_url_hits_cache_unsigned_url_is_refetched(server, store):
+    server.files["/r.mp4"] = (b"result", "video/mp4")
+    store.fetch(f"{server.url}/r.mp4?X-Tos-Signature=one&X-Tos-Expires=60")
+    cached = store.fetch(f"{server.url}/r.mp4?X-Tos-Signature=two&X-Tos-Expires=60")
+    assert cached.cached and server.hits == ["/r.mp4"]
+
+    server.files["/avatar"] = (b"old", "image/jpeg")
+    old = store.fetch(f"{server.url}/avatar")
+    server.files["/avatar"] = (b"new", "image/jpeg")
+    new = store.fetch(f"{server.url}/avatar")
+    assert old.digest != new.digest and not new.cached
+
+
+def test_extension_from_content_type(server, store):
+    server.files["/image"] = (b"png-bytes", "image/png; charset=binary")
+    server.files["/blob"] = (b"bin-bytes", "application/octet-stream")
+    assert store.fetch(f"{server.url}/image", extension=".jpg").path.endswith(".png")
+    assert store.fetch(f"{server.url}/blob", extension=".mp4").path.endswith(".mp4")
+
+
+def test_gc_removes_least_recently_used(server, store, tmp_path):
+    for name in ("one", "two", "three"):
+        server.files[f"/{name}.mp4"] = (name.encode() * 100, "video/mp4")
+    kept = str(tmp_path / "one.mp4")
+    store.fetch(f"{server.url}/one.mp4", kept)
+    store.fetch(f"{server.url}/two.mp4")
+    store.fetch(f"{server.url}/three.mp4")
+    result = store.gc(max_bytes=600)
+    assert result["removed"] == 2 and result["remaining"] == 500
+    assert store.stats()["files"] == 1
+    assert open(kept, "rb").read() == b"one" * 100
@@ -0,0 +1,89 @@
+import pytest
+
+from src.core import video_audio_driven_client as client_module
+from src.core.task_waiter import TaskFailedError
+from src.core.video_audio_driven_client import VideoAudioDrivenClient
+from src.modules.avatar_manager import AvatarManager
+
+SIGNED = "https://cdn.example.com/face.jpg?X-Tos-Signature=one&X-Tos-Expires=600"
+RESIGNED = "https://cdn.example.com/face.jpg?X-Tos-Signature=two&X-Tos-Expires=600"
+UNSIGNED = "https://cdn.example.com/avatar.jpg"
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return AvatarManager(str(tmp_path / "avatars.json"))
+
+
+def save(manager, task_id, resource_id, image_url, digest, mode="normal"):
+    manager.save_avatar(task_id, {"resource_id": resource_id}, mode, image_url=image_url, image_digest=digest)
+
+
+def test_signed_url_matches_after_resigning(manager):
+    save(manager, "r1", "res-1", SIGNED, "d1")
+    assert manager.find_avatar("normal", image_url=RESIGNED)["resource_id"] == "res-1"
+    assert manager.find_avatar("loopy", image_url=RESIGNED) is None
+
+
+def test_unsigned_url_only_matches_by_digest(manager):
+    save(manager, "r1", "res-1", UNSIGNED, "old-photo")
+    # 原地址换了图片：URL相同不代表内容相同
+    assert manager.find_avatar("normal", image_url=UNSIGNED) is None
+    assert manager.find_avatar("normal", image_digest="new-photo") is None
+    assert manager.find_avatar("normal", image_digest="old-photo")["resource_id"] == "res-1"
+
+
+def test_invalidated_avatar_is_not_reused(manager):
+    save(manager, "r1", "res-1", SIGNED, "d1")
+    assert manager.invalidate_avatar("res-1")
+    assert manager.find_avatar("normal", image_url=SIGNED) is None
+    assert manager.find_avatar("normal", image_digest="d1") is None
+    assert AvatarManager(manager.data_file).find_avatar("normal", image_digest="d1") is None
+
+
+class FakeClient(VideoAudioDrivenClient):
+    """形象创建和视频生成都在本地完成；video_error 为复用形象生成视频时抛出的异常"""
+
+    def __init__(self, video_error):
+        super().__init__("ak", "sk")
+        self.video_error = video_error
+        self.created = []
+
+    def create_role(self, image_url, mode="normal"):
+        self.created.append(image_url)
+        return f"role-{len(self.created)}"
+
+    def generate_video(self, resource_id, audio_url, mode="normal", aigc_meta=None):
+        if resource_id == "stale" and self.video_error is not None:
+            raise self.video_error
+        return f"video-{resource_id}"
+
+    def wait_for_completion(self, task_id, mode, task_type, deadline=None, **kwargs):
+        if task_type == "role":
+            return {"resource_id": f"fresh-{task_id}"}
+        return {"video_url": f"https://cdn.example.com/{task_id}.mp4"}
+
+
+@pytest.fixture
+def reused(manager, monkeypatch):
+    monkeypatch.setattr(client_module, "avatar_manager", manager)
+    monkeypatch.setattr(client_module, "image_digest", lambda url: "d1")
+    save(manager, "old-role", "stale", SIGNED, "d1")
+    return manager
+
+
+def test_reused_avatar_recreated_on_task_failure(reused):
+    client = FakeClient(TaskFailedError("视频任务失败"))
+    result = client.generate_video_from_image_audio(SIGNED, "https://cdn.example.com/a.mp3", max_wait_time=60)
+    assert result["resource_id"] == "fresh-role-1"
+    assert client.created == [SIGNED]
+    assert reused.find_avatar("normal", image_digest="d1")["resource_id"] == "fresh-role-1"
+
+
+@pytest.mark.parametrize("error", [TimeoutError("等待超时"), ConnectionError("网络错误")])
+def test_reused_avatar_kept_on_unrelated_errors(reused, error):
+    client = FakeClient(error)
+    with pytest.raises(type(error)):
+        client.generate_video_from_image_audio(SIGNED, "https://cdn.example.com/a.mp3", max_wait_time=60)
+    assert client.created == []
+    assert reused.find_avatar("normal", image_url=SIGNED)["resource_id"] == "stale"
@@ -0,0 +1,136 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.core.base_volcengine_client import BaseVolcengineClient
+from src.modules.endpoint_registry import EndpointRegistry
+
+
+class FakeService:
+    """本地模拟接入点：提交返回新任务ID，查询返回任务状态，记录收到的请求"""
+
+    def __init__(self, name, port=0):
+        self.name = name
+        self.hits = []
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self._reply({})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                service.hits.append(self.path)
+                if "SubmitTask" in self.path:
+                    self._reply({"code": 10000, "data": {"task_id": f"{service.name}-{len(service.hits)}"}})
+                else:
+                    self._reply({"code": 10000, "data": {"status": "generating", "task_id": body.get("task_id")}})
+
+            def _reply(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def services():
+    started = [FakeService("a"), FakeService("b")]
+    yield started
+    for service in started:
+        try:
+            service.stop()
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def client(services):
+    registry = EndpointRegistry(probe_interval=0)
+    for service in services:
+        registry.add(service.url, "cn-north-1")
+    client = BaseVolcengineClient("test_ak", "test_sk")
+    client.endpoints = registry
+    client.adaptive_limit = False
+    client.fair_schedule = False
+    return client
+
+
+def submit(client, req_key):
+    return client._make_request("POST", "CVSync2AsyncSubmitTask", req_key)["data"]["task_id"]
+
+
+def query(client, req_key, task_id):
+    return client._make_request("POST", "CVSync2AsyncGetResult", req_key, task_id=task_id)
+
+
+def test_query_pinned_to_accepting_endpoint(client, services):
+    a, b = services
+    registry = client.endpoints
+    task_id = submit(client, "pin_req")
+    assert task_id.startswith("a-")
+    # 接入点 b 更快，但查询仍发往受理任务的 a
+    registry.record(registry.endpoints()[1], 0.001, True)
+    registry.record(registry.endpoints()[0], 0.5, True)
+    query(client, "pin_req", task_id)
+    assert len(a.hits) == 2 and len(b.hits) == 0
+    assert submit(client, "pin_req").startswith("b-")
+
+
+def test_failover_and_ejection(client, services):
+    a, b = services
+    endpoint_a, endpoint_b = client.endpoints.endpoints()
+    a.stop()
+
+    # 连接被拒绝（请求一定没有发出），提交切换到 b
+    assert submit(client, "failover_req").startswith("b-")
+    assert not endpoint_a.healthy and endpoint_b.healthy
+
+    # 不可用的接入点在恢复前不再被选择
+    assert client.endpoints.choose() is endpoint_b
+    assert submit(client, "failover_req").startswith("b-")
+    assert len(b.hits) == 2
+
+
+def test_recovery_after_probe(client, services):
+    a, b = services
+    endpoint_a, endpoint_b = client.endpoints.endpoints()
+    port = a.port
+    a.stop()
+    client.endpoints.probe(endpoint_a)
+    assert not endpoint_a.healthy
+
+    services[0] = restarted = FakeService("a", port)
+    client.endpoints.probe_all()
+    assert endpoint_a.healthy and endpoint_b.healthy
+
+    # 恢复后按延迟重新参与选择
+    client.endpoints.record(endpoint_a, 0.001, True)
+    client.endpoints.record(endpoint_b, 1.0, True)
+    assert submit(client, "recovery_req").startswith("a-")
+    assert len(restarted.hits) == 1
+
+
+def test_query_fails_over_within_region(client, services):
+    a, b = services
+    task_id = submit(client, "region_req")
+    a.stop()
+    result = query(client, "region_req", task_id)
+    assert result["data"]["task_id"] == task_id
+    assert len(b.hits) == 1
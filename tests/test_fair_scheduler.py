@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from src.modules.adaptive_limiter import AdaptiveLimiter
+from src.modules.fair_scheduler import FairScheduler, SchedulerTimeout
+
+
+@pytest.fixture
+def scheduler():
+    return FairScheduler(lane_weights={"interactive": 8, "standard": 4, "bulk": 1}, tenant_weights={"acme": 3})
+
+
+def waiting(scheduler):
+    return sum(entry["waiting"] for entry in scheduler.status())
+
+
+def queue_all(scheduler, requests, scope="req"):
+    """占住轮次后让 requests [(lane, tenant)] 依次排队，交还轮次后返回各请求拿到轮次的顺序"""
+    order = []
+    holder = scheduler.enter("standard", "default", scope=scope)
+
+    def run(lane, tenant):
+        ticket = scheduler.enter(lane, tenant, scope=scope)
+        order.append((lane, tenant))
+        scheduler.leave(ticket)
+
+    threads = []
+    for lane, tenant in requests:
+        thread = threading.Thread(target=run, args=(lane, tenant))
+        thread.start()
+        threads.append(thread)
+        while waiting(scheduler) < len(threads):
+            time.sleep(0.001)
+    scheduler.leave(holder)
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_lanes_share_turns_by_weight(scheduler):
+    requests = [("bulk", "default")] * 10 + [("standard", "default")] * 10 + [("interactive", "default")] * 10
+    order = queue_all(scheduler, requests)
+    first_round = [lane for lane, _ in order[:13]]
+    assert first_round.count("interactive") == 8
+    assert first_round.count("standard") == 4
+    assert first_round.count("bulk") == 1
+
+
+def test_tenants_share_lane_by_weight(scheduler):
+    requests = [("bulk", "backfill")] * 8 + [("bulk", "acme")] * 8
+    order = queue_all(scheduler, requests)
+    assert [tenant for _, tenant in order[:8]].count("acme") == 6
+
+
+def test_scopes_do_not_block_each_other(scheduler):
+    held = scheduler.enter("bulk", "default", scope="busy-service")
+    started = time.monotonic()
+    ticket = scheduler.enter("bulk", "default", scope="other-service")
+    assert time.monotonic() - started < 0.5
+    scheduler.leave(ticket)
+    scheduler.leave(held)
+
+
+def test_timeout_withdraws_ticket():
+    scheduler = FairScheduler(lane_weights={"standard": 1}, wait_timeout=0.05)
+    held = scheduler.enter("standard", "default", scope="req")
+    with pytest.raises(SchedulerTimeout):
+        scheduler.enter("standard", "default", scope="req")
+    assert waiting(scheduler) == 0
+    scheduler.leave(held)
+    scheduler.leave(held)
+    scheduler.leave(scheduler.enter("standard", "default", scope="req"))
+
+
+def test_limiter_serves_urgent_waiters_first():
+    limiter = AdaptiveLimiter("req-urgent", initial=1, min_limit=1, max_limit=1)
+    first = limiter.acquire()
+    order = []
+
+    def run(name, urgent):
+        permit = limiter.acquire(timeout=5, urgent=urgent)
+        order.append(name)
+        limiter.release(permit)
+
+    submit = threading.Thread(target=run, args=("submit", False))
+    submit.start()
+    while limiter._waiting < 1:
+        time.sleep(0.001)
+    query = threading.Thread(target=run, args=("query", True))
+    query.start()
+    while limiter._waiting < 2:
+        time.sleep(0.001)
+    limiter.release(first)
+    submit.join(5)
+    query.join(5)
+    assert order == ["query", "submit"]
@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from src.core.task_waiter import PollJob
+from src.modules.gateway import Gateway, GatewayBusy
+
+
+class FakeRunner:
+    """提交计数；running 中的任务一直处于排队状态，其余任务第一次查询就完成"""
+
+    JOB_KINDS = ("echo",)
+
+    def __init__(self, access_key="ak-1", use_credential_pool=True):
+        self.access_key = access_key
+        self.use_credential_pool = use_credential_pool
+        self.submits = []
+        self.running = set()
+
+    def submit_job(self, kind, params):
+        time.sleep(0.05)
+        self.submits.append(params)
+        return f"task-{len(self.submits)}"
+
+    def job_poller(self, kind, task_id, params):
+        def fetch():
+            if task_id in self.running:
+                return {"status": "in_queue"}
+            return {"status": "done", "video_url": f"https://cdn.example.com/{task_id}.mp4"}
+
+        return PollJob(task_id, fetch, min_interval=0.01, max_interval=0.02)
+
+
+def finish(gateway, task_id):
+    """等待任务结束并记下结束时间（完成回调在唤醒等待方之后执行）"""
+    assert gateway.result("echo", task_id, wait=5)["status"] == "done"
+    tracked = gateway._tracked[("echo", task_id)]
+    while tracked.finished_at is None:
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def runner():
+    return FakeRunner()
+
+
+@pytest.fixture
+def gateway(runner):
+    gateway = Gateway(runner, result_ttl=60, task_timeout=10, max_foreign=2)
+    yield gateway
+    runner.running.clear()
+    for tracked in list(gateway._tracked.values()):
+        tracked.cancel_event.set()
+
+
+def test_identical_submits_share_one_task(gateway, runner):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.submit("echo", {"x": 1}, tenant="acme")))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(runner.submits) == 1
+    assert {task_id for task_id, _ in results} == {"task-1"}
+    assert sorted(coalesced for _, coalesced in results) == [False, True, True, True, True]
+
+    assert gateway.submit("echo", {"x": 1}, tenant="other") == ("task-2", False)
+    assert gateway.submit("echo", {"x": 1}, tenant="acme", coalesce=False) == ("task-3", False)
+    assert gateway.result("echo", "task-1", wait=5)["status"] == "done"
+
+
+def test_coalesce_key_includes_account_only_when_explicit():
+    pooled = [Gateway(FakeRunner(key))._coalesce_key("echo", {}, "acme") for key in ("ak-1", "ak-2")]
+    assert pooled[0] == pooled[1]
+    explicit = [Gateway(FakeRunner(key, use_credential_pool=False))._coalesce_key("echo", {}, "acme")
+                for key in ("ak-1", "ak-2")]
+    assert explicit[0] != explicit[1]
+
+
+def test_foreign_tasks_are_bounded(gateway, runner):
+    runner.running.update({"f1", "f2", "f3"})
+    gateway.status("echo", "f1")
+    gateway.status("echo", "f2")
+    with pytest.raises(GatewayBusy):
+        gateway.status("echo", "f3")
+
+    # 本网关提交或接手的任务不受限制
+    task_id, _ = gateway.submit("echo", {"x": 2})
+    assert gateway.adopt("echo", "adopted", {})["task_id"] == "adopted"
+
+    # 已结束的 foreign 任务为新任务让出位置
+    runner.running.discard("f1")
+    finish(gateway, "f1")
+    assert gateway.status("echo", "f3")["status"] == "running"
+    assert ("echo", "f1") not in gateway._tracked
+    assert ("echo", task_id) in gateway._tracked
+
+
+def test_finished_tasks_evicted_without_submits(runner):
+    gateway = Gateway(runner, result_ttl=0, task_timeout=10)
+    finish(gateway, "g1")
+    time.sleep(0.01)
+    gateway._evicted_at = 0
+    gateway.status("echo", "g2")
+    assert ("echo", "g1") not in gateway._tracked
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from src.core.task_waiter import PollJob
+from src.modules.job_queue import DONE, FAILED, QUEUED, JobQueue
+from src.modules.job_worker import JobWorker
+
+
+class FakeRunner:
+    """记录提交和轮询的任务，任务第一次查询就完成（结果中没有文件，不需要下载）"""
+
+    def __init__(self):
+        self.submits = []
+        self.polled = []
+
+    def submit_job(self, kind, params):
+        self.submits.append(params)
+        return f"task-{len(self.submits)}"
+
+    def job_poller(self, kind, task_id, params):
+        self.polled.append(task_id)
+        return PollJob(task_id, lambda: {"status": "done"}, min_interval=0.01, max_interval=0.02)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    yield queue
+    queue.close()
+
+
+def run_worker(queue, runner, jobs=1):
+    worker = JobWorker(queue, runner, concurrency=2, lease=5, poll_interval=0.01, drain_timeout=5, output_dir=None)
+    worker.run(max_jobs=jobs)
+    return worker
+
+
+def test_expired_lease_is_redelivered_with_task_id(queue):
+    job_id = queue.enqueue("echo", {"x": 1})
+    first = queue.claim("w1", 0.05)
+    assert queue.set_task(job_id, "w1", "task-1")
+    time.sleep(0.1)
+
+    second = queue.claim("w2", 5)
+    assert second.id == first.id and second.task_id == "task-1" and second.attempts == 2
+    # 原 worker 的租约已失效，写回被忽略
+    assert queue.heartbeat(job_id, "w1", 5) is False
+    assert queue.complete(job_id, "w1", {"late": True}) is False
+    assert queue.complete(job_id, "w2", {"ok": True}) is True
+    assert queue.get(job_id).status == DONE and queue.get(job_id).result == {"ok": True}
+
+
+def test_release_keeps_task_and_attempts(queue):
+    job_id = queue.enqueue("echo", {})
+    queue.claim("w1", 5)
+    queue.set_task(job_id, "w1", "task-1")
+    assert queue.release(job_id, "w1")
+    job = queue.get(job_id)
+    assert job.status == QUEUED and job.attempts == 0 and job.task_id == "task-1"
+    assert queue.claim("w2", 5).attempts == 1
+
+
+def test_exhausted_attempts_fail_on_redelivery(queue):
+    job_id = queue.enqueue("echo", {}, max_attempts=1)
+    queue.claim("w1", 0.01)
+    time.sleep(0.05)
+    assert queue.claim("w2", 5) is None
+    assert queue.get(job_id).status == FAILED
+
+
+def test_worker_resumes_submitted_task(queue):
+    runner = FakeRunner()
+    job_id = queue.enqueue("echo", {"x": 1})
+    queue.claim("crashed", 0.01)
+    queue.set_task(job_id, "crashed", "task-old")
+    time.sleep(0.05)
+
+    run_worker(queue, runner)
+    job = queue.get(job_id)
+    assert job.status == DONE and job.result["task_id"] == "task-old"
+    assert runner.submits == [] and runner.polled == ["task-old"]
+
+
+@pytest.mark.parametrize("value", ["30", 30, "", None])
+def test_max_wait_time_accepts_strings(queue, value):
+    runner = FakeRunner()
+    params = {} if value is None else {"max_wait_time": value}
+    job_id = queue.enqueue("echo", params)
+    run_worker(queue, runner)
+    assert queue.get(job_id).status == DONE
+    assert len(runner.submits) == 1
+
+
+@pytest.mark.parametrize("value", ["abc", "-5", "nan", [1]])
+def test_invalid_max_wait_time_fails_without_submitting(queue, value):
+    runner = FakeRunner()
+    job_id = queue.enqueue("echo", {"max_wait_time": value})
+    run_worker(queue, runner)
+    job = queue.get(job_id)
+    assert job.status == FAILED and "max_wait_time" in job.error
+    assert runner.submits == []
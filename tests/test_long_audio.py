@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.modules import long_audio
+from src.modules.long_audio import find_split_points, render_long_audio, split_audio
+
+RATE = 8000
+
+
+def tone(seconds, amplitude=8000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype("<i2")
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype="<i2")
+
+
+def write_wav(path, samples):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+    return str(path)
+
+
+def test_short_audio_is_not_split():
+    assert find_split_points(tone(5).reshape(-1, 1), RATE, 10) == []
+
+
+def test_splits_evenly_at_quiet_positions():
+    # 24秒：静音在 7.5-8.5 秒和 15.5-16.5 秒，上限10秒 -> 3段，切在静音里
+    samples = np.concatenate([tone(7.5), silence(1), tone(7), silence(1), tone(7.5)]).reshape(-1, 1)
+    cuts = find_split_points(samples, RATE, 10)
+    assert len(cuts) == 2
+    assert 7.5 <= cuts[0] / RATE <= 8.5 and 15.5 <= cuts[1] / RATE <= 16.5
+    bounds = [0] + cuts + [len(samples)]
+    assert all((end - begin) / RATE <= 10 for begin, end in zip(bounds, bounds[1:]))
+
+
+def test_split_audio_writes_segments(tmp_path):
+    source = write_wav(tmp_path / "in.wav", np.concatenate([tone(6), silence(1), tone(6)]))
+    segments = split_audio(source, 8, str(tmp_path / "out"))
+    assert [segment.index for segment in segments] == [0, 1]
+    assert segments[0].end == segments[1].start and segments[1].end == pytest.approx(13)
+    with wave.open(segments[1].path, "rb") as wav:
+        assert wav.getnframes() / RATE == pytest.approx(segments[1].duration)
+
+
+class FakeHandle:
+    def __init__(self, index, error=None):
+        self.index = index
+        self.error = error
+        self.cancelled = threading.Event()
+
+    def result(self, timeout=None):
+        if self.error is not None:
+            raise self.error
+        if self.cancelled.is_set():
+            raise Exception("cancelled")
+        return {"video_url": f"https://cdn.example.com/{self.index}.mp4"}
+
+    def cancel(self):
+        self.cancelled.set()
+        return True
+
+    def __str__(self):
+        return f"task-{self.index}"
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    path = tmp_path / "work"
+
+    def mkdtemp(prefix=""):
+        path.mkdir()
+        return str(path)
+
+    def download(url, filename, *args, **kwargs):
+        with open(filename, "w") as f:
+            f.write(url)
+        return filename
+
+    def concat(paths, output):
+        with open(output, "w") as f:
+            f.write("|".join(open(path).read() for path in paths))
+
+    monkeypatch.setattr(long_audio.tempfile, "mkdtemp", mkdtemp)
+    monkeypatch.setattr(long_audio, "download_file", download)
+    monkeypatch.setattr(long_audio, "concat_videos", concat)
+    return path
+
+
+def long_wav(tmp_path):
+    return write_wav(tmp_path / "long.wav", np.concatenate([tone(6), silence(1), tone(6)]))
+
+
+def test_render_concatenates_in_order_and_removes_workdir(tmp_path, workdir):
+    output = str(tmp_path / "out.mp4")
+    result = render_long_audio(long_wav(tmp_path), 9, lambda url, segment: FakeHandle(segment.index),
+                               lambda path: f"https://cdn.example.com/{os.path.basename(path)}", output)
+    assert [segment["task_id"] for segment in result["segments"]] == ["task-0", "task-1"]
+    assert open(output).read() == "https://cdn.example.com/0.mp4|https://cdn.example.com/1.mp4"
+    assert not workdir.exists()
+
+
+def test_failure_cancels_segment_submitted_late(tmp_path, workdir):
+    entered, release = threading.Event(), threading.Event()
+    late = []
+
+    def submit(url, segment):
+        if segment.index == 0:
+            entered.wait(5)
+            return FakeHandle(0, error=Exception("服务端失败"))
+        # 第二段还在提交中时第一段已失败
+        entered.set()
+        release.wait(5)
+        late.append(FakeHandle(1))
+        return late[0]
+
+    started = time.monotonic()
+    with pytest.raises(Exception, match="第 1 段渲染失败"):
+        render_long_audio(long_wav(tmp_path), 9, submit, lambda path: path, str(tmp_path / "out.mp4"))
+    assert time.monotonic() - started < 2
+    release.set()
+    for _ in range(100):
+        if late and late[0].cancelled.is_set() and not workdir.exists():
+            break
+        time.sleep(0.02)
+    assert late[0].cancelled.is_set()
+    assert not workdir.exists()
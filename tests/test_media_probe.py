@@ -0,0 +1,32 @@
+import pytest
+
+from src.core import base_volcengine_client as client_module
+from src.core.base_volcengine_client import BaseVolcengineClient
+from src.modules.media_probe import MediaInfo, MediaLimitError
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    urls = []
+
+    def probe(url):
+        urls.append(url)
+        return MediaInfo("MP3", 50.0)
+
+    monkeypatch.setattr(client_module.media_probe, "probe", probe)
+    return urls
+
+
+def test_duration_check_is_off_by_default(probes):
+    client = BaseVolcengineClient("ak", "sk")
+    assert client._check_media_duration("https://cdn.example.com/a.mp3", 45) is None
+    assert probes == []
+
+
+def test_duration_check_when_enabled(probes):
+    client = BaseVolcengineClient("ak", "sk")
+    client.probe_media = True
+    with pytest.raises(MediaLimitError):
+        client._check_media_duration("https://cdn.example.com/a.mp3", 45)
+    assert client._check_media_duration("https://cdn.example.com/a.mp3", 60).duration == 50.0
+    assert len(probes) == 2
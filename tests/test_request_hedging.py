@@ -0,0 +1,50 @@
+import threading
+import time
+
+from src.modules.request_hedging import HedgingPolicy
+
+
+def warmed(policy, key, latency=0.01, count=20):
+    for _ in range(count):
+        policy._observe(key, latency)
+    policy._tokens = policy._max_tokens
+    return policy
+
+
+def test_primary_runs_on_caller_thread_without_samples():
+    policy = HedgingPolicy(min_samples=5)
+    assert policy.call("q", threading.current_thread) is threading.current_thread()
+    assert policy._executor is None
+
+
+def test_primary_is_not_queued_behind_busy_pool():
+    policy = warmed(HedgingPolicy(min_samples=5, min_delay=0.2, max_workers=1), "q")
+    release = threading.Event()
+    policy._get_executor().submit(release.wait, 5)
+    try:
+        started = time.monotonic()
+        assert policy.call("q", lambda: "ok") == "ok"
+        assert time.monotonic() - started < 0.15
+    finally:
+        release.set()
+
+
+def test_hedge_returns_first_when_primary_is_slow():
+    policy = warmed(HedgingPolicy(min_samples=5, min_delay=0.05), "q")
+    calls = []
+    release = threading.Event()
+
+    def send():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            release.wait(5)
+            return "primary"
+        return "hedge"
+
+    try:
+        started = time.monotonic()
+        assert policy.call("q", send) == "hedge"
+        assert time.monotonic() - started < 1
+        assert calls[0] == "volc-hedge-primary" and calls[1].startswith("volc-hedge_")
+    finally:
+        release.set()
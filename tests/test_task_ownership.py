@@ -0,0 +1,94 @@
+import pytest
+
+from src.modules import task_store as task_store_module
+from src.modules.task_ownership import SQLiteLeaseBackend, TaskOwnership
+from src.modules.task_store import LEASE_OWNED, LEASE_TAKEN, TaskStore
+
+
+@pytest.fixture(params=[True, False], ids=["returning", "no-returning"])
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(task_store_module, "_HAS_RETURNING", request.param)
+    store = TaskStore(str(tmp_path / "tasks.db"), enabled=True)
+    yield store
+    store.close()
+
+
+def make_node(store, node_id, adopted):
+    node = TaskOwnership(SQLiteLeaseBackend(store), node_id=node_id, lease=5, heartbeat=100, enabled=True)
+    node.start(lambda kind, task_id, params: adopted.append(task_id))
+    return node
+
+
+def task_for(node, owner, prefix="t"):
+    return next(f"{prefix}{i}" for i in range(1000) if node.owner_of(f"{prefix}{i}") == owner)
+
+
+def test_registered_task_goes_to_ring_owner(store):
+    adopted_a, adopted_b = [], []
+    a, b = make_node(store, "a", adopted_a), make_node(store, "b", adopted_b)
+    try:
+        b._heartbeat()
+        a._heartbeat()
+        assert a.status()["nodes"] == ["a", "b"]
+
+        task_id = task_for(a, "b")
+        a.register(task_id, "avatar", {"x": 1})
+        waiter = object()
+        assert a.claim(task_id, waiter) is False
+
+        b._heartbeat()
+        assert adopted_b == [task_id] and adopted_a == []
+        poller = object()
+        assert b.claim(task_id, poller) is True
+
+        assert a.outcome(task_id) is None
+        store.record_finished(task_id, None, {"video_url": "x"})
+        b.finish(task_id, poller, {"video_url": "x"})
+        assert a.outcome(task_id)["result"] == {"video_url": "x"}
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_own_task_and_takeover_after_stop(store):
+    adopted_a, adopted_b = [], []
+    a, b = make_node(store, "a", adopted_a), make_node(store, "b", adopted_b)
+    try:
+        b._heartbeat()
+        a._heartbeat()
+        mine = task_for(a, "a", "m")
+        a.register(mine, "avatar", {})
+        assert a.claim(mine, object()) is True
+        assert b.claim(mine, object()) is False
+        assert store.renew_leases([mine], "a", 5) == [mine]
+        assert store.renew_leases([mine], "b", 5) == []
+
+        theirs = task_for(a, "b", "o")
+        b.register(theirs, "avatar", {})
+        assert b.claim(theirs, object()) is True
+        b.stop()
+        a._heartbeat()
+        assert a.status()["nodes"] == ["a"]
+        assert theirs in adopted_a
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_claim_lease_without_kind_is_not_deferred(store):
+    assert store.claim_lease("plain", "a", 5, defer=True) == LEASE_OWNED
+    assert store.claim_lease("plain", "b", 5, defer=True) == LEASE_TAKEN
+    store.release_lease("plain", "a")
+    assert store.claim_lease("plain", "b", 5, defer=True) == LEASE_OWNED
+    store.offer_lease("offered", "avatar", {})
+    assert store.claim_lease("offered", "b", 5, defer=True) == LEASE_TAKEN
+    assert store.claim_lease("offered", "b", 5) == LEASE_OWNED
+
+
+def test_task_store_records_nothing_when_disabled(tmp_path):
+    path = tmp_path / "tasks.db"
+    store = TaskStore(str(path), enabled=False)
+    store.record_submitted("t1", "req")
+    store.record_finished("t1", "req", {"video_url": "x"})
+    assert store.get("t1") is None
+    assert not path.exists()
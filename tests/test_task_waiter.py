@@ -0,0 +1,174 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from src.config import POLL_BACKOFF
+from src.core.task_waiter import (
+    DONE, FAILED, RUNNING, PollJob, PollScheduler, TaskFailedError, completion_stats,
+    raw_response_status, status_extractor
+)
+from src.modules.deadline import Deadline
+
+
+def fetch_sequence(*results):
+    """依次返回给定结果的查询函数（异常对象会被抛出），最后一个结果一直重复"""
+    results = list(results)
+    calls = []
+
+    def fetch():
+        calls.append(time.monotonic())
+        result = results.pop(0) if len(results) > 1 else results[0]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    fetch.calls = calls
+    return fetch
+
+
+def make_job(fetch, req_key="test_req", **kwargs):
+    kwargs.setdefault("min_interval", 0.01)
+    kwargs.setdefault("max_interval", 0.05)
+    return PollJob("task-" + str(id(fetch)), fetch, req_key=req_key, **kwargs)
+
+
+class TestStatusExtractor:
+    def test_done_status(self):
+        assert status_extractor()({"status": "done"})[0] == DONE
+
+    def test_done_key_present(self):
+        extract = status_extractor(("image_urls",))
+        assert extract({"status": "generating", "image_urls": []})[0] == DONE
+        assert extract({"status": "generating", "video_url": "x"})[0] == RUNNING
+
+    def test_failed_statuses(self):
+        for status in ("not_found", "expired"):
+            state, message = status_extractor()({"status": status})
+            assert state == FAILED
+            assert status in message
+
+    def test_running_message(self):
+        assert status_extractor()({"status": "in_queue", "message": "排队中"}) == (RUNNING, "排队中")
+        assert status_extractor()({}) == (RUNNING, "任务状态: unknown")
+
+    def test_raw_response(self):
+        assert raw_response_status({"code": 10000, "data": {"status": "done"}})[0] == DONE
+        assert raw_response_status({"code": 10000, "data": {"status": "expired"}})[0] == FAILED
+        assert raw_response_status({"code": 10000, "data": {"status": "generating"}})[0] == RUNNING
+        with pytest.raises(Exception):
+            raw_response_status({"code": 50400, "data": None})
+
+
+class TestPollJobStep:
+    def test_running_then_done(self):
+        job = make_job(fetch_sequence({"status": "in_queue"}, {"status": "done", "video_url": "u"}))
+        assert job.step() is not None
+        assert not job.finished
+        assert job.step() is None
+        assert job.finished and job.outcome() == {"status": "done", "video_url": "u"}
+        assert job.polls == 2
+
+    def test_failed_status(self):
+        job = make_job(fetch_sequence({"status": "expired"}))
+        assert job.step() is None
+        with pytest.raises(TaskFailedError):
+            job.outcome()
+
+    def test_query_error_keeps_polling(self):
+        job = make_job(fetch_sequence(Exception("网络错误"), {"status": "done"}))
+        assert job.step() is not None
+        assert not job.finished
+        assert job.step() is None
+        assert job.outcome() == {"status": "done"}
+
+    def test_wrapped_task_failure_finishes(self):
+        def fetch():
+            try:
+                raise TaskFailedError("服务端失败")
+            except TaskFailedError as e:
+                raise Exception("查询失败") from e
+
+        job = make_job(fetch)
+        assert job.step() is None
+        with pytest.raises(TaskFailedError):
+            job.outcome()
+
+
+class TestBackoff:
+    def test_interval_grows_and_caps(self):
+        job = make_job(fetch_sequence({"status": "in_queue"}), req_key="backoff_req", min_interval=1, max_interval=4)
+        intervals = [job.step() for _ in range(6)]
+        assert intervals[0] == 1
+        assert intervals[1] == pytest.approx(POLL_BACKOFF)
+        assert intervals == sorted(intervals)
+        assert intervals[-1] == 4
+
+    def test_expected_completion_delays_early_polls(self):
+        completion_stats.observe("slow_req", 100)
+        job = make_job(fetch_sequence({"status": "in_queue"}), req_key="slow_req", min_interval=1, max_interval=30)
+        assert job.step() == 30
+
+
+class TestDeadline:
+    def test_wait_times_out(self):
+        job = make_job(fetch_sequence({"status": "in_queue"}))
+        with pytest.raises(TimeoutError):
+            job.wait(Deadline(0.1))
+
+    def test_wait_cancelled(self):
+        cancel = threading.Event()
+        cancel.set()
+        job = make_job(fetch_sequence({"status": "in_queue"}))
+        with pytest.raises(CancelledError):
+            job.wait(Deadline(5), cancel)
+
+    def test_scheduler_deadline(self):
+        scheduler = PollScheduler(workers=2)
+        fetch = fetch_sequence({"status": "in_queue"})
+        future = scheduler.submit(make_job(fetch), Deadline(0.2))
+        with pytest.raises(TimeoutError):
+            future.result(timeout=5)
+        assert fetch.calls
+
+
+class TestPollScheduler:
+    def test_finishes_in_order_of_readiness(self):
+        scheduler = PollScheduler(workers=4)
+        finished = []
+        futures = []
+        for name, polls in (("slow", 6), ("fast", 1), ("medium", 3)):
+            fetch = fetch_sequence(*([{"status": "in_queue"}] * polls + [{"status": "done", "name": name}]))
+            future = scheduler.submit(make_job(fetch, min_interval=0.02, max_interval=0.02), Deadline(10))
+            future.add_done_callback(lambda f: finished.append(f.result()["name"]))
+            futures.append(future)
+        for future in futures:
+            future.result(timeout=5)
+        assert finished == ["fast", "medium", "slow"]
+        assert scheduler.pending() == 0
+
+    def test_cancel_event_stops_polling(self):
+        scheduler = PollScheduler(workers=2)
+        cancel = threading.Event()
+        fetch = fetch_sequence({"status": "in_queue"})
+        future = scheduler.submit(make_job(fetch, min_interval=0.02, max_interval=0.02), Deadline(10), cancel)
+        time.sleep(0.1)
+        cancel.set()
+        with pytest.raises(CancelledError):
+            future.result(timeout=5)
+        polls = len(fetch.calls)
+        time.sleep(0.1)
+        assert len(fetch.calls) == polls
+        assert scheduler.pending() == 0
+
+    def test_cancelled_future_is_dropped(self):
+        scheduler = PollScheduler(workers=2)
+        fetch = fetch_sequence({"status": "in_queue"})
+        future = scheduler.submit(make_job(fetch, min_interval=0.02, max_interval=0.02), Deadline(10))
+        time.sleep(0.05)
+        assert future.cancel()
+        time.sleep(0.1)
+        polls = len(fetch.calls)
+        time.sleep(0.1)
+        assert len(fetch.calls) == polls
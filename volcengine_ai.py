@@ -7,11 +7,19 @@ import os
 import sys
 import time
 import argparse
-import requests
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
-from src.config import ACCESS_KEY, SECRET_KEY
-from src.modules.avatar_manager import avatar_manager
+from src.config import (
+    ACCESS_KEY, SECRET_KEY, JOB_QUEUE_BACKEND, JOB_WORKER_CONCURRENCY, JOB_DRAIN_TIMEOUT, JOB_MAX_ATTEMPTS,
+    GATEWAY_HOST, GATEWAY_PORT
+)
+from src.modules.avatar_manager import avatar_manager, image_digest
+from src.modules.asset_store import asset_store
+from src.modules.deadline import Deadline, current_deadline
+from src.modules.media_probe import media_probe
+from src.modules.service_router import Backend, service_router
+from src.utils import get_supported_audio_length
+from src.core.task_waiter import TaskFailedError
 
 
 class VolcEngineAI:
@@ -21,12 +29,21 @@ class VolcEngineAI:
         """初始化客户端"""
         self.access_key = access_key or ACCESS_KEY
         self.secret_key = secret_key or SECRET_KEY
+        # 未显式传入密钥时由凭证池为每次提交选择账号
+        self.use_credential_pool = not access_key
 
         # 动态导入模块
         self._avatar_client = None
         self._lip_sync_client = None
         self._init_clients()
 
+        # 未显式传入密钥时使用环境变量配置的账号，包括 VOLCENGINE_CREDENTIALS 中的多账号凭证池
+        if not access_key:
+            for client in (self._avatar_client, self._lip_sync_client, self._jimeng_client, self._jimeng_mimic_client,
+                           self._effect_client, self._video_driven_client, self._image_outfit_client):
+                if client is not None:
+                    client.use_credential_pool = True
+
     def _init_clients(self):
         """初始化各个功能模块的客户端"""
         # 延迟导入，避免循环依赖
@@ -85,6 +102,12 @@ class VolcEngineAI:
             raise Exception("单图音频驱动模块未正确加载")
         return self._avatar_client.get_role_result(task_id, mode)
 
+    def wait_avatar_result(self, task_id: str, mode: str = "normal", max_wait_time: int = 600):
+        """等待形象创建完成"""
+        if not self._avatar_client:
+            raise Exception("单图音频驱动模块未正确加载")
+        return self._avatar_client.wait_for_completion(task_id, mode, "role", max_wait_time)
+
     def generate_avatar_video(self, resource_id: str, audio_url: str, mode: str = "normal", aigc_meta: Optional[Dict] = None) -> str:
         """生成角色视频"""
         if not self._avatar_client:
@@ -97,6 +120,12 @@ class VolcEngineAI:
             raise Exception("单图音频驱动模块未正确加载")
         return self._avatar_client.get_video_result(task_id, mode, aigc_meta)
 
+    def wait_video_result(self, task_id: str, mode: str = "normal", max_wait_time: int = 600):
+        """等待视频生成完成"""
+        if not self._avatar_client:
+            raise Exception("单图音频驱动模块未正确加载")
+        return self._avatar_client.wait_for_completion(task_id, mode, "video", max_wait_time)
+
     def generate_avatar_video_from_image_audio(self, image_url: str, audio_url: str, mode: str = "normal", aigc_meta: Optional[Dict] = None, max_wait_time: int = 600):
         """从图片和音频生成完整视频"""
         if not self._avatar_client:
@@ -160,6 +189,12 @@ class VolcEngineAI:
             raise Exception("特效视频模块未正确加载")
         return self._effect_client.get_result(task_id)
 
+    def wait_effect_video_result(self, task_id: str, max_wait_time: int = 600):
+        """等待特效视频生成完成"""
+        if not self._effect_client:
+            raise Exception("特效视频模块未正确加载")
+        return self._effect_client.wait_for_completion(task_id, max_wait_time)
+
     # 视频改口型功能
     def submit_lip_sync_task(self, video_url: str, audio_url: str, mode: str = "lite", **kwargs) -> str:
         """提交视频改口型任务"""
@@ -173,6 +208,12 @@ class VolcEngineAI:
             raise Exception("视频改口型模块未正确加载")
         return self._lip_sync_client.get_lip_sync_result(task_id, mode, aigc_meta)
 
+    def wait_lip_sync_result(self, task_id: str, mode: str = "lite", max_wait_time: int = 600):
+        """等待视频改口型完成"""
+        if not self._lip_sync_client:
+            raise Exception("视频改口型模块未正确加载")
+        return self._lip_sync_client.wait_for_completion(task_id, mode, max_wait_time)
+
     def change_lip_sync(self, video_url: str, audio_url: str, mode: str = "lite", aigc_meta: Optional[Dict] = None, max_wait_time: int = 600, **kwargs):
         """视频改口型（完整流程）"""
         if not self._lip_sync_client:
@@ -204,6 +245,12 @@ class VolcEngineAI:
             raise Exception("即梦AI模块未正确加载")
         return self._jimeng_client.get_result(task_id, operation_type, version)
 
+    def jm_wait_result(self, task_id: str, operation_type: str = "generate", version: str = "1.5", max_wait_time: int = 600):
+        """等待即梦AI任务完成"""
+        if not self._jimeng_client:
+            raise Exception("即梦AI模块未正确加载")
+        return self._jimeng_client.wait_for_completion(task_id, operation_type, version, max_wait_time)
+
     def jm_mimic_submit_task(self, image_url: str, video_url: str) -> str:
         """提交动作模仿任务"""
         if not self._jimeng_mimic_client:
@@ -216,6 +263,12 @@ class VolcEngineAI:
             raise Exception("即梦AI动作模仿模块未正确加载")
         return self._jimeng_mimic_client.get_mimic_result(task_id)
 
+    def jm_mimic_wait_result(self, task_id: str, max_wait_time: int = 600) -> Dict[str, Any]:
+        """等待动作模仿任务完成"""
+        if not self._jimeng_mimic_client:
+            raise Exception("即梦AI动作模仿模块未正确加载")
+        return self._jimeng_mimic_client.wait_for_completion(task_id, max_wait_time)
+
     # 单图视频驱动功能
     def submit_video_driven_task(self, image_url: str, video_url: str, aigc_meta: Optional[Dict] = None) -> str:
         """提交单图视频驱动任务"""
@@ -229,6 +282,162 @@ class VolcEngineAI:
             raise Exception("单图视频驱动模块未正确加载")
         return self._video_driven_client.get_driven_result(task_id, aigc_meta)
 
+    def wait_video_driven_result(self, task_id: str, max_wait_time: int = 600) -> Dict[str, Any]:
+        """等待单图视频驱动任务完成"""
+        if not self._video_driven_client:
+            raise Exception("单图视频驱动模块未正确加载")
+        return self._video_driven_client.wait_for_completion(task_id, max_wait_time)
+
+    # 等价服务路由
+    def route_talking_head(self, image_url: str, audio_url: str, objective: str = "fastest",
+                           sla: Optional[float] = None) -> Tuple[Backend, Any]:
+        """
+        图片+音频生成数字人视频：在 OmniHuman 1.5 / 1.0 和单图音频驱动灵动模式（图片已有形象时）间按近期耗时选择
+
+        Args:
+            image_url: 图片URL
+            audio_url: 音频URL
+            objective: fastest（最快）或 cheapest（SLA 内最便宜）
+            sla: 可接受的预计耗时（秒）
+
+        Returns:
+            (选中的服务, 任务句柄)
+        """
+        info = media_probe.probe(audio_url)
+        duration = info.duration if info else None
+        backends = []
+        if self._jimeng_client:
+            for version in ("1.5", "1.0"):
+                config = self._jimeng_client.VERSION_CONFIG[version]
+                if duration is None or duration <= config["max_audio_length"]:
+                    backends.append(Backend(
+                        config["name"], self._jimeng_client.REQ_KEYS[version]["generate"],
+                        lambda version=version: self._jimeng_client.generate_video(image_url, audio_url, version),
+                        price=config["price"] * duration if duration else None
+                    ))
+        if self._avatar_client:
+            # 单图音频驱动需要先创建形象（数分钟），只在已有形象时参与选择
+            avatar = avatar_manager.find_avatar("loopy", image_url=image_url)
+            if avatar and (duration is None or duration <= get_supported_audio_length("loopy")):
+                backends.append(Backend(
+                    "单图音频驱动（灵动模式）", self._avatar_client.REQ_KEYS["loopy"]["generate_video"],
+                    lambda: self._avatar_client.generate_video(avatar["resource_id"], audio_url, "loopy")
+                ))
+        if not backends:
+            raise ValueError("没有支持该音频时长的服务")
+        return service_router.submit(backends, objective, sla)
+
+    def route_motion_transfer(self, image_url: str, video_url: str, objective: str = "fastest",
+                              sla: Optional[float] = None) -> Tuple[Backend, Any]:
+        """
+        图片+驱动视频生成动作模仿视频：在即梦动作模仿和单图视频驱动间按近期耗时选择
+
+        Args:
+            image_url: 图片URL
+            video_url: 驱动视频URL
+            objective: fastest（最快）或 cheapest（SLA 内最便宜）
+            sla: 可接受的预计耗时（秒）
+
+        Returns:
+            (选中的服务, 任务句柄)
+        """
+        info = media_probe.probe(video_url)
+        duration = info.duration if info else None
+        backends = []
+        if self._jimeng_mimic_client:
+            backends.append(Backend(
+                "即梦动作模仿", self._jimeng_mimic_client.REQ_KEY,
+                lambda: self._jimeng_mimic_client.submit_mimic_task(image_url, video_url),
+                action="CVSync2AsyncSubmitTask"
+            ))
+        if self._video_driven_client:
+            config = self._video_driven_client.CONFIG
+            if duration is None or duration <= config["max_video_duration"]:
+                backends.append(Backend(
+                    config["name"], self._video_driven_client.REQ_KEY,
+                    lambda: self._video_driven_client.submit_driven_task(image_url, video_url),
+                    price=config["price"] * duration if duration else None
+                ))
+        if not backends:
+            raise ValueError("没有支持该驱动视频的服务")
+        return service_router.submit(backends, objective, sla)
+
+    # 队列作业（worker 和 HTTP 网关使用）
+    JOB_KINDS = ("lip-sync", "effect", "omni", "mimic", "video-driven", "avatar", "avatar-video", "outfit")
+
+    def submit_job(self, kind: str, params: Dict[str, Any]) -> str:
+        """
+        按作业类型提交任务
+
+        Args:
+            kind: 作业类型（见 JOB_KINDS）
+            params: 作业参数
+
+        Returns:
+            任务ID
+
+        Raises:
+            ValueError: 不支持的作业类型或缺少参数
+        """
+        try:
+            if kind == "lip-sync":
+                return self.submit_lip_sync_task(params["video_url"], params["audio_url"], params.get("mode", "lite"))
+            if kind == "effect":
+                return self._effect_client.submit_task(params["image_url"], params["template_id"],
+                                                       params.get("final_stitch_switch", True))
+            if kind == "omni":
+                return self.jm_create_video(params["image_url"], params["audio_url"], params.get("version", "1.5"),
+                                            params.get("prompt"), params.get("mask_url"), params.get("seed"),
+                                            params.get("pe_fast_mode", False))
+            if kind == "mimic":
+                return self.jm_mimic_submit_task(params["image_url"], params["video_url"])
+            if kind == "video-driven":
+                return self.submit_video_driven_task(params["image_url"], params["video_url"])
+            if kind == "avatar":
+                return self.create_avatar(params["image_url"], params.get("mode", "normal"))
+            if kind == "avatar-video":
+                mode = params.get("mode", "normal")
+                resource_id = params.get("resource_id")
+                if not resource_id:
+                    resource_id = self._avatar_client.find_or_create_role(params["image_url"], mode)["resource_id"]
+                return self.generate_avatar_video(resource_id, params["audio_url"], mode)
+            if kind == "outfit":
+                garment_urls = params["garment_urls"]
+                if isinstance(garment_urls, str):
+                    garment_urls = [url.strip() for url in garment_urls.split(",") if url.strip()]
+                result = self.submit_outfit_task_v2(garment_urls, params["model_url"], params.get("garment_types"),
+                                                    params.get("model_id"), params.get("protect_mask_url"),
+                                                    params.get("inference_config"))
+                return result["task_id"]
+        except KeyError as e:
+            raise ValueError(f"{kind} 作业缺少参数: {e.args[0]}")
+        raise ValueError(f"不支持的作业类型: {kind}，支持: {', '.join(self.JOB_KINDS)}")
+
+    def job_poller(self, kind: str, task_id: str, params: Dict[str, Any]):
+        """
+        按作业类型创建任务的轮询状态（交给共享轮询调度器）
+
+        Returns:
+            PollJob
+        """
+        if kind == "lip-sync":
+            return self._lip_sync_client._poll_job(task_id, params.get("mode", "lite"))
+        if kind == "effect":
+            return self._effect_client._poll_job(task_id, self._effect_client._get_req_key(params["template_id"]))
+        if kind == "omni":
+            return self._jimeng_client._poll_job(task_id, "generate", params.get("version", "1.5"))
+        if kind == "mimic":
+            return self._jimeng_mimic_client._poll_job(task_id)
+        if kind == "video-driven":
+            return self._video_driven_client._poll_job(task_id)
+        if kind == "avatar":
+            return self._avatar_client._poll_job(task_id, params.get("mode", "normal"), "role")
+        if kind == "avatar-video":
+            return self._avatar_client._poll_job(task_id, params.get("mode", "normal"), "video")
+        if kind == "outfit":
+            return self._image_outfit_client._poll_job(task_id)
+        raise ValueError(f"不支持的作业类型: {kind}，支持: {', '.join(self.JOB_KINDS)}")
+
     # 图片换装功能
     def submit_outfit_task(self, model_url: str, garment_url: str, return_url: bool = True,
                           model_id: str = "1", garment_id: str = "1",
@@ -329,6 +538,27 @@ class VolcEngineAI:
         )
 
 
+def wait_task(wait, hint: str) -> Optional[Dict[str, Any]]:
+    """
+    命令行等待任务完成（各查询命令共用）
+
+    Args:
+        wait: 等待任务完成的函数（VolcEngineAI 的 wait_xxx 方法）
+        hint: 超时后继续查询的命令
+
+    Returns:
+        任务结果，超时或任务异常时返回None
+    """
+    try:
+        return wait()
+    except TaskFailedError as e:
+        print(f"❌ {str(e)}")
+    except TimeoutError as e:
+        print(f"⏰ {str(e)}，任务可能仍在处理")
+        print(f"💡 提示: 可手动继续查询: {hint}")
+    return None
+
+
 def create_avatar(args):
     """创建形象（自动查询并等待完成）"""
     ai = VolcEngineAI()
@@ -347,6 +577,7 @@ def create_avatar(args):
             def __init__(self):
                 self.task_id = task_id
                 self.mode = args.mode
+                self.image_url = args.image_url
 
         query_avatar(QueryArgs())
 
@@ -355,70 +586,28 @@ def create_avatar(args):
 
 
 def query_avatar(args):
-    """查询形象状态"""
+    """查询形象状态（循环等待直到完成）"""
     ai = VolcEngineAI()
     try:
         print(f"🔍 查询任务ID: {args.task_id} ({args.mode}模式)")
 
-        # 循环查询直到任务完成
-        import time
-        start_time = time.time()
-        max_wait_time = 600  # 最大等待10分钟
-        check_interval = 15  # 每15秒查询一次
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.get_avatar_result(args.task_id, args.mode)
-
-                # 显示当前状态
-                if isinstance(result, dict):
-                    status = result.get("status", "unknown")
-                    if status == "done":
-                        print(f"📋 API响应: {result}")
-
-                        # 保存形象信息
-                        if "resource_id" in result:
-                            avatar_manager.save_avatar(args.task_id, result, args.mode, result.get("resp_data"))
-                            print("\n🎉 数字形象创建完成！")
-                            print("=" * 50)
-                            print(f"🆔 形象ID: {result['resource_id']}")
-                            print(f"🎭 形象类型: {result.get('role_type', 'unknown')}")
-                            if result.get('face_position'):
-                                print(f"📍 人脸位置: {result['face_position']}")
-                            print("=" * 50)
-                        return
-
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    elif "resource_id" in result:
-                        # 如果有resource_id说明任务已完成
-                        print(f"📋 API响应: {result}")
-                        avatar_manager.save_avatar(args.task_id, result, args.mode, result.get("resp_data"))
-                        print("\n🎉 数字形象创建完成！")
-                        print("=" * 50)
-                        print(f"🆔 形象ID: {result['resource_id']}")
-                        print("=" * 50)
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = result.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-                        print(f"📋 API响应: {result}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py va query-avatar {args.task_id} --mode {args.mode}")
+        result = wait_task(lambda: ai.wait_avatar_result(args.task_id, args.mode),
+                           f"python volcengine_ai.py va query-avatar {args.task_id} --mode {args.mode}")
+        if result is None:
+            return
+
+        print(f"📋 API响应: {result}")
+        if "resource_id" in result:
+            image_url = getattr(args, "image_url", None)
+            avatar_manager.save_avatar(args.task_id, result, args.mode, result.get("resp_data"), image_url=image_url,
+                                       image_digest=image_digest(image_url) if image_url else None)
+            print("\n🎉 数字形象创建完成！")
+            print("=" * 50)
+            print(f"🆔 形象ID: {result['resource_id']}")
+            print(f"🎭 形象类型: {result.get('role_type', 'unknown')}")
+            if result.get('face_position'):
+                print(f"📍 人脸位置: {result['face_position']}")
+            print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")
@@ -439,97 +628,47 @@ def generate_video(args):
 
 def query_video(args):
     """查询视频状态（循环等待直到完成）"""
-    import time
     ai = VolcEngineAI()
-    start_time = time.time()
-    max_wait_time = 600  # 10分钟
-    check_interval = 15  # 15秒检查一次
-
     try:
         print(f"🔍 开始查询任务ID: {args.task_id} ({args.mode}模式)")
-        print(f"⏰ 最大等待时间: {max_wait_time}秒，每{check_interval}秒检查一次")
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.get_video_result(args.task_id, args.mode)
-                print(f"📋 API响应: {result}")
-
-                # 检查任务状态
-                if isinstance(result, dict):
-                    status = result.get("status", "unknown")
-                    if status == "done":
-                        print(f"✅ 任务完成！")
-
-                        # 下载视频
-                        if result.get("video_url"):
-                            video_url = result["video_url"]
-                            filename = args.filename or f"video_{args.task_id}.mp4"
-                            download_video(video_url, filename)
-                            print("\n🎉 视频生成完成！")
-                            print("=" * 50)
-                            print(f"🆔 任务ID: {args.task_id}")
-                            print(f"📹 视频URL: {video_url}")
-                            print("=" * 50)
-                        return
-
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    elif result.get("video_url"):
-                        # 如果有video_url说明任务已完成
-                        print(f"✅ 任务完成！")
-                        video_url = result["video_url"]
-                        filename = args.filename or f"video_{args.task_id}.mp4"
-                        download_video(video_url, filename)
-                        print("\n🎉 视频生成完成！")
-                        print("=" * 50)
-                        print(f"🆔 任务ID: {args.task_id}")
-                        print("=" * 50)
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = result.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py va query-video {args.task_id} --mode {args.mode}")
+
+        result = wait_task(lambda: ai.wait_video_result(args.task_id, args.mode),
+                           f"python volcengine_ai.py va query-video {args.task_id} --mode {args.mode}")
+        if result is None:
+            return
+
+        print(f"✅ 任务完成！")
+        print(f"📋 API响应: {result}")
+        if result.get("video_url"):
+            video_url = result["video_url"]
+            filename = args.filename or f"video_{args.task_id}.mp4"
+            download_video(video_url, filename, task_id=args.task_id)
+            print("\n🎉 视频生成完成！")
+            print("=" * 50)
+            print(f"🆔 任务ID: {args.task_id}")
+            print(f"📹 视频URL: {video_url}")
+            print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")
 
 
-def download_video(url: str, filename: str):
-    """下载视频到本地"""
+def download_video(url: str, filename: str, deadline: Optional[Deadline] = None, task_id: Optional[str] = None):
+    """下载视频到本地（经过资源存储去重，已下载过的结果直接从本地取得；可指定截止时间）"""
+    def progress(downloaded: int, total_size: int):
+        if total_size > 0:
+            percent = (downloaded / total_size) * 100
+            print(f"\r📥 下载进度: {percent:.1f}%", end='', flush=True)
+
     try:
         print(f"📥 开始下载视频到: {filename}")
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
-
-        with open(filename, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        percent = (downloaded / total_size) * 100
-                        print(f"\r📥 下载进度: {percent:.1f}%", end='', flush=True)
+        asset = asset_store.fetch(url, filename, task_id=task_id, deadline=deadline or current_deadline(),
+                                  extension=".mp4", progress=progress)
+        if asset.cached:
+            print("♻️ 视频已在本地存储中，无需重复下载")
 
         print(f"\n✅ 视频下载完成: {filename}")
-        print(f"📁 文件大小: {downloaded / (1024*1024):.1f} MB")
+        print(f"📁 文件大小: {asset.size / (1024*1024):.1f} MB")
 
     except Exception as e:
         print(f"\n❌ 下载失败: {str(e)}")
@@ -629,71 +768,33 @@ def generate_effect_video(args):
 
 def query_effect_video(args):
     """查询特效视频状态（循环等待直到完成）"""
-    import time
+    import json
     ai = VolcEngineAI()
-    start_time = time.time()
-    max_wait_time = 600  # 10分钟
-    check_interval = 15  # 15秒检查一次
-
     try:
         print(f"🔍 开始查询特效视频任务ID: {args.task_id}")
-        print(f"⏰ 最大等待时间: {max_wait_time}秒，每{check_interval}秒检查一次")
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.get_effect_video_result(args.task_id)
-                print(f"📋 API响应: {result}")
-
-                # 检查任务状态
-                if isinstance(result, dict) and result.get("code") == 10000:
-                    data = result.get("data", {})
-                    status = data.get("status")
-
-                    if status == "done":
-                        print(f"✅ 任务完成！")
-
-                        # 解析resp_data获取视频URL
-                        resp_data_str = data.get("resp_data", "{}")
-                        try:
-                            import json
-                            resp_data = json.loads(resp_data_str)
-                            video_url = resp_data.get("video_url")
-                            if video_url:
-                                filename = args.filename or f"effect_video_{args.task_id}.mp4"
-                                download_video(video_url, filename)
-                                print("\n🎉 特效视频生成完成！")
-                                print("=" * 50)
-                                print(f"🆔 任务ID: {args.task_id}")
-                                print(f"📹 视频URL: {video_url}")
-                                print("=" * 50)
-                            return
-                        except:
-                            print("\n🎉 特效视频生成完成！")
-                            print("=" * 50)
-                            print(f"🆔 任务ID: {args.task_id}")
-                            print("=" * 50)
-                            return
-
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = data.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py ve query {args.task_id}")
+
+        result = wait_task(lambda: ai.wait_effect_video_result(args.task_id),
+                           f"python volcengine_ai.py ve query {args.task_id}")
+        if result is None:
+            return
+
+        print(f"✅ 任务完成！")
+
+        # 解析resp_data获取视频URL
+        try:
+            resp_data = json.loads(result.get("data", {}).get("resp_data", "{}"))
+        except (TypeError, ValueError):
+            resp_data = {}
+        video_url = resp_data.get("video_url")
+        if video_url:
+            filename = args.filename or f"effect_video_{args.task_id}.mp4"
+            download_video(video_url, filename, task_id=args.task_id)
+        print("\n🎉 特效视频生成完成！")
+        print("=" * 50)
+        print(f"🆔 任务ID: {args.task_id}")
+        if video_url:
+            print(f"📹 视频URL: {video_url}")
+        print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")
@@ -727,71 +828,26 @@ def submit_lip_sync_task(args):
         print(f"❌ 提交失败: {str(e)}")
 
 def query_lip_sync(args):
-    """查询视频改口型状态"""
+    """查询视频改口型状态（循环等待直到完成）"""
     ai = VolcEngineAI()
     try:
         print(f"🔍 查询任务ID: {args.task_id} ({args.mode}模式)")
 
-        # 循环查询直到任务完成
-        import time
-        start_time = time.time()
-        max_wait_time = 600  # 最大等待10分钟
-        check_interval = 15  # 每15秒查询一次
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.get_lip_sync_result(args.task_id, args.mode)
-
-                # 显示当前状态
-                if isinstance(result, dict):
-                    status = result.get("status", "unknown")
-                    if status == "done":
-                        print(f"📋 API响应: {result}")
-
-                        # 下载视频
-                        if result.get("video_url"):
-                            video_url = result["video_url"]
-                            filename = args.filename or f"lip_sync_video_{args.task_id}.mp4"
-                            download_video(video_url, filename)
-                            print("\n🎉 视频改口型完成！")
-                            print("=" * 50)
-                            print(f"🆔 任务ID: {args.task_id}")
-                            print(f"📹 视频URL: {video_url}")
-                            print("=" * 50)
-                        return
-
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    elif result.get("video_url"):
-                        # 如果有video_url说明任务已完成
-                        print(f"📋 API响应: {result}")
-                        video_url = result["video_url"]
-                        filename = args.filename or f"lip_sync_video_{args.task_id}.mp4"
-                        download_video(video_url, filename)
-                        print("\n🎉 视频改口型完成！")
-                        print("=" * 50)
-                        print(f"🆔 任务ID: {args.task_id}")
-                        print("=" * 50)
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = result.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py vl query {args.task_id} --mode {args.mode}")
+        result = wait_task(lambda: ai.wait_lip_sync_result(args.task_id, args.mode),
+                           f"python volcengine_ai.py vl query {args.task_id} --mode {args.mode}")
+        if result is None:
+            return
+
+        print(f"📋 API响应: {result}")
+        if result.get("video_url"):
+            video_url = result["video_url"]
+            filename = args.filename or f"lip_sync_video_{args.task_id}.mp4"
+            download_video(video_url, filename, task_id=args.task_id)
+            print("\n🎉 视频改口型完成！")
+            print("=" * 50)
+            print(f"🆔 任务ID: {args.task_id}")
+            print(f"📹 视频URL: {video_url}")
+            print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")
@@ -958,14 +1014,19 @@ def generate_all(args):
         print(f"开始生成视频（{args.mode}模式）...")
         print("💡 提示: 视频生成需要3-10分钟，请耐心等待")
 
-        # 步骤1：创建形象（使用现有的create_avatar函数）
+        # 步骤1：创建形象（同一图片已有形象时直接复用，使用现有的create_avatar函数）
         print("步骤1：创建数字形象...")
-        create_avatar(args)
+        latest_avatar = None
+        if not getattr(args, "new_avatar", False):
+            latest_avatar = find_existing_avatar(args.image_url, args.mode)
+        if latest_avatar:
+            print(f"♻️ 复用已有形象（创建任务ID: {latest_avatar['task_id']}），使用 --new-avatar 可重新创建")
+        else:
+            create_avatar(args)
 
-        # 步骤2：生成视频（需要从create_avatar的结果中获取resource_id）
-        # create_avatar已经保存到本地，可以直接读取
-        from src.modules.avatar_manager import avatar_manager
-        latest_avatar = avatar_manager.get_latest_avatar(args.mode)
+            # 步骤2：生成视频（需要从create_avatar的结果中获取resource_id）
+            # create_avatar已经保存到本地，可以直接读取
+            latest_avatar = avatar_manager.get_latest_avatar(args.mode)
         if not latest_avatar:
             raise Exception("无法获取刚创建的形象信息")
 
@@ -990,6 +1051,16 @@ def generate_all(args):
             print("💡 建议: 可以单独查询任务状态")
 
 
+def find_existing_avatar(image_url: str, mode: str):
+    """查找同一图片（URL相同或内容相同）已创建的形象"""
+    avatar = avatar_manager.find_avatar(mode, image_url=image_url)
+    if avatar is None:
+        digest = image_digest(image_url)
+        if digest:
+            avatar = avatar_manager.find_avatar(mode, image_digest=digest)
+    return avatar
+
+
 def generate_video_with_query(args):
     """生成视频并查询结果（模块化组合）"""
     # 步骤1：生成视频（提交任务）
@@ -1060,6 +1131,7 @@ def va_create_handler(args):
             self.image_url = args.image_url
             self.audio_url = args.audio_url
             self.mode = args.mode
+            self.new_avatar = args.new_avatar
 
     generate_all(Args())
 
@@ -1097,6 +1169,185 @@ def va_avatars_handler(args):
 
     list_avatars(Args())
 
+
+def va_warm_handler(args):
+    """为常用图片预先创建形象（已有可用形象的直接复用）"""
+    from src.modules.avatar_pool import AvatarPool
+    ai = VolcEngineAI()
+    if not ai._avatar_client:
+        raise Exception("单图音频驱动模块未正确加载")
+    pool = AvatarPool(images=args.image_urls, modes=args.modes)
+    print(f"🔥 预热 {len(args.image_urls)} 张图片 × {len(args.modes)} 种模式的形象...")
+    pool.start(ai._avatar_client)
+    ready = pool.wait_ready(args.timeout)
+    pool.stop()
+    for row in pool.status():
+        print(f"   [{row['state']}] {row['mode']:7} {row['resource_id'] or '-':40} {row['image_url']}")
+    print("✅ 全部形象已就绪" if ready else "⚠️ 部分形象未就绪，可稍后重新运行")
+
+
+# 服务路由 (route) 处理器
+def route_run(submit, args):
+    """按路由结果提交任务，等待完成并下载"""
+    try:
+        backend, handle = submit()
+        print(f"🆔 任务ID: {handle}")
+        result = wait_task(lambda: handle.result(args.timeout),
+                           f"{backend.name} 的查询命令（任务ID: {handle}）")
+        if result and result.get("video_url"):
+            download_video(result["video_url"], args.filename or f"route_{handle}.mp4", task_id=str(handle))
+    except Exception as e:
+        print(f"❌ 生成失败: {str(e)}")
+
+
+def route_talking_head_handler(args):
+    """数字人视频（自动选择服务）"""
+    ai = VolcEngineAI()
+    route_run(lambda: ai.route_talking_head(args.image_url, args.audio_url, args.objective, args.sla), args)
+
+
+def route_motion_handler(args):
+    """动作模仿视频（自动选择服务）"""
+    ai = VolcEngineAI()
+    route_run(lambda: ai.route_motion_transfer(args.image_url, args.video_url, args.objective, args.sla), args)
+
+
+def route_stats_handler(args):
+    """查看各服务近期耗时"""
+    ai = VolcEngineAI()
+    req_keys = []
+    if ai._jimeng_client:
+        req_keys += [ai._jimeng_client.REQ_KEYS[version]["generate"] for version in ("1.5", "1.0")]
+    if ai._avatar_client:
+        req_keys.append(ai._avatar_client.REQ_KEYS["loopy"]["generate_video"])
+    if ai._jimeng_mimic_client:
+        req_keys.append(ai._jimeng_mimic_client.REQ_KEY)
+    if ai._video_driven_client:
+        req_keys.append(ai._video_driven_client.REQ_KEY)
+
+    def seconds(value):
+        return f"{value:.0f}s" if value is not None else "-"
+
+    print(f"{'服务':50} {'样本':>4} {'耗时':>7} {'排队':>7} {'成功率':>6} {'预计':>7}")
+    for req_key in req_keys:
+        estimate = service_router.estimate(req_key)
+        success = f"{estimate['success_rate'] * 100:.0f}%" if estimate["success_rate"] is not None else "-"
+        print(f"{req_key:50} {estimate['samples']:>4} {seconds(estimate['latency']):>7} "
+              f"{seconds(estimate['queue']):>7} {success:>6} {seconds(estimate['expected']):>7}")
+
+
+# 资源存储 (assets) 处理器
+def assets_stats_handler(args):
+    """查看资源存储统计"""
+    stats = asset_store.stats()
+    print(f"📦 资源存储: {asset_store.root}")
+    print(f"   文件数: {stats['files']}，总大小: {stats['bytes'] / 1024 / 1024:.1f} MB")
+    print(f"   已索引URL: {stats['urls']}，任务: {stats['tasks']}")
+
+
+def assets_gc_handler(args):
+    """清理资源存储"""
+    max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+    max_age = args.max_days * 86400 if args.max_days is not None else None
+    result = asset_store.gc(max_bytes=max_bytes, max_age=max_age)
+    print(f"✅ 已删除 {result['removed']} 个文件，释放 {result['freed'] / 1024 / 1024:.1f} MB，"
+          f"剩余 {result['remaining'] / 1024 / 1024:.1f} MB")
+
+
+# 作业队列 (worker) 处理器
+def worker_process(queue_spec: str, concurrency: int, drain_timeout: float, max_jobs: Optional[int] = None):
+    """单个 worker 进程：共用一套客户端，处理作业直到收到 SIGTERM / SIGINT"""
+    from src.modules.job_queue import create_job_queue
+    from src.modules.job_worker import JobWorker
+    worker = JobWorker(create_job_queue(queue_spec), VolcEngineAI(), concurrency=concurrency,
+                       drain_timeout=drain_timeout)
+    worker.install_signal_handlers()
+    worker.run(max_jobs)
+
+
+def worker_run_handler(args):
+    """启动 worker（多进程时每个进程独立领取作业，信号转发给所有子进程）"""
+    if args.processes <= 1:
+        worker_process(args.queue, args.concurrency, args.drain_timeout, args.max_jobs)
+        return
+
+    import multiprocessing
+    import signal
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_process, name=f"volc-worker-{i}",
+                                 args=(args.queue, args.concurrency, args.drain_timeout, args.max_jobs))
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    print(f"👷 已启动 {len(processes)} 个 worker 进程")
+
+    def forward(signum, frame):
+        print(f"🛑 收到信号 {signum}，通知所有 worker 进程停止...")
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+def worker_enqueue_handler(args):
+    """加入作业（命令行参数或 JSON Lines 文件）"""
+    import json
+    from src.modules.job_queue import create_job_queue
+    queue = create_job_queue(args.queue)
+    specs = []
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            specs = [json.loads(line) for line in f if line.strip()]
+    elif args.kind:
+        params = json.loads(args.json) if args.json else {}
+        for item in args.param or []:
+            key, _, value = item.partition("=")
+            params[key] = value
+        specs = [{"kind": args.kind, "params": params}]
+    else:
+        print("❌ 请指定作业类型或 --file")
+        return
+
+    for spec in specs:
+        if spec["kind"] not in VolcEngineAI.JOB_KINDS:
+            print(f"❌ 不支持的作业类型: {spec['kind']}，支持: {', '.join(VolcEngineAI.JOB_KINDS)}")
+            return
+    for spec in specs:
+        job_id = queue.enqueue(spec["kind"], spec.get("params", {}), spec.get("lane", args.lane),
+                               spec.get("tenant", args.tenant), spec.get("max_attempts", args.max_attempts))
+        if len(specs) == 1:
+            print(f"✅ 作业已加入队列，作业ID: {job_id}")
+    if len(specs) > 1:
+        print(f"✅ 已加入 {len(specs)} 个作业")
+
+
+def worker_status_handler(args):
+    """查看作业队列"""
+    import json
+    from src.modules.job_queue import create_job_queue
+    queue = create_job_queue(args.queue)
+    if args.job_id is not None:
+        job = queue.get(args.job_id)
+        print(json.dumps(job.to_dict(), ensure_ascii=False, indent=2) if job else f"❌ 作业不存在: {args.job_id}")
+        return
+    stats = queue.stats()
+    print("📋 作业队列: " + "，".join(f"{status} {count}" for status, count in stats.items()))
+    for job in queue.list(args.status, args.limit):
+        detail = (job.result or {}).get("output") or job.error or job.task_id or ""
+        print(f"   #{job.id:<6} {job.status:8} {job.kind:13} {job.lane:11} {job.attempts}/{job.max_attempts}  {detail}")
+
+
+# HTTP 网关 (serve) 处理器
+def serve_handler(args):
+    """启动HTTP网关（所有请求共用一套客户端和共享轮询调度器）"""
+    from src.modules.gateway import Gateway, serve
+    serve(Gateway(VolcEngineAI()), args.host, args.port)
+
+
 # 视频改口型 (vl) 处理器
 def vl_create_handler(args):
     """生成视频改口型"""
@@ -1244,77 +1495,54 @@ def jm_query_handler(args):
 
 def jm_query_result(args):
     """查询即梦AI任务结果（循环等待直到完成）"""
-    import time
     ai = VolcEngineAI()
-    start_time = time.time()
-    max_wait_time = 600  # 10分钟
-    check_interval = 15  # 15秒检查一次
-
     try:
         print(f"🔍 开始查询任务ID: {args.task_id} ({args.operation_type}操作)")
         print(f"🔢 版本: {args.version}")
-        print(f"⏰ 最大等待时间: {max_wait_time}秒，每{check_interval}秒检查一次")
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.jm_query_result(args.task_id, args.operation_type, args.version)
-                print(f"📋 API响应: {result}")
-
-                # 检查任务状态
-                if isinstance(result, dict):
-                    status = result.get("status", "unknown")
-                    if status == "done":
-                        print(f"✅ 任务完成！")
-
-                        # 如果是视频生成且有视频URL，自动下载
-                        if args.operation_type == "generate" and result.get("video_url"):
-                            video_url = result["video_url"]
-                            filename = args.filename or f"jm_video_{args.task_id}.mp4"
-                            download_video(video_url, filename)
-                            print("\n🎉 视频生成完成！")
-                            print("=" * 50)
-                            print(f"🆔 任务ID: {args.task_id}")
-                            print(f"📹 视频URL: {video_url}")
-                            print(f"📁 本地文件: {filename}")
-                            print("=" * 50)
-                        return
-
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    elif args.operation_type == "generate" and result.get("video_url"):
-                        # 如果有video_url说明任务已完成
-                        print(f"✅ 任务完成！")
-                        video_url = result["video_url"]
-                        filename = args.filename or f"jm_video_{args.task_id}.mp4"
-                        download_video(video_url, filename)
-                        print("\n🎉 视频生成完成！")
-                        print("=" * 50)
-                        print(f"🆔 任务ID: {args.task_id}")
-                        print("=" * 50)
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = result.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py jm omni query {args.task_id} --version {args.version} --operation-type {args.operation_type}")
+
+        result = wait_task(lambda: ai.jm_wait_result(args.task_id, args.operation_type, args.version),
+                           f"python volcengine_ai.py jm omni query {args.task_id} --version {args.version} --operation-type {args.operation_type}")
+        if result is None:
+            return
+
+        print(f"✅ 任务完成！")
+        print(f"📋 API响应: {result}")
+
+        # 如果是视频生成且有视频URL，自动下载
+        if args.operation_type == "generate" and result.get("video_url"):
+            video_url = result["video_url"]
+            filename = args.filename or f"jm_video_{args.task_id}.mp4"
+            download_video(video_url, filename, task_id=args.task_id)
+            print("\n🎉 视频生成完成！")
+            print("=" * 50)
+            print(f"🆔 任务ID: {args.task_id}")
+            print(f"📹 视频URL: {video_url}")
+            print(f"📁 本地文件: {filename}")
+            print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")
 
+def jm_multi_handler(args):
+    """多主体并行生成（每个主体或每条音轨一个视频，完成一个下载一个）"""
+    ai = VolcEngineAI()
+    if not ai._jimeng_client:
+        raise Exception("即梦AI模块未正确加载")
+
+    def save(variant):
+        if variant["video_url"]:
+            download_video(variant["video_url"], f"jm_multi_{variant['index'] + 1}_{variant['task_id']}.mp4",
+                           task_id=variant["task_id"])
+
+    try:
+        audio = args.audio_urls[0] if len(args.audio_urls) == 1 else args.audio_urls
+        results = ai._jimeng_client.generate_multi_subject(args.image_url, audio, args.subjects, args.prompt,
+                                                           args.seed, args.pe_fast_mode, on_result=save)
+        done = sum(1 for variant in results if not variant["error"])
+        print(f"\n🎉 多主体生成完成: {done}/{len(results)} 个变体成功")
+    except Exception as e:
+        print(f"❌ 多主体生成失败: {str(e)}")
+
 # 即梦AI动作模仿 (jm mimic) 处理器
 def jm_mimic_create_handler(args):
     """创建动作模仿任务（提交任务并自动查询下载）"""
@@ -1359,72 +1587,29 @@ def jm_mimic_query_handler(args):
 
 def jm_mimic_query(args):
     """查询动作模仿任务结果（循环等待直到完成）"""
-    import time
     ai = VolcEngineAI()
-    start_time = time.time()
-    max_wait_time = 600  # 10分钟
-    check_interval = 15  # 15秒检查一次
-
     try:
         print(f"🔍 开始查询动作模仿任务ID: {args.task_id}")
-        print(f"⏰ 最大等待时间: {max_wait_time}秒，每{check_interval}秒检查一次")
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.jm_mimic_get_result(args.task_id)
-                print(f"📋 API响应: {result}")
-
-                # 检查任务状态
-                if isinstance(result, dict):
-                    status = result.get("status", "unknown")
-                    if status == "done":
-                        print(f"✅ 任务完成！")
-
-                        # 如果有视频URL，自动下载
-                        if result.get("video_url"):
-                            video_url = result["video_url"]
-                            filename = args.filename or f"jm_mimic_{args.task_id}.mp4"
-                            download_video(video_url, filename)
-                            print("\n🎉 动作模仿视频生成完成！")
-                            print("=" * 50)
-                            print(f"🆔 任务ID: {args.task_id}")
-                            print(f"📹 视频URL: {video_url}")
-                            print(f"📁 本地文件: {filename}")
-                            print("=" * 50)
-                        return
-
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    elif result.get("video_url"):
-                        # 如果有video_url说明任务已完成
-                        print(f"✅ 任务完成！")
-                        video_url = result["video_url"]
-                        filename = args.filename or f"jm_mimic_{args.task_id}.mp4"
-                        download_video(video_url, filename)
-                        print("\n🎉 动作模仿视频生成完成！")
-                        print("=" * 50)
-                        print(f"🆔 任务ID: {args.task_id}")
-                        print("=" * 50)
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = result.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py jm mimic query {args.task_id}")
+
+        result = wait_task(lambda: ai.jm_mimic_wait_result(args.task_id),
+                           f"python volcengine_ai.py jm mimic query {args.task_id}")
+        if result is None:
+            return
+
+        print(f"✅ 任务完成！")
+        print(f"📋 API响应: {result}")
+
+        # 如果有视频URL，自动下载
+        if result.get("video_url"):
+            video_url = result["video_url"]
+            filename = args.filename or f"jm_mimic_{args.task_id}.mp4"
+            download_video(video_url, filename, task_id=args.task_id)
+            print("\n🎉 动作模仿视频生成完成！")
+            print("=" * 50)
+            print(f"🆔 任务ID: {args.task_id}")
+            print(f"📹 视频URL: {video_url}")
+            print(f"📁 本地文件: {filename}")
+            print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")
@@ -1470,6 +1655,7 @@ def main():
     va_create.add_argument('image_url', help='图片URL')
     va_create.add_argument('audio_url', help='音频URL')
     va_create.add_argument('--mode', choices=['normal', 'loopy', 'loopyb'], default='normal', help='模式选择')
+    va_create.add_argument('--new-avatar', action='store_true', help='总是重新创建形象（默认复用同一图片已有的形象）')
     va_create.set_defaults(func=va_create_handler)
 
     # === 特效视频 (ve) ===
@@ -1593,6 +1779,16 @@ def main():
     jm_omni_create.add_argument('--pe-fast-mode', action='store_true', help='启用快速模式（仅1.5版）')
     jm_omni_create.set_defaults(func=jm_create_handler)
 
+    # jm omni multi - 多主体并行生成
+    jm_omni_multi = jm_omni_subparsers.add_parser('multi', help='即梦数字人 - 多主体并行生成（1.5版）')
+    jm_omni_multi.add_argument('image_url', help='图片URL')
+    jm_omni_multi.add_argument('audio_urls', nargs='+', help='音频URL（一条：每个主体各说一遍；多条：按顺序分给各主体）')
+    jm_omni_multi.add_argument('--subjects', type=int, nargs='+', help='主体序号（对象检测结果中mask的下标，默认全部）')
+    jm_omni_multi.add_argument('--prompt', help='提示词')
+    jm_omni_multi.add_argument('--seed', type=int, help='随机种子（所有变体共用）')
+    jm_omni_multi.add_argument('--pe-fast-mode', action='store_true', help='启用快速模式')
+    jm_omni_multi.set_defaults(func=jm_multi_handler)
+
     # jm omni query - 查询状态
     jm_omni_query = jm_omni_subparsers.add_parser('query', help='即梦数字人 - 查询状态')
     jm_omni_query.add_argument('task_id', help='任务ID')
@@ -1623,12 +1819,106 @@ def main():
     va_avatars.add_argument('--mode', choices=['normal', 'loopy', 'loopyb'], help='按模式筛选')
     va_avatars.set_defaults(func=va_avatars_handler)
 
+    # va warm
+    va_warm = va_subparsers.add_parser('warm', help='为常用图片预先创建形象')
+    va_warm.add_argument('image_urls', nargs='+', help='图片URL（可多个）')
+    va_warm.add_argument('--modes', nargs='+', choices=['normal', 'loopy', 'loopyb'], default=['normal'], help='预热的模式')
+    va_warm.add_argument('--timeout', type=float, help='最长等待时间（秒），默认等待全部完成')
+    va_warm.set_defaults(func=va_warm_handler)
+
+    # === 服务路由 (route) ===
+    route_parser = subparsers.add_parser('route', help='在功能等价的服务间按近期耗时自动选择')
+    route_subparsers = route_parser.add_subparsers(dest='route_action', help='服务路由操作')
+
+    route_talking_head = route_subparsers.add_parser('talking-head', help='图片+音频数字人视频（OmniHuman / 单图音频驱动）')
+    route_talking_head.add_argument('image_url', help='图片URL')
+    route_talking_head.add_argument('audio_url', help='音频URL')
+    route_talking_head.set_defaults(func=route_talking_head_handler)
+
+    route_motion = route_subparsers.add_parser('motion', help='图片+驱动视频动作模仿（即梦动作模仿 / 单图视频驱动）')
+    route_motion.add_argument('image_url', help='图片URL')
+    route_motion.add_argument('video_url', help='驱动视频URL')
+    route_motion.set_defaults(func=route_motion_handler)
+
+    for route_command in (route_talking_head, route_motion):
+        route_command.add_argument('--objective', choices=['fastest', 'cheapest'], default='fastest',
+                                   help='fastest: 预计最快；cheapest: 预计耗时在 --sla 内的最便宜服务')
+        route_command.add_argument('--sla', type=float, help='可接受的预计耗时（秒）')
+        route_command.add_argument('--timeout', type=float, default=1800, help='最长等待时间（秒）')
+        route_command.add_argument('--filename', help='保存文件名（可选，默认为route_<task_id>.mp4）')
+
+    route_stats = route_subparsers.add_parser('stats', help='查看各服务近期耗时')
+    route_stats.set_defaults(func=route_stats_handler)
+
+    # === 资源存储 (assets) ===
+    assets_parser = subparsers.add_parser('assets', help='本地资源存储（下载结果去重）')
+    assets_subparsers = assets_parser.add_subparsers(dest='assets_action', help='资源存储操作')
+
+    assets_stats = assets_subparsers.add_parser('stats', help='查看存储统计')
+    assets_stats.set_defaults(func=assets_stats_handler)
+
+    assets_gc = assets_subparsers.add_parser('gc', help='按最近访问时间清理存储')
+    assets_gc.add_argument('--max-mb', type=float, help='总大小上限（MB），超出时删除最久未访问的文件')
+    assets_gc.add_argument('--max-days', type=float, help='删除超过N天未访问的文件')
+    assets_gc.set_defaults(func=assets_gc_handler)
+
+    # === 作业队列 (worker) ===
+    worker_parser = subparsers.add_parser('worker', help='长期运行的作业队列 worker')
+    worker_subparsers = worker_parser.add_subparsers(dest='worker_action', help='作业队列操作')
+
+    worker_run = worker_subparsers.add_parser('run', help='启动 worker，处理队列中的作业（SIGTERM 优雅停止）')
+    worker_run.add_argument('--processes', type=int, default=1, help='worker 进程数（默认1）')
+    worker_run.add_argument('--concurrency', type=int, default=JOB_WORKER_CONCURRENCY, help='每个进程同时处理的作业数')
+    worker_run.add_argument('--drain-timeout', type=float, default=JOB_DRAIN_TIMEOUT, help='停止时等待处理中作业的最长时间（秒）')
+    worker_run.add_argument('--max-jobs', type=int, help='每个进程领取N个作业后退出（可选）')
+    worker_run.set_defaults(func=worker_run_handler)
+
+    worker_enqueue = worker_subparsers.add_parser('enqueue', help='加入作业')
+    worker_enqueue.add_argument('kind', nargs='?', help=f"作业类型: {', '.join(VolcEngineAI.JOB_KINDS)}")
+    worker_enqueue.add_argument('--param', action='append', help='作业参数 key=value（可多次指定）')
+    worker_enqueue.add_argument('--json', help='作业参数JSON')
+    worker_enqueue.add_argument('--file', help='JSON Lines 文件，每行 {"kind", "params", "lane", "tenant"}')
+    worker_enqueue.add_argument('--lane', default='standard', choices=['interactive', 'standard', 'bulk'], help='通道（默认standard）')
+    worker_enqueue.add_argument('--tenant', help='租户（可选）')
+    worker_enqueue.add_argument('--max-attempts', type=int, default=JOB_MAX_ATTEMPTS, help='最大尝试次数')
+    worker_enqueue.set_defaults(func=worker_enqueue_handler)
+
+    worker_status = worker_subparsers.add_parser('status', help='查看作业队列')
+    worker_status.add_argument('job_id', nargs='?', type=int, help='作业ID（可选，查看单个作业详情）')
+    worker_status.add_argument('--status', choices=['queued', 'running', 'done', 'failed'], help='按状态过滤')
+    worker_status.add_argument('--limit', type=int, default=20, help='显示的作业数')
+    worker_status.set_defaults(func=worker_status_handler)
+
+    for worker_command in (worker_run, worker_enqueue, worker_status):
+        worker_command.add_argument('--queue', default=JOB_QUEUE_BACKEND, help='作业队列（sqlite:路径 或 redis://...，默认 VOLCENGINE_JOB_QUEUE）')
+
+    # === HTTP 网关 (serve) ===
+    serve_parser = subparsers.add_parser('serve', help='启动HTTP网关（提交/状态/结果接口，共用客户端和轮询）')
+    serve_parser.add_argument('--host', default=GATEWAY_HOST, help=f'监听地址（默认{GATEWAY_HOST}）')
+    serve_parser.add_argument('--port', type=int, default=GATEWAY_PORT, help=f'监听端口（默认{GATEWAY_PORT}）')
+    serve_parser.set_defaults(func=serve_handler)
+
     args = parser.parse_args()
 
     if not args.command:
         parser.print_help()
         return
 
+    # 本地命令不需要访问密钥
+    if args.command == 'assets':
+        if not args.assets_action:
+            assets_parser.print_help()
+            return
+        args.func(args)
+        return
+    if args.command == 'worker':
+        if not args.worker_action:
+            worker_parser.print_help()
+            return
+        if args.worker_action != 'run':
+            args.func(args)
+            return
+
     # 检查环境变量
     if not ACCESS_KEY:
         print("❌ 错误：未设置环境变量 VOLCENGINE_ACCESS_KEY")
@@ -1664,6 +1954,13 @@ def main():
             io_parser.print_help()
             return
         args.func(args)
+    elif args.command in ('worker', 'serve'):
+        args.func(args)
+    elif args.command == 'route':
+        if not args.route_action:
+            route_parser.print_help()
+            return
+        args.func(args)
     elif args.command == 'jm':
         if not args.jm_action:
             jm_parser.print_help()
@@ -1721,59 +2018,29 @@ def vv_create(args):
 
 def vv_query(args):
     """查询单图视频驱动任务状态（循环等待直到完成）"""
-    import time
     ai = VolcEngineAI()
-    start_time = time.time()
-    max_wait_time = 600  # 10分钟
-    check_interval = 15  # 15秒检查一次
-
     try:
         print(f"🔍 开始查询单图视频驱动任务ID: {args.task_id}")
-        print(f"⏰ 最大等待时间: {max_wait_time}秒，每{check_interval}秒检查一次")
-
-        while time.time() - start_time < max_wait_time:
-            try:
-                result = ai.get_video_driven_result(args.task_id)
-                print(f"📋 API响应: {result}")
-
-                # 检查任务状态
-                if isinstance(result, dict):
-                    status = result.get("status", "unknown")
-                    if status == "done":
-                        print(f"✅ 任务完成！")
-
-                        # 下载视频
-                        if result.get("video_url"):
-                            video_url = result["video_url"]
-                            filename = args.filename or f"video_driven_{args.task_id}.mp4"
-                            download_video(video_url, filename)
-                            print("\n🎉 单图视频驱动视频生成完成！")
-                            print("=" * 50)
-                            print(f"🆔 任务ID: {args.task_id}")
-                            print(f"📹 视频URL: {video_url}")
-                            print(f"🏷️ 隐式标识: {'已添加' if result.get('aigc_meta_tagged') else '未添加'}")
-                            print("=" * 50)
-                        return
-                    elif status in ["not_found", "expired"]:
-                        print(f"❌ 任务异常: {status}")
-                        return
-
-                    else:
-                        # 优先使用API返回的中文message，如果没有则使用status
-                        message = result.get("message", f"任务状态: {status}")
-                        print(f"⏳ 任务进行中... {message}")
-
-                else:
-                    print(f"⏳ 任务进行中... 状态: {result}")
-
-                time.sleep(check_interval)
-
-            except Exception as e:
-                print(f"⚠️ 查询出错: {str(e)}，{check_interval}秒后重试...")
-                time.sleep(check_interval)
-
-        print(f"⏰ 等待超时 ({max_wait_time}秒)，任务可能仍在处理")
-        print(f"💡 提示: 可手动继续查询: python volcengine_ai.py vv query {args.task_id}")
+
+        result = wait_task(lambda: ai.wait_video_driven_result(args.task_id),
+                           f"python volcengine_ai.py vv query {args.task_id}")
+        if result is None:
+            return
+
+        print(f"✅ 任务完成！")
+        print(f"📋 API响应: {result}")
+
+        # 下载视频
+        if result.get("video_url"):
+            video_url = result["video_url"]
+            filename = args.filename or f"video_driven_{args.task_id}.mp4"
+            download_video(video_url, filename, task_id=args.task_id)
+            print("\n🎉 单图视频驱动视频生成完成！")
+            print("=" * 50)
+            print(f"🆔 任务ID: {args.task_id}")
+            print(f"📹 视频URL: {video_url}")
+            print(f"🏷️ 隐式标识: {'已添加' if result.get('aigc_meta_tagged') else '未添加'}")
+            print("=" * 50)
 
     except Exception as e:
         print(f"❌ 查询失败: {str(e)}")